@@ -1,8 +1,11 @@
+import json
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from threading import Lock
 from typing import Any, List, Dict
 
+import numpy as np
+
 
 """
 PSM (becomes a python dict)
@@ -43,7 +46,7 @@ def get_rt_bounds(rt: float, offset: float) -> Boundary:
 @dataclass
 class AbstractPSMTree(ABC):
     db: Any
-    _lock: Lock = Lock()
+    _lock: Lock = field(default_factory=Lock, repr=False)
 
     @abstractmethod
     def search(self, mz_bounds: Boundary, ook0_bounds: Boundary, rt_bounds: Boundary) -> List[Dict]:
@@ -77,45 +80,227 @@ class AbstractPSMTree(ABC):
         """
         pass
 
-"""
-Remove pass and replace with actual code
-"""
 
 @dataclass
-class PsmRedBlackTree(AbstractPSMTree):
-    db: RedBlackTree = RedBlackTree()
+class ArrayPSMTree(AbstractPSMTree, ABC):
+    """
+    Base for PSMTrees which index the (mz, ook0, rt) of each psm in numpy arrays. db holds the psm dicts, the index
+    refers to psm's by their position in db.
+
+    psm's passed to add are kept in a small pending buffer which is scanned linearly, the index is rebuilt once the
+    buffer grows past rebuild_fraction of the indexed psm's (and at least min_rebuild_size).
+    """
+    db: List[Dict] = field(default_factory=list)
+    min_rebuild_size: int = 4096
+    rebuild_fraction: float = 0.1
+    _points: np.ndarray = field(default=None, init=False, repr=False)
+    _pending: List[Dict] = field(default_factory=list, init=False, repr=False)
+
+    def __post_init__(self):
+        if len(self.db) > 0:
+            self._build(self.db)
+
+    @classmethod
+    def from_arrays(cls, mz: np.ndarray, ook0: np.ndarray, rt: np.ndarray, psms: List[Dict] = None, **kwargs):
+        """
+        Bulk builds a PSMTree from (mz, ook0, rt) arrays. When psms is None a {"mz", "ook0", "rt"} dict is created
+        for each point.
+        """
+        points = np.column_stack([mz, ook0, rt]).astype(np.float64)
+        if psms is None:
+            psms = [{"mz": mz_val, "ook0": ook0_val, "rt": rt_val} for mz_val, ook0_val, rt_val in points.tolist()]
+        elif len(psms) != len(points):
+            raise ValueError(f"expected {len(points)} psm's, got {len(psms)}")
+
+        tree = cls(**kwargs)
+        with tree._lock:
+            tree.db = list(psms)
+            tree._points = points
+            tree._build_index()
+        return tree
 
     def search(self, mz_bounds: Boundary, ook0_bounds: Boundary, rt_bounds: Boundary) -> List[Dict]:
-        pass
+        db = self.db
+        return [db[i] for i in self.search_indexes(mz_bounds, ook0_bounds, rt_bounds).tolist()]
+
+    def search_indexes(self, mz_bounds: Boundary, ook0_bounds: Boundary, rt_bounds: Boundary) -> np.ndarray:
+        """
+        Returns the db indexes of all psm's within the bounds
+        """
+        lower = np.array([mz_bounds.lower, ook0_bounds.lower, rt_bounds.lower])
+        upper = np.array([mz_bounds.upper, ook0_bounds.upper, rt_bounds.upper])
+
+        with self._lock:
+            indexes = self._search_index(lower, upper) if self._points is not None else np.array([], dtype=np.int64)
+            if len(self._pending) > 0:
+                pending_points = np.array([[psm["mz"], psm["ook0"], psm["rt"]] for psm in self._pending])
+                in_bounds = np.all((pending_points >= lower) & (pending_points <= upper), axis=1)
+                pending_start = len(self.db) - len(self._pending)
+                indexes = np.concatenate([indexes, pending_start + np.flatnonzero(in_bounds)])
+        return indexes
 
     def add(self, psm: Dict) -> None:
-        pass
+        with self._lock:
+            self.db.append(psm)
+            self._pending.append(psm)
+            if len(self._pending) >= max(self.min_rebuild_size, self.rebuild_fraction * len(self.db)):
+                self._merge_pending()
 
     def len(self) -> int:
-        pass
+        return len(self.db)
+
+    def __len__(self):
+        return len(self.db)
 
     def save(self, file_name: str) -> None:
-        pass
+        with self._lock, open(file_name, "w") as file:
+            for psm in self.db:
+                file.write(json.dumps(psm) + "\n")
 
     def load(self, file_name: str) -> None:
+        with open(file_name) as file:
+            psms = [json.loads(line) for line in file if line.strip()]
+        with self._lock:
+            self._build(self.db + psms)
+
+    def _build(self, psms: List[Dict]) -> None:
+        self.db = list(psms)
+        self._pending = []
+        self._points = np.array([[psm["mz"], psm["ook0"], psm["rt"]] for psm in self.db], dtype=np.float64)
+        self._points = self._points.reshape(-1, 3)
+        self._build_index()
+
+    def _merge_pending(self) -> None:
+        pending_points = np.array([[psm["mz"], psm["ook0"], psm["rt"]] for psm in self._pending], dtype=np.float64)
+        self._points = pending_points if self._points is None else np.concatenate([self._points, pending_points])
+        self._pending = []
+        self._build_index()
+
+    @abstractmethod
+    def _build_index(self) -> None:
+        """
+        (re)builds the index over self._points
+        """
+        pass
+
+    @abstractmethod
+    def _search_index(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        returns the indexes of all indexed points within [lower, upper] (inclusive)
+        """
         pass
 
 
 @dataclass
-class PsmKDTree(AbstractPSMTree):
-    db: KDTree = KDTree()
+class PsmRedBlackTree(ArrayPSMTree):
+    """
+    Interval index over m/z: points are kept sorted by m/z, so the m/z bounds map to one contiguous run found by
+    binary search. The ook0 and rt bounds are then applied to that run with a vectorised mask.
+    """
+    _order: np.ndarray = field(default=None, init=False, repr=False)
+    _sorted_points: np.ndarray = field(default=None, init=False, repr=False)
 
-    def search(self, mz_bounds: Boundary, ook0_bounds: Boundary, rt_bounds: Boundary) -> List[Dict]:
-        pass
+    def _build_index(self) -> None:
+        self._order = np.argsort(self._points[:, 0], kind='stable')
+        self._sorted_points = self._points[self._order]
 
-    def add(self, psm: Dict) -> None:
-        pass
+    def _search_index(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        sorted_mz = self._sorted_points[:, 0]
+        start = np.searchsorted(sorted_mz, lower[0], side='left')
+        end = np.searchsorted(sorted_mz, upper[0], side='right')
 
-    def len(self) -> int:
-        pass
+        candidates = self._sorted_points[start:end, 1:]
+        in_bounds = np.all((candidates >= lower[1:]) & (candidates <= upper[1:]), axis=1)
+        return np.sort(self._order[start:end][in_bounds])
 
-    def save(self, file_name: str) -> None:
-        pass
 
-    def load(self, file_name: str) -> None:
-        pass
\ No newline at end of file
+@dataclass
+class PsmKDTree(ArrayPSMTree):
+    """
+    Static KD-tree over (mz, ook0, rt). Nodes are split at the median of their widest dimension until they hold at
+    most leaf_size points, points are reordered so every node covers one contiguous slice. Nodes are stored in flat
+    arrays (bounding box, children, slice). A search skips nodes whose bounding box misses the query box, takes whole
+    nodes inside the box and masks the points of leaves which partially overlap.
+
+    Dimensions are compared in their own units, the split dimension is chosen after scaling by the spread of each
+    dimension.
+    """
+    leaf_size: int = 256
+    _order: np.ndarray = field(default=None, init=False, repr=False)
+    _sorted_points: np.ndarray = field(default=None, init=False, repr=False)
+    _node_lower: np.ndarray = field(default=None, init=False, repr=False)
+    _node_upper: np.ndarray = field(default=None, init=False, repr=False)
+    _node_children: np.ndarray = field(default=None, init=False, repr=False)
+    _node_slices: np.ndarray = field(default=None, init=False, repr=False)
+
+    def _build_index(self) -> None:
+        points = self._points
+        order = np.arange(len(points))
+        scale = np.ptp(points, axis=0) if len(points) > 0 else np.ones(3)
+        scale[scale == 0] = 1
+
+        node_lower, node_upper, node_children, node_slices = [], [], [], []
+        stack = [(-1, 0, len(points))]  # (parent node, start, end)
+        while stack:
+            parent, start, end = stack.pop()
+            node = len(node_slices)
+            if parent >= 0:
+                node_children[parent][0 if node_children[parent][0] == -1 else 1] = node
+
+            node_points = points[order[start:end]]
+            if end > start:
+                node_lower.append(node_points.min(axis=0))
+                node_upper.append(node_points.max(axis=0))
+            else:
+                node_lower.append(np.full(3, np.inf))
+                node_upper.append(np.full(3, -np.inf))
+            node_children.append([-1, -1])
+            node_slices.append((start, end))
+
+            if end - start <= self.leaf_size:
+                continue
+
+            split_dim = int(np.argmax((node_upper[-1] - node_lower[-1]) / scale))
+            mid = (end - start) // 2
+            order[start:end] = order[start:end][np.argpartition(node_points[:, split_dim], mid)]
+            stack.append((node, start + mid, end))
+            stack.append((node, start, start + mid))
+
+        self._order = order
+        self._sorted_points = points[order]
+        self._node_lower = np.array(node_lower).reshape(-1, 3)
+        self._node_upper = np.array(node_upper).reshape(-1, 3)
+        self._node_children = np.array(node_children, dtype=np.int64).reshape(-1, 2)
+        self._node_slices = np.array(node_slices, dtype=np.int64).reshape(-1, 2)
+
+    def _search_index(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        node_lower, node_upper = self._node_lower, self._node_upper
+        node_children, node_slices = self._node_children, self._node_slices
+        lower_list, upper_list = lower.tolist(), upper.tolist()
+
+        results = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            box_lower, box_upper = node_lower[node].tolist(), node_upper[node].tolist()
+
+            if any(box_lower[d] > upper_list[d] or box_upper[d] < lower_list[d] for d in range(3)):
+                continue
+
+            start, end = node_slices[node]
+            if all(box_lower[d] >= lower_list[d] and box_upper[d] <= upper_list[d] for d in range(3)):
+                results.append(self._order[start:end])
+                continue
+
+            left, right = node_children[node]
+            if left == -1:
+                leaf_points = self._sorted_points[start:end]
+                in_bounds = np.all((leaf_points >= lower) & (leaf_points <= upper), axis=1)
+                results.append(self._order[start:end][in_bounds])
+            else:
+                stack.append(right)
+                stack.append(left)
+
+        if len(results) == 0:
+            return np.array([], dtype=np.int64)
+        return np.sort(np.concatenate(results))
@@ -0,0 +1,36 @@
+import argparse
+
+from src.senpy.spectra.library import SpectralLibraryWriter, add_search_spectra
+
+
+def parse_args():
+    # Parse Arguments
+    parser = argparse.ArgumentParser(description='Build a spectral library from identified ms2 spectra')
+    parser.add_argument('--ms2', nargs='+', required=True, type=str, help='path to ms2 files')
+    parser.add_argument('--filter', nargs='+', required=True, type=str,
+                        help='path to DTASelect-filter files, one per ms2 file (or a single file for all)')
+    parser.add_argument('--out', required=True, type=str, help='path to the library file (.slib)')
+    parser.add_argument('--min_xcorr', required=False, type=float, default=0,
+                        help='peptides below this XCorr are not added')
+    parser.add_argument('--dta_filter_version', required=False, type=str, default=None,
+                        help='DTASelect-filter version, detected from the file header by default')
+    return parser.parse_args()
+
+
+def get_file_pairs(args):
+    if len(args.filter) == 1:
+        return [(ms2, args.filter[0]) for ms2 in args.ms2]
+
+    if len(args.filter) != len(args.ms2):
+        raise ValueError(f"expected 1 or {len(args.ms2)} DTASelect-filter files, got {len(args.filter)}")
+    return list(zip(args.ms2, args.filter))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with SpectralLibraryWriter(args.out) as writer:
+        for ms2_path, filter_path in get_file_pairs(args):
+            n_added = add_search_spectra(writer, ms2_path, filter_path, min_x_corr=args.min_xcorr,
+                                         dta_filter_version=args.dta_filter_version)
+            print(f"{ms2_path}: {n_added} spectra added")
+    print(f"{args.out}: {len(writer)} spectra")
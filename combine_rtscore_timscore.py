@@ -1,6 +1,7 @@
 import argparse
 
-from src.senpy.sqt import parser as sqt_parser
+from src.senpy.sqt.columns import MLineColumns_v2_1_0
+from src.senpy.sqt.patch import patch_m_line_columns, read_m_line_column
 
 
 def parse_args():
@@ -16,15 +17,9 @@ def parse_args():
 
 
 def combine_sqt(sqt_rt, sqt_tims):
-    _, s_lines_rt = sqt_parser.read_file(sqt_rt)
-    _, s_lines_tims = sqt_parser.read_file(sqt_tims)
-
-    for s_line_rt, s_line_tim in zip(s_lines_rt, s_lines_tims):
-
-        for m_line_rt, m_line_tim in zip(s_line_rt.m_lines, s_line_tim.m_lines):
-            m_line_tim.predicted_ook0 = m_line_rt.tims_score
-
-    sqt_parser.write_file(_, s_lines_tims, sqt_tims + ".comb", version="v2.1.0_ext")
+    # both files come from the same search, so their M lines line up
+    rt_scores = read_m_line_column(sqt_rt, MLineColumns_v2_1_0.tims_score.value)
+    patch_m_line_columns(sqt_tims, sqt_tims + ".comb", {MLineColumns_v2_1_0.predicted_ook0.value: rt_scores})
 
 
 if __name__ == '__main__':
@@ -65,6 +65,9 @@ def make_hdf5_file(analysis_dir):
         ("scan_num_end", np.float32)
     ]
 
+    msms_batch = td.readPasefMsMsBatch([item.id for item in precursors_table_items
+                                        if item.monoisotopic_mz is not None and item.charge is not None])
+
     spectras, precursors = [], []
     for item in tqdm(precursors_table_items):
 
@@ -76,11 +79,10 @@ def make_hdf5_file(analysis_dir):
         ook0 = td.scanNumToOneOverK0(item.parent_frame, [item.scan_number])[0]
         ccs = oneOverK0ToCCSforMz(ook0, item.charge, item.monoisotopic_mz)
 
-        msms_spectra = td.readPasefMsMs([item.id])
-        n_peaks = len(msms_spectra[item.id][0])
-        spectra = np.zeros(n_peaks, dtype=peak_dt)
-        spectra["mz_array"] = msms_spectra[item.id][0]
-        spectra["intensity_array"] = msms_spectra[item.id][1]
+        mz_array, intensity_array = msms_batch.get_peaks(item.id)
+        spectra = np.zeros(len(mz_array), dtype=peak_dt)
+        spectra["mz_array"] = mz_array
+        spectra["intensity_array"] = intensity_array
         spectras.append(spectra)
 
         precursor = np.zeros(1, dtype=precursor_dt)
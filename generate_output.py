@@ -1,11 +1,13 @@
 import argparse
 import os.path
 
+import numpy as np
+
 from src.senpy.ms2.lines import ILine
-from src.senpy.ms2.fast_parser import read_file
-from src.senpy.dtaSelectFilter.parser import read_file as parse_filter
-from src.senpy.out.line import OutLine
-from src.senpy.out.parser import write_file
+from src.senpy.ms2.scan_map import MISSING, ScanPrecursorMap
+from src.senpy.ms2.fast_parser import read_file_incrementally
+from src.senpy.dtaSelectFilter.parser import read_peptide_scan_index
+from src.senpy.out.codec import OutFileWriter
 
 
 def parse_args():
@@ -18,7 +20,7 @@ def parse_args():
     _parser.add_argument('--out', required=False, type=str, default=None,
                          help='path to DTASelect-filter file')
     _parser.add_argument('--sn2p', required=False, type=str, default=None,
-                         help='path to sn2p file (sn to prec id)')
+                         help='path to sn2p file (sn to prec id) of the searched ms2 file, binary or text')
 
     # Allow for custom ms2 I line keywords
     _parser.add_argument('--retention_time_keyword', required=False, type=str, default=ILine.RETENTION_TIME_KEYWORD,
@@ -58,63 +60,55 @@ def generate_output(ms2_path=None,
                     mz_spectra_keyword=None,
                     dta_filter_version=None
                     ):
+    """
+    Writes the out file of one search as a pipeline: the scan -> peptide index is streamed from the DTASelect-filter,
+    ms2 headers are streamed with peak blocks skipped and every matching spectrum is written as it is read.
+    :return:    int:    number of out rows written
+    """
     ms2_file_name = os.path.basename(ms2_path).split(".ms2")[0]
     print("ms2_file_name: " + ms2_file_name)
 
-    precursor_id_to_scan_number_map = {}
-    if sn2p_path:
-        print("snap")
-        with open(sn2p_path) as file:
-            for line in file:
-                line_elems = line.rstrip().split('\t')
-                precursor_id_to_scan_number_map[int(line_elems[1])] = int(line_elems[0])
-
-
-    peptide_line_by_scan_number_map = {}
-    _, dta_filter_results, _ = parse_filter(filter_path, version=dta_filter_version)
-
     print("DTASelect-filter")
-    for filter_result in dta_filter_results:
-        for peptide_line in filter_result.peptide_lines:
-            if peptide_line.file_name == ms2_file_name:
-                peptide_line_by_scan_number_map[peptide_line.low_scan] = peptide_line
-    print(len(peptide_line_by_scan_number_map))
+    peptide_scan_index = read_peptide_scan_index(filter_path, ms2_file_name, version=dta_filter_version)
+    print(len(peptide_scan_index))
 
-    print("MS2")
-    out_lines = []
-    _, ms2_spectras = read_file(ms2_path)
-    for ms2_spectra in ms2_spectras:
-        ms2_scan_number = int(ms2_spectra.s_line.get_low_scan())
+    if sn2p_path:
+        # the filter scans are scans of the searched ms2 file, join the spectra on precursor id instead
+        scans = np.fromiter(peptide_scan_index, dtype=np.int64, count=len(peptide_scan_index))
+        precursor_ids = ScanPrecursorMap.load(sn2p_path).get_precursor_ids(scans)
+        peptide_hits = {int(precursor_id): peptide_scan_index[int(scan)]
+                        for scan, precursor_id in zip(scans, precursor_ids) if precursor_id != MISSING}
+    else:
+        peptide_hits = peptide_scan_index
 
-        if sn2p_path:
-            if int(ms2_spectra.get_precursor_id()) not in precursor_id_to_scan_number_map:
+    print("MS2")
+    with OutFileWriter(out_path) as writer:
+        for ms2_spectra in read_file_incrementally(ms2_path):
+            key = ms2_spectra.get_precursor_id() if sn2p_path else ms2_spectra.s_line.get_low_scan()
+            peptide_hit = peptide_hits.get(int(key)) if key is not None else None
+            if peptide_hit is None:
                 continue
-            ms2_scan_number = precursor_id_to_scan_number_map[int(ms2_spectra.get_precursor_id())]
-
-        if ms2_scan_number in peptide_line_by_scan_number_map:
-            peptide_line = peptide_line_by_scan_number_map[ms2_scan_number]
-
-            out_line = OutLine(scan_number=peptide_line.low_scan,
-                               sequence=peptide_line.sequence,
-                               charge=peptide_line.charge,
-                               mass=ms2_spectra.z_line.get_mass(),
-                               mz=ms2_spectra.s_line.get_mz(),
-                               x_corr=peptide_line.x_corr,
-                               retention_time=ms2_spectra.get_retention_time(keyword=retention_time_keyword),
-                               OOK0=ms2_spectra.get_ook0(keyword=ook0_keyword),
-                               CCS=ms2_spectra.get_ccs(keyword=ccs_keyword),
-                               collision_energy=ms2_spectra.get_collision_energy(keyword=collision_energy_keyword),
-                               precursor_intensity=ms2_spectra.get_precursor_intensity(
-                                   keyword=precursor_intensity_keyword),
-                               OOK0_spectra=ms2_spectra.get_ook0_spectra(keyword=ook0_spectra_keyword),
-                               CCS_spectra=ms2_spectra.get_ccs_spectra(keyword=ccs_spectra_keyword),
-                               intensity_spectra=ms2_spectra.get_mobility_intensity_spectra(
-                                   keyword=intensity_spectra_keyword),
-                               mz_spectra=ms2_spectra.get_mobility_mz_spectra(keyword=mz_spectra_keyword))
-
-            out_lines.append(out_line)
-
-    write_file(out_lines, out_path)
+
+            writer.write_row(scan_number=peptide_hit.low_scan,
+                             sequence=peptide_hit.sequence,
+                             charge=peptide_hit.charge,
+                             mass=ms2_spectra.z_line.get_mass(),
+                             mz=ms2_spectra.s_line.get_mz(),
+                             x_corr=peptide_hit.x_corr,
+                             retention_time=ms2_spectra.get_retention_time(keyword=retention_time_keyword),
+                             OOK0=ms2_spectra.get_ook0(keyword=ook0_keyword),
+                             CCS=ms2_spectra.get_ccs(keyword=ccs_keyword),
+                             collision_energy=ms2_spectra.get_collision_energy(keyword=collision_energy_keyword),
+                             precursor_intensity=ms2_spectra.get_precursor_intensity(
+                                 keyword=precursor_intensity_keyword),
+                             OOK0_spectra=ms2_spectra.get_ook0_spectra(keyword=ook0_spectra_keyword),
+                             CCS_spectra=ms2_spectra.get_ccs_spectra(keyword=ccs_spectra_keyword),
+                             intensity_spectra=ms2_spectra.get_mobility_intensity_spectra(
+                                 keyword=intensity_spectra_keyword),
+                             mz_spectra=ms2_spectra.get_mobility_mz_spectra(keyword=mz_spectra_keyword))
+
+    print(writer.n_rows)
+    return writer.n_rows
 
 
 if __name__ == '__main__':
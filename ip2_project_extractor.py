@@ -1,10 +1,11 @@
 import argparse
 import os.path
-from glob import glob
-
-import numpy as np
+from functools import partial
+from pathlib import Path
 
 from generate_output import generate_output
+from src.senpy.ip2_project.batch import SearchJob, run_batch
+from src.senpy.ip2_project.file_types import Ip2FileType
 
 # IP2 Files Structure:
 # Project_Name <-- project_path
@@ -21,61 +22,42 @@ from generate_output import generate_output
 def parse_args():
     # Parse Arguments
     _parser = argparse.ArgumentParser(description='Arguments for Ip2 project extractor')
-    _parser.add_argument('--project_path', required=True, type=str, help='path to ip2 project')
+    _parser.add_argument('--project_path', required=True, type=lambda p: Path(p).absolute(),
+                         help='path to ip2 project')
     _parser.add_argument('--output_dir', required=False, type=str, help='path to output dir')
+    _parser.add_argument('-i', '--search_ids', nargs='+', required=False, type=str,
+                         help='searches to extract, defaults to the latest search per experiment')
+    _parser.add_argument('-n', '--processes', required=False, type=int, default=None,
+                         help='number of searches extracted in parallel, defaults to the number of cpus')
+    _parser.add_argument('--force', required=False, action='store_true',
+                         help='rerun searches which are unchanged since the last run')
 
     return _parser.parse_args()
 
 
-def _get_latest_search_dir(experiment_path):
-    search_folder_path = os.path.join(experiment_path, "search", "*")
-    searches = glob(search_folder_path, recursive=True)
-    searches = [search for search in searches if "luciphor_ptm_out_final" not in search]
-    search_times = [os.path.getctime(search) for search in searches]
-    latest_search = searches[np.argmax(search_times)]
-    return latest_search
-
-
-def get_experiments_in_project(project_path):
-    experiments = os.listdir(project_path)
-    experiments.remove("default_params")
-    experiments.remove("tmp_bulk_upload")
-    experiments.remove("activeExpList.txt")
-    return experiments
-
-
-def get_latest_project_search_dirs(project_path):
-    experiments = get_experiments_in_project(project_path)
-    print(f"experiments: {len(experiments)}")
-    search_paths = [_get_latest_search_dir(os.path.join(project_path, expt)) for expt in experiments]
-    return search_paths
-
-
-def assert_file_exist(pth):
-    assert (os.path.isfile(pth))
-
-
-def main(project_path, output_dir=None):
-    ip2_search_paths = get_latest_project_search_dirs(project_path)
-    print([glob(os.path.join(pth, "*.ms2"), recursive=True) for pth in ip2_search_paths])
-    ms2_file_paths = [glob(os.path.join(pth, "*.ms2"), recursive=True)[0] for pth in ip2_search_paths]
-    dta_filter_file_paths = [os.path.join(pth, "DTASelect-filter.txt") for pth in ip2_search_paths]
+def get_out_file_path(job: SearchJob, output_dir=None):
+    ms2_file_path = str(job.get_file(Ip2FileType.MS2))
+    if output_dir:
+        return os.path.join(output_dir, os.path.basename(ms2_file_path) + ".out")
+    return os.path.splitext(ms2_file_path)[0] + ".out"
 
-    # Check that all files exists
-    [assert_file_exist(pth) for pth in ms2_file_paths]
-    [assert_file_exist(pth) for pth in dta_filter_file_paths]
 
-    for ms2_file_path, dta_filter_file_path in zip(ms2_file_paths,dta_filter_file_paths):
+def extract_search(job: SearchJob, output_dir=None):
+    ms2_file_path = str(job.get_file(Ip2FileType.MS2))
+    dta_filter_file_path = str(job.get_file(Ip2FileType.DTA_SELECT_FILTER))
+    return generate_output(ms2_path=ms2_file_path, filter_path=dta_filter_file_path,
+                           out_path=get_out_file_path(job, output_dir), dta_filter_version="v2.1.13_timscore")
 
-        if output_dir:
-            out_file_path = os.path.join(output_dir, os.path.basename(ms2_file_path) + ".out")
-        else:
-            out_file_path = os.path.splitext(ms2_file_path)[0] + ".out"
 
-        generate_output(ms2_path=ms2_file_path, filter_path=dta_filter_file_path,
-                        out_path=out_file_path, dta_filter_version="v2.1.13_timscore")
+def main(project_path, output_dir=None, search_ids=None, processes=None, force=False):
+    n_rows = run_batch(project_path, partial(extract_search, output_dir=output_dir),
+                       [Ip2FileType.MS2, Ip2FileType.DTA_SELECT_FILTER], task_name='extractor',
+                       search_ids=search_ids, processes=processes, force=force,
+                       get_outputs=lambda job: [get_out_file_path(job, output_dir)])
+    print(f"out rows written: {sum(n_rows.values())} from {len(n_rows)} searches")
 
 
 if __name__ == '__main__':
     args = parse_args()
-    main(project_path=args.project_path, output_dir=args.output_dir)
+    main(project_path=args.project_path, output_dir=args.output_dir, search_ids=args.search_ids,
+         processes=args.processes, force=args.force)
@@ -2,10 +2,14 @@ import argparse
 import os.path
 from pathlib import Path
 
+from src.senpy.ip2_project.batch import SearchJob, discover_search_jobs, run_batch
 from src.senpy.ip2_project.file_types import Ip2FileType
-from src.senpy.ip2_project.search import get_file_from_search
-from src.senpy.ip2_project.project import get_latest_search_per_experiment, get_searches_matching_ids
-from src.senpy.sqt.parser import read_file, write_file
+from src.senpy.sqt.columns import MLineColumns_v2_1_0_ext
+from src.senpy.sqt.patch import set_m_line_columns
+
+# values written by MLine.serialize for 0
+ZERO_PREDICTED_OOK0 = '0.0000'
+ZERO_TIMS_SCORE = '0'
 
 def parse_args():
     # Parse Arguments
@@ -13,6 +17,10 @@ def parse_args():
     _parser.add_argument('-p', '--project', required=True, type=lambda p: Path(p).absolute(), help='path to ip2 project')
     _parser.add_argument('-i', '--search_ids', nargs='+', required=False, type=str, help='experiment to convert')
     _parser.add_argument('-l', '--list_files', required=False, action='store_true', help='only list files')
+    _parser.add_argument('-n', '--processes', required=False, type=int, default=None,
+                         help='number of searches processed in parallel, defaults to the number of cpus')
+    _parser.add_argument('--force', required=False, action='store_true',
+                         help='rerun searches which are unchanged since the last run')
 
     return _parser.parse_args()
 
@@ -22,38 +30,25 @@ def assert_file_exist(pth):
 
 
 def set_timsscore_to_zero(sqt: Path):
-    h_lines, s_lines = read_file(str(sqt))
-
-    for s_line in s_lines:
-        for m_line in s_line.m_lines:
-            m_line.tims_score = 0
-            m_line.predicted_ook0 = 0
+    set_m_line_columns(str(sqt), str(sqt), {MLineColumns_v2_1_0_ext.predicted_ook0.value: ZERO_PREDICTED_OOK0,
+                                            MLineColumns_v2_1_0_ext.tims_score.value: ZERO_TIMS_SCORE})
 
-    write_file(h_lines, s_lines, str(sqt), version='v2.1.0_ext')
 
+def set_search_timsscore_to_zero(job: SearchJob):
+    set_timsscore_to_zero(job.get_file(Ip2FileType.SQT))
 
-def convert_projects(project, search_ids=None):
-    if search_ids is None:
-        searches = get_latest_search_per_experiment(project)
-    else:
-        searches = get_searches_matching_ids(project, search_ids)
 
-    sqt_files = [get_file_from_search(search, Ip2FileType.SQT) for search in searches]
-    for sqt in sqt_files:
-        print(sqt)
-
-    con = input("continue: yes/no\n")
-    if con == 'no':
-        print('Quiting')
+def convert_projects(project, search_ids=None, list_files=False, processes=None, force=False):
+    if list_files:
+        for job in discover_search_jobs(project, [Ip2FileType.SQT], search_ids):
+            print(job.get_file(Ip2FileType.SQT))
         return
-    elif con == 'yes':
-        for sqt in sqt_files:
-            print(f'sqt: {sqt}')
-            set_timsscore_to_zero(sqt)
-    else:
-        print("input not recognized!")
+
+    run_batch(project, set_search_timsscore_to_zero, [Ip2FileType.SQT], task_name='set_timscore_zero',
+              search_ids=search_ids, processes=processes, force=force)
 
 
 if __name__ == '__main__':
     args = parse_args()
-    convert_projects(project=args.project, search_ids=args.search_ids)
+    convert_projects(project=args.project, search_ids=args.search_ids, list_files=args.list_files,
+                     processes=args.processes, force=args.force)
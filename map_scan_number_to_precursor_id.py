@@ -1,7 +1,7 @@
 import argparse
-import os
 
-from ms2.fast_parser import read_file
+from src.senpy.ms2.lines import ILine
+from src.senpy.ms2.scan_map import ScanPrecursorMap, get_scan_map_path
 
 
 def parse_args():
@@ -10,31 +10,24 @@ def parse_args():
     _parser.add_argument('--ms2', required=True, type=str,
                          help='path to ms2 file')
     _parser.add_argument('--out', required=False, type=str,
-                         help='output file')
+                         help='output file, defaults to [ms2].sn2p')
+    _parser.add_argument('--precursor_id_keyword', required=False, type=str, default=ILine.PRECURSOR_ID_KEYWORD,
+                         help='I line keyword for precursor id')
 
     return _parser.parse_args()
 
-def main(ms2_path, out_path):
-    ms2_file_name = os.path.basename(ms2_path).split(".ms2")[0]
-    print("ms2_file_name: " + ms2_file_name)
 
-    lines = []
-    _, ms2_spectras = read_file(ms2_path)
-    for ms2_spectra in ms2_spectras:
-        ms2_scan_number = int(ms2_spectra.s_line.get_low_scan())
-        precursor_id = int(ms2_spectra.get_precursor_id())
-        line = '\t'.join([str(ms2_scan_number), str(precursor_id)]) + '\n'
-        lines.append(line)
-
-    with open(out_path, "w") as file:
-        file.write(''.join(lines))
+def main(ms2_path, out_path, precursor_id_keyword=ILine.PRECURSOR_ID_KEYWORD):
+    scan_map = ScanPrecursorMap.from_ms2(ms2_path, precursor_id_keyword)
+    scan_map.save(out_path)
+    print(f"{scan_map}: {out_path}")
 
 
 if __name__ == '__main__':
     args = parse_args()
     if args.out is None:
-        args.out = args.ms2 + ".sn2p"
+        args.out = get_scan_map_path(args.ms2)
 
     print(args)
 
-    main(args.ms2, args.out)
\ No newline at end of file
+    main(args.ms2, args.out, args.precursor_id_keyword)
@@ -2,9 +2,7 @@ import argparse
 import os
 import time
 
-from src.senpy.ms2.fast_parser import read_file as read_file_fast
-from src.senpy.ms2.fast_parser import write_file as write_file_fast
-from src.senpy.ms2.parser import read_file
+from src.senpy.ms2.merge import merge_index_peaks
 
 FILE_OOK0_KEY = "OOK0"
 FILE_RETENTION_TIME_KEY = "Retention_Time"
@@ -20,33 +18,19 @@ def parse_args():
 
 
 def main(ms2_path, index_path):
-    _, ms2_spectras = read_file(ms2_path)
-    _, ms2_index_spectras = read_file_fast(index_path)
-
-    precursor_id_to_peak_lines_map = {}
-    for ms2_spectra in ms2_spectras:
-        prec_id = int(ms2_spectra.get_precursor_id())
-        precursor_id_to_peak_lines_map[prec_id] = ms2_spectra.peak_lines
-
-    for ms2_index_spectra in ms2_index_spectras:
-        prec_id = int(ms2_index_spectra.get_precursor_id())
-        if prec_id in precursor_id_to_peak_lines_map:
-            ms2_index_spectra.peak_lines = precursor_id_to_peak_lines_map[prec_id]
-
-    os.rename(ms2_path, ms2_path + ".bak")
+    # the peak bearing ms2 is kept as .bak and streamed into the merged file at ms2_path
+    backup_path = ms2_path + ".bak"
+    os.rename(ms2_path, backup_path)
 
     # convert to timscore
-    for spectra in ms2_index_spectras:
-        for i_line in spectra.i_line_dict:
-            if "Spectra" not in i_line.line:
-                i_line.line = i_line.line.replace(FILE_OOK0_KEY, TIMSCORE_OOK0_KEY)
-                i_line.line = i_line.line.replace(FILE_RETENTION_TIME_KEY, TIMSCORE_RETENTION_TIME_KEY)
-
-    write_file_fast(_, ms2_index_spectras, ms2_path)
+    keyword_map = {FILE_OOK0_KEY: TIMSCORE_OOK0_KEY, FILE_RETENTION_TIME_KEY: TIMSCORE_RETENTION_TIME_KEY}
+    start_time = time.time()
+    scan_map = merge_index_peaks(index_path, backup_path, ms2_path, keyword_map=keyword_map)
+    print(f"merged {len(scan_map)} spectra in {time.time() - start_time:.2f}s")
 
 
 if __name__ == '__main__':
     args = parse_args()
     print(args)
     main(ms2_path=args.ms2_path, index_path=args.ms2_index_path)
-    print("done!")
\ No newline at end of file
+    print("done!")
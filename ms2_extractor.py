@@ -1,5 +1,6 @@
 import argparse
 import os
+from contextlib import nullcontext
 
 from src.senpy.d_folder.tables import get_frame_table_items
 from src.senpy.d_folder.tables import get_pasef_frame_msms_table_items
@@ -9,9 +10,12 @@ from src.senpy.d_folder.timstof_utils import build_precursor_to_mobility_spectra
     build_frame_id_ms1_scan_map, build_parent_id_to_precursors_map
 
 from src.senpy.ms2.lines import Ms2Spectra, ILine
+from src.senpy.ms2.mobility_store import MobilitySpectraWriter, get_mobility_store_path
+from src.senpy.ms2.scan_map import ScanPrecursorMap, get_scan_map_path
 
 PROTON_MASS = 1.007276466
 VERSION = '0.0.1'
+PASEF_MSMS_BATCH_SIZE = 1000  # precursors per readPasefMsMsBatch call
 
 def parse_args():
     # Parse Arguments
@@ -22,6 +26,9 @@ def parse_args():
                          help='absolute path for output ms2 file')
     _parser.add_argument('--include_mobility_spectra', action='store_true',
                          help='include complete mobility spectra in I lines')
+    _parser.add_argument('--mobility_spectra_store', action='store_true',
+                         help='write mobility spectra to a binary side store ([ms2].mobility), the I lines only hold '
+                              'an index into the store')
     _parser.add_argument('--mobility_spectra_ppm', required=False, type=int, default=15,
                          help='ppm to use for identifying precursor ion')
     _parser.add_argument('--skip_spectra', action='store_true',
@@ -46,7 +53,10 @@ def parse_args():
                          help='keyword for mobility intensity spectra')
 
     # add the command line args from the stream-engine
-    return _parser.parse_args()
+    args = _parser.parse_args()
+    if args.mobility_spectra_store and not args.include_mobility_spectra:
+        _parser.error('--mobility_spectra_store requires --include_mobility_spectra')
+    return args
 
 
 def get_ms2_header(version, ppm, last_scan):
@@ -74,7 +84,8 @@ def extract_ms2_file(analysis_dir: str,
                      output_file: str = None,
                      include_mobility_spectra: bool = False,
                      ppm: int = 15,
-                     skip_spectra: bool = False
+                     skip_spectra: bool = False,
+                     mobility_spectra_store: bool = False
                      ):
 
     if output_file is None:
@@ -107,65 +118,86 @@ def extract_ms2_file(analysis_dir: str,
 
     print('----- Generating Ms2 File -----')
     ms2_header = get_ms2_header(version=VERSION, ppm=ppm, last_scan=len(pasef_frame_msms_table_items))
-    with open(output_file, 'w') as out_file:
-        out_file.write(ms2_header)
-        for item in precursors_table_items:
-
-            if item.monoisotopic_mz is None or item.charge is None:
-                continue
-
-            precursor_mass = (item.monoisotopic_mz * item.charge) - (item.charge - 1) * PROTON_MASS
-            precursor_pasef_frame_msms_info_item = precursor_to_pasef_frame_msms_info_map[item.id]
-            scan_id = ms2_scan_map[item.parent_frame][item.id]
-            ook0 = td.scanNumToOneOverK0(item.parent_frame, [item.scan_number])[0]
-            ccs = oneOverK0ToCCSforMz(ook0, item.charge, item.monoisotopic_mz)
+    scan_numbers, precursor_ids = [], []
+    mobility_store = nullcontext()  # mobility_writer is None without a side store
+    if include_mobility_spectra and mobility_spectra_store:
+        mobility_store = MobilitySpectraWriter(get_mobility_store_path(output_file))
 
-            spectra_mz_array = []
-            spectra_intensity_array = []
+    # the writer removes its partial store if extraction fails
+    with mobility_store as mobility_writer, open(output_file, 'w') as out_file:
+        out_file.write(ms2_header)
+        for batch_start in range(0, len(precursors_table_items), PASEF_MSMS_BATCH_SIZE):
+            batch_items = precursors_table_items[batch_start:batch_start + PASEF_MSMS_BATCH_SIZE]
+            msms_batch = None
             if not skip_spectra:
-                msms_spectra = td.readPasefMsMs([item.id])
-                spectra_mz_array = msms_spectra[item.id][0]
-                spectra_intensity_array = msms_spectra[item.id][1]
-
-            if not skip_spectra and len(spectra_mz_array) == 0:
-                continue
-
-            info_dict = {
-                 ILine.PARENT_ID_KEYWORD: f"{item.parent_frame}",
-                 ILine.PRECURSOR_ID_KEYWORD: f"{item.id}",
-                 ILine.OOK0_KEYWORD: f"{ook0:.4f}",
-                 ILine.CCS_KEYWORD: f"{ccs:.4f}",
-                 ILine.RETENTION_TIME_KEYWORD: f"{frame_table_items[item.parent_frame - 1].time:.4f}",
-                 ILine.COLLISION_ENERGY_KEYWORD: f"{precursor_pasef_frame_msms_info_item.collision_energy:.4f}",
-                 ILine.ISOLATION_MZ_KEYWORD: f"{precursor_pasef_frame_msms_info_item.isolation_mz:.4f}",
-                 ILine.ISOLATION_WIDTH_KEYWORD: f"{precursor_pasef_frame_msms_info_item.isolation_width:.4f}",
-                 ILine.SCAN_NUMBER_BEGIN_KEYWORD: f"{precursor_pasef_frame_msms_info_item.scan_number_begin:.4f}",
-                 ILine.SCAN_NUMBER_END_KEYWORD: f"{precursor_pasef_frame_msms_info_item.scan_number_end:.4f}",
-                 ILine.PRECURSOR_INTENSITY_KEYWORD: f"{item.intensity:.4f}"
-            }
-
-            if include_mobility_spectra:
-                ook0_spectra = td.scanNumToOneOverK0(item.parent_frame, spectra_dict[item.id].scan_numbers)
-                mz_list = td.indexToMz(item.parent_frame, spectra_dict[item.id].indexes)
-                ccs_spectra = [oneOverK0ToCCSforMz(val, item.charge, item.monoisotopic_mz) for val in ook0_spectra]
-                intensity_list = spectra_dict[item.id].intensities
-
-                info_dict[ILine.OOK0_SPECTRA_KEYWORD] = str([round(val, 4) for val in ook0_spectra])
-                info_dict[ILine.CCS_SPECTRA_KEYWORD] = str([round(val, 4) for val in ccs_spectra])
-                info_dict[ILine.MZ_SPECTRA_KEYWORD] = str([round(val, 4) for val in mz_list])
-                info_dict[ILine.INTENSITY_SPECTRA_KEYWORD] = str([round(val, 1) for val in intensity_list])
-
-            precursor_spectra = Ms2Spectra.create(low_scan=scan_id,
-                                                  high_scan=scan_id,
-                                                  mz=item.monoisotopic_mz,
-                                                  charge=item.charge,
-                                                  mass=precursor_mass,
-                                                  mz_spectra=spectra_mz_array,
-                                                  intensity_spectra=spectra_intensity_array,
-                                                  info_dict=info_dict)
-
-            out_file.write(precursor_spectra.serialize())
-
+                msms_batch = td.readPasefMsMsBatch([item.id for item in batch_items
+                                                    if item.monoisotopic_mz is not None and item.charge is not None])
+
+            for item in batch_items:
+
+                if item.monoisotopic_mz is None or item.charge is None:
+                    continue
+
+                precursor_mass = (item.monoisotopic_mz * item.charge) - (item.charge - 1) * PROTON_MASS
+                precursor_pasef_frame_msms_info_item = precursor_to_pasef_frame_msms_info_map[item.id]
+                scan_id = ms2_scan_map[item.parent_frame][item.id]
+                ook0 = td.scanNumToOneOverK0(item.parent_frame, [item.scan_number])[0]
+                ccs = oneOverK0ToCCSforMz(ook0, item.charge, item.monoisotopic_mz)
+
+                spectra_mz_array = []
+                spectra_intensity_array = []
+                if not skip_spectra:
+                    spectra_mz_array, spectra_intensity_array = msms_batch.get_peaks(item.id)
+
+                if not skip_spectra and len(spectra_mz_array) == 0:
+                    continue
+
+                info_dict = {
+                     ILine.PARENT_ID_KEYWORD: f"{item.parent_frame}",
+                     ILine.PRECURSOR_ID_KEYWORD: f"{item.id}",
+                     ILine.OOK0_KEYWORD: f"{ook0:.4f}",
+                     ILine.CCS_KEYWORD: f"{ccs:.4f}",
+                     ILine.RETENTION_TIME_KEYWORD: f"{frame_table_items[item.parent_frame - 1].time:.4f}",
+                     ILine.COLLISION_ENERGY_KEYWORD: f"{precursor_pasef_frame_msms_info_item.collision_energy:.4f}",
+                     ILine.ISOLATION_MZ_KEYWORD: f"{precursor_pasef_frame_msms_info_item.isolation_mz:.4f}",
+                     ILine.ISOLATION_WIDTH_KEYWORD: f"{precursor_pasef_frame_msms_info_item.isolation_width:.4f}",
+                     ILine.SCAN_NUMBER_BEGIN_KEYWORD: f"{precursor_pasef_frame_msms_info_item.scan_number_begin:.4f}",
+                     ILine.SCAN_NUMBER_END_KEYWORD: f"{precursor_pasef_frame_msms_info_item.scan_number_end:.4f}",
+                     ILine.PRECURSOR_INTENSITY_KEYWORD: f"{item.intensity:.4f}"
+                }
+
+                if include_mobility_spectra:
+                    ook0_spectra = td.scanNumToOneOverK0(item.parent_frame, spectra_dict[item.id].scan_numbers)
+                    mz_list = td.indexToMz(item.parent_frame, spectra_dict[item.id].indexes)
+                    ccs_spectra = [oneOverK0ToCCSforMz(val, item.charge, item.monoisotopic_mz) for val in ook0_spectra]
+                    intensity_list = spectra_dict[item.id].intensities
+
+                    if mobility_writer is not None:
+                        info_dict[ILine.MOBILITY_SPECTRA_INDEX_KEYWORD] = str(mobility_writer.add({
+                            ILine.OOK0_SPECTRA_KEYWORD: ook0_spectra,
+                            ILine.CCS_SPECTRA_KEYWORD: ccs_spectra,
+                            ILine.MZ_SPECTRA_KEYWORD: mz_list,
+                            ILine.INTENSITY_SPECTRA_KEYWORD: intensity_list}))
+                    else:
+                        info_dict[ILine.OOK0_SPECTRA_KEYWORD] = str([round(val, 4) for val in ook0_spectra])
+                        info_dict[ILine.CCS_SPECTRA_KEYWORD] = str([round(val, 4) for val in ccs_spectra])
+                        info_dict[ILine.MZ_SPECTRA_KEYWORD] = str([round(val, 4) for val in mz_list])
+                        info_dict[ILine.INTENSITY_SPECTRA_KEYWORD] = str([round(val, 1) for val in intensity_list])
+
+                precursor_spectra = Ms2Spectra.create(low_scan=scan_id,
+                                                      high_scan=scan_id,
+                                                      mz=item.monoisotopic_mz,
+                                                      charge=item.charge,
+                                                      mass=precursor_mass,
+                                                      mz_spectra=spectra_mz_array,
+                                                      intensity_spectra=spectra_intensity_array,
+                                                      info_dict=info_dict)
+
+                out_file.write(precursor_spectra.serialize())
+                scan_numbers.append(scan_id)
+                precursor_ids.append(item.id)
+
+    ScanPrecursorMap(scan_numbers, precursor_ids).save(get_scan_map_path(output_file))
     print("Done!")
 
 
@@ -208,5 +240,6 @@ if __name__ == '__main__':
                      output_file=args.output_ms2_path,
                      include_mobility_spectra=args.include_mobility_spectra,
                      ppm=args.mobility_spectra_ppm,
-                     skip_spectra=args.skip_spectra
+                     skip_spectra=args.skip_spectra,
+                     mobility_spectra_store=args.mobility_spectra_store
                      )
@@ -1,22 +1,14 @@
 import argparse
-import re
+from functools import partial
 from pathlib import Path
 
-import numpy as np
-import pandas as pd
-from deeplc import DeepLC
-import scipy.stats as stats
-
+from src.senpy.ip2_project.batch import SearchJob, run_batch
 from src.senpy.ip2_project.file_types import Ip2FileType
-from src.senpy.ip2_project.project import get_latest_search_per_experiment, get_searches_matching_ids
-from src.senpy.ip2_project.search import get_file_from_search
 from src.senpy.ms2.lines import ILine
-from src.senpy.ms2 import fast_parser as fast_ms2_parser
-from src.senpy.sqt import parser as sqt_parser
+from src.senpy.rt_score.engine import generate_rt_score_sqt
+from src.senpy.rt_score.predictors import CompositionPredictor, DeepLCPredictor
 
-MOD_MAP = {}
-MOD_MAP['(15.994915)'] = 'Oxidation'
-MOD_MAP['(0.984016)'] = 'Deamidated'
+PREDICTORS = {'deeplc': DeepLCPredictor, 'composition': CompositionPredictor}
 
 
 def parse_args():
@@ -34,104 +26,29 @@ def parse_args():
     _parser.add_argument('-i', '--search_ids', nargs='+', required=False, type=str, help='experiment to convert')
     _parser.add_argument('--retention_time_keyword', required=False, type=str, default=ILine.RETENTION_TIME_KEYWORD,
                          help='I line keyword for retention time')
+    _parser.add_argument('-n', '--processes', required=False, type=int, default=None,
+                         help='number of searches scored in parallel, defaults to the number of cpus')
+    _parser.add_argument('--force', required=False, action='store_true',
+                         help='rescore searches which are unchanged since the last run')
+    _parser.add_argument('--predictor', required=False, type=str, default='deeplc', choices=list(PREDICTORS),
+                         help='retention time predictor')
 
     # add the command line args from the stream-engine
     return _parser.parse_args()
 
 
-def get_scan_num_to_retention_time_map(ms2_spectras, retention_time_keyword):
-    scan_num_to_retention_time_map = {}
-    for ms2_spectra in ms2_spectras:
-        rt = float(ms2_spectra.get_retention_time(keyword=retention_time_keyword))
-        sn = int(ms2_spectra.s_line.get_low_scan())
-        scan_num_to_retention_time_map[sn] = rt
-    return scan_num_to_retention_time_map
-
-
-def convert_mod_sequence(sequence):
-    mods = []
-
-    for key in MOD_MAP:
-        while sequence.find(key) != -1:
-            itr = 0
-            for aa in sequence[:sequence.find(key)]:
-                if aa.isalpha():
-                    itr += 1
-            sequence = sequence.replace(key, "", 1)
-            mods.append(f"{itr}|{MOD_MAP[key]}")
-    return mods, sequence
-
-
-def calculate_score(error, std):
-    z_score = error / std
-    timsscore = stats.norm.sf(abs(z_score)) * 2
-    return timsscore
-
-
-def is_valid_sequence(sequence):
-    return bool(re.match('^[ARNDCEQGHILKMFPSTWYV]+$', sequence))
-
-
-def generate_rt_score_sqt(sqt_file, ms2_file, out_file, retention_time_keyword):
-    _, ms2_spectras = fast_ms2_parser.read_file(ms2_file)
-    _, s_lines = sqt_parser.read_file(sqt_file)
-
-    rt_by_sn_map = get_scan_num_to_retention_time_map(ms2_spectras, retention_time_keyword)
+def get_predictor(name):
+    return PREDICTORS[name]()
 
-    data = {'ip2_seq': [], 'tr': [], 'reverse': [], 'xcorr': [], 'm_line_number': []}
-    for s_line in s_lines:
-        for i, m_line in enumerate(s_line.m_lines):
-            data['ip2_seq'].append(m_line.sequence)
-            data['tr'].append(rt_by_sn_map[s_line.low_scan])
-            data['xcorr'].append(m_line.xcorr)
-            data['reverse'].append(m_line.is_reverse())
-            data['m_line_number'].append(i)
 
-    df = pd.DataFrame(data)
-    df['clean_seq'] = [seq[2:-2] for seq in df.ip2_seq]
-    df['modifications'] = ["|".join(convert_mod_sequence(seq)[0]) for seq in df.clean_seq]
-    df['seq'] = [convert_mod_sequence(seq)[1] for seq in df.clean_seq]
-    df['is_valid'] = [is_valid_sequence(seq) for seq in df.seq]
+def get_rt_score_path(job: SearchJob) -> str:
+    return str(job.get_file(Ip2FileType.SQT)) + ".rtscore"
 
-    x_corr_percentile = np.percentile(df[(df.reverse == False) & (df.m_line_number == 0)].xcorr, 95)
-    print(x_corr_percentile)
 
-    align_df = df[(df.reverse == False) & (df.xcorr >= x_corr_percentile)
-                  & (df.is_valid == True) & (df.m_line_number == 0)]
-    print("number of alignment peptides: ", len(align_df))
-
-    dlc = DeepLC()
-    dlc.calibrate_preds(seq_df=align_df)
-
-    prediction_df = df[(df.is_valid == True)]
-    prediction_df['pred_rt'] = dlc.make_preds(seq_df=prediction_df)
-
-    prediction_df_targets = prediction_df[
-        (prediction_df.xcorr >= x_corr_percentile) & (prediction_df.reverse == False) & (
-                    prediction_df.m_line_number == 0)]
-
-    pred_error = prediction_df_targets.tr - prediction_df_targets.pred_rt
-    pred_rt_by_seq_dict = {seq: rt for seq, rt in zip(prediction_df.ip2_seq, prediction_df.pred_rt)}
-    rt_std = np.std(pred_error)
-
-    # Update experimental ook0 values and generate timscores
-    for s_line in s_lines:
-        experimental_rt = rt_by_sn_map[s_line.low_scan]
-        s_line.experimental_ook0 = experimental_rt
-        for m_line in s_line.m_lines:
-            sequence = m_line.sequence
-            if sequence in pred_rt_by_seq_dict and m_line.xcorr != 0:
-                predicted_rt = pred_rt_by_seq_dict[sequence]
-                error = experimental_rt - predicted_rt
-                timsscore = calculate_score(error, rt_std)
-            else:
-                predicted_rt = None
-                timsscore = None
-
-            m_line.predicted_ook0 = predicted_rt
-            m_line.tims_score = timsscore
-
-    sqt_parser.write_file(_, s_lines, str(out_file), version="v2.1.0_ext")
+def rt_score_search(job: SearchJob, predictor_name: str, retention_time_keyword: str):
+    sqt = job.get_file(Ip2FileType.SQT)
+    generate_rt_score_sqt(str(sqt), str(job.get_file(Ip2FileType.MS2)), get_rt_score_path(job),
+                          get_predictor(predictor_name), retention_time_keyword=retention_time_keyword)
 
 
 if __name__ == '__main__':
@@ -139,25 +56,15 @@ if __name__ == '__main__':
 
     print(args)
 
-    if args.project and args.search_ids:
-
-        searches = get_searches_matching_ids(args.project, args.search_ids)
-        sqt_files = [get_file_from_search(search, Ip2FileType.SQT) for search in searches]
-        ms2_files = [get_file_from_search(search, Ip2FileType.MS2) for search in searches]
-
-        print("sqt_files: ", sqt_files)
-        print("ms2_files: ", ms2_files)
-        con = input("continue: yes/no\n")
-        if con != "yes":
-            quit(1)
-
-        for ms2, sqt in zip(ms2_files, sqt_files):
-            if args.newfile:
-                args.out = Path(str(sqt) + ".rtscore")
-            print(str(ms2).split("\\")[-1])
-            generate_rt_score_sqt(str(sqt), str(ms2), str(args.out), retention_time_keyword=args.retention_time_keyword)
+    if args.project:
+        # every search is written to [sqt].rtscore
+        run_batch(args.project, partial(rt_score_search, predictor_name=args.predictor,
+                                        retention_time_keyword=args.retention_time_keyword),
+                  [Ip2FileType.SQT, Ip2FileType.MS2], task_name='rtscore', search_ids=args.search_ids,
+                  processes=args.processes, force=args.force, get_outputs=lambda job: [get_rt_score_path(job)])
 
     if args.sqt and args.ms2:
         if args.newfile:
             args.out = Path(str(args.sqt) + ".rtscore")
-        generate_rt_score_sqt(args.sqt, args.ms2, args.out, retention_time_keyword=args.retention_time_keyword)
+        generate_rt_score_sqt(args.sqt, args.ms2, str(args.out), get_predictor(args.predictor),
+                              retention_time_keyword=args.retention_time_keyword)
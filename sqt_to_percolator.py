@@ -1,130 +1,183 @@
 import argparse
-import re
+from multiprocessing import Pool
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
 
+import numpy as np
+import pandas as pd
 from Bio.SeqUtils.ProtParam import ProteinAnalysis
 
-from senpy.sqt.lines import SLine
+from src.senpy.ip2_project.file_types import Ip2FileType
+from src.senpy.ip2_project.project import get_latest_search_per_experiment, get_searches_matching_ids
+from src.senpy.ip2_project.search import get_file_from_search
 from src.senpy.sqt import parser as sqt_parser
 
+PIN_COLUMNS = ['PSMId', 'Label', 'ScanNr', 'ExpMass', 'CalcMass', 'seq_len', 'charge1', 'charge2', 'charge3',
+               'charge4', 'SP', 'aromaticity', 'instability_index', 'gravy', 'helix', 'turn', 'sheet', 'BB', 'TIMScore',
+               'RTScore', 'xcorr', 'deltaCN', 'Peptide', 'Proteins']
+PIN_CHARGES = np.arange(1, 5)
+
+# Bull-Breese hydrophobicity, indexed by byte value, nan for residues without a value
+BB_AMINO_ACIDS = 'ARNDCEQGHILKMFPSTWYV'
+BB_VALUES = [610, 690, 890, 610, 360, 970, 510, 810, 690, -1450, -1650, 460, -660, -1520, -170, 420, 290, -1200, -1430,
+             -750]
+BB_TABLE = np.full(256, np.nan, dtype=np.float64)
+BB_TABLE[np.frombuffer(BB_AMINO_ACIDS.encode(), dtype=np.uint8)] = BB_VALUES
+
+# ProtParam features of every unique sequence seen by this process
+_PROT_PARAM_CACHE: Dict[str, Tuple[float, float, float, float, float, float]] = {}
+
 
 def parse_args():
     # Parse Arguments
-    _parser = argparse.ArgumentParser(description='Arguments for Ms2 Extractor')
-    _parser.add_argument('--sqt', required=False, type=str,
-                         help='path to sqt file')
+    _parser = argparse.ArgumentParser(description='Convert sqt files to percolator pin files')
+    _parser.add_argument('--sqt', nargs='+', required=False, type=str, default=[],
+                         help='path to sqt files, each is written to [sqt].tsv')
+    _parser.add_argument('-p', '--project', required=False, type=lambda p: Path(p).absolute(), help='path to ip2 project')
+    _parser.add_argument('-i', '--search_ids', nargs='+', required=False, type=str, help='searches to convert')
+    _parser.add_argument('--out', required=False, type=str, default=None,
+                         help='write a single combined pin file instead of one per sqt')
+    _parser.add_argument('-n', '--processes', required=False, type=int, default=None,
+                         help='number of sqt files converted in parallel, defaults to the number of cpus')
 
     # add the command line args from the stream-engine
     return _parser.parse_args()
 
 
-def convert_sqt_to_pin(sqt: str):
-    s_lines = List[SLine]
+def get_prot_param_features(sequence: str) -> Tuple[float, float, float, float, float, float]:
+    """
+    Returns (aromaticity, instability_index, gravy, helix, turn, sheet) of the sequence, computed once per sequence
+    """
+    features = _PROT_PARAM_CACHE.get(sequence)
+    if features is None:
+        analysis = ProteinAnalysis(sequence)
+        helix, turn, sheet = analysis.secondary_structure_fraction()
+        features = (analysis.aromaticity(), analysis.instability_index(), analysis.gravy(), helix, turn, sheet)
+        _PROT_PARAM_CACHE[sequence] = features
+    return features
+
+
+def compute_bull_breese(sequences: np.ndarray) -> np.ndarray:
+    """
+    Returns the mean Bull-Breese value of every sequence. Only the 20 standard residues (upper case) have a value,
+    any other residue (X, B, Z, U, lower case) raises a KeyError.
+    """
+    residues = np.frombuffer("".join(sequences).encode(), dtype=np.uint8)
+    residue_values = BB_TABLE[residues]
+    unknown_residues = np.flatnonzero(np.isnan(residue_values))
+    if len(unknown_residues):
+        raise KeyError(bytes(residues[unknown_residues[:1]]).decode(errors='replace'))
+
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    return np.add.reduceat(residue_values, starts) / lengths
+
+
+def get_peptide_feature_table(sequences: List[str]) -> pd.DataFrame:
+    """
+    Computes the sequence features once per unique sequence and expands them to one row per sequence
+    """
+    unique_sequences, inverse = np.unique(np.array(sequences, dtype=str), return_inverse=True)
+    prot_param_features = np.array([get_prot_param_features(sequence) for sequence in unique_sequences.tolist()],
+                                   dtype=np.float64).reshape(-1, 6)
+    unique_features = {
+        'seq_len': np.char.str_len(unique_sequences),
+        'aromaticity': prot_param_features[:, 0],
+        'instability_index': prot_param_features[:, 1],
+        'gravy': prot_param_features[:, 2],
+        'helix': prot_param_features[:, 3],
+        'turn': prot_param_features[:, 4],
+        'sheet': prot_param_features[:, 5],
+        'BB': compute_bull_breese(unique_sequences.tolist()) if len(unique_sequences) > 0 else np.array([]),
+    }
+    return pd.DataFrame({column: values[inverse] for column, values in unique_features.items()})
+
+
+def get_pin_table(sqt: str) -> pd.DataFrame:
+    """
+    Builds the percolator pin table of the top ranked m line of every s line in the sqt file
+    """
     _, s_lines = sqt_parser.read_file(sqt)
 
-    # id <tab> label <tab> scannr <tab> feature1 <tab> ... <tab> featureN <tab> peptide <tab> proteinId1 <tab> .. <tab> proteinIdM
-    with open(sqt + ".tsv", "w") as pin_file:
-        # PSMId < tab > Label < tab > ScanNr < tab > feature1name < tab > ... < tab > featureNname < tab > Peptide < tab > Proteins
-        pin_file.write(f"{'PSMId'}\t{'Label'}\t{'ScanNr'}\t{'ExpMass'}\t{'CalcMass'}\t"
-                       f"{'seq_len'}\t{'charge1'}\t{'charge2'}\t{'charge3'}\t{'charge4'}\t{'SP'}\t"
-                       f"{'aromaticity'}\t{'instability_index'}\t{'gravy'}\t{'helix'}\t{'turn'}\t{'sheet'}\t{'BB'}\t"
-                       f"{'TIMScore'}\t"
-                       f"{'RTScore'}\t"
-                       f"{'xcorr'}\t{'deltaCN'}\t{'Peptide'}\t{'Proteins'}\n")
-        id_index = 0
-
-        for s_line in s_lines:
-            id = s_line.low_scan
-            charge = s_line.charge
-            for i, m_line in enumerate(s_line.m_lines):
-                xcorr = m_line.xcorr
-
-                if i > 0:
-                    continue
-
-                if xcorr == 0:
-                    continue
-                if i == len(s_line.m_lines)-1:
-                    continue
-                else:
-                    delta_cn = s_line.m_lines[i+1].delta_cn
-
-                #delta_cn = m_line.delta_cn
-                label = -1 if m_line.is_reverse() else 1
-                peptide = m_line.sequence
-                proteins = [l_line.locus_name for l_line in m_line.l_lines]
-                #proteins = [protein.split("|")[1] for protein in proteins if "contaminant" not in protein]
-                if len(proteins) == 0:
-                    continue
-
-                unmod_seq = "".join([c for c in m_line.get_clean_seq() if c.isalpha()])
-                seq_len = len(unmod_seq)
-
-                get_aromaticity = lambda x: ProteinAnalysis(x).aromaticity()
-                get_instability_index = lambda x: ProteinAnalysis(x).instability_index()
-                get_gravy = lambda x: ProteinAnalysis(x).gravy()
-                get_helix = lambda x: ProteinAnalysis(x).secondary_structure_fraction()[0]
-                get_turn = lambda x: ProteinAnalysis(x).secondary_structure_fraction()[1]
-                get_sheet = lambda x: ProteinAnalysis(x).secondary_structure_fraction()[2]
-
-                aas = 'ARNDCEQGHILKMFPSTWYV'
-                bbs = [610, 690, 890, 610, 360, 970, 510, 810, 690, -1450, -1650, 460, -660, -1520, -170, 420, 290,
-                       -1200, -1430, -750]
-                BB_MAP = {aa: bb for aa, bb in zip(aas, bbs)}
-
-                def compute_bull_breese(peptide):
-                    bb = 0
-                    for aa in peptide:
-                        bb += BB_MAP[aa]
-                    return bb / len(peptide)
-
-                get_bb = lambda x: compute_bull_breese(x)
-
-                """
-                percolator_proteins = []
-                try:
-                    for locus_name in proteins:
-                        if "Reverse" in locus_name:
-                            percolator_proteins.append("random_seq_" + locus_name.split("|")[1])
-                        else:
-                            percolator_proteins.append(locus_name.split("|")[1])
-                except IndexError:
-                    print(s_line)"""
-
-                proteins_serialized = " ".join(proteins)
-                ExpMass = s_line.experimental_mass
-                CalcMass = m_line.calculated_mass
-                timscore = 0 if m_line.tims_score is None else m_line.tims_score
-                #timscore = 0 if m_line.predicted_ook0 is None else (s_line.corrected_ook0 - m_line.predicted_ook0)/s_line.corrected_ook0
-                rtscore = 0 if m_line.predicted_ook0 is None else m_line.predicted_ook0
-
-
-                charges = [0]*4
-                if charge == 1:
-                    charges[0] = 1
-                if charge == 2:
-                    charges[1] = 1
-                if charge == 3:
-                    charges[2] = 1
-                if charge == 4:
-                    charges[3] = 1
-
-                sp = m_line.sp
-
-                pin_file.write(f"{id_index}\t{label}\t{id}\t{ExpMass}\t{CalcMass}\t"
-                               f"{seq_len}\t{charges[0]}\t{charges[1]}\t{charges[2]}\t{charges[3]}\t{sp}\t"
-                               f"{get_aromaticity(unmod_seq)}\t{get_instability_index(unmod_seq)}\t{get_gravy(unmod_seq)}\t"
-                               f"{get_helix(unmod_seq)}\t{get_turn(unmod_seq)}\t{get_sheet(unmod_seq)}\t{get_bb(unmod_seq)}\t"
-                               f"{timscore}\t"
-                               f"{rtscore}\t"
-                               f"{xcorr}\t{delta_cn}\t{peptide}\t{proteins_serialized}\n")
-                id_index += 1
-
+    columns = {column: [] for column in ['Label', 'ScanNr', 'charge', 'ExpMass', 'CalcMass', 'SP', 'TIMScore',
+                                         'RTScore', 'xcorr', 'deltaCN', 'Peptide', 'Proteins', 'unmod_seq']}
+    for s_line in s_lines:
+        # the top m line is used, delta_cn comes from the next m line
+        if len(s_line.m_lines) < 2:
+            continue
+
+        m_line = s_line.m_lines[0]
+        if m_line.xcorr == 0 or len(m_line.l_lines) == 0:
+            continue
+
+        columns['Label'].append(-1 if m_line.is_reverse() else 1)
+        columns['ScanNr'].append(s_line.low_scan)
+        columns['charge'].append(s_line.charge)
+        columns['ExpMass'].append(s_line.experimental_mass)
+        columns['CalcMass'].append(m_line.calculated_mass)
+        columns['SP'].append(m_line.sp)
+        columns['TIMScore'].append(0 if m_line.tims_score is None else m_line.tims_score)
+        columns['RTScore'].append(0 if m_line.predicted_ook0 is None else m_line.predicted_ook0)
+        columns['xcorr'].append(m_line.xcorr)
+        columns['deltaCN'].append(s_line.m_lines[1].delta_cn)
+        columns['Peptide'].append(m_line.sequence)
+        columns['Proteins'].append(" ".join(l_line.locus_name for l_line in m_line.l_lines))
+        columns['unmod_seq'].append("".join([c for c in m_line.get_clean_seq() if c.isalpha()]))
+
+    charges = np.array(columns.pop('charge'), dtype=np.int64)
+    peptide_features = get_peptide_feature_table(columns.pop('unmod_seq'))
+
+    pin_table = pd.DataFrame(columns)
+    pin_table['PSMId'] = np.arange(len(pin_table))
+    one_hot_charges = (charges[:, None] == PIN_CHARGES[None, :]).astype(np.int8)
+    for i, charge in enumerate(PIN_CHARGES):
+        pin_table[f'charge{charge}'] = one_hot_charges[:, i]
+    for column in peptide_features.columns:
+        pin_table[column] = peptide_features[column].to_numpy()
+    return pin_table[PIN_COLUMNS]
+
+
+def write_pin_table(pin_table: pd.DataFrame, out_file: str) -> None:
+    pin_table.to_csv(out_file, sep="\t", index=False)
+
+
+def convert_sqt_to_pin(sqt: str) -> int:
+    pin_table = get_pin_table(sqt)
+    write_pin_table(pin_table, sqt + ".tsv")
+    return len(pin_table)
+
+
+def get_sqt_files(args) -> List[str]:
+    if args.project:
+        if args.search_ids:
+            searches = get_searches_matching_ids(args.project, args.search_ids)
+        else:
+            searches = get_latest_search_per_experiment(args.project)
+        sqt_files = []
+        for search in searches:
+            sqt_path = get_file_from_search(search, Ip2FileType.SQT)
+            if sqt_path is None:
+                print(f"skipping search (missing sqt): {search}")
+                continue
+            sqt_files.append(str(sqt_path))
+        return sqt_files
+    return args.sqt
 
 
 if __name__ == '__main__':
     args = parse_args()
     print(args)
 
-    convert_sqt_to_pin(args.sqt)
+    sqt_files = get_sqt_files(args)
+    print("sqt_files: ", sqt_files)
+
+    with Pool(processes=args.processes) as pool:
+        if args.out:
+            pin_tables = pool.map(get_pin_table, sqt_files)
+            pin_table = pd.concat(pin_tables, ignore_index=True)
+            pin_table['PSMId'] = np.arange(len(pin_table))
+            write_pin_table(pin_table, args.out)
+            print(f"{args.out}: {len(pin_table)} psms")
+        else:
+            for sqt, psm_count in zip(sqt_files, pool.imap(convert_sqt_to_pin, sqt_files)):
+                print(f"{sqt}.tsv: {psm_count} psms")
@@ -1 +1,2 @@
-PROTON_MASS=1.007276466
\ No newline at end of file
+PROTON_MASS = 1.007276466
+C13_MASS_DIFFERENCE = 1.0033548378
@@ -2,6 +2,8 @@ import os
 import sqlite3
 import sys
 from ctypes import *
+from dataclasses import dataclass
+from typing import Dict, Tuple
 
 import numpy as np
 from numpy import unicode
@@ -118,6 +120,111 @@ def ccsToOneOverK0ToCCSforMz(ccs, charge, mz):
     return dll.tims_ccs_to_oneoverk0_for_mz(ccs, charge, mz)
 
 
+def _copy_from_pointer(pointer, count, dtype):
+    """
+    Copies count values behind a ctypes pointer into a new numpy array with one memcpy, slicing the pointer instead
+    builds a python list element by element. The pointer is only valid inside the dll callback, so a copy is required.
+    """
+    dtype = np.dtype(dtype)
+    return np.frombuffer(string_at(pointer, count * dtype.itemsize), dtype=dtype).copy()
+
+
+class _PeakArena:
+    """
+    Growing, preallocated columns which the dll callbacks memmove each spectrum into, capacity doubles when full.
+    """
+
+    def __init__(self, dtypes, capacity=1 << 16):
+        self.columns = [np.empty(capacity, dtype=dtype) for dtype in dtypes]
+        self.itemsizes = [column.itemsize for column in self.columns]
+        self.addresses = [column.ctypes.data for column in self.columns]
+        self.precursor_ids = []
+        self.offsets = [0]
+
+    def add(self, precursor_id, count, pointers):
+        start = self.offsets[-1]
+        end = start + count
+        if end > len(self.columns[0]):
+            capacity = max(end, 2 * len(self.columns[0]))
+            self.columns = [np.concatenate([column[:start], np.empty(capacity - start, dtype=column.dtype)])
+                            for column in self.columns]
+            self.addresses = [column.ctypes.data for column in self.columns]
+        for address, itemsize, pointer in zip(self.addresses, self.itemsizes, pointers):
+            memmove(address + start * itemsize, pointer, count * itemsize)
+        self.precursor_ids.append(precursor_id)
+        self.offsets.append(end)
+
+    def finish(self):
+        """
+        Returns (precursor ids, offsets, columns), columns are trimmed to the number of values read
+        """
+        end = self.offsets[-1]
+        return (np.array(self.precursor_ids, dtype=np.int64), np.array(self.offsets, dtype=np.int64),
+                [column[:end].copy() for column in self.columns])
+
+
+@dataclass
+class PasefMsMsBatch:
+    """
+    Columnar peak-picked MS/MS spectra, the peaks of precursor_ids[i] are mz[offsets[i]:offsets[i + 1]] and
+    intensity[offsets[i]:offsets[i + 1]]. Precursors are in the order the dll returned them.
+    """
+    precursor_ids: np.ndarray  # int64
+    offsets: np.ndarray  # int64, len(precursor_ids) + 1
+    mz: np.ndarray  # float64
+    intensity: np.ndarray  # float32
+
+    def __post_init__(self):
+        self._positions = {int(precursor_id): i for i, precursor_id in enumerate(self.precursor_ids)}
+
+    def get_peaks(self, precursor_id) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (mz, intensity) views for precursor_id, empty arrays if the dll returned no spectrum for it
+        """
+        i = self._positions.get(int(precursor_id))
+        if i is None:
+            return self.mz[:0], self.intensity[:0]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.mz[start:end], self.intensity[start:end]
+
+    def to_dict(self) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        return {int(precursor_id): self.get_peaks(precursor_id) for precursor_id in self.precursor_ids}
+
+    def __contains__(self, precursor_id):
+        return int(precursor_id) in self._positions
+
+    def __len__(self):
+        return len(self.precursor_ids)
+
+
+@dataclass
+class PasefProfileMsMsBatch:
+    """
+    Columnar "quasi profile" MS/MS spectra, the profile of precursor_ids[i] is intensity[offsets[i]:offsets[i + 1]]
+    """
+    precursor_ids: np.ndarray  # int64
+    offsets: np.ndarray  # int64, len(precursor_ids) + 1
+    intensity: np.ndarray  # int32
+
+    def __post_init__(self):
+        self._positions = {int(precursor_id): i for i, precursor_id in enumerate(self.precursor_ids)}
+
+    def get_profile(self, precursor_id) -> np.ndarray:
+        i = self._positions.get(int(precursor_id))
+        if i is None:
+            return self.intensity[:0]
+        return self.intensity[self.offsets[i]:self.offsets[i + 1]]
+
+    def to_dict(self) -> Dict[int, np.ndarray]:
+        return {int(precursor_id): self.get_profile(precursor_id) for precursor_id in self.precursor_ids}
+
+    def __contains__(self, precursor_id):
+        return int(precursor_id) in self._positions
+
+    def __len__(self):
+        return len(self.precursor_ids)
+
+
 class TimsData:
 
     def __init__(self, analysis_directory, use_recalibrated_state=False):
@@ -272,7 +379,8 @@ class TimsData:
 
         @MSMS_SPECTRUM_FUNCTOR
         def callback_for_dll(precursor_id, num_peaks, mz_values, area_values):
-            result[precursor_id] = (mz_values[0:num_peaks], area_values[0:num_peaks])
+            result[precursor_id] = (_copy_from_pointer(mz_values, num_peaks, np.float64),
+                                    _copy_from_pointer(area_values, num_peaks, np.float32))
 
         rc = self.dll.tims_read_pasef_msms(self.handle,
                                            precursors_for_dll.ctypes.data_as(POINTER(c_int64)),
@@ -284,15 +392,37 @@ class TimsData:
 
         return result
 
-        # read peak-picked MS/MS spectra for a given frame; returns a dict mapping
+    # read some peak-picked MS/MS spectra for a given list of precursors into one PasefMsMsBatch, use this over
+    # readPasefMsMs when reading many precursors.
+    def readPasefMsMsBatch(self, precursor_list):
+        precursors_for_dll = np.array(precursor_list, dtype=np.int64)
+
+        arena = _PeakArena([np.float64, np.float32])
 
+        @MSMS_SPECTRUM_FUNCTOR
+        def callback_for_dll(precursor_id, num_peaks, mz_values, area_values):
+            arena.add(precursor_id, num_peaks, (mz_values, area_values))
+
+        rc = self.dll.tims_read_pasef_msms(self.handle,
+                                           precursors_for_dll.ctypes.data_as(POINTER(c_int64)),
+                                           len(precursor_list),
+                                           callback_for_dll)
+
+        if rc == 0:
+            throwLastTimsDataError(self.dll)
+
+        precursor_ids, offsets, (mz, intensity) = arena.finish()
+        return PasefMsMsBatch(precursor_ids, offsets, mz, intensity)
+
+    # read peak-picked MS/MS spectra for a given frame; returns a dict mapping
     # 'precursor_id' to a pair of arrays (mz_values, area_values).
     def readPasefMsMsForFrame(self, frame_id):
         result = {}
 
         @MSMS_SPECTRUM_FUNCTOR
         def callback_for_dll(precursor_id, num_peaks, mz_values, area_values):
-            result[precursor_id] = (mz_values[0:num_peaks], area_values[0:num_peaks])
+            result[precursor_id] = (_copy_from_pointer(mz_values, num_peaks, np.float64),
+                                    _copy_from_pointer(area_values, num_peaks, np.float32))
 
         rc = self.dll.tims_read_pasef_msms_for_frame(self.handle,
                                                      frame_id,
@@ -303,8 +433,25 @@ class TimsData:
 
         return result
 
-        # read some "quasi profile" MS/MS spectra for a given list of precursors; returns a dict mapping
+    # read peak-picked MS/MS spectra for a given frame into one PasefMsMsBatch.
+    def readPasefMsMsForFrameBatch(self, frame_id):
+        arena = _PeakArena([np.float64, np.float32])
+
+        @MSMS_SPECTRUM_FUNCTOR
+        def callback_for_dll(precursor_id, num_peaks, mz_values, area_values):
+            arena.add(precursor_id, num_peaks, (mz_values, area_values))
+
+        rc = self.dll.tims_read_pasef_msms_for_frame(self.handle,
+                                                     frame_id,
+                                                     callback_for_dll)
+
+        if rc == 0:
+            throwLastTimsDataError(self.dll)
+
+        precursor_ids, offsets, (mz, intensity) = arena.finish()
+        return PasefMsMsBatch(precursor_ids, offsets, mz, intensity)
 
+    # read some "quasi profile" MS/MS spectra for a given list of precursors; returns a dict mapping
     # 'precursor_id' to the profil arrays (intensity_values).
     def readPasefProfileMsMs(self, precursor_list):
         precursors_for_dll = np.array(precursor_list, dtype=np.int64)
@@ -313,7 +460,7 @@ class TimsData:
 
         @MSMS_PROFILE_SPECTRUM_FUNCTOR
         def callback_for_dll(precursor_id, num_points, intensity_values):
-            result[precursor_id] = intensity_values[0:num_points]
+            result[precursor_id] = _copy_from_pointer(intensity_values, num_points, np.int32)
 
         rc = self.dll.tims_read_pasef_profile_msms(self.handle,
                                                    precursors_for_dll.ctypes.data_as(POINTER(c_int64)),
@@ -325,6 +472,27 @@ class TimsData:
 
         return result
 
+    # read some "quasi profile" MS/MS spectra for a given list of precursors into one PasefProfileMsMsBatch.
+    def readPasefProfileMsMsBatch(self, precursor_list):
+        precursors_for_dll = np.array(precursor_list, dtype=np.int64)
+
+        arena = _PeakArena([np.int32])
+
+        @MSMS_PROFILE_SPECTRUM_FUNCTOR
+        def callback_for_dll(precursor_id, num_points, intensity_values):
+            arena.add(precursor_id, num_points, (intensity_values,))
+
+        rc = self.dll.tims_read_pasef_profile_msms(self.handle,
+                                                   precursors_for_dll.ctypes.data_as(POINTER(c_int64)),
+                                                   len(precursor_list),
+                                                   callback_for_dll)
+
+        if rc == 0:
+            throwLastTimsDataError(self.dll)
+
+        precursor_ids, offsets, (intensity,) = arena.finish()
+        return PasefProfileMsMsBatch(precursor_ids, offsets, intensity)
+
     # read "quasi profile" MS/MS spectra for a given frame; returns a dict mapping
     # 'precursor_id' to the profil arrays (intensity_values).
     def readPasefProfileMsMsForFrame(self, frame_id):
@@ -332,7 +500,7 @@ class TimsData:
 
         @MSMS_PROFILE_SPECTRUM_FUNCTOR
         def callback_for_dll(precursor_id, num_points, intensity_values):
-            result[precursor_id] = intensity_values[0:num_points]
+            result[precursor_id] = _copy_from_pointer(intensity_values, num_points, np.int32)
 
         rc = self.dll.tims_read_pasef_profile_msms_for_frame(self.handle,
                                                              frame_id,
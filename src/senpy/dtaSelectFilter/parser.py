@@ -1,6 +1,19 @@
+from dataclasses import dataclass
+from typing import Dict
+
+from .columns import PeptideLineColumns_v2_1_12, PeptideLineColumns_v2_1_12_paser, PeptideLineColumns_v2_1_13, \
+    PeptideLineColumns_v2_1_13_timscore
+from .exceptions import DTASelectFilterDeserializationPeptideLineException
 from .lines import ProteinLine, DTAFilterResult, PeptideLine
 from enum import Enum
 
+_PEPTIDE_LINE_COLUMNS = {
+    "v2.1.12": PeptideLineColumns_v2_1_12,
+    "v2.1.13": PeptideLineColumns_v2_1_13,
+    "v2.1.12_paser": PeptideLineColumns_v2_1_12_paser,
+    "v2.1.13_timscore": PeptideLineColumns_v2_1_13_timscore,
+}
+
 
 class FileState(Enum):
     HEADER = 1
@@ -58,6 +71,71 @@ def read_file(dta_select_filter_file_path: str, version: str = None) -> ([str],
     return h_lines, dta_filter_results, end_lines
 
 
+@dataclass
+class PeptideScanHit:
+    """
+    The peptide line fields needed to annotate a spectrum
+    """
+    low_scan: int
+    sequence: str
+    charge: int
+    x_corr: float
+
+    __slots__ = 'low_scan', 'sequence', 'charge', 'x_corr'
+
+
+def read_peptide_scan_index(dta_select_filter_file_path: str, file_name: str,
+                            version: str = None) -> Dict[int, PeptideScanHit]:
+    """
+    Streams a DTASelect-filter file and returns {low scan: PeptideScanHit} for the peptide lines of one ms2 file.
+    Protein lines are skipped and peptide lines of other ms2 files are rejected on their file name column before
+    anything else is parsed. A scan listed under several proteins keeps its last peptide line, as in read_file.
+    :param:     dta_select_filter_file_path:    path to DTASelect-filter file
+    :param:     file_name:                      ms2 file name without extension, ex: 'sample' for sample.ms2
+    :param:     version:                        DTASelect version, read from the header when None
+    :return:    Dict[int, PeptideScanHit]
+    """
+    peptide_scan_index = {}
+    file_prefix = file_name + '.'
+    columns = _PEPTIDE_LINE_COLUMNS.get(version)
+    file_state = FileState.HEADER
+
+    with open(dta_select_filter_file_path) as file:
+        for line in file:
+            line_elements = line.split("\t")
+
+            if file_state == FileState.HEADER:
+                if line_elements[0] == 'Unique':
+                    if columns is None:
+                        raise NotImplementedError(f"unsupported DTASelect-filter version: {version}")
+                    file_state = FileState.DATA
+                elif line[:9] == 'DTASelect' and version is None:
+                    version = line.split(" ")[1].rstrip()
+                    columns = _PEPTIDE_LINE_COLUMNS.get(version)
+                continue
+
+            if len(line_elements) > 1 and line_elements[1] == "Proteins":
+                break
+
+            # peptide line of this ms2 file
+            if (line_elements[0] == '' or '*' in line_elements[0] or line_elements[0].isnumeric()) and \
+                    line_elements[columns.file_name.value].startswith(file_prefix):
+                line_elements = line.rstrip().split("\t")
+                if len(line_elements) != len(columns):
+                    raise DTASelectFilterDeserializationPeptideLineException(line)
+                ms2_file_name, low_scan, _, charge = \
+                    PeptideLine._deserialize_file_line(line_elements[columns.file_name.value])
+                if ms2_file_name != file_name:
+                    continue
+                peptide_scan_index[low_scan] = PeptideScanHit(
+                    low_scan=low_scan,
+                    sequence=PeptideLine._deserialize_sequence(line_elements[columns.sequence.value]),
+                    charge=charge,
+                    x_corr=PeptideLine._deserialize_x_corr(line_elements[columns.x_corr.value]))
+
+    return peptide_scan_index
+
+
 def write_file(h_lines: [str], dta_filter_results: [DTAFilterResult], end_lines: [str], out_file_path: str, version: str = None) -> None:
     """
     Write Sqt file from hlines and slines
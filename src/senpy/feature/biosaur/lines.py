@@ -1,9 +1,9 @@
-import ast
 from dataclasses import dataclass
 from enum import Enum
 from typing import List, Union, Any, ClassVar
 
-from util import cast_float, cast_int
+from ...util import cast_float, cast_int
+from ...ragged import parse_number_list
 
 
 class _BiosaurFeatureLineDeserializationException(Exception):
@@ -94,34 +94,29 @@ class BiosaurFeatureLine:
             raise _BiosaurFeatureLineDeserializationException(line_elements)
 
         neutral_mass = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        rt_apex = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        intensity_apex = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        charge = cast_int(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        num_isotopes = cast_int(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        num_scans = cast_int(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        sulfur = cast_int(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        cos_corr_1 = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        cos_corr_2 = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        diff_for_output = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        corr_fill_zero = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        intensity_1 = [cast_float(elem) for elem
-                       in ast.literal_eval(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])]
-        scan_id_1 = [cast_int(elem) for elem
-                     in ast.literal_eval(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])]
-        mz_std_1 = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        intensity_2 = [cast_float(elem) for elem
-                       in ast.literal_eval(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])]
-        scan_id_2 = [cast_int(elem) for elem
-                     in ast.literal_eval(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])]
-        mz_std_2 = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        mz = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        rt_start = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        rt_end = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        id = cast_int(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        ion_mobility = cast_float(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        faims = cast_int(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])
-        targeted_mode = [cast_float(elem) for elem
-                         in ast.literal_eval(line_elements[_BiosaurFeatureLineColumns.neutral_mass.value])]
+        rt_apex = cast_float(line_elements[_BiosaurFeatureLineColumns.rt_apex.value])
+        intensity_apex = cast_float(line_elements[_BiosaurFeatureLineColumns.intensity_apex.value])
+        charge = cast_int(line_elements[_BiosaurFeatureLineColumns.charge.value])
+        num_isotopes = cast_int(line_elements[_BiosaurFeatureLineColumns.num_isotopes.value])
+        num_scans = cast_int(line_elements[_BiosaurFeatureLineColumns.num_scans.value])
+        sulfur = cast_int(line_elements[_BiosaurFeatureLineColumns.sulfur.value])
+        cos_corr_1 = cast_float(line_elements[_BiosaurFeatureLineColumns.cos_corr_1.value])
+        cos_corr_2 = cast_float(line_elements[_BiosaurFeatureLineColumns.cos_corr_2.value])
+        diff_for_output = cast_float(line_elements[_BiosaurFeatureLineColumns.diff_for_output.value])
+        corr_fill_zero = cast_float(line_elements[_BiosaurFeatureLineColumns.corr_fill_zero.value])
+        intensity_1 = parse_number_list(line_elements[_BiosaurFeatureLineColumns.intensity_1.value], float)
+        scan_id_1 = parse_number_list(line_elements[_BiosaurFeatureLineColumns.scan_id_1.value], int)
+        mz_std_1 = cast_float(line_elements[_BiosaurFeatureLineColumns.mz_std_1.value])
+        intensity_2 = parse_number_list(line_elements[_BiosaurFeatureLineColumns.intensity_2.value], float)
+        scan_id_2 = parse_number_list(line_elements[_BiosaurFeatureLineColumns.scan_id_2.value], int)
+        mz_std_2 = cast_float(line_elements[_BiosaurFeatureLineColumns.mz_std_2.value])
+        mz = cast_float(line_elements[_BiosaurFeatureLineColumns.mz.value])
+        rt_start = cast_float(line_elements[_BiosaurFeatureLineColumns.rt_start.value])
+        rt_end = cast_float(line_elements[_BiosaurFeatureLineColumns.rt_end.value])
+        id = cast_int(line_elements[_BiosaurFeatureLineColumns.id.value])
+        ion_mobility = cast_float(line_elements[_BiosaurFeatureLineColumns.ion_mobility.value])
+        faims = cast_int(line_elements[_BiosaurFeatureLineColumns.faims.value])
+        targeted_mode = cast_float(line_elements[_BiosaurFeatureLineColumns.targeted_mode.value])
 
         feature_line = BiosaurFeatureLine(
             neutral_mass=neutral_mass,
@@ -1,6 +1,6 @@
 from typing import List
 
-from feature.biosaur.lines import BiosaurFeatureLine
+from .lines import BiosaurFeatureLine
 
 
 def parse_file(file_path: str) -> List[BiosaurFeatureLine]:
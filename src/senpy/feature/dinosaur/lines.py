@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import List, Union, Any, ClassVar
 
-from util import cast_float, cast_int
+from ...util import cast_float, cast_int
 
 
 class _DinosaurFeatureLineDeserializationException(Exception):
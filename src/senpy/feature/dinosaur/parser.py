@@ -1,6 +1,6 @@
 from typing import List
 
-from feature.dinosaur.lines import DinosaurFeatureLine
+from .lines import DinosaurFeatureLine
 
 
 def parse_file(file_path: str) -> List[DinosaurFeatureLine]:
@@ -0,0 +1,176 @@
+from dataclasses import dataclass
+from typing import Any, Iterable, Tuple, Union
+
+import numpy as np
+
+from .table import FeatureTable
+from ..ragged import expand_ranges
+
+NO_FEATURE = -1
+
+
+@dataclass
+class FeatureMatches:
+    """
+    Dataclass to store precursor to feature matches. Element i pairs query query_indexes[i] with feature
+    feature_indexes[i] (row in the FeatureTable) whose id is feature_ids[i]. ppm_errors are
+    (feature mz - query mz) / feature mz * 1e6. Matches are ordered by query index.
+    """
+    query_indexes: np.ndarray
+    feature_indexes: np.ndarray
+    feature_ids: np.ndarray
+    ppm_errors: np.ndarray
+
+    __slots__ = 'query_indexes', 'feature_indexes', 'feature_ids', 'ppm_errors'
+
+    def get_offsets(self, n_queries: int) -> np.ndarray:
+        """
+        Returns offsets (n_queries + 1), the matches of query i are [offsets[i]:offsets[i + 1]]
+        """
+        offsets = np.zeros(n_queries + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.query_indexes, minlength=n_queries), out=offsets[1:])
+        return offsets
+
+    def get_best_feature_ids(self, n_queries: int) -> np.ndarray:
+        """
+        Returns one feature id per query, the match with the smallest absolute ppm error, NO_FEATURE if unmatched
+        """
+        best_feature_ids = np.full(n_queries, NO_FEATURE, dtype=np.int64)
+        order = np.lexsort((np.abs(self.ppm_errors), self.query_indexes))
+        query_indexes = self.query_indexes[order]
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = query_indexes[1:] != query_indexes[:-1]
+        best_feature_ids[query_indexes[is_first]] = self.feature_ids[order][is_first]
+        return best_feature_ids
+
+    def __len__(self):
+        return len(self.query_indexes)
+
+
+class FeatureIndex:
+    """
+    Index over (mz, rt_start - rt_end, ion_mobility) of MS1 features for batched precursor matching.
+
+    Features are sorted by mz once. A query locates its mz window with two searchsorted calls, every feature in the
+    window is expanded into a candidate (query, feature) pair and the candidates are filtered on rt and mobility with
+    array operations, there is no python loop over queries or features.
+
+    index = FeatureIndex.from_table(read_feature_table('features.tsv'))
+    matches = index.query(mz, rt, ook0, ppm=10, ook0_tolerance=0.05)
+    """
+
+    def __init__(self, mz: np.ndarray, rt_start: np.ndarray, rt_end: np.ndarray, ion_mobility: np.ndarray = None,
+                 charge: np.ndarray = None, feature_ids: np.ndarray = None):
+        """
+        :param:     mz:             feature monoisotopic m/z
+        :param:     rt_start:       feature retention time start, same unit as the query rt
+        :param:     rt_end:         feature retention time end
+        :param:     ion_mobility:   feature 1/K0, optional
+        :param:     charge:         feature charge, optional
+        :param:     feature_ids:    feature ids, defaults to the row index
+        """
+        mz = np.asarray(mz, dtype=np.float64)
+        self._order = np.argsort(mz, kind='stable')
+        self.mz = mz[self._order]
+        self.rt_start = np.asarray(rt_start, dtype=np.float64)[self._order]
+        self.rt_end = np.asarray(rt_end, dtype=np.float64)[self._order]
+        self.ion_mobility = np.asarray(ion_mobility, dtype=np.float64)[self._order] \
+            if ion_mobility is not None else None
+        self.charge = np.asarray(charge, dtype=np.int64)[self._order] if charge is not None else None
+        self.feature_ids = np.asarray(feature_ids, dtype=np.int64)[self._order] \
+            if feature_ids is not None else self._order.astype(np.int64)
+
+    @staticmethod
+    def from_table(table: FeatureTable) -> 'FeatureIndex':
+        """
+        Builds the index from a FeatureTable, ion mobility and ids are used when the format has them (Biosaur)
+        """
+        return FeatureIndex(mz=table['mz'],
+                            rt_start=table['rt_start'],
+                            rt_end=table['rt_end'],
+                            ion_mobility=table['ion_mobility'] if 'ion_mobility' in table else None,
+                            charge=table['charge'],
+                            feature_ids=table['id'] if 'id' in table else None)
+
+    def query(self, mz: np.ndarray, rt: np.ndarray, ook0: np.ndarray = None, charge: np.ndarray = None,
+              ppm: float = 10, ook0_tolerance: float = 0.05, rt_tolerance: float = 0,
+              batch_size: int = 100_000) -> FeatureMatches:
+        """
+        Returns every feature within ppm of the query m/z whose rt range contains the query rt (widened by
+        rt_tolerance) and, when both sides have it, whose ion mobility is within ook0_tolerance. A nan query 1/K0 is
+        not filtered on. Charges are compared when given, a charge of 0 matches any charge.
+        :param:     mz:             query (precursor) m/z
+        :param:     rt:             query retention time
+        :param:     ook0:           query 1/K0, optional
+        :param:     charge:         query charge, optional
+        :param:     ppm:            m/z tolerance in ppm
+        :param:     ook0_tolerance: absolute 1/K0 tolerance
+        :param:     rt_tolerance:   widens every feature rt range on both sides
+        :param:     batch_size:     queries per batch, bounds the candidate arrays
+        :return:    FeatureMatches: query indexes refer to the input arrays
+        """
+        mz = np.asarray(mz, dtype=np.float64)
+        rt = np.asarray(rt, dtype=np.float64)
+        ook0 = np.asarray(ook0, dtype=np.float64) if ook0 is not None else None
+        charge = np.asarray(charge, dtype=np.int64) if charge is not None else None
+
+        results = []
+        for batch_start in range(0, len(mz), batch_size):
+            batch = slice(batch_start, batch_start + batch_size)
+            query_indexes, positions = self._query_batch(mz[batch], rt[batch],
+                                                         ook0[batch] if ook0 is not None else None,
+                                                         charge[batch] if charge is not None else None,
+                                                         ppm, ook0_tolerance, rt_tolerance)
+            results.append((query_indexes + batch_start, positions))
+
+        if results:
+            query_indexes = np.concatenate([query_indexes for query_indexes, _ in results])
+            positions = np.concatenate([positions for _, positions in results])
+        else:
+            query_indexes, positions = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        feature_mz = self.mz[positions]
+        return FeatureMatches(query_indexes=query_indexes,
+                              feature_indexes=self._order[positions],
+                              feature_ids=self.feature_ids[positions],
+                              ppm_errors=(feature_mz - mz[query_indexes]) / feature_mz * 1_000_000)
+
+    def _query_batch(self, mz: np.ndarray, rt: np.ndarray, ook0: Union[np.ndarray, None],
+                     charge: Union[np.ndarray, None], ppm: float, ook0_tolerance: float,
+                     rt_tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        tolerance = mz * ppm / 1_000_000
+        start_indexes = np.searchsorted(self.mz, mz - tolerance, side='left')
+        end_indexes = np.searchsorted(self.mz, mz + tolerance, side='right')
+        counts = end_indexes - start_indexes
+
+        # (query, feature) candidates, filtered on rt, ion mobility and charge below
+        query_indexes = np.repeat(np.arange(len(mz)), counts)
+        positions = expand_ranges(start_indexes, counts)
+
+        candidate_rt = rt[query_indexes]
+        keep = (self.rt_start[positions] - rt_tolerance <= candidate_rt) & \
+               (candidate_rt <= self.rt_end[positions] + rt_tolerance)
+        if ook0 is not None and self.ion_mobility is not None:
+            candidate_ook0 = ook0[query_indexes]
+            keep &= (np.abs(self.ion_mobility[positions] - candidate_ook0) <= ook0_tolerance) | np.isnan(candidate_ook0)
+        if charge is not None and self.charge is not None:
+            candidate_charge, feature_charge = charge[query_indexes], self.charge[positions]
+            keep &= (candidate_charge == feature_charge) | (candidate_charge == 0) | (feature_charge == 0)
+
+        return query_indexes[keep], positions[keep]
+
+    def __len__(self):
+        return len(self.mz)
+
+
+def get_precursor_arrays(ms2_spectras: Iterable[Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns (mz, rt, ook0, charge) query arrays for senpy.ms2 spectra, missing rt / ook0 are nan
+    """
+    rows = [(ms2_spectra.get_precursor_mz(), ms2_spectra.get_retention_time(), ms2_spectra.get_ook0(),
+             ms2_spectra.get_precursor_charge()) for ms2_spectra in ms2_spectras]
+    mz, rt, ook0, charge = zip(*rows) if rows else ((), (), (), ())
+    return (np.array(mz, dtype=np.float64),
+            np.array([val if val is not None else np.nan for val in rt], dtype=np.float64),
+            np.array([val if val is not None else np.nan for val in ook0], dtype=np.float64),
+            np.array([val if val is not None else 0 for val in charge], dtype=np.int64))
@@ -1,33 +1,18 @@
-from typing import List
+from typing import Iterator, Union
 
-from feature.biosaur.lines import BiosaurFeatureLine
-from feature.dinosaur.lines import DinosaurFeatureLine
+from .biosaur.lines import BiosaurFeatureLine
+from .dinosaur.lines import DinosaurFeatureLine
+from .table import detect_feature_format
 
 
-def parse_file(file_path: str) -> List[BiosaurFeatureLine]:
+def parse_file(file_path: str) -> Iterator[Union[BiosaurFeatureLine, DinosaurFeatureLine]]:
     """
-    Parse biosaur file into BiosaurFeatureLine's
+    Parse biosaur or dinosaur file into FeatureLine's, the format is detected from the header. Use
+    table.read_feature_table for a columnar read of large files.
     :param file_path: path to feature.tsv file
-    :return: List of BiosaurFeatureLine's
+    :return: Iterator of BiosaurFeatureLine's or DinosaurFeatureLine's
     """
-    FeatureLine = None
     with open(file_path) as file:
-        for i, line in enumerate(file):
-            if i == 0:
-                continue
-            else:
-                if FeatureLine is None:
-                    line_elems = line.split('/t')
-
-                    if len(line_elems) == BiosaurFeatureLine.get_number_elements():
-                        FeatureLine = BiosaurFeatureLine
-                    elif len(line_elems) == DinosaurFeatureLine.get_number_elements():
-                        FeatureLine = DinosaurFeatureLine
-                    else:
-                        print(f"Number of line elements does not match supported file types.")
-                        raise NotImplementedError
-
-                feature_line = FeatureLine.deserialize(line)
-                yield feature_line
-
-        return feature_line
+        FeatureLine = detect_feature_format(file.readline()).line_type
+        for line in file:
+            yield FeatureLine.deserialize(line)
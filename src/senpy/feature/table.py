@@ -0,0 +1,88 @@
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Tuple, Type
+
+import numpy as np
+import pandas as pd
+
+from .biosaur.lines import BiosaurFeatureLine, _BiosaurFeatureLineColumns
+from .dinosaur.lines import DinosaurFeatureLine, _DinosaurFeatureLineColumns
+from ..ragged import ColumnTable, RaggedArray, parse_ragged
+
+
+@dataclass(frozen=True)
+class FeatureFormat:
+    """
+    Column layout of a feature file, columns not listed in int_columns or list_columns are float64
+    """
+    name: str
+    line_type: Type
+    columns: Type[Enum]
+    int_columns: Tuple[str, ...] = ()
+    list_columns: Dict[str, np.dtype] = field(default_factory=dict)
+
+    def get_number_elements(self) -> int:
+        return len(self.columns)
+
+
+BIOSAUR_FORMAT = FeatureFormat(name='biosaur',
+                               line_type=BiosaurFeatureLine,
+                               columns=_BiosaurFeatureLineColumns,
+                               int_columns=('charge', 'num_isotopes', 'num_scans', 'sulfur', 'id', 'faims'),
+                               list_columns={'intensity_1': np.dtype(np.float64), 'scan_id_1': np.dtype(np.int64),
+                                             'intensity_2': np.dtype(np.float64), 'scan_id_2': np.dtype(np.int64)})
+DINOSAUR_FORMAT = FeatureFormat(name='dinosaur',
+                                line_type=DinosaurFeatureLine,
+                                columns=_DinosaurFeatureLineColumns,
+                                int_columns=('charge', 'num_isotopes', 'num_scans'))
+FEATURE_FORMATS = (BIOSAUR_FORMAT, DINOSAUR_FORMAT)
+
+
+def detect_feature_format(header: str) -> FeatureFormat:
+    """
+    Returns the FeatureFormat of a feature file from its header line
+    """
+    n_elements = len(header.rstrip('\r\n').split('\t'))
+    for feature_format in FEATURE_FORMATS:
+        if n_elements == feature_format.get_number_elements():
+            return feature_format
+    raise NotImplementedError(f"Number of header elements ({n_elements}) does not match supported feature files: "
+                              f"{[feature_format.name for feature_format in FEATURE_FORMATS]}")
+
+
+@dataclass
+class FeatureTable(ColumnTable):
+    """
+    Columnar Biosaur/Dinosaur features, column names are the FeatureLine field names.
+
+    table = read_feature_table('features.tsv')
+    table['mz']             -> np.ndarray, one value per feature
+    table['intensity_1'][i] -> np.ndarray, list values of feature i
+    """
+    feature_format: FeatureFormat
+
+
+def read_feature_table(file_path: str) -> FeatureTable:
+    """
+    Reads a Biosaur or Dinosaur feature file into typed column arrays. The format is detected from the header,
+    scalar columns are read in bulk by pandas and list columns are tokenized into RaggedArray's.
+    :param:     file_path:  path to feature.tsv file
+    :return:    FeatureTable
+    """
+    with open(file_path) as file:
+        feature_format = detect_feature_format(file.readline())
+
+    names = [column.name for column in feature_format.columns]
+    dtypes = {name: str if name in feature_format.list_columns else
+              np.int64 if name in feature_format.int_columns else np.float64 for name in names}
+    df = pd.read_csv(file_path, sep='\t', header=0, names=names, dtype=dtypes, engine='c')
+
+    columns, list_columns = {}, {}
+    for name in names:
+        if name in feature_format.list_columns:
+            offsets, values = parse_ragged(df[name].fillna('').tolist(), feature_format.list_columns[name])
+            list_columns[name] = RaggedArray(offsets, values)
+        else:
+            columns[name] = df[name].to_numpy()
+
+    return FeatureTable(columns=columns, list_columns=list_columns, feature_format=feature_format)
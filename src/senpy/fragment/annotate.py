@@ -0,0 +1,268 @@
+import os
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..dtaSelectFilter.parser import read_file as read_filter_file
+from ..ip2_project.file_types import Ip2FileType
+from ..ip2_project.project import get_latest_search_per_experiment, get_searches_matching_ids
+from ..ip2_project.search import get_file_from_search
+from ..ms2.lines import ILine, SLine, ZLine, decode_peak_block
+from ..ms2.parser import filter_ms2_lines_from_file
+from .engine import FragmentEngine
+from .matcher import match_fragment_ions
+from .peptide import remove_ptm
+
+SUPPORTED_RESIDUES = set('ARNDCQGEHILKMFPSTWYV')
+
+ANNOTATION_COLUMNS = ['file_name', 'scan_number', 'sequence', 'charge', 'collision_energy', 'max_fragment_intensity',
+                      'ion_type', 'number', 'fragment_charge', 'loss', 'fragment_mz', 'mz', 'ppm', 'intensity']
+
+
+@dataclass
+class AnnotationBatch:
+    """
+    A batch of identified spectra sent to an annotation worker. Peaks are kept as the raw peak line text so that
+    decoding happens in the worker. Every batch carries the (precomputed) fragment engine.
+    """
+    engine: FragmentEngine
+    ppm: float
+    ms2_path: str
+    file_name: str
+    scan_numbers: List[int] = field(default_factory=list)
+    sequences: List[str] = field(default_factory=list)
+    charges: List[int] = field(default_factory=list)
+    collision_energies: List[float] = field(default_factory=list)
+    peak_blocks: List[str] = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.scan_numbers)
+
+
+def empty_annotation_table() -> Dict[str, np.ndarray]:
+    return {
+        'file_name': np.array([], dtype=str),
+        'scan_number': np.array([], dtype=np.int32),
+        'sequence': np.array([], dtype=str),
+        'charge': np.array([], dtype=np.int8),
+        'collision_energy': np.array([], dtype=np.float32),
+        'max_fragment_intensity': np.array([], dtype=np.float32),
+        'ion_type': np.array([], dtype='U1'),
+        'number': np.array([], dtype=np.int32),
+        'fragment_charge': np.array([], dtype=np.int8),
+        'loss': np.array([], dtype='U16'),
+        'fragment_mz': np.array([], dtype=np.float64),
+        'mz': np.array([], dtype=np.float64),
+        'ppm': np.array([], dtype=np.float32),
+        'intensity': np.array([], dtype=np.float32),
+    }
+
+
+def concatenate_annotation_tables(tables: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if len(tables) == 0:
+        return empty_annotation_table()
+    return {column: np.concatenate([table[column] for table in tables]) for column in ANNOTATION_COLUMNS}
+
+
+def annotate_batch(batch: AnnotationBatch) -> Dict[str, np.ndarray]:
+    """
+    Annotates every spectrum in the batch. Returns a columnar table with one row per matched fragment ion.
+    """
+    spectrum_indexes, fragments, matched_mz, ppms, intensities, max_intensities = [], [], [], [], [], []
+    for i, (sequence, peak_block) in enumerate(zip(batch.sequences, batch.peak_blocks)):
+        mz_spectra, intensity_spectra = decode_peak_block(peak_block)
+        if len(mz_spectra) == 0:
+            continue
+
+        fragment_ions = batch.engine.fragment(sequence)
+        matches = match_fragment_ions(fragment_ions['mz'], mz_spectra, intensity_spectra, ppm=batch.ppm)
+
+        spectrum_indexes.append(np.full(len(matches), i, dtype=np.int32))
+        fragments.append(fragment_ions[matches.fragment_indexes])
+        matched_mz.append(matches.mz)
+        ppms.append(matches.ppm_errors)
+        intensities.append(matches.intensities)
+        max_intensities.append(np.full(len(matches), intensity_spectra.max()))
+
+    if len(spectrum_indexes) == 0:
+        return empty_annotation_table()
+
+    spectrum_indexes = np.concatenate(spectrum_indexes)
+    fragments = np.concatenate(fragments)
+    return {
+        'file_name': np.full(len(spectrum_indexes), batch.file_name),
+        'scan_number': np.asarray(batch.scan_numbers, dtype=np.int32)[spectrum_indexes],
+        'sequence': np.asarray(batch.sequences)[spectrum_indexes],
+        'charge': np.asarray(batch.charges, dtype=np.int8)[spectrum_indexes],
+        'collision_energy': np.asarray(batch.collision_energies, dtype=np.float32)[spectrum_indexes],
+        'max_fragment_intensity': np.concatenate(max_intensities).astype(np.float32),
+        'ion_type': fragments['ion_type'],
+        'number': fragments['number'],
+        'fragment_charge': fragments['charge'],
+        'loss': fragments['loss'],
+        'fragment_mz': fragments['mz'],
+        'mz': np.concatenate(matched_mz),
+        'ppm': np.concatenate(ppms).astype(np.float32),
+        'intensity': np.concatenate(intensities).astype(np.float32),
+    }
+
+
+def get_ms2_file_name(ms2_path: str) -> str:
+    return os.path.basename(ms2_path).split(".ms2")[0]
+
+
+def build_scan_number_to_sequence_map(filter_path: str, ms2_file_name: str,
+                                      dta_filter_version: str = None) -> Dict[int, Tuple[str, int]]:
+    """
+    Maps the low scan of every DTASelect-filter peptide line belonging to ms2_file_name to (sequence, charge).
+    Sequences have their flanking residues removed but keep ptm's, ex: 'K.PEPC(57.02146)TIDE.R' -> 'PEPC(57.02146)TIDE'
+    """
+    _, dta_filter_results, _ = read_filter_file(filter_path, version=dta_filter_version)
+
+    scan_number_to_sequence_map = {}
+    for dta_filter_result in dta_filter_results:
+        for peptide_line in dta_filter_result.peptide_lines:
+            if peptide_line.file_name == ms2_file_name:
+                scan_number_to_sequence_map[peptide_line.low_scan] = (peptide_line.sequence[2:-2], peptide_line.charge)
+    return scan_number_to_sequence_map
+
+
+def read_annotation_batches(ms2_path: str, scan_number_to_sequence_map: Dict[int, Tuple[str, int]],
+                            engine: FragmentEngine, ppm: float = 40, batch_size: int = 1000,
+                            collision_energy_keyword: str = None) -> Iterator[AnnotationBatch]:
+    """
+    Streams the ms2 file and groups identified spectra into AnnotationBatches. Only S/Z/I lines are split,
+    peak lines are passed through as text. Spectra without a Z line matching the DTASelect-filter charge are skipped.
+    """
+    if collision_energy_keyword is None:
+        collision_energy_keyword = ILine.COLLISION_ENERGY_KEYWORD
+
+    file_name = get_ms2_file_name(ms2_path)
+    batch = AnnotationBatch(engine=engine, ppm=ppm, ms2_path=ms2_path, file_name=file_name)
+    charge_mismatch_count = 0
+    for spectra_lines in filter_ms2_lines_from_file(ms2_path):
+        low_scan = int(spectra_lines[0].split("\t")[1])
+        if low_scan not in scan_number_to_sequence_map:
+            continue
+
+        sequence, charge = scan_number_to_sequence_map[low_scan]
+        if not set(remove_ptm(sequence)).issubset(SUPPORTED_RESIDUES):
+            continue
+
+        collision_energy = np.nan
+        z_line_charges = []
+        peak_start = len(spectra_lines)
+        for i, line in enumerate(spectra_lines):
+            if line[0] == ILine.LETTER:
+                i_line_elements = line.rstrip().split("\t")
+                if len(i_line_elements) == 3 and i_line_elements[1] == collision_energy_keyword:
+                    collision_energy = float(i_line_elements[2])
+            elif line[0] == ZLine.LETTER:
+                z_line_charges.append(ZLine.deserialize(line).charge)
+            elif line[0] != SLine.LETTER:
+                peak_start = i
+                break
+
+        # sanity check, the spectrum was identified with the DTASelect-filter charge
+        if charge not in z_line_charges:
+            charge_mismatch_count += 1
+            continue
+
+        batch.scan_numbers.append(low_scan)
+        batch.sequences.append(sequence)
+        batch.charges.append(charge)
+        batch.collision_energies.append(collision_energy)
+        batch.peak_blocks.append(''.join(spectra_lines[peak_start:]))
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = AnnotationBatch(engine=engine, ppm=ppm, ms2_path=ms2_path, file_name=file_name)
+
+    if len(batch) > 0:
+        yield batch
+
+    if charge_mismatch_count > 0:
+        print(f"{ms2_path}: skipped {charge_mismatch_count} spectra without a Z line matching the DTASelect-filter "
+              f"charge")
+
+
+def annotate_files(file_pairs: Iterable[Tuple[str, str]], engine: FragmentEngine, ppm: float = 40,
+                   processes: int = None, batch_size: int = 1000, dta_filter_version: str = None,
+                   collision_energy_keyword: str = None) -> Iterator[Tuple[str, Dict[str, np.ndarray]]]:
+    """
+    Annotates fragment ions for many (ms2, DTASelect-filter) file pairs. Identified spectra from all files are
+    distributed to a process pool in batches.
+    :param file_pairs: (ms2_path, filter_path) pairs
+    :param engine: FragmentEngine used to generate theoretical fragments
+    :param ppm: fragment tolerance in ppm
+    :param processes: number of worker processes, defaults to os.cpu_count()
+    :param batch_size: number of spectra per batch
+    :param dta_filter_version: DTASelect-filter version, detected from the header if None
+    :param collision_energy_keyword: I line keyword for collision energy
+    :return: yields (ms2_path, annotation table) for each ms2 file, in input order
+    """
+
+    def generate_batches():
+        for ms2_path, filter_path in file_pairs:
+            ms2_path, filter_path = str(ms2_path), str(filter_path)
+            scan_number_to_sequence_map = build_scan_number_to_sequence_map(filter_path, get_ms2_file_name(ms2_path),
+                                                                            dta_filter_version=dta_filter_version)
+            print(f"{ms2_path}: {len(scan_number_to_sequence_map)} ms2 scans identified in dta-filter")
+
+            # an empty batch marks the file so that files without identifications are still reported
+            yield AnnotationBatch(engine=engine, ppm=ppm, ms2_path=ms2_path, file_name=get_ms2_file_name(ms2_path))
+            yield from read_annotation_batches(ms2_path, scan_number_to_sequence_map, engine, ppm=ppm,
+                                               batch_size=batch_size,
+                                               collision_energy_keyword=collision_energy_keyword)
+
+    current_ms2_path, tables = None, []
+    with Pool(processes=processes) as pool:
+        # imap keeps batch order, so the batches of one ms2 file come back contiguously
+        for ms2_path, table in pool.imap(_annotate_batch_worker, generate_batches()):
+            if ms2_path != current_ms2_path:
+                if current_ms2_path is not None:
+                    yield current_ms2_path, concatenate_annotation_tables(tables)
+                current_ms2_path, tables = ms2_path, []
+            tables.append(table)
+
+    if current_ms2_path is not None:
+        yield current_ms2_path, concatenate_annotation_tables(tables)
+
+
+def _annotate_batch_worker(batch: AnnotationBatch) -> Tuple[str, Dict[str, np.ndarray]]:
+    return batch.ms2_path, annotate_batch(batch)
+
+
+def write_annotation_table(table: Dict[str, np.ndarray], out_path: str) -> None:
+    """
+    Writes a columnar annotation table as a tab separated file
+    """
+    df = pd.DataFrame(table, columns=ANNOTATION_COLUMNS)
+    df = df.round({'fragment_mz': 5, 'mz': 5, 'ppm': 1, 'intensity': 1, 'max_fragment_intensity': 1})
+    df.to_csv(out_path, sep='\t', index=False)
+
+
+def get_project_file_pairs(project: Path, search_ids: List[str] = None) -> List[Tuple[str, str]]:
+    """
+    Returns (ms2_path, filter_path) pairs for the searches of an ip2 project
+    :param project: path to ip2 project
+    :param search_ids: search ids to use, defaults to the latest search of each experiment
+    """
+    if search_ids:
+        searches = get_searches_matching_ids(project, search_ids)
+    else:
+        searches = get_latest_search_per_experiment(project)
+
+    file_pairs = []
+    for search in searches:
+        ms2_path = get_file_from_search(search, Ip2FileType.MS2)
+        filter_path = get_file_from_search(search, Ip2FileType.DTA_SELECT_FILTER)
+        if ms2_path is None or filter_path is None:
+            print(f"skipping search (missing ms2 or DTASelect-filter): {search}")
+            continue
+        file_pairs.append((str(ms2_path), str(filter_path)))
+    return file_pairs
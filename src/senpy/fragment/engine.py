@@ -0,0 +1,189 @@
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+from pyteomics import mass
+
+from ..constants import PROTON_MASS
+from .exceptions import FragmentUnsupportedResidueException, FragmentUnsupportedIonTypeException
+from .peptide import get_ptm_index_dict, remove_ptm
+
+FORWARD_ION_TYPES = 'abc'
+BACKWARD_ION_TYPES = 'xyz'
+
+FRAGMENT_ION_DTYPE = np.dtype([
+    ('ion_type', 'U1'),
+    ('number', np.int32),
+    ('charge', np.int8),
+    ('loss', 'U16'),
+    ('mz', np.float64),
+])
+
+
+def build_residue_mass_table(residue_modifications: Dict[str, float] = None,
+                             aa_mass: Dict[str, float] = None) -> np.ndarray:
+    """
+    Returns a lookup table of residue masses indexed by the ascii code of each one letter amino acid. Static
+    residue modifications are added to the table. Unsupported residues are nan.
+    :param residue_modifications: residue specific mass shifts ex: {'C': 57.02146}
+    :param aa_mass: residue masses, defaults to pyteomics std_aa_mass
+    :return: float64 array of length 128
+    """
+    if aa_mass is None:
+        aa_mass = mass.std_aa_mass
+
+    table = np.full(128, np.nan, dtype=np.float64)
+    for aa, aa_mass_val in aa_mass.items():
+        if len(aa) == 1:
+            table[ord(aa)] = aa_mass_val
+
+    if residue_modifications:
+        for aa, mass_shift in residue_modifications.items():
+            table[ord(aa)] += mass_shift
+
+    return table
+
+
+def get_ion_type_offset(ion_type: str) -> float:
+    """
+    Returns the neutral mass which is added to the summed residue masses of a fragment (water + ion composition),
+    matching pyteomics.mass.fast_mass
+    """
+    if ion_type not in FORWARD_ION_TYPES + BACKWARD_ION_TYPES:
+        raise FragmentUnsupportedIonTypeException(ion_type)
+
+    offset = mass.nist_mass['H'][0][0] * 2 + mass.nist_mass['O'][0][0]
+    offset += sum(mass.nist_mass[element][0][0] * num for element, num in mass.std_ion_comp[ion_type].items())
+    return offset
+
+
+def encode_fragment_ions(ions: np.ndarray) -> List[str]:
+    """
+    Encodes fragment ions as '[ion_type][number]_[charge]_[loss]' ex: 'b3_1_NA'
+    """
+    return [f"{ion_type}{number}_{charge}_{loss}" for ion_type, number, charge, loss in
+            zip(ions['ion_type'], ions['number'], ions['charge'], ions['loss'])]
+
+
+class FragmentEngine:
+    """
+    FragmentEngine generates fragment ion m/z for peptides using precomputed residue mass lookup tables.
+
+    A peptide is converted into an array of residue masses (static residue modifications come from the lookup table,
+    ptm's like 'C(57.02146)' are added to the residue they follow). Every forward ion series (a/b/c) is built from
+    the same cumulative sum and every backward series (x/y/z) from the cumulative sum of the reversed array:
+
+        peptide = "PEP"
+        residue_masses = [97.05276, 129.04259, 97.05276]
+        b_ions (neutral) = cumsum(residue_masses) + b_offset                -> b1, b2, b3
+        y_ions (neutral) = cumsum(residue_masses[::-1]) + y_offset          -> y1, y2, y3
+
+    Neutral losses and charges are then broadcast over the (ion_types, length) matrix:
+
+        mz[ion_type, loss, charge, number] = (neutral[ion_type, number] - loss + charge * PROTON_MASS) / charge
+
+    The result is a structured array with FRAGMENT_ION_DTYPE (ion_type, number, charge, loss, mz).
+    """
+
+    def __init__(self, ion_types: Iterable[str] = ('b', 'y'), charges: Iterable[int] = (1,),
+                 losses: Dict[str, float] = None, residue_modifications: Dict[str, float] = None):
+
+        if losses is None:
+            losses = {'NA': 0.0}
+
+        self._ion_types = tuple(ion_types)
+        self._charges = np.array(list(charges), dtype=np.int8)
+        self._loss_names = np.array(list(losses.keys()), dtype='U16')
+        self._loss_masses = np.array(list(losses.values()), dtype=np.float64)
+        self._residue_modifications = residue_modifications
+
+        self._residue_mass_table = build_residue_mass_table(residue_modifications)
+        self._ion_type_offsets = np.array([get_ion_type_offset(ion_type) for ion_type in self._ion_types],
+                                          dtype=np.float64)
+        self._is_forward = np.array([ion_type in FORWARD_ION_TYPES for ion_type in self._ion_types])
+
+        # ion_type/loss/charge/number columns only depend on peptide length
+        self._templates = {}
+
+    def get_residue_masses(self, peptide: str) -> np.ndarray:
+        """
+        Returns the residue masses of the peptide with static residue modifications and ptm's applied
+        """
+        ptm_dict = get_ptm_index_dict(peptide) if "(" in peptide else None
+        clean_peptide = remove_ptm(peptide) if ptm_dict else peptide
+
+        residue_codes = np.frombuffer(clean_peptide.encode('latin-1', errors='replace'), dtype=np.uint8)
+        if len(residue_codes) == 0 or residue_codes.max() >= len(self._residue_mass_table):
+            raise FragmentUnsupportedResidueException(peptide)
+
+        residue_masses = self._residue_mass_table[residue_codes]
+        if np.isnan(residue_masses).any():
+            raise FragmentUnsupportedResidueException(peptide)
+
+        if ptm_dict:
+            # n-terminal ptm's ('(42.0106)PEPK') are keyed -1, they belong to the first residue
+            ptm_indexes = np.maximum(np.fromiter(ptm_dict.keys(), dtype=np.int64, count=len(ptm_dict)), 0)
+            np.add.at(residue_masses, ptm_indexes, np.fromiter(ptm_dict.values(), dtype=np.float64,
+                                                               count=len(ptm_dict)))
+
+        return residue_masses
+
+    def get_neutral_fragment_masses(self, residue_masses: np.ndarray) -> np.ndarray:
+        """
+        Returns neutral fragment masses for every ion type with shape (ion_types, peptide length). Column n - 1
+        holds the mass of fragment ion number n.
+        """
+        prefix_masses = np.cumsum(residue_masses)
+        suffix_masses = np.cumsum(residue_masses[::-1])
+        fragment_masses = np.where(self._is_forward[:, None], prefix_masses[None, :], suffix_masses[None, :])
+        return fragment_masses + self._ion_type_offsets[:, None]
+
+    def fragment(self, peptide: Union[str, np.ndarray]) -> np.ndarray:
+        """
+        Returns all fragment ions of the peptide (or of an array of residue masses)
+        :param peptide: peptide sequence, may include ptm's ex: 'PEPC(57.02146)TIDE'
+        :return: structured array with FRAGMENT_ION_DTYPE
+        """
+        residue_masses = self.get_residue_masses(peptide) if isinstance(peptide, str) else peptide
+        neutral_masses = self.get_neutral_fragment_masses(residue_masses)
+
+        charges = self._charges.astype(np.float64)[None, None, :, None]
+        mz = (neutral_masses[:, None, None, :] - self._loss_masses[None, :, None, None]
+              + charges * PROTON_MASS) / charges
+
+        ions = self._get_template(len(residue_masses)).copy()
+        ions['mz'] = mz.ravel()
+        return ions
+
+    def _get_template(self, peptide_length: int) -> np.ndarray:
+        template = self._templates.get(peptide_length)
+        if template is None:
+            n_ion_types, n_losses, n_charges = len(self._ion_types), len(self._loss_names), len(self._charges)
+            template = np.zeros(n_ion_types * n_losses * n_charges * peptide_length, dtype=FRAGMENT_ION_DTYPE)
+            template['ion_type'] = np.repeat(np.array(self._ion_types, dtype='U1'),
+                                             n_losses * n_charges * peptide_length)
+            template['loss'] = np.tile(np.repeat(self._loss_names, n_charges * peptide_length), n_ion_types)
+            template['charge'] = np.tile(np.repeat(self._charges, peptide_length), n_ion_types * n_losses)
+            template['number'] = np.tile(np.arange(1, peptide_length + 1, dtype=np.int32),
+                                         n_ion_types * n_losses * n_charges)
+            self._templates[peptide_length] = template
+        return template
+
+    @property
+    def ion_types(self):
+        return self._ion_types
+
+    @property
+    def charges(self):
+        return self._charges
+
+    @property
+    def losses(self):
+        return dict(zip(self._loss_names, self._loss_masses))
+
+    @property
+    def residue_modifications(self):
+        return self._residue_modifications
+
+    @property
+    def residue_mass_table(self):
+        return self._residue_mass_table
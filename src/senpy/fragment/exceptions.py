@@ -0,0 +1,27 @@
+class FragmentUnsupportedResidueException(Exception):
+
+    def __init__(self, _peptide: str):
+        self.peptide = _peptide
+
+    def __repr__(self):
+        return f"Unsupported residue in peptide: '{self.peptide}'"
+
+
+class FragmentUnsupportedIonTypeException(Exception):
+
+    def __init__(self, _ion_type: str):
+        self.ion_type = _ion_type
+
+    def __repr__(self):
+        return f"Unsupported fragment ion type: '{self.ion_type}'"
+
+
+class FragmerTableSizeException(Exception):
+
+    def __init__(self, _k: int, _base: int, _table_bytes: int):
+        self.k = _k
+        self.base = _base
+        self.table_bytes = _table_bytes
+
+    def __repr__(self):
+        return f"Fragmer k-mer table too large: k={self.k}, alphabet size={self.base}, {self.table_bytes} bytes"
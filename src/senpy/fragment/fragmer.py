@@ -0,0 +1,227 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from pyteomics import mass
+
+from ..constants import PROTON_MASS
+from .engine import FORWARD_ION_TYPES, build_residue_mass_table, get_ion_type_offset
+from .exceptions import FragmentUnsupportedResidueException, FragmerTableSizeException
+
+STANDARD_AMINO_ACIDS = 'ARNDCEQGHILKMFPSTWYV'
+DEFAULT_MAX_TABLE_BYTES = 256_000_000
+
+_RESIDUE_TOKEN_PATTERN = re.compile(r'[A-Z](?:\([^)]*\))?')
+_PAD_CODE = 0
+
+
+def parse_modified_residue(token: str) -> Tuple[str, float]:
+    """
+    Splits a modified residue token into residue and mass shift, ex: 'M(15.994915)' -> ('M', 15.994915)
+    """
+    return token[0], float(token[2:-1])
+
+
+def build_kmer_table(residue_masses: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the prefix masses of every k-mer over an alphabet. Row c holds the cumulative masses of the k-mer whose
+    base-(len(residue_masses)) code is c, the first residue is the least significant digit:
+
+        code = codes[0] + codes[1] * base + ... + codes[k - 1] * base ** (k - 1)
+        table[code] = cumsum(residue_masses[codes])
+
+    :param residue_masses: mass of each residue code
+    :param k: k-mer length
+    :return: float64 array with shape (base ** k, k)
+    """
+    base = len(residue_masses)
+    kmer_codes = np.arange(base ** k, dtype=np.int64)
+    digits = (kmer_codes[:, None] // base ** np.arange(k, dtype=np.int64)[None, :]) % base
+    return np.cumsum(residue_masses[digits], axis=1)
+
+
+@dataclass
+class FragmentLadders:
+    """
+    Neutral fragment masses for a batch of peptides. The ladder of peptide i is stored in the columns
+    offsets[i]:offsets[i + 1] of neutral_masses, one row per ion type. Column offsets[i] + n - 1 holds the mass of
+    fragment ion number n.
+    """
+    ion_types: Tuple[str, ...]
+    offsets: np.ndarray
+    neutral_masses: np.ndarray
+
+    __slots__ = 'ion_types', 'offsets', 'neutral_masses'
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_mz(self, charge: int = 1) -> np.ndarray:
+        """
+        Returns the m/z of all fragment ladders for charge, same shape as neutral_masses
+        """
+        return (self.neutral_masses + charge * PROTON_MASS) / charge
+
+    def get_peptide_neutral_masses(self, i: int) -> np.ndarray:
+        """
+        Returns the neutral fragment masses of peptide i with shape (ion_types, peptide length)
+        """
+        return self.neutral_masses[:, self.offsets[i]:self.offsets[i + 1]]
+
+
+class Fragmer:
+    """
+    Fragmer generates fragment ion ladders for peptides from precomputed k-mer prefix masses.
+
+    Every residue of the alphabet (the standard amino acids plus any modified residues ex: 'M(15.994915)') gets a code
+    in 1..n, code 0 is a zero mass pad residue. The prefix masses of all base-(n + 1) k-mers are stored in one
+    contiguous table (see build_kmer_table). Peptides are padded to a multiple of k and split into k-mers:
+
+        k = 3
+        peptide = "PEPTIDE" -> ["PEP", "TID", "E__"]
+
+    Each k-mer code indexes the table and the last mass of every k-mer is carried into the next k-mer, which gives the
+    prefix masses of the peptide. The forward ions (a/b/c) are prefix masses + ion offset and the backward ions
+    (x/y/z) are (peptide mass - prefix masses) + ion offset. fragment_peptides does this for all peptides at once.
+
+    The table holds (n + 1) ** k * k float64 values, a FragmerTableSizeException is raised when that exceeds
+    max_table_bytes.
+    """
+
+    def __init__(self, k: int = 3, ion_types: Iterable[str] = ('b', 'y'),
+                 valid_amino_acids: str = STANDARD_AMINO_ACIDS, modified_residues: Iterable[str] = None,
+                 residue_modifications: Dict[str, float] = None, max_table_bytes: int = DEFAULT_MAX_TABLE_BYTES):
+
+        if modified_residues is None:
+            modified_residues = []
+
+        self._k = k
+        self._ion_types = tuple(ion_types)
+        self._valid_amino_acids = valid_amino_acids
+        self._modified_residues = tuple(modified_residues)
+        self._residue_modifications = residue_modifications
+
+        self._alphabet = tuple(valid_amino_acids) + self._modified_residues
+        self._base = len(self._alphabet) + 1
+
+        table_bytes = self._base ** k * k * np.dtype(np.float64).itemsize
+        if table_bytes > max_table_bytes:
+            raise FragmerTableSizeException(k, self._base, table_bytes)
+
+        residue_mass_table = build_residue_mass_table(residue_modifications, aa_mass=mass.std_aa_mass)
+        self._residue_masses = np.zeros(self._base, dtype=np.float64)
+        for code, token in enumerate(self._alphabet, start=1):
+            if len(token) == 1:
+                self._residue_masses[code] = residue_mass_table[ord(token)]
+            else:
+                residue, mass_shift = parse_modified_residue(token)
+                self._residue_masses[code] = residue_mass_table[ord(residue)] + mass_shift
+        if np.isnan(self._residue_masses).any():
+            raise FragmentUnsupportedResidueException(''.join(self._alphabet))
+
+        # unmodified residues are coded with a single ascii lookup, -1 marks unsupported residues
+        self._ascii_codes = np.full(128, -1, dtype=np.int64)
+        for code, token in enumerate(self._alphabet, start=1):
+            if len(token) == 1:
+                self._ascii_codes[ord(token)] = code
+        self._token_codes = {token: code for code, token in enumerate(self._alphabet, start=1)}
+
+        self._kmer_table = build_kmer_table(self._residue_masses, k)
+        self._kmer_weights = self._base ** np.arange(k, dtype=np.int64)
+        self._ion_type_offsets = np.array([get_ion_type_offset(ion_type) for ion_type in self._ion_types],
+                                          dtype=np.float64)
+        self._is_forward = np.array([ion_type in FORWARD_ION_TYPES for ion_type in self._ion_types])
+
+    def encode_peptide(self, peptide: str) -> np.ndarray:
+        """
+        Returns the residue codes of the peptide, ex: 'PEM(15.994915)' -> [code(P), code(E), code(M(15.994915))]
+        """
+        if "(" in peptide:
+            tokens = _RESIDUE_TOKEN_PATTERN.findall(peptide)
+            if sum(len(token) for token in tokens) != len(peptide):
+                raise FragmentUnsupportedResidueException(peptide)
+            try:
+                return np.array([self._token_codes[token] for token in tokens], dtype=np.int64)
+            except KeyError:
+                raise FragmentUnsupportedResidueException(peptide)
+
+        residue_bytes = np.frombuffer(peptide.encode('latin-1', errors='replace'), dtype=np.uint8)
+        if len(residue_bytes) == 0 or residue_bytes.max() >= len(self._ascii_codes):
+            raise FragmentUnsupportedResidueException(peptide)
+        codes = self._ascii_codes[residue_bytes]
+        if (codes < 0).any():
+            raise FragmentUnsupportedResidueException(peptide)
+        return codes
+
+    def fragment_peptides(self, peptides: List[str]) -> FragmentLadders:
+        """
+        Returns the fragment ladders of every ion type for all peptides
+        :param peptides: peptide sequences, may include modified residues from the alphabet ex: 'PEPM(15.994915)'
+        :return: FragmentLadders
+        """
+        k = self._k
+        peptide_codes = [self.encode_peptide(peptide) for peptide in peptides]
+        lengths = np.array([len(codes) for codes in peptide_codes], dtype=np.int64)
+        offsets = np.zeros(len(peptides) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        # pad every peptide to a multiple of k and look up all k-mers at once
+        padded_lengths = -(-lengths // k) * k
+        padded_offsets = np.zeros(len(peptides) + 1, dtype=np.int64)
+        np.cumsum(padded_lengths, out=padded_offsets[1:])
+        padded_codes = np.full(padded_offsets[-1], _PAD_CODE, dtype=np.int64)
+        padded_positions = np.arange(offsets[-1]) - np.repeat(offsets[:-1] - padded_offsets[:-1], lengths)
+        if len(peptide_codes) > 0:
+            padded_codes[padded_positions] = np.concatenate(peptide_codes)
+
+        kmer_prefix_masses = self._kmer_table[padded_codes.reshape(-1, k) @ self._kmer_weights]
+
+        # carry the mass of all previous k-mers of the same peptide into each k-mer
+        kmer_masses = kmer_prefix_masses[:, -1]
+        kmers_per_peptide = padded_lengths // k
+        carried_masses = np.cumsum(kmer_masses) - kmer_masses
+        peptide_start_masses = np.repeat(carried_masses[padded_offsets[:-1] // k], kmers_per_peptide)
+        prefix_masses = (kmer_prefix_masses + (carried_masses - peptide_start_masses)[:, None]).ravel()
+        prefix_masses = prefix_masses[padded_positions]
+
+        # suffix mass of n residues = peptide mass - prefix mass of the first (length - n) residues
+        peptide_masses = np.repeat(prefix_masses[offsets[1:] - 1], lengths)
+        residue_masses = self._residue_masses[padded_codes[padded_positions]]
+        starts = np.repeat(offsets[:-1], lengths)
+        mirrored_positions = 2 * starts + np.repeat(lengths, lengths) - 1 - np.arange(offsets[-1])
+        suffix_masses = peptide_masses - (prefix_masses - residue_masses)[mirrored_positions]
+
+        neutral_masses = np.where(self._is_forward[:, None], prefix_masses[None, :], suffix_masses[None, :])
+        neutral_masses += self._ion_type_offsets[:, None]
+        return FragmentLadders(ion_types=self._ion_types, offsets=offsets, neutral_masses=neutral_masses)
+
+    def fragment_peptide(self, peptide: str) -> np.ndarray:
+        """
+        Returns the neutral fragment masses of a single peptide with shape (ion_types, peptide length)
+        """
+        return self.fragment_peptides([peptide]).neutral_masses
+
+    @property
+    def k(self):
+        return self._k
+
+    @property
+    def ion_types(self):
+        return self._ion_types
+
+    @property
+    def valid_amino_acids(self):
+        return self._valid_amino_acids
+
+    @property
+    def modified_residues(self):
+        return self._modified_residues
+
+    @property
+    def alphabet(self):
+        return self._alphabet
+
+    @property
+    def kmer_table(self):
+        return self._kmer_table
@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import Any, Tuple
+
+import numpy as np
+
+from ..ragged import expand_ranges
+from ..spectra.peaks import get_spectrum_arrays
+
+
+@dataclass
+class FragmentMatches:
+    """
+    Dataclass to store matched fragment ions. Element i pairs theoretical fragment fragment_indexes[i] with
+    experimental peak peak_indexes[i]. ppm_errors are (theoretical - observed) / theoretical * 1e6.
+    """
+    fragment_indexes: np.ndarray
+    peak_indexes: np.ndarray
+    ppm_errors: np.ndarray
+    mz: np.ndarray
+    intensities: np.ndarray
+
+    __slots__ = 'fragment_indexes', 'peak_indexes', 'ppm_errors', 'mz', 'intensities'
+
+    def __len__(self):
+        return len(self.peak_indexes)
+
+
+def match_fragment_ions(fragment_mz: np.ndarray, mz_spectra: np.ndarray, intensity_spectra: np.ndarray,
+                        ppm: float = 40) -> FragmentMatches:
+    """
+    Matches theoretical fragment m/z to experimental peaks within ppm of the theoretical m/z.
+
+    The theoretical m/z are sorted once, and for every fragment the window [mz - mz * ppm, mz + mz * ppm] is located in
+    the sorted experimental m/z array with two searchsorted calls. Every (fragment, peak) pair within the window is a
+    match, results are ordered by peak index.
+
+    :param fragment_mz: theoretical fragment m/z (ex: FragmentEngine.fragment(peptide)['mz'])
+    :param mz_spectra: experimental m/z
+    :param intensity_spectra: experimental intensities
+    :param ppm: fragment tolerance in ppm
+    :return: FragmentMatches, indexes refer to the input arrays
+    """
+    fragment_mz = np.asarray(fragment_mz, dtype=np.float64)
+    mz_spectra = np.asarray(mz_spectra, dtype=np.float64)
+    intensity_spectra = np.asarray(intensity_spectra)
+
+    fragment_order = np.argsort(fragment_mz, kind='stable')
+    sorted_fragment_mz = fragment_mz[fragment_order]
+
+    # ms2 peaks are normally written in ascending m/z
+    peak_order = None
+    if len(mz_spectra) > 1 and np.any(mz_spectra[1:] < mz_spectra[:-1]):
+        peak_order = np.argsort(mz_spectra, kind='stable')
+        mz_spectra = mz_spectra[peak_order]
+
+    tolerance = sorted_fragment_mz * ppm / 1_000_000
+    start_indexes = np.searchsorted(mz_spectra, sorted_fragment_mz - tolerance, side='left')
+    end_indexes = np.searchsorted(mz_spectra, sorted_fragment_mz + tolerance, side='right')
+    counts = end_indexes - start_indexes
+
+    # every (fragment, peak) pair within the window
+    sorted_fragment_indexes = np.repeat(np.arange(len(sorted_fragment_mz)), counts)
+    peak_indexes = expand_ranges(start_indexes, counts)
+
+    matched_fragment_mz = sorted_fragment_mz[sorted_fragment_indexes]
+    matched_mz = mz_spectra[peak_indexes]
+    ppm_errors = (matched_fragment_mz - matched_mz) / matched_fragment_mz * 1_000_000
+
+    fragment_indexes = fragment_order[sorted_fragment_indexes]
+    if peak_order is not None:
+        peak_indexes = peak_order[peak_indexes]
+
+    order = np.argsort(peak_indexes, kind='stable')
+    peak_indexes = peak_indexes[order]
+    return FragmentMatches(fragment_indexes=fragment_indexes[order],
+                           peak_indexes=peak_indexes,
+                           ppm_errors=ppm_errors[order],
+                           mz=matched_mz[order],
+                           intensities=intensity_spectra[peak_indexes])
+
+
+def match_spectrum_fragment_ions(ms2_spectra: Any, fragment_ions: np.ndarray, ppm: float = 40) -> FragmentMatches:
+    """
+    Matches fragment ions (FRAGMENT_ION_DTYPE array or m/z array) against a senpy Ms2Spectra
+    """
+    fragment_mz = fragment_ions['mz'] if fragment_ions.dtype.names else fragment_ions
+    mz_spectra, intensity_spectra = get_spectrum_arrays(ms2_spectra)
+    return match_fragment_ions(fragment_mz, mz_spectra, intensity_spectra, ppm=ppm)
@@ -0,0 +1,35 @@
+from typing import Dict
+
+
+def get_ptm_index_dict(peptide: str) -> Dict[int, float]:
+    """
+    Maps the index of each modified residue (in the unmodified sequence) to its ptm mass, n-terminal ptm's are
+    keyed -1
+
+    Example:
+        "PEPC(57.02146)TIDE" -> {3: 57.02146}
+        "(42.0106)PEPK" -> {-1: 42.0106}
+    """
+    ptm_dict = {}
+    while "(" in peptide:
+        start_index_of_lowest_index_ptm = peptide.find("(")
+        end_index_of_lowest_index_ptm = peptide.find(")")
+
+        ptm_mass = float(peptide[start_index_of_lowest_index_ptm + 1:end_index_of_lowest_index_ptm])
+        peptide = peptide[:start_index_of_lowest_index_ptm] + peptide[end_index_of_lowest_index_ptm + 1:]
+        ptm_dict[start_index_of_lowest_index_ptm - 1] = ptm_dict.get(start_index_of_lowest_index_ptm - 1, 0) + \
+            ptm_mass
+
+    return ptm_dict
+
+
+def remove_ptm(peptide: str) -> str:
+    """
+    Removes all '(mass)' modifications from the peptide sequence
+    """
+    while "(" in peptide:
+        start_index_of_lowest_index_ptm = peptide.find("(")
+        end_index_of_lowest_index_ptm = peptide.find(")")
+        peptide = peptide[:start_index_of_lowest_index_ptm] + peptide[end_index_of_lowest_index_ptm + 1:]
+
+    return peptide
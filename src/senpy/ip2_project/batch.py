@@ -0,0 +1,151 @@
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+
+from .catalog import ProjectCatalog
+from .file_types import Ip2FileType
+
+MANIFEST_FILE_NAME = '.senpy_manifest_{task_name}.json'
+
+
+@dataclass
+class SearchJob:
+    """
+    A search and its input files, discovered once per batch
+    """
+    search: Path
+    files: Dict[Ip2FileType, Path] = field(default_factory=dict)
+
+    def get_file(self, file_type: Ip2FileType) -> Path:
+        return self.files[file_type]
+
+    def get_fingerprint(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Returns (size, mtime_ns) of each input file
+        """
+        fingerprint = {}
+        for file in self.files.values():
+            stat = os.stat(file)
+            fingerprint[str(file)] = (stat.st_size, stat.st_mtime_ns)
+        return fingerprint
+
+
+def discover_search_jobs(project: Path, file_types: Iterable[Ip2FileType], search_ids: List[str] = None,
+                         catalog: ProjectCatalog = None) -> List[SearchJob]:
+    """
+    Returns a SearchJob for the latest search of each experiment (or the searches matching search_ids) which contains
+    every file type. Searches missing a file type are reported and skipped.
+    """
+    if catalog is None:
+        catalog = ProjectCatalog(project)
+
+    if search_ids:
+        searches = catalog.get_searches_matching_ids(search_ids)
+    else:
+        searches = catalog.get_latest_search_per_experiment()
+
+    jobs = []
+    for search in searches:
+        files = {file_type: catalog.get_file(search, file_type) for file_type in file_types}
+        missing = [file_type.name for file_type, file in files.items() if file is None]
+        if missing:
+            print(f"skipping search, missing {missing}: {search}")
+            continue
+        jobs.append(SearchJob(search=search, files=files))
+    return jobs
+
+
+class Manifest:
+    """
+    Records the (size, mtime_ns) of the inputs and the output paths of every completed search job in a json file. A
+    job whose inputs still have the recorded size and mtime and whose outputs all still exist is skipped on the next
+    run. The file is rewritten (atomically) after each completed job, so an interrupted batch resumes where it
+    stopped.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._entries = {}
+        if self.path.exists():
+            with open(self.path) as file:
+                self._entries = json.load(file)
+
+    def is_complete(self, job: SearchJob) -> bool:
+        entry = self._entries.get(str(job.search))
+        if entry is None:
+            return False
+        try:
+            fingerprint = job.get_fingerprint()
+        except FileNotFoundError:
+            return False
+        if not all(os.path.exists(output) for output in entry.get('outputs', [])):
+            return False
+        return {file: tuple(val) for file, val in entry['files'].items()} == fingerprint
+
+    def record(self, job: SearchJob, outputs: Iterable[Union[str, Path]] = ()) -> None:
+        self._entries[str(job.search)] = {'files': job.get_fingerprint(),
+                                          'outputs': [str(output) for output in outputs],
+                                          'completed': time.time()}
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(self._entries, file, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _run_job_args(args: Tuple[Callable[[SearchJob], Any], SearchJob]) -> Tuple[SearchJob, Any, Union[str, None]]:
+    task, job = args
+    try:
+        return job, task(job), None
+    except Exception as e:
+        return job, None, repr(e)
+
+
+def run_batch(project: Path, task: Callable[[SearchJob], Any], file_types: Iterable[Ip2FileType], task_name: str,
+              search_ids: List[str] = None, processes: int = None, manifest_path: Union[str, Path] = None,
+              force: bool = False, catalog: ProjectCatalog = None,
+              get_outputs: Callable[[SearchJob], Iterable[Union[str, Path]]] = None) -> Dict[Path, Any]:
+    """
+    Runs task on every search of the project in a process pool, skipping searches whose inputs did not change since
+    they last completed and whose outputs still exist. Input fingerprints are taken after the task finishes, so tasks
+    may rewrite their inputs.
+    :param project: path to ip2 project
+    :param task: picklable (module level) function taking a SearchJob
+    :param file_types: input file types each search must contain
+    :param task_name: names the manifest, ex: 'rtscore'
+    :param search_ids: search ids to run, defaults to the latest search of each experiment
+    :param processes: number of worker processes, defaults to os.cpu_count()
+    :param manifest_path: defaults to [project]/.senpy_manifest_[task_name].json
+    :param force: run every search, ignoring the manifest
+    :param catalog: ProjectCatalog of the project, a new one is scanned by default
+    :param get_outputs: returns the files task writes for a search, a search is rerun when one of them is missing
+    :return: task result of each search which ran successfully
+    """
+    if manifest_path is None:
+        manifest_path = Path(project) / MANIFEST_FILE_NAME.format(task_name=task_name)
+    manifest = Manifest(manifest_path)
+
+    jobs = discover_search_jobs(project, file_types, search_ids, catalog)
+    pending_jobs = jobs if force else [job for job in jobs if not manifest.is_complete(job)]
+    print(f"{task_name}: {len(pending_jobs)} of {len(jobs)} searches to run, manifest: {manifest_path}")
+
+    results, failures = {}, []
+    with Pool(processes=processes) as pool:
+        for job, result, error in pool.imap_unordered(_run_job_args, [(task, job) for job in pending_jobs]):
+            if error is not None:
+                print(f"failed: {job.search}: {error}")
+                failures.append(job)
+                continue
+            manifest.record(job, get_outputs(job) if get_outputs is not None else ())
+            results[job.search] = result
+            print(f"completed ({len(results)}/{len(pending_jobs)}): {job.search}")
+
+    if failures:
+        print(f"{len(failures)} searches failed, rerun to retry them")
+    return results
@@ -0,0 +1,260 @@
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from .file_types import Ip2FileType
+from .project import ITEMS_TO_REMOVE
+
+SNAPSHOT_VERSION = 1
+
+_DIGITS_PATTERN = re.compile(r'\d+')
+
+
+@dataclass
+class FileEntry:
+    name: str
+    size: int
+    mtime_ns: int
+    ctime: float
+
+
+@dataclass
+class SearchEntry:
+    name: str
+    mtime_ns: int
+    ctime: float
+    files: List[FileEntry] = field(default_factory=list)
+
+
+@dataclass
+class ExperimentEntry:
+    name: str
+    mtime_ns: int
+    ctime: float
+    search_dir_mtime_ns: Union[int, None]
+    searches: List[SearchEntry] = field(default_factory=list)  # sorted by ctime
+
+
+def _scan_files(path: str) -> List[FileEntry]:
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                files.append(FileEntry(entry.name, stat.st_size, stat.st_mtime_ns, stat.st_ctime))
+    files.sort(key=lambda file: file.name)
+    return files
+
+
+def _scan_search(path: str, name: str) -> SearchEntry:
+    stat = os.stat(path)
+    return SearchEntry(name, stat.st_mtime_ns, stat.st_ctime, _scan_files(path))
+
+
+def _scan_experiment(path: str, name: str) -> ExperimentEntry:
+    stat = os.stat(path)
+    search_dir = os.path.join(path, 'search')
+    searches, search_dir_mtime_ns = [], None
+    if os.path.isdir(search_dir):
+        search_dir_mtime_ns = os.stat(search_dir).st_mtime_ns
+        with os.scandir(search_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():  # removes luciphor_ptm_out_final.txt
+                    searches.append(_scan_search(entry.path, entry.name))
+    searches.sort(key=lambda search: search.ctime)
+    return ExperimentEntry(name, stat.st_mtime_ns, stat.st_ctime, search_dir_mtime_ns, searches)
+
+
+class ProjectCatalog:
+    """
+    In memory catalog of an ip2 project (experiments -> searches -> files), built with a single os.scandir walk.
+    Every stat result is taken once during the walk, lookups afterwards do not touch the filesystem.
+
+    With snapshot_path the catalog is saved as json and reused by later runs. A snapshot is validated with one scandir
+    of the project and one stat per directory: new experiments and experiments whose directory (or search directory)
+    mtime changed are rescanned, and searches whose directory mtime changed have their files rescanned. File
+    sizes/mtimes come from the snapshot, files rewritten in place (without adding/removing directory entries) keep
+    their cached stat until refresh() is called.
+
+    Searches of an experiment are ordered by ctime (oldest first), the same order as get_searches_from_experiment.
+    """
+
+    def __init__(self, project: Union[str, Path], snapshot_path: Union[str, Path] = None):
+        self.project = Path(project)
+        self.snapshot_path = Path(snapshot_path) if snapshot_path is not None else None
+        self._experiments: Dict[str, ExperimentEntry] = {}
+
+        if self.snapshot_path is not None and self.snapshot_path.exists():
+            self._load_snapshot()
+        else:
+            self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Rescans the whole project
+        """
+        self._load_experiments({})
+
+    def _load_experiments(self, cached_experiments: Dict[str, dict]) -> bool:
+        """
+        Scans the project directory and (re)scans each experiment, cached_experiments (from a snapshot) are reused
+        when their directory mtimes did not change. Returns True if anything was rescanned.
+        """
+        changed = False
+        experiments = []
+        with os.scandir(self.project) as entries:
+            for entry in entries:
+                if not entry.is_dir() or entry.name in ITEMS_TO_REMOVE:
+                    continue
+
+                experiment_dict = cached_experiments.get(entry.name)
+                experiment, searches_changed = self._load_cached_experiment(entry.path, experiment_dict) \
+                    if experiment_dict else (None, False)
+                if experiment is None:
+                    experiment = _scan_experiment(entry.path, entry.name)
+                    searches_changed = True
+                changed = changed or searches_changed
+                experiments.append(experiment)
+
+        changed = changed or len(experiments) != len(cached_experiments)
+        experiments.sort(key=lambda experiment: experiment.ctime)
+        self._experiments = {experiment.name: experiment for experiment in experiments}
+        self._build_lookups()
+        if changed:
+            self.save_snapshot()
+        return changed
+
+    @staticmethod
+    def _load_cached_experiment(path: str, experiment_dict: dict) -> Tuple[Union[ExperimentEntry, None], bool]:
+        """
+        Returns the cached experiment with changed searches rescanned and whether any search was rescanned, or
+        (None, False) if the experiment must be rescanned
+        """
+        search_dir = os.path.join(path, 'search')
+        experiment_mtime_ns = os.stat(path).st_mtime_ns
+        search_dir_mtime_ns = os.stat(search_dir).st_mtime_ns if os.path.isdir(search_dir) else None
+        if experiment_mtime_ns != experiment_dict['mtime_ns'] or \
+                search_dir_mtime_ns != experiment_dict['search_dir_mtime_ns']:
+            return None, False
+
+        searches, changed = [], False
+        for search_dict in experiment_dict['searches']:
+            search_path = os.path.join(search_dir, search_dict['name'])
+            if os.stat(search_path).st_mtime_ns != search_dict['mtime_ns']:
+                searches.append(_scan_search(search_path, search_dict['name']))
+                changed = True
+            else:
+                files = [FileEntry(**file_dict) for file_dict in search_dict['files']]
+                searches.append(SearchEntry(search_dict['name'], search_dict['mtime_ns'], search_dict['ctime'], files))
+        if changed:
+            # a rescanned search has a new ctime
+            searches.sort(key=lambda search: search.ctime)
+        return ExperimentEntry(experiment_dict['name'], experiment_dict['mtime_ns'], experiment_dict['ctime'],
+                               experiment_dict['search_dir_mtime_ns'], searches), changed
+
+    def _build_lookups(self) -> None:
+        self._search_entries = {}
+        self._searches_by_id = {}
+        for experiment in self._experiments.values():
+            for search in experiment.searches:
+                self._search_entries[(experiment.name, search.name)] = search
+                for search_id in _DIGITS_PATTERN.findall(search.name):
+                    self._searches_by_id.setdefault(search_id, []).append(self._get_search_path(experiment, search))
+
+    def _load_snapshot(self) -> None:
+        with open(self.snapshot_path) as file:
+            snapshot = json.load(file)
+
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('project') != str(self.project):
+            self.refresh()
+            return
+
+        self._load_experiments({experiment['name']: experiment for experiment in snapshot['experiments']})
+
+    def save_snapshot(self) -> None:
+        if self.snapshot_path is None:
+            return
+        snapshot = {'version': SNAPSHOT_VERSION, 'project': str(self.project),
+                    'experiments': [asdict(experiment) for experiment in self._experiments.values()]}
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + '.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _get_search_path(self, experiment: ExperimentEntry, search: SearchEntry) -> Path:
+        return self.project / experiment.name / 'search' / search.name
+
+    def get_experiments(self) -> List[Path]:
+        return [self.project / name for name in self._experiments]
+
+    def get_searches(self, experiment: Union[str, Path]) -> List[Path]:
+        experiment = self._experiments[Path(experiment).name]
+        return [self._get_search_path(experiment, search) for search in experiment.searches]
+
+    def get_latest_search(self, experiment: Union[str, Path]) -> Union[Path, None]:
+        searches = self.get_searches(experiment)
+        return searches[-1] if searches else None
+
+    def get_oldest_search(self, experiment: Union[str, Path]) -> Union[Path, None]:
+        searches = self.get_searches(experiment)
+        return searches[0] if searches else None
+
+    def get_latest_search_per_experiment(self) -> List[Path]:
+        searches = [self.get_latest_search(experiment) for experiment in self._experiments]
+        return [search for search in searches if search is not None]
+
+    def get_search_by_id(self, experiment: Union[str, Path], search_id: str) -> Union[Path, None]:
+        experiment = self._experiments[Path(experiment).name]
+        for search in experiment.searches:
+            if search_id in search.name:
+                return self._get_search_path(experiment, search)
+
+    def get_searches_matching_ids(self, search_ids: List[str]) -> List[Path]:
+        """
+        Returns the first search of each experiment whose name contains each id, same as
+        project.get_searches_matching_ids
+        """
+        searches = []
+        for experiment in self._experiments:
+            for search_id in search_ids:
+                search = self.get_search_by_id(experiment, search_id)
+                if search:
+                    searches.append(search)
+        return searches
+
+    def get_searches_with_id(self, search_id: str) -> List[Path]:
+        """
+        Returns every search in the project with search_id as a number in its name, ex: '157895' -> 'search_157895'
+        """
+        return list(self._searches_by_id.get(search_id, []))
+
+    def get_files(self, search: Union[str, Path], file_type: Ip2FileType) -> List[Path]:
+        search = Path(search)
+        search_entry = self._search_entries.get((search.parent.parent.name, search.name))
+        if search_entry is None:
+            return []
+        return [search / file.name for file in search_entry.files if fnmatch(file.name, file_type.value)]
+
+    def get_file(self, search: Union[str, Path], file_type: Ip2FileType) -> Union[Path, None]:
+        files = self.get_files(search, file_type)
+        return files[0] if files else None
+
+    def get_file_stat(self, file: Union[str, Path]) -> Union[FileEntry, None]:
+        """
+        Returns the cached size/mtime of a search file
+        """
+        file = Path(file)
+        search_entry = self._search_entries.get((file.parent.parent.parent.name, file.parent.name))
+        if search_entry is None:
+            return None
+        for file_entry in search_entry.files:
+            if file_entry.name == file.name:
+                return file_entry
+        return None
+
+    def __len__(self):
+        return len(self._experiments)
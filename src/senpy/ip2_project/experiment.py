@@ -18,10 +18,10 @@ def get_search_by_id_from_experiment(experiment: Path, search_id: str) -> Path:
 
 
 def get_latest_search_from_experiment(experiment: Path) -> Path:
-    return get_searches_from_experiment(experiment)[0]
+    return get_searches_from_experiment(experiment)[-1]
 
 
 def get_oldest_search_from_experiment(experiment: Path) -> Path:
-    return get_searches_from_experiment(experiment)[-1]
+    return get_searches_from_experiment(experiment)[0]
 
 
@@ -158,7 +158,6 @@ class Ms2SpectraFast(Ms2Spectra):
     i_lines: List[ILine]
     z_line: ZLine
     peak_lines: List[PeakLine]
-    i_line_dict = None
 
     def get_mz_spectra(self):
         return [peak_line.get_mz() for peak_line in self.peak_lines]
@@ -169,13 +168,6 @@ class Ms2SpectraFast(Ms2Spectra):
     def get_i_line_dict(self):
         return {i_line.get_keyword(): i_line.get_value() for i_line in self.i_lines}
 
-    def get_i_line_value(self, keyword) -> Union[str, None]:
-        if self.i_line_dict is None:
-            self.i_line_dict = self.get_i_line_dict()
-        if keyword in self.i_line_dict:
-            return self.i_line_dict[keyword]
-        return None
-
     @staticmethod
     def create(low_scan: int, high_scan: int, mz: float, charge: int, mass: float, mz_spectra: np.ndarray,
                intensity_spectra: np.ndarray, info_dict: Dict[str, str]) -> 'Ms2Spectra':
@@ -1,92 +1,60 @@
-from typing import List
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
 
 from .fast_lines import SLine, HLine, ZLine, PeakLine, ILine, Ms2SpectraFast, parse_ms2_line
+from . import reader
 
 
 def read_file(file_path) -> (List[HLine], List[Ms2SpectraFast]):
     """
-    Return HLines and Ms2Spectra, from provided ms2 file. Will always
-    return correctly and fully read ms2 file until eof or corrupted line is reached.
-    :param:     file_path:          str to the path for the sqt file
+    Return HLines and Ms2Spectra, from provided ms2 file. Peak lines are skipped.
+    :param:     file_path:          str to the path for the ms2 file
     :return:    (List[HLine], List[Ms2Spectra]):          lists of HLines and Ms2Spectra
     """
-    h_lines, ms2_spectras = [], []
-    with open(file_path) as file:
-        s_line, z_line, i_lines, peak_lines = None, None, [], []
-        for line in file:
-            if line == "" or line == "\n":
-                continue
-            ms2_line = parse_ms2_line(line)
-            if isinstance(ms2_line, HLine):
-                h_lines.append(ms2_line)
-                continue
-            elif isinstance(ms2_line, SLine):
-                if s_line is not None:
-                    ms2_spectras.append(Ms2SpectraFast(s_line=s_line,
-                                                   z_line=z_line,
-                                                   i_lines=i_lines,
-                                                   peak_lines=peak_lines
-                                                   )
-                                        )
-                    s_line, z_line, i_lines, peak_lines = None, None, [], []
-                s_line = ms2_line
-            elif isinstance(ms2_line, ILine):
-                i_lines.append(ms2_line)
-            elif isinstance(ms2_line, ZLine):
-                z_line = ms2_line
-            elif isinstance(ms2_line, PeakLine):
-                #peak_lines.append(ms2_line)
-                pass
+    return reader.read_file(file_path, materialize=reader.HEADER)
 
-        ms2_spectras.append(Ms2SpectraFast(s_line=s_line,
-                                       z_line=z_line,
-                                       i_lines=i_lines,
-                                       peak_lines=peak_lines
-                                       )
-                            )
 
-    return h_lines, ms2_spectras
+def read_file_incrementally(file_path) -> Iterator[Ms2SpectraFast]:
+    """
+    Return Ms2Spectra incrementally, from provided ms2 file. Peak lines are skipped.
+    :param:     file_path:          str to the path for the ms2 file
+    :return:    Iterator[Ms2Spectra]:          Ms2Spectra
+    """
+    return reader.read_file_incrementally(file_path, materialize=reader.HEADER)
 
 
-def read_file_incrementally(file_path) -> List[Ms2SpectraFast]:
+def read_metadata_index(file_path, keywords: Iterable[str]) -> Dict[str, np.ndarray]:
     """
-    Return Ms2Spectra incrementally, from provided ms2 file. Will always
-    return correctly and fully read ms2 file until eof or corrupted line is reached.
-    :param:     file_path:          str to the path for the sqt file
-    :return:    List[Ms2Spectra]:          lists of SLines
+    Return a columnar index of the S line scans and I line values of an ms2 file without reading peaks. Peak, Z
+    and H lines are skipped by their first character.
+    :param:     file_path:          str to the path for the ms2 file
+    :param:     keywords:           I line keywords to collect, ex: [ILine.RETENTION_TIME_KEYWORD]
+    :return:    Dict[str, np.ndarray]:  'low_scan' (int32), 'high_scan' (int32) and one float64 column per keyword,
+                                        nan when a spectrum has no I line for the keyword
     """
+    keywords = list(keywords)
+    low_scans, high_scans = [], []
+    values = {keyword: [] for keyword in keywords}
 
     with open(file_path) as file:
-        s_line, z_line, i_lines, peak_lines = None, None, [], []
         for line in file:
-            ms2_line = parse_ms2_line(line)
-            if isinstance(ms2_line, HLine):
-                continue
-            elif isinstance(ms2_line, SLine):
-                if s_line is not None:
-                    yield Ms2SpectraFast(s_line=s_line,
-                                     z_line=z_line,
-                                     i_lines=i_lines,
-                                     peak_lines=peak_lines
-                                     )
-
-                    s_line, z_line, i_lines, peak_lines = None, None, [], []
-                s_line = ms2_line
-            elif isinstance(ms2_line, ILine):
-                i_lines.append(ms2_line)
-            elif isinstance(ms2_line, ZLine):
-                z_line = ms2_line
-            elif isinstance(ms2_line, PeakLine):
-                #peak_lines.append(ms2_line)
-                pass
-
-        yield Ms2SpectraFast(s_line=s_line,
-                          z_line=z_line,
-                          i_lines=i_lines,
-                          peak_lines=peak_lines
-                          )
+            letter = line[:1]
+            if letter == 'S':
+                line_elements = line.split("\t")
+                low_scans.append(line_elements[1])
+                high_scans.append(line_elements[2])
+                for keyword in keywords:
+                    values[keyword].append('nan')
+            elif letter == 'I':
+                line_elements = line.rstrip().split("\t")
+                if len(line_elements) == 3 and line_elements[1] in values:
+                    values[line_elements[1]][-1] = line_elements[2]
 
-    return
+    index = {'low_scan': np.array(low_scans, dtype=np.int32), 'high_scan': np.array(high_scans, dtype=np.int32)}
+    for keyword in keywords:
+        index[keyword] = np.array(values[keyword], dtype=np.float64)
+    return index
 
 
 def write_file(h_lines: List[HLine], ms2_spectras: List[Ms2SpectraFast], out_file_path: str) -> None:
@@ -1,4 +1,3 @@
-import ast
 from dataclasses import dataclass
 from typing import List, Dict, Union, ClassVar
 import numpy as np
@@ -7,6 +6,8 @@ from . import exceptions as ms2_exceptions
 from .columns import PeakLineColumns, ZLineColumns, ILineColumns, SLineColumns
 from ..util import Line, HLine
 
+_NEWLINE, _SPACE = ord('\n'), ord(' ')
+
 
 @dataclass
 class PeakLine(Line):
@@ -144,6 +145,7 @@ class ILine(Line):
     CCS_SPECTRA_KEYWORD: ClassVar[str] = 'CCS_Spectra'
     INTENSITY_SPECTRA_KEYWORD: ClassVar[str] = 'Intensity_Spectra'
     MZ_SPECTRA_KEYWORD: ClassVar[str] = 'MZ_Spectra'
+    MOBILITY_SPECTRA_INDEX_KEYWORD: ClassVar[str] = 'Mobility_Spectra_Index'  # index into a mobility spectra store
 
     __slots__ = 'keyword', 'value'
 
@@ -247,6 +249,63 @@ class SLine(Line):
         return f"{self.mz:.{SLine.MZ_PRECISION}f}"
 
 
+def parse_float_list(val: str) -> np.ndarray:
+    """
+    Parses a list string of numbers, ex: '[1.2, 3.4]', into a float64 array without evaluating it as python
+    """
+    val = val.strip()
+    if val[:1] == '[' and val[-1:] == ']':
+        val = val[1:-1]
+    if not val.strip():
+        return np.empty(0, dtype=np.float64)
+    return np.array(val.split(','), dtype=np.float64)
+
+
+class ILineAttributes:
+    """
+    I line values of one spectrum, keyword -> raw str. Typed values are converted on first access and cached, numeric
+    lists are returned as read-only float64 arrays (shared between calls). Lists which are not in the I lines are
+    looked up in mobility_store (a MobilitySpectraStore, float32) when the spectrum has a mobility spectra index.
+    """
+
+    __slots__ = '_values', '_cache', '_mobility_store'
+
+    def __init__(self, values: Dict[str, str], mobility_store=None):
+        self._values = values
+        self._cache = {}
+        self._mobility_store = mobility_store
+
+    def get_str(self, keyword: str) -> Union[str, None]:
+        return self._values.get(keyword)
+
+    def get_float(self, keyword: str) -> Union[float, None]:
+        if keyword not in self._cache:
+            val = self._values.get(keyword)
+            self._cache[keyword] = float(val) if val else None
+        return self._cache[keyword]
+
+    def get_array(self, keyword: str) -> Union[np.ndarray, None]:
+        if keyword not in self._cache:
+            val = self._values.get(keyword)
+            array = None
+            if val:
+                array = parse_float_list(val)
+                array.flags.writeable = False
+            elif self._mobility_store is not None and ILine.MOBILITY_SPECTRA_INDEX_KEYWORD in self._values:
+                array = self._mobility_store.get_array(int(self._values[ILine.MOBILITY_SPECTRA_INDEX_KEYWORD]), keyword)
+            self._cache[keyword] = array
+        return self._cache[keyword]
+
+    def to_dict(self) -> Dict[str, str]:
+        return dict(self._values)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+
 @dataclass
 class Ms2Spectra:
     """
@@ -262,9 +321,11 @@ class Ms2Spectra:
     z_line: ZLine
     peak_lines: List[PeakLine]
 
-    i_line_dict = None
+    __slots__ = 's_line', 'i_lines', 'z_line', 'peak_lines', '_attributes', '_mobility_store'
 
-    __slots__ = 's_line', 'i_lines', 'z_line', 'peak_lines'
+    def __post_init__(self):
+        self._attributes = None
+        self._mobility_store = None
 
     def get_precursor_mass(self):
         return self.z_line.mass
@@ -282,15 +343,28 @@ class Ms2Spectra:
         return [peak_line.intensity for peak_line in self.peak_lines]
 
     def get_i_line_dict(self):
-        if self.i_line_dict:
-            return self.i_line_dict
         return {i_line.keyword: i_line.val for i_line in self.i_lines}
 
+    def get_attributes(self) -> ILineAttributes:
+        """
+        I line values decoded once per spectrum, call reset_attributes() after modifying i_lines
+        """
+        if self._attributes is None:
+            self._attributes = ILineAttributes(self.get_i_line_dict(), self._mobility_store)
+        return self._attributes
+
+    def reset_attributes(self) -> None:
+        self._attributes = None
+
+    def set_mobility_store(self, mobility_store) -> None:
+        """
+        Resolves mobility spectra I line references from mobility_store (a MobilitySpectraStore)
+        """
+        self._mobility_store = mobility_store
+        self._attributes = None
+
     def get_i_line_value(self, keyword) -> Union[str, None]:
-        i_line_dict = self.get_i_line_dict()
-        if keyword in i_line_dict:
-            return i_line_dict[keyword]
-        return None
+        return self.get_attributes().get_str(keyword)
 
     def get_parent_id(self, keyword=None) -> Union[str, None]:
         if keyword is None:
@@ -310,64 +384,55 @@ class Ms2Spectra:
         if keyword is None:
             keyword = ILine.RETENTION_TIME_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return float(val) if val else val
+        return self.get_attributes().get_float(keyword)
 
     def get_collision_energy(self, keyword=None) -> Union[float, None]:
         if keyword is None:
             keyword = ILine.COLLISION_ENERGY_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return float(val) if val else val
+        return self.get_attributes().get_float(keyword)
 
     def get_ook0(self, keyword=None) -> Union[float, None]:
         if keyword is None:
             keyword = ILine.OOK0_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return float(val) if val else val
+        return self.get_attributes().get_float(keyword)
 
     def get_ccs(self, keyword=None) -> Union[float, None]:
         if keyword is None:
             keyword = ILine.CCS_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return float(val) if val else val
+        return self.get_attributes().get_float(keyword)
 
     def get_precursor_intensity(self, keyword=None) -> Union[float, None]:
         if keyword is None:
             keyword = ILine.PRECURSOR_INTENSITY_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return float(val) if val else val
+        return self.get_attributes().get_float(keyword)
 
-    def get_ook0_spectra(self, keyword=None) -> Union[List[float], None]:
+    def get_ook0_spectra(self, keyword=None) -> Union[np.ndarray, None]:
         if keyword is None:
             keyword = ILine.OOK0_SPECTRA_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return [float(i) for i in ast.literal_eval(val)] if val else val
+        return self.get_attributes().get_array(keyword)
 
-    def get_ccs_spectra(self, keyword=None) -> Union[List[float], None]:
+    def get_ccs_spectra(self, keyword=None) -> Union[np.ndarray, None]:
         if keyword is None:
             keyword = ILine.CCS_SPECTRA_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return [float(i) for i in ast.literal_eval(val)] if val else val
+        return self.get_attributes().get_array(keyword)
 
-    def get_mobility_intensity_spectra(self, keyword=None) -> Union[List[float], None]:
+    def get_mobility_intensity_spectra(self, keyword=None) -> Union[np.ndarray, None]:
         if keyword is None:
             keyword = ILine.INTENSITY_SPECTRA_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return [float(i) for i in ast.literal_eval(val)] if val else val
+        return self.get_attributes().get_array(keyword)
 
-    def get_mobility_mz_spectra(self, keyword=None) -> Union[List[float], None]:
+    def get_mobility_mz_spectra(self, keyword=None) -> Union[np.ndarray, None]:
         if keyword is None:
             keyword = ILine.MZ_SPECTRA_KEYWORD
 
-        val = self.get_i_line_value(keyword)  # none/str
-        return [float(i) for i in ast.literal_eval(val)] if val else val
+        return self.get_attributes().get_array(keyword)
 
     def serialize(self) -> str:
         lines = [self.s_line] + self.i_lines + [self.z_line] + self.peak_lines
@@ -384,6 +449,151 @@ class Ms2Spectra:
         return precursor_spectra
 
 
+def _get_line_token_counts(peak_block: str) -> (np.ndarray, np.ndarray):
+    """
+    Returns the byte offset of every line of the block and its number of whitespace separated tokens, counted by numpy
+    on the block bytes. A trailing newline does not start another line.
+    """
+    data = np.frombuffer(peak_block.encode(), dtype=np.uint8)
+    is_space = data <= _SPACE
+    token_starts = np.flatnonzero(~is_space & np.concatenate(([True], is_space[:-1])))
+    newlines = np.flatnonzero(data == _NEWLINE)
+    n_lines = len(newlines) + (1 if len(data) and data[-1] != _NEWLINE else 0)
+    line_starts = np.concatenate(([0], newlines + 1))[:n_lines]
+    return line_starts, np.bincount(np.searchsorted(newlines, token_starts), minlength=n_lines)[:n_lines]
+
+
+def _raise_bad_peak_line(peak_block: str, line_starts: np.ndarray, line_index: int) -> None:
+    data = peak_block.encode()
+    end = line_starts[line_index + 1] if line_index + 1 < len(line_starts) else len(data)
+    raise ms2_exceptions.Ms2FileDeserializationPeakLineException(_line=data[line_starts[line_index]:end].decode())
+
+
+def decode_peak_block(peak_block: str, n_lines: int = None) -> (np.ndarray, np.ndarray):
+    """
+    Returns the mz (float64) and intensity (float32) arrays of a block of '[mz] [intensity]' peak lines, the whole
+    block is parsed in one call
+    :param:     peak_block:     peak lines, blank lines are skipped
+    :param:     n_lines:        when given the block must be exactly n_lines peak lines, blank lines included
+    :return:    (np.ndarray, np.ndarray):   mz, intensity
+    """
+    line_starts, token_counts = _get_line_token_counts(peak_block)
+    if n_lines is None:
+        bad_lines = np.flatnonzero((token_counts != len(PeakLineColumns)) & (token_counts != 0))
+    else:
+        bad_lines = np.flatnonzero(token_counts != len(PeakLineColumns))
+    if len(bad_lines):
+        _raise_bad_peak_line(peak_block, line_starts, bad_lines[0])
+    if n_lines is not None and len(token_counts) != n_lines:
+        raise ms2_exceptions.Ms2FileDeserializationPeakLineException(_line=peak_block)
+
+    values = np.array(peak_block.split(), dtype=np.float64).reshape(-1, len(PeakLineColumns))
+    return values[:, PeakLineColumns.mz.value], values[:, PeakLineColumns.intensity.value].astype(np.float32)
+
+
+def decode_peak_lines(peak_lines: List[str]) -> (np.ndarray, np.ndarray):
+    """
+    Returns the mz (float64) and intensity (float32) arrays of '[mz] [intensity]' peak lines, every line must hold
+    exactly one peak
+    """
+    return decode_peak_block(''.join(peak_lines), n_lines=len(peak_lines))
+
+
+def encode_peak_block(mz_array: np.ndarray, intensity_array: np.ndarray, mz_precision: int = PeakLine.MZ_PRECISION,
+                      intensity_precision: int = PeakLine.INTENSITY_PRECISION) -> str:
+    """
+    Returns the peak lines of the arrays as one block, in the PeakLine format, with one %-format call for the whole
+    block
+    """
+    if len(mz_array) != len(intensity_array):
+        raise ValueError(f"mz and intensity lengths differ: {len(mz_array)} != {len(intensity_array)}")
+    values = np.empty((len(mz_array), len(PeakLineColumns)), dtype=np.float64)
+    values[:, PeakLineColumns.mz.value] = mz_array
+    values[:, PeakLineColumns.intensity.value] = intensity_array
+
+    line_elements = [""] * len(PeakLineColumns)
+    line_elements[PeakLineColumns.mz.value] = f"%.{mz_precision}f"
+    line_elements[PeakLineColumns.intensity.value] = f"%.{intensity_precision}f"
+    return (' '.join(line_elements) + '\n') * len(values) % tuple(values.ravel().tolist())
+
+
+@dataclass
+class Ms2SpectraArrays(Ms2Spectra):
+    """
+    Ms2Spectra with the peaks decoded into arrays instead of PeakLines, peak_lines is empty
+    """
+
+    mz_array: np.ndarray
+    intensity_array: np.ndarray
+
+    def get_mz_spectra(self) -> np.ndarray:
+        return self.mz_array
+
+    def get_intensity_spectra(self) -> np.ndarray:
+        return self.intensity_array
+
+    def serialize(self) -> str:
+        lines = [self.s_line] + self.i_lines + [self.z_line]
+        return ''.join([line.serialize() for line in lines]) + encode_peak_block(self.mz_array, self.intensity_array)
+
+
+@dataclass
+class Ms2SpectraLazy(Ms2Spectra):
+    """
+    Ms2Spectra keeping its peak lines as the raw text block they were read from, peak_lines is empty. The block is
+    decoded into arrays by the first get_mz_spectra / get_intensity_spectra call and the arrays are cached. serialize
+    writes the block back unchanged until set_peaks replaces the peaks.
+
+    The cached arrays are read only, use set_peaks to change peaks.
+    """
+
+    peak_block: Union[str, None]
+
+    __slots__ = 'peak_block', '_mz_array', '_intensity_array'
+
+    def __post_init__(self):
+        super().__post_init__()
+        self._mz_array = None
+        self._intensity_array = None
+
+    def _decode(self) -> None:
+        mz_array, intensity_array = decode_peak_block(self.peak_block)
+        mz_array.flags.writeable = False
+        intensity_array.flags.writeable = False
+        self._mz_array, self._intensity_array = mz_array, intensity_array
+
+    def is_decoded(self) -> bool:
+        return self._mz_array is not None
+
+    def get_mz_spectra(self) -> np.ndarray:
+        if self._mz_array is None:
+            self._decode()
+        return self._mz_array
+
+    def get_intensity_spectra(self) -> np.ndarray:
+        if self._intensity_array is None:
+            self._decode()
+        return self._intensity_array
+
+    def set_peaks(self, mz_array: np.ndarray, intensity_array: np.ndarray) -> None:
+        """
+        Replaces the peaks, serialize formats them from now on
+        """
+        if len(mz_array) != len(intensity_array):
+            raise ValueError(f"{len(mz_array)} m/z values for {len(intensity_array)} intensities")
+        self._mz_array = np.array(mz_array, dtype=np.float64)
+        self._intensity_array = np.array(intensity_array, dtype=np.float32)
+        self._mz_array.flags.writeable = False
+        self._intensity_array.flags.writeable = False
+        self.peak_block = None
+
+    def serialize(self) -> str:
+        lines = [self.s_line] + self.i_lines + [self.z_line]
+        peak_block = self.peak_block if self.peak_block is not None else \
+            encode_peak_block(self._mz_array, self._intensity_array)
+        return ''.join([line.serialize() for line in lines]) + peak_block
+
+
 def parse_ms2_line(line: str) -> Union[HLine, SLine, ILine, ZLine, PeakLine]:
     """
     Returns the appropriate Ms2 Line object or throws error
@@ -0,0 +1,120 @@
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .lines import ILine
+from .scan_map import MISSING, ScanPrecursorMap, get_scan_map_path, lookup_sorted
+
+_WRITE_BUFFER_SIZE = 1_000_000
+
+
+def read_peak_block_index(ms2_path: str, precursor_id_keyword: str = ILine.PRECURSOR_ID_KEYWORD) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the byte range of the peak lines of each spectrum in an ms2 file, keyed by precursor id. Only S and I lines
+    are tokenised, peak lines are counted by length. Spectra without a precursor id are skipped.
+    :param:     ms2_path:               path to the peak bearing ms2 file
+    :param:     precursor_id_keyword:   I line keyword for precursor id
+    :return:    (precursor_ids, starts, ends):  int64 arrays sorted by precursor id, the last spectrum wins when a
+                                                precursor id is repeated
+    """
+    precursor_id_prefix = f"I\t{precursor_id_keyword}\t".encode()
+    precursor_ids, starts, ends = [], [], []
+    precursor_id, start = None, None
+
+    def add_block(end):
+        if precursor_id is not None:
+            precursor_ids.append(precursor_id)
+            starts.append(end if start is None else start)
+            ends.append(end)
+
+    offset = 0
+    with open(ms2_path, 'rb') as file:
+        for line in file:
+            letter = line[:1]
+            if letter == b'S':
+                add_block(offset)
+                precursor_id, start = None, None
+            elif letter == b'I':
+                if line.startswith(precursor_id_prefix):
+                    precursor_id = int(line[len(precursor_id_prefix):])
+            elif letter not in (b'Z', b'H', b'D', b'\n', b'\r', b'') and start is None:
+                start = offset
+            offset += len(line)
+        add_block(offset)
+
+    # reversed so np.unique keeps the last spectrum of repeated precursor ids
+    precursor_ids = np.array(precursor_ids[::-1], dtype=np.int64)
+    precursor_ids, first = np.unique(precursor_ids, return_index=True)
+    return precursor_ids, np.array(starts[::-1], dtype=np.int64)[first], np.array(ends[::-1], dtype=np.int64)[first]
+
+
+def _rename_i_line(line: bytes, keyword_map: Dict[bytes, bytes]) -> bytes:
+    line_elements = line.split(b'\t', 2)
+    if len(line_elements) == 3 and line_elements[1] in keyword_map:
+        line_elements[1] = keyword_map[line_elements[1]]
+        return b'\t'.join(line_elements)
+    return line
+
+
+def merge_index_peaks(index_path: str, ms2_path: str, out_path: str, keyword_map: Dict[str, str] = None,
+                      precursor_id_keyword: str = ILine.PRECURSOR_ID_KEYWORD) -> ScanPrecursorMap:
+    """
+    Writes the spectra of an ms2.index file with the peak lines of the spectrum with the same precursor id in the full
+    ms2 file. The index file is streamed and the peak lines are copied from the ms2 file as raw byte ranges, so memory
+    only grows with the number of spectra. Peak lines of the index file are dropped (as fast_parser.read_file does)
+    and spectra without a match in the ms2 file are written without peaks. out_path is written through a temp file and
+    renamed once complete, so out_path may be ms2_path.
+    :param:     index_path:             path to the ms2.index file (headers, S, I and Z lines)
+    :param:     ms2_path:               path to the peak bearing ms2 file
+    :param:     out_path:               path of the merged ms2 file
+    :param:     keyword_map:            I line keywords to rename, ex: {'OOK0': ILine.OOK0_KEYWORD}
+    :param:     precursor_id_keyword:   I line keyword for precursor id, in both files
+    :return:    ScanPrecursorMap:       scan/precursor id map of the merged file
+    """
+    block_precursor_ids, block_starts, block_ends = read_peak_block_index(ms2_path, precursor_id_keyword)
+    keyword_map = {key.encode(): val.encode() for key, val in (keyword_map or {}).items()}
+    precursor_id_prefix = f"I\t{precursor_id_keyword}\t".encode()
+
+    scans, precursor_ids = [], []
+    tmp_path = out_path + '.tmp'
+    with open(index_path, 'rb') as index_file, open(ms2_path, 'rb') as ms2_file, \
+            open(tmp_path, 'wb', buffering=_WRITE_BUFFER_SIZE) as out_file:
+
+        def write_peaks():
+            if not scans or precursor_ids[-1] == MISSING:
+                return
+            position = lookup_sorted(block_precursor_ids, precursor_ids[-1:])[0]
+            if position == MISSING:
+                return
+            ms2_file.seek(block_starts[position])
+            peaks = ms2_file.read(block_ends[position] - block_starts[position])
+            out_file.write(peaks)
+            if peaks and not peaks.endswith(b'\n'):
+                out_file.write(b'\n')
+
+        for line in index_file:
+            letter = line[:1]
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            if letter == b'S':
+                write_peaks()
+                scans.append(int(line.split(b'\t', 2)[1]))
+                precursor_ids.append(MISSING)
+                out_file.write(line)
+            elif letter == b'I':
+                if line.startswith(precursor_id_prefix):
+                    precursor_ids[-1] = int(line[len(precursor_id_prefix):])
+                out_file.write(_rename_i_line(line, keyword_map))
+            elif letter in (b'H', b'Z', b'D'):
+                out_file.write(line)
+        write_peaks()
+
+    os.replace(tmp_path, out_path)
+
+    scans, precursor_ids = np.array(scans, dtype=np.int64), np.array(precursor_ids, dtype=np.int64)
+    has_precursor_id = precursor_ids != MISSING
+    scan_map = ScanPrecursorMap(scans[has_precursor_id], precursor_ids[has_precursor_id])
+    scan_map.save(get_scan_map_path(out_path))
+    return scan_map
@@ -0,0 +1,135 @@
+import os
+from typing import Dict, List, Union
+
+import numpy as np
+
+from .lines import ILine
+
+MOBILITY_STORE_EXTENSION = '.mobility'
+
+# binary layout:
+#   header: magic, version (uint32), keywords length (uint32), keywords (utf-8, tab separated)
+#   data:   float32 blocks, spectrum i holds n_points values per keyword at [offsets[i] * n_keywords, ...)
+#   footer: offsets (int64[n_spectra + 1], in points), n_spectra (uint64), magic
+MOBILITY_STORE_MAGIC = b'SMOB'
+MOBILITY_STORE_VERSION = 1
+_UINT32_DTYPE = np.dtype('<u4')
+_UINT64_DTYPE = np.dtype('<u8')
+_OFFSET_DTYPE = np.dtype('<i8')
+_VALUE_DTYPE = np.dtype('<f4')
+
+MOBILITY_SPECTRA_KEYWORDS = [ILine.OOK0_SPECTRA_KEYWORD, ILine.CCS_SPECTRA_KEYWORD, ILine.MZ_SPECTRA_KEYWORD,
+                             ILine.INTENSITY_SPECTRA_KEYWORD]
+
+
+def get_mobility_store_path(ms2_path: str) -> str:
+    return ms2_path + MOBILITY_STORE_EXTENSION
+
+
+class MobilitySpectraWriter:
+    """
+    Streams mobility spectra to a binary side store, add() returns the index written to the ms2 I line
+    (ILine.MOBILITY_SPECTRA_INDEX_KEYWORD). The store is written to a temp file and renamed by close().
+
+    with MobilitySpectraWriter(get_mobility_store_path(ms2_path)) as writer:
+        index = writer.add({ILine.OOK0_SPECTRA_KEYWORD: ook0_spectra, ...})
+    """
+
+    def __init__(self, path: str, keywords: List[str] = None):
+        self.path = path
+        self.keywords = list(keywords) if keywords is not None else list(MOBILITY_SPECTRA_KEYWORDS)
+        self._tmp_path = path + '.tmp'
+        self._offsets = [0]
+        self._file = open(self._tmp_path, 'wb', buffering=1_000_000)
+
+        keywords_bytes = '\t'.join(self.keywords).encode()
+        self._file.write(MOBILITY_STORE_MAGIC)
+        self._file.write(np.array([MOBILITY_STORE_VERSION, len(keywords_bytes)], dtype=_UINT32_DTYPE).tobytes())
+        self._file.write(keywords_bytes)
+
+    def add(self, spectra: Dict[str, np.ndarray]) -> int:
+        """
+        Writes the mobility spectra of one precursor, every keyword must have the same number of points
+        :param:     spectra:    {keyword: values}
+        :return:    int:        index of the spectra in the store
+        """
+        n_points = len(spectra[self.keywords[0]])
+        for keyword in self.keywords:
+            values = np.asarray(spectra[keyword], dtype=_VALUE_DTYPE)
+            if len(values) != n_points:
+                raise ValueError(f"{keyword} has {len(values)} points, expected {n_points}")
+            self._file.write(values.tobytes())
+        self._offsets.append(self._offsets[-1] + n_points)
+        return len(self._offsets) - 2
+
+    def close(self) -> None:
+        self._file.write(np.array(self._offsets, dtype=_OFFSET_DTYPE).tobytes())
+        self._file.write(np.array([len(self._offsets) - 1], dtype=_UINT64_DTYPE).tobytes())
+        self._file.write(MOBILITY_STORE_MAGIC)
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+class MobilitySpectraStore:
+    """
+    Read only, memory mapped mobility spectra side store. Arrays returned by get_array are float32 views of the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as file:
+            if file.read(len(MOBILITY_STORE_MAGIC)) != MOBILITY_STORE_MAGIC:
+                raise ValueError(f"not a mobility spectra store: {path}")
+            version, keywords_length = np.fromfile(file, dtype=_UINT32_DTYPE, count=2)
+            if version != MOBILITY_STORE_VERSION:
+                raise ValueError(f"unsupported mobility spectra store version: {version}, path: {path}")
+            self.keywords = file.read(int(keywords_length)).decode().split('\t')
+            data_start = file.tell()
+
+            footer_size = _UINT64_DTYPE.itemsize + len(MOBILITY_STORE_MAGIC)
+            file.seek(file_size - footer_size)
+            n_spectra = int(np.fromfile(file, dtype=_UINT64_DTYPE, count=1)[0])
+            if file.read(len(MOBILITY_STORE_MAGIC)) != MOBILITY_STORE_MAGIC:
+                raise ValueError(f"truncated mobility spectra store: {path}")
+            offsets_start = file_size - footer_size - (n_spectra + 1) * _OFFSET_DTYPE.itemsize
+            file.seek(offsets_start)
+            self.offsets = np.fromfile(file, dtype=_OFFSET_DTYPE, count=n_spectra + 1)
+
+        self._keyword_index = {keyword: i for i, keyword in enumerate(self.keywords)}
+        n_values = int(self.offsets[-1]) * len(self.keywords)
+        # plain ndarray view of the memmap, slicing a np.memmap subclass is several times slower
+        self._data = np.asarray(np.memmap(path, dtype=_VALUE_DTYPE, mode='r', offset=data_start, shape=(n_values,))) \
+            if n_values else np.empty(0, dtype=_VALUE_DTYPE)
+
+    def get_array(self, index: int, keyword: str) -> Union[np.ndarray, None]:
+        """
+        Returns the values of keyword for the spectra at index, None if the keyword is not stored
+        """
+        if keyword not in self._keyword_index:
+            return None
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        n_points = end - start
+        block_start = start * len(self.keywords) + self._keyword_index[keyword] * n_points
+        return self._data[block_start:block_start + n_points]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def open_mobility_store(ms2_path: str) -> Union[MobilitySpectraStore, None]:
+    """
+    Returns the side store of ms2_path if it exists
+    """
+    path = get_mobility_store_path(ms2_path)
+    return MobilitySpectraStore(path) if os.path.exists(path) else None
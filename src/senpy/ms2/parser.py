@@ -1,6 +1,7 @@
-from typing import List
+from typing import Iterator, List
 
 from .lines import SLine, HLine, ZLine, PeakLine, ILine, Ms2Spectra, parse_ms2_line
+from . import reader
 
 
 def return_lines(file):
@@ -26,7 +27,8 @@ def filter_ms2_lines(lines):
             yield spectra_lines
             spectra_lines = []
         spectra_lines.append(line)
-    return spectra_lines
+    if len(spectra_lines) > 0:
+        yield spectra_lines
 
 
 def filter_ms2_lines_from_file(file):
@@ -44,7 +46,8 @@ def filter_ms2_lines_from_file(file):
                 yield spectra_lines
                 spectra_lines = []
             spectra_lines.append(line)
-    return spectra_lines
+    if len(spectra_lines) > 0:
+        yield spectra_lines
 
 
 def convert_lines_to_ms2_spectra(spectra_lines):
@@ -93,80 +96,17 @@ def read_file(file_path) -> (List[HLine], List[Ms2Spectra]):
     :param:     file_path:          str to the path for the sqt file
     :return:    (List[HLine], List[Ms2Spectra]):          lists of HLines and Ms2Spectra
     """
-    h_lines, ms2_spectras = [], []
+    return reader.read_file(file_path, materialize=reader.OBJECTS)
 
-    with open(file_path) as file:
-        s_line, z_line, i_lines, peak_lines = None, None, [], []
-        for i, line in enumerate(file):
-            if line == "" or line == "\n":
-                continue
-            ms2_line = parse_ms2_line(line)
-            if isinstance(ms2_line, HLine):
-                h_lines.append(ms2_line)
-                continue
-            elif isinstance(ms2_line, SLine):
-                if s_line is not None:
-                    ms2_spectras.append(Ms2Spectra(s_line=s_line,
-                                                   z_line=z_line,
-                                                   i_lines=i_lines,
-                                                   peak_lines=peak_lines
-                                                   )
-                                        )
-                    s_line, z_line, i_lines, peak_lines = None, None, [], []
-                s_line = ms2_line
-            elif isinstance(ms2_line, ILine):
-                i_lines.append(ms2_line)
-            elif isinstance(ms2_line, ZLine):
-                z_line = ms2_line
-            elif isinstance(ms2_line, PeakLine):
-                peak_lines.append(ms2_line)
-
-        ms2_spectras.append(Ms2Spectra(s_line=s_line,
-                                       z_line=z_line,
-                                       i_lines=i_lines,
-                                       peak_lines=peak_lines
-                                       )
-                            )
-
-    return h_lines, ms2_spectras
-
-
-def read_file_incrementally(file_path) -> List[Ms2Spectra]:
+
+def read_file_incrementally(file_path) -> Iterator[Ms2Spectra]:
     """
     Return Ms2Spectra incrementally, from provided ms2 file. Will always
     return correctly and fully read ms2 file until eof or corrupted line is reached.
     :param:     file_path:          str to the path for the sqt file
-    :return:    List[Ms2Spectra]:          lists of SLines
+    :return:    Iterator[Ms2Spectra]:          Ms2Spectra
     """
-
-    with open(file_path) as file:
-        s_line, z_line, i_lines, peak_lines = None, None, [], []
-        for line in file:
-            ms2_line = parse_ms2_line(line)
-            if isinstance(ms2_line, HLine):
-                continue
-            elif isinstance(ms2_line, SLine):
-                if s_line is not None:
-                    yield Ms2Spectra(s_line=s_line,
-                                     z_line=z_line,
-                                     i_lines=i_lines,
-                                     peak_lines=peak_lines
-                                     )
-
-                    s_line, z_line, i_lines, peak_lines = None, None, [], []
-                s_line = ms2_line
-            elif isinstance(ms2_line, ILine):
-                i_lines.append(ms2_line)
-            elif isinstance(ms2_line, ZLine):
-                z_line = ms2_line
-            elif isinstance(ms2_line, PeakLine):
-                peak_lines.append(ms2_line)
-
-    return Ms2Spectra(s_line=s_line,
-                      z_line=z_line,
-                      i_lines=i_lines,
-                      peak_lines=peak_lines
-                      )
+    return reader.read_file_incrementally(file_path, materialize=reader.OBJECTS)
 
 
 def write_file(h_lines: List[HLine], ms2_spectras: List[Ms2Spectra], out_file_path: str) -> None:
@@ -0,0 +1,54 @@
+from typing import Dict, Iterable, List, Union
+
+from ..patch import encode_field, rewrite_lines
+
+FieldValue = Union[str, bytes, None]
+
+
+def patch_i_line_values(in_path: str, out_path: str, values: Dict[str, Iterable[FieldValue]]) -> None:
+    """
+    Sets the value of I lines with one value per spectrum, in file order. Only S and I (and Z) lines are tokenised,
+    everything else, including peak lines, is copied byte for byte. An existing I line has its value column replaced,
+    spectra without the keyword get a new I line after their last I line. A None value leaves the spectrum unchanged.
+    :param:     in_path:    path to the ms2 file
+    :param:     out_path:   path of the patched ms2 file, may be in_path
+    :param:     values:     {I line keyword: values}, ex: {ILine.RETENTION_TIME_KEYWORD: ['10.1234', ...]}
+    """
+    iterators = {keyword.encode(): iter(keyword_values) for keyword, keyword_values in values.items()}
+    missing = object()
+    pending: Dict[bytes, bytes] = {}  # values of the current spectrum which are not written yet
+    ending = [b'\n']
+
+    def flush_pending() -> List[bytes]:
+        lines = [b'I\t' + keyword + b'\t' + val + ending[0] for keyword, val in pending.items()]
+        pending.clear()
+        return lines
+
+    def patch_line(line: bytes) -> List[bytes]:
+        letter = line[:1]
+        if letter == b'S':
+            lines = flush_pending() + [line]
+            ending[0] = line[len(line.rstrip(b'\r\n')):] or b'\n'
+            for keyword, iterator in iterators.items():
+                val = next(iterator, missing)
+                if val is missing:
+                    raise ValueError(f"fewer values than spectra for {keyword.decode()}: {in_path}")
+                if val is not None:
+                    pending[keyword] = encode_field(val)
+            return lines
+        elif letter == b'I':
+            line_elements = line.split(b'\t', 2)
+            if len(line_elements) == 3 and line_elements[1] in pending:
+                body = line_elements[2].rstrip(b'\r\n')
+                return [b'\t'.join(line_elements[:2] + [pending.pop(line_elements[1]) + line_elements[2][len(body):]])]
+            return [line]
+        else:  # Z line, the I lines of the spectrum are done
+            return flush_pending() + [line]
+
+    def finish() -> List[bytes]:
+        for keyword, iterator in iterators.items():
+            if next(iterator, missing) is not missing:
+                raise ValueError(f"more values than spectra for {keyword.decode()}: {in_path}")
+        return flush_pending()
+
+    rewrite_lines(in_path, out_path, ['S', 'I', 'Z'], patch_line, finish)
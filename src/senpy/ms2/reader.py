@@ -0,0 +1,215 @@
+import mmap
+import os
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+
+from . import exceptions as ms2_exceptions
+from . import fast_lines
+from .lines import HLine, ILine, Ms2Spectra, Ms2SpectraArrays, Ms2SpectraLazy, PeakLine, SLine, ZLine, \
+    decode_peak_lines
+from .mobility_store import open_mobility_store
+
+# materialize levels, see testing/ms2_reader.py for their cost
+RAW = 'raw'  # Ms2SpectraFast, every line kept as its raw string (fast_lines), peaks included
+HEADER = 'header'  # Ms2SpectraFast without peak lines, peak blocks are skipped at the byte level
+LAZY = 'lazy'  # Ms2SpectraLazy, typed S/I/Z lines and the raw peak block, decoded into arrays on first access
+ARRAYS = 'arrays'  # Ms2SpectraArrays, typed S/I/Z lines and numpy peak arrays
+OBJECTS = 'objects'  # Ms2Spectra, typed S/I/Z lines and one PeakLine per peak
+MATERIALIZE_LEVELS = (RAW, HEADER, LAZY, ARRAYS, OBJECTS)
+
+# levels read by scan_headers instead of tokenize
+_SCANNED_LEVELS = (HEADER, LAZY)
+
+SpectrumLines = Tuple[str, List[str], Union[str, None], Union[List[str], str]]
+
+
+def tokenize(lines: Iterator[str], h_lines: List[str] = None, skip_peaks: bool = False) -> Iterator[SpectrumLines]:
+    """
+    Groups the lines of an ms2 file into spectra by their first character, nothing is parsed. This is the only
+    tokenizer behind every materialize level.
+    :param:     lines:          lines of an ms2 file
+    :param:     h_lines:        H lines are appended to this list when given, otherwise dropped
+    :param:     skip_peaks:     drop peak lines instead of collecting them
+    :return:    Iterator[SpectrumLines]:    (S line, I lines, Z line or None, peak lines) of each spectrum
+    """
+    s_line, i_lines, z_line, peak_lines = None, [], None, []
+    for line in lines:
+        letter = line[:1]
+        if letter.isdigit():
+            if not skip_peaks:
+                peak_lines.append(line)
+        elif letter == 'S':
+            if s_line is not None:
+                yield s_line, i_lines, z_line, peak_lines
+            s_line, i_lines, z_line, peak_lines = line, [], None, []
+        elif letter == 'I':
+            i_lines.append(line)
+        elif letter == 'Z':
+            z_line = line
+        elif letter == 'H':
+            if h_lines is not None:
+                h_lines.append(line)
+        elif letter in ('', '\n', '\r'):
+            continue
+        else:
+            raise ms2_exceptions.Ms2FileDeserializationUnsupportedLineException(_line=line)
+
+    if s_line is not None:
+        yield s_line, i_lines, z_line, peak_lines
+
+
+def scan_headers(file_path: str, h_lines: List[str] = None, peak_blocks: bool = False) -> Iterator[SpectrumLines]:
+    """
+    Yields the S, I and Z lines of each spectrum without reading peak lines. The file is memory mapped, the header
+    lines after each S line are read and the peak block is jumped over with one bytes.find for the next S line, so
+    peak lines never become python objects.
+    :param:     file_path:      path to the ms2 file
+    :param:     h_lines:        H lines are appended to this list when given
+    :param:     peak_blocks:    yield the peak block as one string (newlines normalized to \\n) instead of []
+    :return:    Iterator[SpectrumLines]:    (S line, I lines, Z line or None, [] or peak block) of each spectrum
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+            start = 0 if data[:2] == b'S\t' else data.find(b'\nS\t') + 1
+            if start == 0 and data[:2] != b'S\t':
+                start = size
+            if h_lines is not None:
+                h_lines.extend(line + '\n' for line in data[:start].decode().splitlines() if line[:1] == 'H')
+
+            while start < size:
+                # header lines are the I and Z lines directly after the S line
+                end = start
+                while True:
+                    end = data.find(b'\n', end)
+                    end = size if end == -1 else end + 1
+                    if end >= size or data[end:end + 1] not in (b'I', b'Z'):
+                        break
+
+                lines = data[start:end].decode().splitlines()
+                i_lines, z_line = [], None
+                for line in lines[1:]:
+                    if line[:1] == 'I':
+                        i_lines.append(line + '\n')
+                    else:
+                        z_line = line + '\n'
+
+                next_start = data.find(b'\nS\t', end - 1)
+                next_start = size if next_start == -1 else next_start + 1
+                if peak_blocks:
+                    yield lines[0] + '\n', i_lines, z_line, _get_peak_block(data[end:next_start])
+                else:
+                    yield lines[0] + '\n', i_lines, z_line, []
+                start = next_start
+
+
+def _get_peak_block(block: bytes) -> str:
+    if b'\r' in block:
+        block = block.replace(b'\r\n', b'\n')
+    if block[-1:] not in (b'\n', b''):
+        block += b'\n'
+    return block.decode()
+
+
+def _build_raw(s_line: str, i_lines: List[str], z_line: str, peak_lines: List[str]) -> fast_lines.Ms2SpectraFast:
+    return fast_lines.Ms2SpectraFast(s_line=fast_lines.SLine(s_line),
+                                     i_lines=[fast_lines.ILine(line) for line in i_lines],
+                                     z_line=fast_lines.ZLine(z_line) if z_line is not None else None,
+                                     peak_lines=[fast_lines.PeakLine(line) for line in peak_lines])
+
+
+def _build_lazy(s_line: str, i_lines: List[str], z_line: str, peak_block: str) -> Ms2SpectraLazy:
+    return Ms2SpectraLazy(s_line=SLine.deserialize(s_line),
+                          i_lines=[ILine.deserialize(line) for line in i_lines],
+                          z_line=ZLine.deserialize(z_line) if z_line is not None else None,
+                          peak_lines=[],
+                          peak_block=peak_block)
+
+
+def _build_arrays(s_line: str, i_lines: List[str], z_line: str, peak_lines: List[str]) -> Ms2SpectraArrays:
+    mz_array, intensity_array = decode_peak_lines(peak_lines)
+    return Ms2SpectraArrays(s_line=SLine.deserialize(s_line),
+                            i_lines=[ILine.deserialize(line) for line in i_lines],
+                            z_line=ZLine.deserialize(z_line) if z_line is not None else None,
+                            peak_lines=[],
+                            mz_array=mz_array,
+                            intensity_array=intensity_array)
+
+
+def _build_objects(s_line: str, i_lines: List[str], z_line: str, peak_lines: List[str]) -> Ms2Spectra:
+    return Ms2Spectra(s_line=SLine.deserialize(s_line),
+                      i_lines=[ILine.deserialize(line) for line in i_lines],
+                      z_line=ZLine.deserialize(z_line) if z_line is not None else None,
+                      peak_lines=[PeakLine.deserialize(line) for line in peak_lines])
+
+
+_BUILDERS: Dict[str, Callable[[str, List[str], str, List[str]], Ms2Spectra]] = {
+    RAW: _build_raw,
+    HEADER: _build_raw,
+    LAZY: _build_lazy,
+    ARRAYS: _build_arrays,
+    OBJECTS: _build_objects,
+}
+
+
+def _check_materialize(materialize: str) -> None:
+    if materialize not in _BUILDERS:
+        raise ValueError(f"unknown materialize level: {materialize}, expected one of {MATERIALIZE_LEVELS}")
+
+
+def read_file_incrementally(file_path: str, materialize: str = OBJECTS) -> Iterator[Ms2Spectra]:
+    """
+    Yields the spectra of an ms2 file one at a time, H lines are skipped. The mobility spectra side store of the file
+    is attached when it exists.
+    :param:     file_path:      path to the ms2 file
+    :param:     materialize:    one of MATERIALIZE_LEVELS, pick the cheapest level which has what you need
+    :return:    Iterator[Ms2Spectra]:   spectra, the type depends on materialize
+    """
+    _check_materialize(materialize)
+    build = _BUILDERS[materialize]
+    mobility_store = open_mobility_store(file_path)
+
+    if materialize in _SCANNED_LEVELS:
+        for spectrum_lines in scan_headers(file_path, peak_blocks=materialize == LAZY):
+            ms2_spectra = build(*spectrum_lines)
+            if mobility_store is not None:
+                ms2_spectra.set_mobility_store(mobility_store)
+            yield ms2_spectra
+        return
+
+    with open(file_path) as file:
+        for spectrum_lines in tokenize(file):
+            ms2_spectra = build(*spectrum_lines)
+            if mobility_store is not None:
+                ms2_spectra.set_mobility_store(mobility_store)
+            yield ms2_spectra
+
+
+def read_file(file_path: str, materialize: str = OBJECTS) -> Tuple[List, List[Ms2Spectra]]:
+    """
+    Returns the H lines and spectra of an ms2 file. H lines are fast_lines.HLine for the raw and header levels and
+    HLine otherwise.
+    :param:     file_path:      path to the ms2 file
+    :param:     materialize:    one of MATERIALIZE_LEVELS
+    :return:    (List[HLine], List[Ms2Spectra]):    H lines and spectra
+    """
+    _check_materialize(materialize)
+    build = _BUILDERS[materialize]
+    mobility_store = open_mobility_store(file_path)
+
+    h_lines = []
+    if materialize in _SCANNED_LEVELS:
+        ms2_spectras = [build(*spectrum_lines) for spectrum_lines in scan_headers(file_path, h_lines=h_lines,
+                                                                                  peak_blocks=materialize == LAZY)]
+    else:
+        with open(file_path) as file:
+            ms2_spectras = [build(*spectrum_lines) for spectrum_lines in tokenize(file, h_lines=h_lines)]
+
+    if mobility_store is not None:
+        for ms2_spectra in ms2_spectras:
+            ms2_spectra.set_mobility_store(mobility_store)
+
+    if materialize in (RAW, HEADER):
+        return [fast_lines.HLine(line) for line in h_lines], ms2_spectras
+    return [HLine.deserialize(line) for line in h_lines], ms2_spectras
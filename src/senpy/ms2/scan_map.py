@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+
+from .fast_parser import read_metadata_index
+from .lines import ILine
+
+SCAN_MAP_EXTENSION = '.sn2p'
+
+# binary layout: magic, version (uint32), count (uint32), scans (int32[count]), precursor_ids (int32[count])
+SCAN_MAP_MAGIC = b'SN2P'
+SCAN_MAP_VERSION = 1
+_HEADER_DTYPE = np.dtype('<u4')
+_VALUE_DTYPE = np.dtype('<i4')
+
+MISSING = -1
+
+
+def get_scan_map_path(ms2_path: str) -> str:
+    return ms2_path + SCAN_MAP_EXTENSION
+
+
+def lookup_sorted(sorted_keys: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    Returns the position of each query in sorted_keys, MISSING for queries which are not present
+    """
+    queries = np.asarray(queries, dtype=np.int64)
+    if len(sorted_keys) == 0:
+        return np.full(len(queries), MISSING, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_keys, queries), len(sorted_keys) - 1)
+    return np.where(sorted_keys[positions] == queries, positions, MISSING)
+
+
+class ScanPrecursorMap:
+    """
+    Scan number <-> timsTOF precursor id mapping of an ms2 file, stored as two aligned int32 arrays sorted by scan.
+    Lookups take arrays and are vectorised with searchsorted, missing values are returned as MISSING (-1).
+    """
+
+    def __init__(self, scans: np.ndarray, precursor_ids: np.ndarray):
+        scans = np.asarray(scans, dtype=_VALUE_DTYPE)
+        precursor_ids = np.asarray(precursor_ids, dtype=_VALUE_DTYPE)
+        if scans.shape != precursor_ids.shape:
+            raise ValueError(f"scans and precursor_ids differ in length: {len(scans)} != {len(precursor_ids)}")
+
+        order = np.argsort(scans, kind='stable')
+        self.scans = scans[order]
+        self.precursor_ids = precursor_ids[order]
+        self._precursor_order = None
+
+    @staticmethod
+    def from_ms2(ms2_path: str, precursor_id_keyword: str = ILine.PRECURSOR_ID_KEYWORD) -> 'ScanPrecursorMap':
+        """
+        Builds the map from the S and I lines of an ms2 (or ms2.index) file, spectra without a precursor id are skipped
+        """
+        index = read_metadata_index(ms2_path, [precursor_id_keyword])
+        precursor_ids = index[precursor_id_keyword]
+        has_precursor_id = ~np.isnan(precursor_ids)
+        return ScanPrecursorMap(index['low_scan'][has_precursor_id], precursor_ids[has_precursor_id])
+
+    @staticmethod
+    def load(path: str) -> 'ScanPrecursorMap':
+        """
+        Reads a binary sidecar, or a legacy text file of 'scan\tprecursor_id' lines
+        """
+        with open(path, 'rb') as file:
+            is_binary = file.read(len(SCAN_MAP_MAGIC)) == SCAN_MAP_MAGIC
+
+        if not is_binary:
+            values = np.loadtxt(path, dtype=np.int64, delimiter='\t', ndmin=2).reshape(-1, 2)
+            return ScanPrecursorMap(values[:, 0], values[:, 1])
+
+        with open(path, 'rb') as file:
+            file.seek(len(SCAN_MAP_MAGIC))
+            version, count = np.fromfile(file, dtype=_HEADER_DTYPE, count=2)
+            if version != SCAN_MAP_VERSION:
+                raise ValueError(f"unsupported scan map version: {version}, path: {path}")
+            values = np.fromfile(file, dtype=_VALUE_DTYPE, count=2 * count)
+
+        scan_map = ScanPrecursorMap.__new__(ScanPrecursorMap)
+        scan_map.scans, scan_map.precursor_ids = values[:count], values[count:]
+        scan_map._precursor_order = None
+        return scan_map
+
+    @staticmethod
+    def load_or_build(ms2_path: str, path: str = None,
+                      precursor_id_keyword: str = ILine.PRECURSOR_ID_KEYWORD) -> 'ScanPrecursorMap':
+        """
+        Loads the sidecar of ms2_path (defaults to [ms2_path].sn2p) if it is newer than the ms2 file, otherwise the
+        map is built from the ms2 file and saved
+        """
+        if path is None:
+            path = get_scan_map_path(ms2_path)
+        if os.path.exists(path) and os.stat(path).st_mtime_ns >= os.stat(ms2_path).st_mtime_ns:
+            return ScanPrecursorMap.load(path)
+        scan_map = ScanPrecursorMap.from_ms2(ms2_path, precursor_id_keyword)
+        scan_map.save(path)
+        return scan_map
+
+    def save(self, path: str) -> None:
+        """
+        Writes the binary sidecar, atomically
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(SCAN_MAP_MAGIC)
+            file.write(np.array([SCAN_MAP_VERSION, len(self.scans)], dtype=_HEADER_DTYPE).tobytes())
+            file.write(self.scans.astype(_VALUE_DTYPE, copy=False).tobytes())
+            file.write(self.precursor_ids.astype(_VALUE_DTYPE, copy=False).tobytes())
+        os.replace(tmp_path, path)
+
+    def get_precursor_ids(self, scans: np.ndarray) -> np.ndarray:
+        """
+        Returns the precursor id of each scan, MISSING for unknown scans
+        """
+        positions = lookup_sorted(self.scans, scans)
+        if len(self) == 0:
+            return positions
+        return np.where(positions != MISSING, self.precursor_ids[positions], MISSING)
+
+    def get_scans(self, precursor_ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the scan of each precursor id, MISSING for unknown precursor ids. The first call sorts the precursor
+        ids once.
+        """
+        if self._precursor_order is None:
+            self._precursor_order = np.argsort(self.precursor_ids, kind='stable')
+        positions = lookup_sorted(self.precursor_ids[self._precursor_order], precursor_ids)
+        if len(self) == 0:
+            return positions
+        return np.where(positions != MISSING, self.scans[self._precursor_order[positions]], MISSING)
+
+    def __len__(self):
+        return len(self.scans)
+
+    def __repr__(self):
+        return f"ScanPrecursorMap({len(self)} scans)"
@@ -1,90 +1,28 @@
-from typing import List
+from typing import Iterator, List
 
-from tqdm import tqdm
+from ..ms2 import reader
+from ..ms2.lines import HLine, Ms2Spectra
 
-from senpy.ms2.lines import SLine, HLine, ZLine, PeakLine, ILine, Ms2Spectra, parse_ms2_line
 
-
-def read_file(file_path) -> (List[HLine], List[Ms2Spectra]):
+def read_file(file_path) -> List[Ms2Spectra]:
     """
-    Return HLines and Ms2Spectra, from provided ms2 file. Will always
+    Return Ms2Spectra, from provided ms2 file. Will always
     return correctly and fully read ms2 file until eof or corrupted line is reached.
     :param:     file_path:          str to the path for the sqt file
-    :return:    (List[HLine], List[Ms2Spectra]):          lists of HLines and Ms2Spectra
+    :return:    List[Ms2Spectra]:          list of Ms2Spectra
     """
-    ms2_spectras = []
-
-    with open(file_path) as file:
-        s_line, z_line, i_lines, peak_lines = None, None, [], []
-        for line in tqdm(file):
-            if line == "" or line == "\n":
-                continue
-            ms2_line = parse_ms2_line(line)
-            if isinstance(ms2_line, HLine):
-                continue
-            elif isinstance(ms2_line, SLine):
-                if s_line is not None:
-                    ms2_spectras.append(Ms2Spectra(s_line=s_line,
-                                                   z_line=z_line,
-                                                   i_lines=i_lines,
-                                                   peak_lines=peak_lines
-                                                   )
-                                        )
-                    s_line, z_line, i_lines, peak_lines = None, None, [], []
-                s_line = ms2_line
-            elif isinstance(ms2_line, ILine):
-                i_lines.append(ms2_line)
-            elif isinstance(ms2_line, ZLine):
-                z_line = ms2_line
-            elif isinstance(ms2_line, PeakLine):
-                peak_lines.append(ms2_line)
-
-        ms2_spectras.append(Ms2Spectra(s_line=s_line,
-                                       z_line=z_line,
-                                       i_lines=i_lines,
-                                       peak_lines=peak_lines
-                                       )
-                            )
-
-        return ms2_spectras
+    _, ms2_spectras = reader.read_file(file_path, materialize=reader.OBJECTS)
+    return ms2_spectras
 
 
-def read_file_incrementally(file_path) -> List[Ms2Spectra]:
+def read_file_incrementally(file_path) -> Iterator[Ms2Spectra]:
     """
     Return Ms2Spectra incrementally, from provided ms2 file. Will always
     return correctly and fully read ms2 file until eof or corrupted line is reached.
     :param:     file_path:          str to the path for the sqt file
-    :return:    List[Ms2Spectra]:          lists of SLines
+    :return:    Iterator[Ms2Spectra]:          Ms2Spectra
     """
-
-    with open(file_path) as file:
-        s_line, z_line, i_lines, peak_lines = None, None, [], []
-        for line in file:
-            ms2_line = parse_ms2_line(line)
-            if isinstance(ms2_line, HLine):
-                continue
-            elif isinstance(ms2_line, SLine):
-                if s_line is not None:
-                    yield Ms2Spectra(s_line=s_line,
-                                     z_line=z_line,
-                                     i_lines=i_lines,
-                                     peak_lines=peak_lines
-                                     )
-
-                    s_line, z_line, i_lines, peak_lines = None, None, [], []
-                s_line = ms2_line
-            elif isinstance(ms2_line, ILine):
-                i_lines.append(ms2_line)
-            elif isinstance(ms2_line, ZLine):
-                z_line = ms2_line
-            elif isinstance(ms2_line, PeakLine):
-                peak_lines.append(ms2_line)
-
-        return Ms2Spectra(s_line=s_line,
-                          z_line=z_line,
-                          i_lines=i_lines,
-                          peak_lines=peak_lines
-                          )
+    return reader.read_file_incrementally(file_path, materialize=reader.OBJECTS)
 
 
 def write_file(h_lines: List[HLine], ms2_spectras: List[Ms2Spectra], out_file_path: str) -> None:
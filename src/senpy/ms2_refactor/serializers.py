@@ -1,36 +1,52 @@
 from dataclasses import dataclass
+from typing import List, Tuple, Union
 
 import numpy as np
 
-from senpy.ms2_refactor.lines import PeakLine, HLine, ZLine, ILine, SLine
-from senpy.ms2_refactor.columns import _PeakLineColumns, _ZLineColumns, _ILineColumns, _SLineColumns
-from senpy.ms2_refactor import exceptions as ms2_exceptions
+from .lines import PeakLine, HLine, ZLine, ILine, SLine
+from .columns import PeakLineColumns, ZLineColumns, ILineColumns, SLineColumns
+from . import exceptions as ms2_exceptions
+from ..ms2.exceptions import Ms2FileDeserializationPeakLineException
+from ..ms2.lines import decode_peak_block, decode_peak_lines, encode_peak_block
 
 
 @dataclass
 class PeakLineSerializer:
+    """
+    Codec of '[mz] [intensity]' peak lines. The block codecs decode_peaks and encode_peaks work on a whole spectrum or
+    file chunk at once, serialize and deserialize are the single line wrappers.
+
+    serializer = PeakLineSerializer(MZ_PRECISION=4)
+    mz, intensity = serializer.decode_peaks(peak_lines)
+    block = serializer.encode_peaks(mz, intensity)
+    """
 
     MZ_PRECISION: int = 5
     INTENSITY_PRECISION: int = 1
 
-    def serialize(self, line: PeakLine):
-        line_elements = [None] * len(_PeakLineColumns)
-        line_elements[_PeakLineColumns.mz.value] = self.serialize_mz(line.mz, self.MZ_PRECISION)
-        line_elements[_PeakLineColumns.intensity.value] = self.serialize_intensity(line.intensity,
-                                                                                   self.INTENSITY_PRECISION)
+    @staticmethod
+    def decode_peaks(lines: Union[str, List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        return decode_peaks(lines)
+
+    def encode_peaks(self, mz: np.ndarray, intensity: np.ndarray) -> str:
+        return encode_peaks(mz, intensity, self.MZ_PRECISION, self.INTENSITY_PRECISION)
+
+    def serialize(self, line: PeakLine) -> str:
+        line_elements = [None] * len(PeakLineColumns)
+        line_elements[PeakLineColumns.mz.value] = self.serialize_mz(line.mz, self.MZ_PRECISION)
+        line_elements[PeakLineColumns.intensity.value] = self.serialize_intensity(line.intensity,
+                                                                                  self.INTENSITY_PRECISION)
         return ' '.join(line_elements) + '\n'
 
     @staticmethod
     def deserialize(line: str) -> 'PeakLine':
-        line_elements = line.rstrip().split(" ")
-        if len(line_elements) != len(_PeakLineColumns):
+        line_elements = line.split()
+        if len(line_elements) != len(PeakLineColumns):
             raise ms2_exceptions.Ms2FileDeserializationPeakLineException(_line=line)
 
-        mz = np.float32(line_elements[_PeakLineColumns.mz.value])
-        intensity = np.float32(line_elements[_PeakLineColumns.intensity.value])
-
-        peak_line = PeakLine(mz, intensity)
-        return peak_line
+        mz = np.float32(line_elements[PeakLineColumns.mz.value])
+        intensity = np.float32(line_elements[PeakLineColumns.intensity.value])
+        return PeakLine(mz, intensity)
 
     @staticmethod
     def serialize_mz(mz, precision):
@@ -40,12 +56,41 @@ class PeakLineSerializer:
     def serialize_intensity(intensity, precision):
         return f"{intensity:.{precision}f}"
 
+
+def decode_peaks(lines: Union[str, List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the mz (float64) and intensity (float32) arrays of peak lines, this is the senpy.ms2.lines peak codec
+    :param:     lines:      a block of peak lines, blank lines are skipped, or a list of exactly one peak per line
+    :return:    (np.ndarray, np.ndarray):   mz, intensity
+    """
+    try:
+        if isinstance(lines, str):
+            return decode_peak_block(lines)
+        return decode_peak_lines(lines)
+    except Ms2FileDeserializationPeakLineException as e:
+        raise ms2_exceptions.Ms2FileDeserializationPeakLineException(_line=e.line) from e
+
+
+def encode_peaks(mz: np.ndarray, intensity: np.ndarray, mz_precision: int = PeakLineSerializer.MZ_PRECISION,
+                 intensity_precision: int = PeakLineSerializer.INTENSITY_PRECISION) -> str:
+    """
+    Returns the peak lines of the arrays as one block, this is the senpy.ms2.lines peak codec
+    :param:     mz:                     mz array
+    :param:     intensity:              intensity array, same length as mz
+    :param:     mz_precision:           decimals of the mz column
+    :param:     intensity_precision:    decimals of the intensity column
+    :return:    str:        '[mz] [intensity]\n' lines
+    """
+    return encode_peak_block(mz, intensity, mz_precision, intensity_precision)
+
+
 @dataclass
 class HLineSerializer:
 
-    def serialize(self) -> str:
+    @staticmethod
+    def serialize(line: HLine) -> str:
         line_elements = ["H",
-                         self.info
+                         line.info
                          ]
         return '\t'.join(line_elements) + '\n'
 
@@ -60,22 +105,22 @@ class ZLineSerializer:
 
     MASS_PRECISION: int = 5
 
-    def serialize(self) -> str:
-        line_elements = [None]*len(_ZLineColumns)
-        line_elements[_ZLineColumns.letter.value] = "Z"
-        line_elements[_ZLineColumns.charge.value] = self.serialize_charge(self.charge)
-        line_elements[_ZLineColumns.mass.value] = self.serialize_mass(self.mass, self.MASS_PRECISION)
+    def serialize(self, line: ZLine) -> str:
+        line_elements = [None]*len(ZLineColumns)
+        line_elements[ZLineColumns.letter.value] = "Z"
+        line_elements[ZLineColumns.charge.value] = self.serialize_charge(line.charge)
+        line_elements[ZLineColumns.mass.value] = self.serialize_mass(line.mass, self.MASS_PRECISION)
         return '\t'.join(line_elements) + '\n'
 
     @staticmethod
     def deserialize(line: str) -> 'ZLine':
         line_elements = line.rstrip().split("\t")
 
-        if len(line_elements) != len(_ZLineColumns):
+        if len(line_elements) != len(ZLineColumns):
             raise ms2_exceptions.Ms2FileDeserializationZLineException(_line=line)
 
-        charge = np.uint8(line_elements[_ZLineColumns.charge.value])
-        mass = np.float32(line_elements[_ZLineColumns.mass.value])
+        charge = np.uint8(line_elements[ZLineColumns.charge.value])
+        mass = np.float32(line_elements[ZLineColumns.mass.value])
 
         return ZLine(charge, mass)
 
@@ -91,22 +136,23 @@ class ZLineSerializer:
 @dataclass
 class ILineSerializer:
 
-    def serialize(self) -> str:
-        line_elements = [None]*len(_ILineColumns)
-        line_elements[_ILineColumns.letter.value] = "I"
-        line_elements[_ILineColumns.keyword.value] = self.keyword
-        line_elements[_ILineColumns.value.value] = self.value
+    @staticmethod
+    def serialize(line: ILine) -> str:
+        line_elements = [None]*len(ILineColumns)
+        line_elements[ILineColumns.letter.value] = "I"
+        line_elements[ILineColumns.keyword.value] = line.keyword
+        line_elements[ILineColumns.value.value] = line.value
         return '\t'.join(line_elements) + '\n'
 
     @staticmethod
     def deserialize(line: str) -> 'ILine':
         line_elements = line.rstrip().split("\t")
 
-        if len(line_elements) != len(_ILineColumns):
+        if len(line_elements) != len(ILineColumns):
             raise ms2_exceptions.Ms2FileDeserializationILineException(_line=line)
 
-        keyword = line_elements[_ILineColumns.keyword.value]
-        value = line_elements[_ILineColumns.value.value]
+        keyword = line_elements[ILineColumns.keyword.value]
+        value = line_elements[ILineColumns.value.value]
 
         return ILine(keyword, value)
 
@@ -122,21 +168,21 @@ class SLineSerializer:
     def deserialize(line: str) -> 'SLine':
         line_elements = line.rstrip().split("\t")
 
-        if len(line_elements) != len(_SLineColumns):
+        if len(line_elements) != len(SLineColumns):
             raise ms2_exceptions.Ms2FileDeserializationSLineException(_line=line)
 
-        low_scan = int(line_elements[_SLineColumns.low_scan.value])
-        high_scan = int(line_elements[_SLineColumns.high_scan.value])
-        mz = float(line_elements[_SLineColumns.mz.value])
+        low_scan = int(line_elements[SLineColumns.low_scan.value])
+        high_scan = int(line_elements[SLineColumns.high_scan.value])
+        mz = float(line_elements[SLineColumns.mz.value])
 
         return SLine(low_scan, high_scan, mz)
 
-    def serialize(self):
-        line_elements = [None] * len(_SLineColumns)
-        line_elements[_SLineColumns.letter.value] = "S"
-        line_elements[_SLineColumns.low_scan.value] = self.serialize_low_scan(self.low_scan, SLine.LOW_SCAN_LENGTH)
-        line_elements[_SLineColumns.high_scan.value] = self.serialize_high_scan(self.high_scan, SLine.HIGH_SCAN_LENGTH)
-        line_elements[_SLineColumns.mz.value] = self.serialize_mz(self.mz, SLine.MZ_PRECISION)
+    def serialize(self, line: SLine) -> str:
+        line_elements = [None] * len(SLineColumns)
+        line_elements[SLineColumns.letter.value] = "S"
+        line_elements[SLineColumns.low_scan.value] = self.serialize_low_scan(line.low_scan, self.LOW_SCAN_LENGTH)
+        line_elements[SLineColumns.high_scan.value] = self.serialize_high_scan(line.high_scan, self.HIGH_SCAN_LENGTH)
+        line_elements[SLineColumns.mz.value] = self.serialize_mz(line.mz, self.MZ_PRECISION)
         return '\t'.join(line_elements) + '\n'
 
     @staticmethod
@@ -149,4 +195,4 @@ class SLineSerializer:
 
     @staticmethod
     def serialize_mz(mz, precision):
-        return f"{mz:.{precision}f}"
\ No newline at end of file
+        return f"{mz:.{precision}f}"
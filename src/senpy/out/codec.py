@@ -0,0 +1,90 @@
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from ..ragged import ColumnTable, RaggedArray, parse_ragged
+from .line import OutLine, _OutLineColumns, format_out_row
+
+_INT_COLUMNS = (_OutLineColumns.scan_number.name, _OutLineColumns.charge.name)
+_STR_COLUMNS = (_OutLineColumns.sequence.name,)
+_LIST_COLUMNS = (_OutLineColumns.OOK0_spectra.name, _OutLineColumns.CCS_spectra.name,
+                 _OutLineColumns.intensity_spectra.name, _OutLineColumns.mz_spectra.name)
+
+
+class OutFileWriter:
+    """
+    Streams out file rows to disk as they are produced, nothing is kept in memory. The file is written to a temp
+    file and renamed by close().
+
+    with OutFileWriter(out_path) as writer:
+        writer.write_row(scan_number=..., sequence=..., ...)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.n_rows = 0
+        self._tmp_path = path + '.tmp'
+        self._file = open(self._tmp_path, 'w', buffering=1_000_000)
+        self._file.write(OutLine.get_header())
+
+    def write_row(self, **fields) -> None:
+        """
+        Writes one row, fields are the format_out_row arguments
+        """
+        self._file.write(format_out_row(**fields))
+        self.n_rows += 1
+
+    def write_line(self, out_line: OutLine) -> None:
+        self._file.write(out_line.serialize())
+        self.n_rows += 1
+
+    def close(self) -> None:
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+@dataclass
+class OutTable(ColumnTable):
+    """
+    Columnar out file, column names are the OutLine field names. List columns are RaggedArray's.
+
+    table = read_out_table('file.out')
+    table['x_corr']         -> np.ndarray, one value per row
+    table['OOK0_spectra'][i] -> np.ndarray, mobility spectra of row i
+    """
+
+
+def read_out_table(file_path: str) -> OutTable:
+    """
+    Reads a whole out file into typed column arrays, scalar columns are read in bulk by pandas and list columns are
+    tokenized into RaggedArray's. A missing mz_spectra column gives empty lists.
+    :param:     file_path:  path to out file
+    :return:    OutTable
+    """
+    names = [column.name for column in _OutLineColumns]
+    dtypes = {name: np.int64 if name in _INT_COLUMNS else str if name in _STR_COLUMNS + _LIST_COLUMNS
+              else np.float64 for name in names}
+    df = pd.read_csv(file_path, sep='\t', header=0, names=names, dtype=dtypes, engine='c', keep_default_na=False,
+                     na_values={name: [''] for name in names if dtypes[name] is np.float64})
+
+    columns, list_columns = {}, {}
+    for name in names:
+        if name in _LIST_COLUMNS:
+            offsets, values = parse_ragged(df[name].fillna('').tolist(), np.float64)
+            list_columns[name] = RaggedArray(offsets, values)
+        else:
+            columns[name] = df[name].to_numpy()
+
+    return OutTable(columns, list_columns)
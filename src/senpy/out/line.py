@@ -1,10 +1,14 @@
-import ast
 from dataclasses import dataclass
 from enum import Enum
 from typing import List, ClassVar, Union
 
+import numpy as np
+
+from ..ragged import format_number_list, parse_number_list
 from ..util import Line
 
+ListValue = Union[np.ndarray, List[float], None]
+
 
 class _OutLineColumns(Enum):
     scan_number = 0
@@ -24,6 +28,48 @@ class _OutLineColumns(Enum):
     mz_spectra = 14
 
 
+def _format_float(val, precision: int) -> str:
+    try:
+        return f"{val:.{precision}f}"
+    except (TypeError, ValueError):  # None or an already formatted str
+        return '' if val is None else str(val)
+
+
+def _format_list(values: ListValue, precision: int) -> str:
+    if values is None:
+        return '[]'
+    if isinstance(values, str):
+        return values
+    return format_number_list(values, precision)
+
+
+def format_out_row(scan_number: int, sequence: str, charge: int, mass: float, mz: float, x_corr: float,
+                   retention_time: float, OOK0: float, CCS: float, collision_energy: float,
+                   precursor_intensity: float, OOK0_spectra: ListValue, CCS_spectra: ListValue,
+                   intensity_spectra: ListValue, mz_spectra: ListValue) -> str:
+    """
+    Formats one out file row, scalars with the OutLine precisions and list columns with one %-format call per list.
+    None scalars are written as empty fields and None lists as [].
+    """
+    return '\t'.join([
+        str(scan_number),
+        sequence,
+        str(charge),
+        _format_float(mass, OutLine.MASS_PRECISION),
+        _format_float(mz, OutLine.MZ_PRECISION),
+        _format_float(x_corr, OutLine.X_CORR_PRECISION),
+        _format_float(retention_time, OutLine.RETENTION_TIME_PRECISION),
+        _format_float(OOK0, OutLine.OOK0_PRECISION),
+        _format_float(CCS, OutLine.CCS_PRECISION),
+        _format_float(collision_energy, OutLine.COLLISION_ENERGY_PRECISION),
+        _format_float(precursor_intensity, OutLine.INTENSITY_PRECISION),
+        _format_list(OOK0_spectra, OutLine.OOK0_PRECISION),
+        _format_list(CCS_spectra, OutLine.CCS_PRECISION),
+        _format_list(intensity_spectra, OutLine.INTENSITY_PRECISION),
+        _format_list(mz_spectra, OutLine.MZ_PRECISION),
+    ]) + '\n'
+
+
 @dataclass
 class OutLine(Line):
     """
@@ -77,15 +123,13 @@ class OutLine(Line):
         CCS = float(line_elements[_OutLineColumns.CCS.value])
         collision_energy = float(line_elements[_OutLineColumns.collision_energy.value])
         precursor_intensity = float(line_elements[_OutLineColumns.precursor_intensity.value])
-        OOK0_spectra = [float(val) for val in ast.literal_eval(line_elements[_OutLineColumns.OOK0_spectra.value])]
-        CCS_spectra = [float(val) for val in ast.literal_eval(line_elements[_OutLineColumns.CCS_spectra.value])]
-        intensity_spectra = [float(val) for val in
-                             ast.literal_eval(line_elements[_OutLineColumns.intensity_spectra.value])]
+        OOK0_spectra = parse_number_list(line_elements[_OutLineColumns.OOK0_spectra.value])
+        CCS_spectra = parse_number_list(line_elements[_OutLineColumns.CCS_spectra.value])
+        intensity_spectra = parse_number_list(line_elements[_OutLineColumns.intensity_spectra.value])
 
         mz_spectra = None
         if len(line_elements) == len(_OutLineColumns):
-            mz_spectra = [float(val) for val in
-                          ast.literal_eval(line_elements[_OutLineColumns.mz_spectra.value])]
+            mz_spectra = parse_number_list(line_elements[_OutLineColumns.mz_spectra.value])
 
         line = OutLine(scan_number=scan_number,
                        sequence=sequence,
@@ -106,41 +150,18 @@ class OutLine(Line):
         return line
 
     def serialize(self) -> str:
-        line_elements = [""] * len(_OutLineColumns)
-        line_elements[_OutLineColumns.scan_number.value] = self.scan_number
-        line_elements[_OutLineColumns.sequence.value] = self.sequence
-        line_elements[_OutLineColumns.charge.value] = f"{self.charge}"
-        line_elements[_OutLineColumns.mass.value] = f"{self.mass:.{self.MASS_PRECISION}f}" if type(
-            self.mass) != str else self.mass
-        line_elements[_OutLineColumns.mz.value] = f"{self.mz:.{self.MZ_PRECISION}f}" if type(
-            self.mz) != str else self.mz
-        line_elements[_OutLineColumns.x_corr.value] = f"{self.x_corr:.{self.X_CORR_PRECISION}f}" if type(
-            self.x_corr) != str else self.x_corr
-        line_elements[
-            _OutLineColumns.retention_time.value] = f"{self.retention_time:.{self.RETENTION_TIME_PRECISION}f}" if type(
-            self.retention_time) != str else self.retention_time
-        line_elements[_OutLineColumns.OOK0.value] = f"{self.OOK0:.{self.OOK0_PRECISION}f}" if type(
-            self.OOK0) != str else self.OOK0
-        line_elements[_OutLineColumns.CCS.value] = f"{self.CCS:.{self.CCS_PRECISION}f}" if type(
-            self.CCS) != str else self.CCS
-        line_elements[_OutLineColumns.collision_energy.value] = \
-            f"{self.collision_energy:.{self.COLLISION_ENERGY_PRECISION}f}" if type(
-                self.collision_energy) != str else self.collision_energy
-        line_elements[_OutLineColumns.precursor_intensity.value] = \
-            f"{self.precursor_intensity:.{self.INTENSITY_PRECISION}f} " if type(
-                self.precursor_intensity) != str else self.precursor_intensity
-        line_elements[_OutLineColumns.OOK0_spectra.value] = \
-            str([f"{val:.{self.OOK0_PRECISION}f}" for val in self.OOK0_spectra]).replace("'", "") if type(
-                self.OOK0_spectra) != str else self.OOK0_spectra
-        line_elements[_OutLineColumns.CCS_spectra.value] = \
-            str([f"{val:.{self.CCS_PRECISION}f}" for val in self.CCS_spectra]).replace("'", "") if type(
-                self.CCS_spectra) != str else self.CCS_spectra
-        line_elements[_OutLineColumns.intensity_spectra.value] = \
-            str([f"{val:.{self.INTENSITY_PRECISION}f}" for val in self.intensity_spectra]).replace("'", "") if type(
-                self.intensity_spectra) != str else self.intensity_spectra
-        line_elements[_OutLineColumns.mz_spectra.value] = \
-            str([f"{val:.{self.MZ_PRECISION}f}" for val in self.mz_spectra]).replace("'", "") if type(
-                self.mz_spectra) != str else self.mz_spectra
-        line_elements = [str(elem) for elem in line_elements]
-
-        return '\t'.join(line_elements) + '\n'
+        return format_out_row(scan_number=self.scan_number,
+                              sequence=self.sequence,
+                              charge=self.charge,
+                              mass=self.mass,
+                              mz=self.mz,
+                              x_corr=self.x_corr,
+                              retention_time=self.retention_time,
+                              OOK0=self.OOK0,
+                              CCS=self.CCS,
+                              collision_energy=self.collision_energy,
+                              precursor_intensity=self.precursor_intensity,
+                              OOK0_spectra=self.OOK0_spectra,
+                              CCS_spectra=self.CCS_spectra,
+                              intensity_spectra=self.intensity_spectra,
+                              mz_spectra=self.mz_spectra)
@@ -1,5 +1,6 @@
-from typing import List
+from typing import Iterable, List
 
+from .codec import OutFileWriter
 from .line import OutLine
 
 
@@ -17,11 +18,10 @@ def read_file(file_path: str) -> List[OutLine]:
     return out_lines
 
 
-def write_file(out_lines: [OutLine], out_file_path: str):
+def write_file(out_lines: Iterable[OutLine], out_file_path: str):
     """
-    Write out file from h_lines and out_lines
+    Write out file from out_lines, out_lines may be a generator, lines are written as they are produced
     """
-    with open(out_file_path, "w") as file:
-        file.write(OutLine.get_header())
+    with OutFileWriter(out_file_path) as writer:
         for out_line in out_lines:
-            file.write(out_line.serialize())
+            writer.write_line(out_line)
@@ -0,0 +1,76 @@
+import os
+from typing import Callable, Dict, Iterable, Union
+
+_BUFFER_SIZE = 1_000_000
+
+NA = b'NA'
+
+
+def encode_field(val: Union[str, bytes, None]) -> bytes:
+    if val is None:
+        return NA
+    return val if isinstance(val, bytes) else str(val).encode()
+
+
+def patch_fields(line: bytes, fields: Dict[int, bytes], pad: bytes = NA) -> bytes:
+    """
+    Replaces tab separated fields of a line, all other fields are kept byte for byte. Lines with fewer fields than the
+    largest patched index are padded with pad.
+    :param:     line:       line including its line ending
+    :param:     fields:     {column index: new value}
+    :param:     pad:        value of missing columns
+    :return:    bytes:      patched line, with the original line ending
+    """
+    body = line.rstrip(b'\r\n')
+    ending = line[len(body):]
+    line_elements = body.split(b'\t')
+    missing = max(fields) + 1 - len(line_elements)
+    if missing > 0:
+        line_elements.extend([pad] * missing)
+    for index, val in fields.items():
+        line_elements[index] = val
+    return b'\t'.join(line_elements) + ending
+
+
+def rewrite_lines(in_path: str, out_path: str, letters: Iterable[str],
+                  patch_line: Callable[[bytes], Union[bytes, Iterable[bytes]]],
+                  finish: Callable[[], Iterable[bytes]] = None) -> None:
+    """
+    Copies in_path to out_path as raw bytes, only lines starting with one of letters are passed to patch_line. patch_line
+    returns the replacement line (or an iterable of lines). out_path is written to a temp file and renamed once
+    complete, so out_path may be in_path. If patch_line or finish raise, out_path is left untouched.
+    :param:     finish:     called after the last line, returns lines to append
+    """
+    letters = {letter.encode()[:1] for letter in letters}
+    tmp_path = str(out_path) + '.tmp'
+    try:
+        with open(in_path, 'rb', buffering=_BUFFER_SIZE) as in_file, \
+                open(tmp_path, 'wb', buffering=_BUFFER_SIZE) as out_file:
+            for line in in_file:
+                if line[:1] in letters:
+                    patched = patch_line(line)
+                    if isinstance(patched, bytes):
+                        out_file.write(patched)
+                    else:
+                        out_file.writelines(patched)
+                else:
+                    out_file.write(line)
+            if finish is not None:
+                out_file.writelines(finish())
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, out_path)
+
+
+def read_fields(path: str, letter: str, index: int) -> Iterable[bytes]:
+    """
+    Yields the raw value of one column of every line starting with letter, None for lines without the column
+    """
+    letter = letter.encode()[:1]
+    with open(path, 'rb', buffering=_BUFFER_SIZE) as file:
+        for line in file:
+            if line[:1] == letter:
+                line_elements = line.rstrip(b'\r\n').split(b'\t', index + 1)
+                yield line_elements[index] if index < len(line_elements) else None
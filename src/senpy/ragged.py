@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+_DROP_BRACKETS_AND_SPACES = str.maketrans('', '', '[] ')
+_SEPARATORS_TO_SPACE = str.maketrans(',\n', '  ')
+_NEWLINE, _COMMA = ord('\n'), ord(',')
+
+
+@dataclass
+class RaggedArray:
+    """
+    One list per row stored as flat values, the list of row i is values[offsets[i]:offsets[i + 1]]
+    """
+    offsets: np.ndarray  # int64, n_rows + 1
+    values: np.ndarray
+
+    def get_lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+@dataclass
+class ColumnTable:
+    """
+    Table stored as one array per column, list columns are RaggedArray's. Columns are looked up by name:
+    table['mz'] -> np.ndarray, table['intensity_1'] -> RaggedArray
+    """
+    columns: Dict[str, np.ndarray]
+    list_columns: Dict[str, RaggedArray]
+
+    def __getitem__(self, name: str) -> Union[np.ndarray, RaggedArray]:
+        if name in self.columns:
+            return self.columns[name]
+        return self.list_columns[name]
+
+    def __contains__(self, name: str):
+        return name in self.columns or name in self.list_columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+
+def expand_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Returns the concatenated ranges [starts[i], starts[i] + lengths[i]). This expands searchsorted windows (starts and
+    counts) into one position per candidate, and ragged rows (offsets and lengths) into the positions of their values.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    window_offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + window_offsets
+
+
+def _strip_list(val: str) -> str:
+    return val.strip().strip('[]').strip()
+
+
+def parse_number_list(val: str, cast: Callable = float) -> List[Union[int, float]]:
+    """
+    Parses a list column value, ex: '[1.0, 2.5, 3.0]', without ast.literal_eval
+    :param:     val:    list column value
+    :param:     cast:   float or int
+    :return:    List[Union[int, float]]:    list values, empty for '[]' or ''
+    """
+    val = _strip_list(val)
+    return [cast(elem) for elem in val.split(',')] if val else []
+
+
+@lru_cache(maxsize=4096)
+def _list_format(precision: int, n_values: int) -> str:
+    return '[' + ', '.join([f"%.{precision}f"] * n_values) + ']'
+
+
+def format_number_list(values: Union[np.ndarray, List[float]], precision: int) -> str:
+    """
+    Formats values as '[1.0000, 2.0000]' with one %-format call for the whole list, the inverse of
+    parse_number_list
+    """
+    values = values.tolist() if isinstance(values, np.ndarray) else values
+    return _list_format(precision, len(values)) % tuple(values)
+
+
+def parse_ragged(vals: Iterable[str], dtype=np.float64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parses a whole list column at once. Row lengths are counted on the column bytes by numpy and all values are
+    tokenized by one np.fromstring call, nothing is done per row in python.
+    :param:     vals:   list column values, one per row, ex: ['[1.0, 2.5]', '[]', ...]
+    :param:     dtype:  dtype of the list values
+    :return:    (np.ndarray, np.ndarray):   offsets (int64, len(vals) + 1) and values, the values of row i are
+                                            values[offsets[i]:offsets[i + 1]]
+    """
+    vals = list(vals)
+    if not vals:
+        return np.zeros(1, dtype=np.int64), np.empty(0, dtype=dtype)
+
+    text = '\n'.join(vals).translate(_DROP_BRACKETS_AND_SPACES)
+    data = np.frombuffer(text.encode(), dtype=np.uint8)
+
+    newlines = np.flatnonzero(data == _NEWLINE)
+    row_lengths = np.diff(np.concatenate([[-1], newlines, [len(data)]])) - 1
+    n_commas = np.bincount(np.searchsorted(newlines, np.flatnonzero(data == _COMMA)), minlength=len(vals))
+
+    offsets = np.zeros(len(vals) + 1, dtype=np.int64)
+    np.cumsum(np.where(row_lengths == 0, 0, n_commas + 1), out=offsets[1:])
+
+    values = np.fromstring(text.translate(_SEPARATORS_TO_SPACE), dtype=dtype, sep=' ') \
+        if offsets[-1] else np.empty(0, dtype=dtype)
+    if len(values) != offsets[-1]:
+        raise ValueError(f"malformed list column, expected {offsets[-1]} values, parsed {len(values)}")
+    return offsets, values
@@ -0,0 +1,160 @@
+import re
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import scipy.stats as stats
+
+from ..ms2.fast_parser import read_metadata_index
+from ..ms2.lines import ILine
+from ..sqt import parser as sqt_parser
+from ..sqt.lines import SLine
+from .predictors import RetentionTimePredictor
+
+MOD_MAP = {'(15.994915)': 'Oxidation', '(0.984016)': 'Deamidated'}
+
+_VALID_SEQUENCE_PATTERN = re.compile('^[ARNDCEQGHILKMFPSTWYV]+$')
+
+
+def convert_mod_sequence(sequence: str) -> Tuple[List[str], str]:
+    """
+    Converts an ip2 modified sequence to DeepLC modifications and an unmodified sequence,
+    ex: 'PEM(15.994915)TIDE' -> (['3|Oxidation'], 'PEMTIDE')
+    """
+    mods = []
+
+    for key in MOD_MAP:
+        while sequence.find(key) != -1:
+            itr = 0
+            for aa in sequence[:sequence.find(key)]:
+                if aa.isalpha():
+                    itr += 1
+            sequence = sequence.replace(key, "", 1)
+            mods.append(f"{itr}|{MOD_MAP[key]}")
+    return mods, sequence
+
+
+def is_valid_sequence(sequence: str) -> bool:
+    return bool(_VALID_SEQUENCE_PATTERN.match(sequence))
+
+
+def calculate_scores(errors: np.ndarray, std: float) -> np.ndarray:
+    """
+    Two sided normal tail probability of each error, nan errors give nan scores
+    """
+    return stats.norm.sf(np.abs(np.asarray(errors, dtype=np.float64) / std)) * 2
+
+
+def get_retention_times(ms2_file: str, low_scans: np.ndarray,
+                        retention_time_keyword: str = ILine.RETENTION_TIME_KEYWORD) -> np.ndarray:
+    """
+    Looks up the retention time of each scan from the ms2 metadata index, missing scans are nan
+    """
+    index = read_metadata_index(ms2_file, [retention_time_keyword])
+    order = np.argsort(index['low_scan'], kind='stable')
+    index_scans, index_rts = index['low_scan'][order], index[retention_time_keyword][order]
+
+    low_scans = np.asarray(low_scans, dtype=np.int64)
+    if len(index_scans) == 0:
+        return np.full(len(low_scans), np.nan)
+    positions = np.minimum(np.searchsorted(index_scans, low_scans), len(index_scans) - 1)
+    return np.where(index_scans[positions] == low_scans, index_rts[positions], np.nan)
+
+
+def read_psm_columns(sqt_file: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Returns the low scan of every s line and one row per m line of the sqt file: s_line_index, m_line_number,
+    sequence, xcorr, reverse
+    """
+    s_line_scans = []
+    columns = {'s_line_index': [], 'm_line_number': [], 'sequence': [], 'xcorr': [], 'reverse': []}
+    for s_line_index, s_line in enumerate(sqt_parser.read_file_incrementally(sqt_file)):
+        s_line_scans.append(s_line.low_scan)
+        for i, m_line in enumerate(s_line.m_lines):
+            columns['s_line_index'].append(s_line_index)
+            columns['m_line_number'].append(i)
+            columns['sequence'].append(m_line.sequence)
+            columns['xcorr'].append(m_line.xcorr)
+            columns['reverse'].append(m_line.is_reverse())
+
+    return np.array(s_line_scans, dtype=np.int64), {
+        's_line_index': np.array(columns['s_line_index'], dtype=np.int64),
+        'm_line_number': np.array(columns['m_line_number'], dtype=np.int64),
+        'sequence': np.array(columns['sequence'], dtype=str),
+        'xcorr': np.array(columns['xcorr'], dtype=np.float64),
+        'reverse': np.array(columns['reverse'], dtype=bool),
+    }
+
+
+def score_psms(psms: Dict[str, np.ndarray], retention_times: np.ndarray, predictor: RetentionTimePredictor,
+               align_percentile: float = 95) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predicts the retention time of every psm and scores the prediction error. Sequences are converted and predicted
+    once per unique sequence. The predictor is calibrated on target top hits with an xcorr above align_percentile,
+    the same psm's set the spread of the prediction error.
+    :param psms: columns from read_psm_columns
+    :param retention_times: experimental retention time of each psm
+    :param predictor: RetentionTimePredictor
+    :param align_percentile: xcorr percentile of target top hits used for calibration
+    :return: (predicted retention times, scores), nan for psm's which are not scored
+    """
+    unique_sequences, inverse = np.unique(psms['sequence'], return_inverse=True)
+    converted = [convert_mod_sequence(sequence[2:-2]) for sequence in unique_sequences.tolist()]
+    unique_modifications = np.array(["|".join(mods) for mods, _ in converted], dtype=object)
+    unique_seqs = np.array([seq for _, seq in converted], dtype=object)
+    unique_is_valid = np.array([is_valid_sequence(seq) for seq in unique_seqs], dtype=bool)
+
+    is_valid = unique_is_valid[inverse] & ~np.isnan(retention_times)
+    is_target_top_hit = ~psms['reverse'] & (psms['m_line_number'] == 0)
+    x_corr_percentile = np.percentile(psms['xcorr'][is_target_top_hit], align_percentile)
+    print("xcorr percentile: ", x_corr_percentile)
+
+    is_align = is_target_top_hit & is_valid & (psms['xcorr'] >= x_corr_percentile)
+    print("number of alignment peptides: ", int(is_align.sum()))
+    predictor.calibrate(unique_seqs[inverse[is_align]].tolist(), unique_modifications[inverse[is_align]].tolist(),
+                        retention_times[is_align])
+
+    unique_predicted = np.full(len(unique_sequences), np.nan)
+    unique_predicted[unique_is_valid] = predictor.predict(unique_seqs[unique_is_valid].tolist(),
+                                                          unique_modifications[unique_is_valid].tolist())
+    predicted = unique_predicted[inverse]
+
+    errors = retention_times - predicted
+    rt_std = np.std(errors[is_align])
+
+    is_scored = is_valid & (psms['xcorr'] != 0)
+    predicted = np.where(is_scored, predicted, np.nan)
+    scores = np.where(is_scored, calculate_scores(errors, rt_std), np.nan)
+    return predicted, scores
+
+
+def _iter_scored_s_lines(sqt_file: str, s_line_retention_times: np.ndarray, predicted: np.ndarray,
+                         scores: np.ndarray) -> Iterator[SLine]:
+    s_line_retention_times = [None if np.isnan(val) else val for val in s_line_retention_times.tolist()]
+    predicted = [None if np.isnan(val) else val for val in predicted.tolist()]
+    scores = [None if np.isnan(val) else val for val in scores.tolist()]
+
+    row = 0
+    for s_line_index, s_line in enumerate(sqt_parser.read_file_incrementally(sqt_file)):
+        s_line.experimental_ook0 = s_line_retention_times[s_line_index]
+        for m_line in s_line.m_lines:
+            m_line.predicted_ook0 = predicted[row]
+            m_line.tims_score = scores[row]
+            row += 1
+        yield s_line
+
+
+def generate_rt_score_sqt(sqt_file: str, ms2_file: str, out_file: str, predictor: RetentionTimePredictor,
+                          retention_time_keyword: str = ILine.RETENTION_TIME_KEYWORD,
+                          version: str = "v2.1.0_ext") -> None:
+    """
+    Writes a copy of the sqt file where each m line holds its predicted retention time (predicted_ook0 column) and
+    rt score (tims_score column), the s line holds the experimental retention time (experimental_ook0 column).
+    The sqt file is read twice: once for the psm columns and once while streaming the scored SLines to out_file.
+    """
+    s_line_scans, psms = read_psm_columns(sqt_file)
+    s_line_retention_times = get_retention_times(ms2_file, s_line_scans, retention_time_keyword)
+    predicted, scores = score_psms(psms, s_line_retention_times[psms['s_line_index']], predictor)
+
+    h_lines = sqt_parser.read_h_lines(sqt_file)
+    sqt_parser.write_file(h_lines, _iter_scored_s_lines(sqt_file, s_line_retention_times, predicted, scores),
+                          out_file, version=version)
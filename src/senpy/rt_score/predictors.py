@@ -0,0 +1,83 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+class RetentionTimePredictor(ABC):
+    """
+    Interface for retention time predictors used by the rt scoring engine. Sequences are unmodified, modifications use
+    the DeepLC format: '[position]|[name]' joined by '|', ex: '3|Oxidation|7|Deamidated'
+    """
+
+    @abstractmethod
+    def calibrate(self, sequences: List[str], modifications: List[str], retention_times: np.ndarray) -> None:
+        """
+        calibrates the predictor on confidently identified peptides
+        """
+        pass
+
+    @abstractmethod
+    def predict(self, sequences: List[str], modifications: List[str]) -> np.ndarray:
+        """
+        returns the predicted retention time of each sequence
+        """
+        pass
+
+
+class DeepLCPredictor(RetentionTimePredictor):
+    """
+    DeepLC backed predictor, kwargs are passed to DeepLC
+    """
+
+    def __init__(self, **kwargs):
+        from deeplc import DeepLC
+        self._dlc = DeepLC(**kwargs)
+
+    def calibrate(self, sequences: List[str], modifications: List[str], retention_times: np.ndarray) -> None:
+        seq_df = pd.DataFrame({'seq': sequences, 'modifications': modifications, 'tr': retention_times})
+        self._dlc.calibrate_preds(seq_df=seq_df)
+
+    def predict(self, sequences: List[str], modifications: List[str]) -> np.ndarray:
+        seq_df = pd.DataFrame({'seq': sequences, 'modifications': modifications})
+        return np.asarray(self._dlc.make_preds(seq_df=seq_df), dtype=np.float64)
+
+
+class CompositionPredictor(RetentionTimePredictor):
+    """
+    Linear model of retention time on amino acid composition, fit by least squares during calibration. Needs no
+    pretrained model, so it can stand in for DeepLC.
+    """
+
+    AMINO_ACIDS = 'ARNDCEQGHILKMFPSTWYV'
+
+    def __init__(self):
+        self._residue_index = np.full(128, -1, dtype=np.int64)
+        self._residue_index[np.frombuffer(self.AMINO_ACIDS.encode(), dtype=np.uint8)] = np.arange(
+            len(self.AMINO_ACIDS))
+        self._coefficients = None
+
+    def get_composition_matrix(self, sequences: List[str]) -> np.ndarray:
+        """
+        Returns residue counts with shape (sequences, amino acids + 1), the last column is the intercept
+        """
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        residues = self._residue_index[np.frombuffer("".join(sequences).encode(), dtype=np.uint8)]
+        rows = np.repeat(np.arange(len(sequences)), lengths)
+
+        composition = np.zeros((len(sequences), len(self.AMINO_ACIDS) + 1), dtype=np.float64)
+        valid = residues >= 0
+        np.add.at(composition, (rows[valid], residues[valid]), 1)
+        composition[:, -1] = 1
+        return composition
+
+    def calibrate(self, sequences: List[str], modifications: List[str], retention_times: np.ndarray) -> None:
+        composition = self.get_composition_matrix(sequences)
+        self._coefficients, _, _, _ = np.linalg.lstsq(composition, np.asarray(retention_times, dtype=np.float64),
+                                                      rcond=None)
+
+    def predict(self, sequences: List[str], modifications: List[str]) -> np.ndarray:
+        if self._coefficients is None:
+            raise ValueError("CompositionPredictor must be calibrated before predicting")
+        return self.get_composition_matrix(sequences) @ self._coefficients
@@ -0,0 +1,308 @@
+import os
+from array import array
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from .peaks import SpectraPeaks
+from .similarity import SimilarityScores, score_pairs
+from ..dtaSelectFilter.parser import read_peptide_scan_index
+from ..ms2.reader import ARRAYS, read_file_incrementally
+from ..ragged import expand_ranges
+
+SPECTRAL_LIBRARY_EXTENSION = '.slib'
+
+# binary layout:
+#   header:     magic, version (uint32)
+#   peaks:      (mz float64, intensity float32) records, in the order spectra were added
+#   table:      one array per _TABLE_COLUMNS entry with n_spectra values, rows sorted by (charge, precursor m/z).
+#               Row i holds the peaks [peak_start[i], peak_start[i] + n_peaks[i])
+#   sequences:  sequence offsets (int64[n_spectra + 1]) and the utf-8 sequences of the sorted rows
+#   footer:     n_spectra (uint64), n_peaks (uint64), sequences length (uint64), magic
+SPECTRAL_LIBRARY_MAGIC = b'SLIB'
+SPECTRAL_LIBRARY_VERSION = 1
+_UINT32_DTYPE = np.dtype('<u4')
+_UINT64_DTYPE = np.dtype('<u8')
+_OFFSET_DTYPE = np.dtype('<i8')
+_PEAK_DTYPE = np.dtype([('mz', '<f8'), ('intensity', '<f4')])
+_TABLE_COLUMNS = (('precursor_mz', np.dtype('<f8')),
+                  ('charge', np.dtype('<i4')),
+                  ('ook0', np.dtype('<f4')),  # nan when unknown
+                  ('peak_start', np.dtype('<i8')),
+                  ('n_peaks', np.dtype('<i8')))
+_HEADER_SIZE = len(SPECTRAL_LIBRARY_MAGIC) + _UINT32_DTYPE.itemsize
+_FOOTER_SIZE = 3 * _UINT64_DTYPE.itemsize + len(SPECTRAL_LIBRARY_MAGIC)
+
+
+class SpectralLibraryWriter:
+    """
+    Streams library spectra to disk, peaks are written as they are added and only the per spectrum table is kept in
+    memory. close() sorts the table by (charge, precursor m/z) and renames the temp file.
+
+    with SpectralLibraryWriter('library.slib') as writer:
+        writer.add(precursor_mz, charge, mz_array, intensity_array, sequence='PEPTIDE', ook0=0.9)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = path + '.tmp'
+        self._precursor_mz, self._charge, self._ook0 = array('d'), array('i'), array('f')
+        self._n_peaks = array('q')
+        self._sequences, self._sequence_offsets = bytearray(), array('q', [0])
+        self._file = open(self._tmp_path, 'wb', buffering=1_000_000)
+        self._file.write(SPECTRAL_LIBRARY_MAGIC)
+        self._file.write(np.array([SPECTRAL_LIBRARY_VERSION], dtype=_UINT32_DTYPE).tobytes())
+
+    def add(self, precursor_mz: float, charge: int, mz_array: np.ndarray, intensity_array: np.ndarray,
+            sequence: str = '', ook0: float = None) -> int:
+        """
+        Writes one spectrum
+        :return:    int:    index of the spectrum in insertion order
+        """
+        peaks = np.empty(len(mz_array), dtype=_PEAK_DTYPE)
+        peaks['mz'], peaks['intensity'] = mz_array, intensity_array
+        self._file.write(peaks.tobytes())
+
+        self._precursor_mz.append(precursor_mz)
+        self._charge.append(charge)
+        self._ook0.append(ook0 if ook0 is not None else np.nan)
+        self._n_peaks.append(len(peaks))
+        self._sequences += sequence.encode()
+        self._sequence_offsets.append(len(self._sequences))
+        return len(self._n_peaks) - 1
+
+    def add_batch(self, peaks: SpectraPeaks, precursor_mz: np.ndarray, charge: np.ndarray,
+                  sequences: Iterable[str] = None, ook0: np.ndarray = None) -> None:
+        """
+        Writes every spectrum of peaks with one write
+        """
+        records = np.empty(len(peaks.mz), dtype=_PEAK_DTYPE)
+        records['mz'], records['intensity'] = peaks.mz, peaks.intensity
+        self._file.write(records.tobytes())
+
+        self._precursor_mz.extend(np.asarray(precursor_mz, dtype=np.float64).tolist())
+        self._charge.extend(np.asarray(charge, dtype=np.int32).tolist())
+        self._ook0.extend(np.asarray(ook0, dtype=np.float32).tolist() if ook0 is not None else [np.nan] * len(peaks))
+        self._n_peaks.extend(peaks.get_n_peaks().tolist())
+        for sequence in (sequences if sequences is not None else [''] * len(peaks)):
+            self._sequences += sequence.encode()
+            self._sequence_offsets.append(len(self._sequences))
+
+    def close(self) -> None:
+        precursor_mz = np.frombuffer(self._precursor_mz, dtype=np.float64)
+        charge = np.frombuffer(self._charge, dtype=np.int32)
+        n_peaks = np.frombuffer(self._n_peaks, dtype=np.int64)
+        peak_starts = np.zeros(len(n_peaks), dtype=np.int64)
+        np.cumsum(n_peaks[:-1], out=peak_starts[1:])
+        order = np.lexsort((precursor_mz, charge))
+
+        columns = {'precursor_mz': precursor_mz, 'charge': charge, 'ook0': np.frombuffer(self._ook0, dtype=np.float32),
+                   'peak_start': peak_starts, 'n_peaks': n_peaks}
+        for name, dtype in _TABLE_COLUMNS:
+            self._file.write(columns[name][order].astype(dtype).tobytes())
+
+        sequence_offsets = np.frombuffer(self._sequence_offsets, dtype=np.int64)
+        sequence_lengths = np.diff(sequence_offsets)[order]
+        sorted_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(sequence_lengths, out=sorted_offsets[1:])
+        sequences = np.frombuffer(bytes(self._sequences), dtype=np.uint8)
+        self._file.write(sorted_offsets.astype(_OFFSET_DTYPE).tobytes())
+        self._file.write(sequences[expand_ranges(sequence_offsets[:-1][order], sequence_lengths)].tobytes())
+
+        self._file.write(np.array([len(order), n_peaks.sum(), len(sequences)], dtype=_UINT64_DTYPE).tobytes())
+        self._file.write(SPECTRAL_LIBRARY_MAGIC)
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __len__(self):
+        return len(self._n_peaks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+class SpectralLibrary:
+    """
+    Read only, memory mapped spectral library. Rows are sorted by (charge, precursor m/z), every charge is a
+    contiguous partition, so a query only touches the rows within its precursor window. Table columns are views of
+    the file, peaks are read for the candidate rows only.
+
+    library = SpectralLibrary('library.slib')
+    scores = library.search(query_peaks, precursor_mz, charge, ook0, ppm=10)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as file:
+            if file.read(len(SPECTRAL_LIBRARY_MAGIC)) != SPECTRAL_LIBRARY_MAGIC:
+                raise ValueError(f"not a spectral library: {path}")
+            version = int(np.fromfile(file, dtype=_UINT32_DTYPE, count=1)[0])
+            if version != SPECTRAL_LIBRARY_VERSION:
+                raise ValueError(f"unsupported spectral library version: {version}, path: {path}")
+            file.seek(file_size - _FOOTER_SIZE)
+            n_spectra, n_peaks, sequences_length = (int(val) for val in np.fromfile(file, dtype=_UINT64_DTYPE,
+                                                                                      count=3))
+            if file.read(len(SPECTRAL_LIBRARY_MAGIC)) != SPECTRAL_LIBRARY_MAGIC:
+                raise ValueError(f"truncated spectral library: {path}")
+
+        self._peaks = self._map(_PEAK_DTYPE, _HEADER_SIZE, n_peaks)
+        offset = _HEADER_SIZE + n_peaks * _PEAK_DTYPE.itemsize
+        columns = {}
+        for name, dtype in _TABLE_COLUMNS:
+            columns[name] = self._map(dtype, offset, n_spectra)
+            offset += n_spectra * dtype.itemsize
+        self.precursor_mz, self.charge, self.ook0 = columns['precursor_mz'], columns['charge'], columns['ook0']
+        self.peak_start, self.n_peaks = columns['peak_start'], columns['n_peaks']
+        self._sequence_offsets = self._map(_OFFSET_DTYPE, offset, n_spectra + 1)
+        self._sequences = self._map(np.dtype(np.uint8), offset + (n_spectra + 1) * _OFFSET_DTYPE.itemsize,
+                                    sequences_length)
+
+        # charge partitions: rows of charge charges[i] are [charge_starts[i], charge_starts[i + 1])
+        self.charges = np.arange(self.charge[0], self.charge[-1] + 1, dtype=np.int64) if n_spectra \
+            else np.empty(0, dtype=np.int64)
+        self.charge_starts = np.searchsorted(self.charge, np.append(self.charges, self.charges[-1] + 1)
+                                             if n_spectra else [0])
+
+    def _map(self, dtype: np.dtype, offset: int, count: int) -> np.ndarray:
+        # plain ndarray view of the memmap, slicing a np.memmap subclass is several times slower
+        return np.asarray(np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=(count,))) if count \
+            else np.empty(0, dtype=dtype)
+
+    def get_sequence(self, i: int) -> str:
+        return self._sequences[self._sequence_offsets[i]:self._sequence_offsets[i + 1]].tobytes().decode()
+
+    def get_sequences(self, indexes: np.ndarray) -> List[str]:
+        return [self.get_sequence(i) for i in np.asarray(indexes).tolist()]
+
+    def get_peaks(self, indexes: np.ndarray = None) -> SpectraPeaks:
+        """
+        Reads the peaks of the rows at indexes (every row by default) into memory
+        """
+        indexes = np.arange(len(self)) if indexes is None else np.asarray(indexes, dtype=np.int64)
+        n_peaks = self.n_peaks[indexes]
+        records = self._peaks[expand_ranges(self.peak_start[indexes], n_peaks)]
+        return SpectraPeaks.from_n_peaks(n_peaks, records['mz'], records['intensity'])
+
+    def query(self, precursor_mz: np.ndarray, charge: np.ndarray, ook0: np.ndarray = None, ppm: float = 10,
+              ook0_tolerance: float = 0.05) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the (query index, library row) candidate pairs: library spectra of the same charge with a precursor
+        within ppm and, when both sides have it, a 1/K0 within ook0_tolerance. A query charge of 0 searches every
+        charge.
+        :return:    (np.ndarray, np.ndarray):   query indexes and library rows, ordered by query then row
+        """
+        precursor_mz = np.asarray(precursor_mz, dtype=np.float64)
+        charge = np.asarray(charge, dtype=np.int64)
+        ook0 = np.asarray(ook0, dtype=np.float64) if ook0 is not None else None
+
+        results = []
+        for partition, partition_charge in enumerate(self.charges.tolist()):
+            start, end = self.charge_starts[partition], self.charge_starts[partition + 1]
+            query_indexes = np.flatnonzero((charge == partition_charge) | (charge == 0))
+            if start == end or len(query_indexes) == 0:
+                continue
+
+            mz = precursor_mz[query_indexes]
+            tolerance = mz * ppm / 1_000_000
+            partition_mz = self.precursor_mz[start:end]
+            start_indexes = np.searchsorted(partition_mz, mz - tolerance, side='left') + start
+            end_indexes = np.searchsorted(partition_mz, mz + tolerance, side='right') + start
+            counts = end_indexes - start_indexes
+
+            query_indexes = np.repeat(query_indexes, counts)
+            rows = expand_ranges(start_indexes, counts)
+            if ook0 is not None:
+                query_ook0, library_ook0 = ook0[query_indexes], self.ook0[rows]
+                keep = (np.abs(library_ook0 - query_ook0) <= ook0_tolerance) | np.isnan(query_ook0) | \
+                    np.isnan(library_ook0)
+                query_indexes, rows = query_indexes[keep], rows[keep]
+            results.append((query_indexes, rows))
+
+        if not results:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        query_indexes = np.concatenate([query_indexes for query_indexes, _ in results])
+        rows = np.concatenate([rows for _, rows in results])
+        order = np.lexsort((rows, query_indexes))
+        return query_indexes[order], rows[order]
+
+    def search(self, query_peaks: SpectraPeaks, precursor_mz: np.ndarray, charge: np.ndarray, ook0: np.ndarray = None,
+               ppm: float = 10, ook0_tolerance: float = 0.05, fragment_tolerance: float = 0.02,
+               fragment_ppm: float = None, processes: int = None, batch_size: int = 50_000) -> SimilarityScores:
+        """
+        Scores every query spectrum against its query() candidates with score_pairs. Only the peaks of the candidate
+        rows of a batch are read from the library.
+        :param:     query_peaks:        query spectra
+        :param:     precursor_mz:       query precursor m/z
+        :param:     charge:             query precursor charge, 0 searches every charge
+        :param:     ook0:               query 1/K0, optional, nan is not filtered on
+        :param:     ppm:                precursor tolerance in ppm
+        :param:     ook0_tolerance:     absolute 1/K0 tolerance
+        :param:     fragment_tolerance: peak m/z tolerance in Da
+        :param:     fragment_ppm:       peak m/z tolerance in ppm, replaces fragment_tolerance when given
+        :param:     processes:          score_pairs worker processes
+        :param:     batch_size:         queries per batch, bounds the candidate peaks read into memory
+        :return:    SimilarityScores:   library_indexes are library rows, pairs ordered by query then row
+        """
+        precursor_mz = np.asarray(precursor_mz, dtype=np.float64)
+        charge = np.asarray(charge, dtype=np.int64)
+        ook0 = np.asarray(ook0, dtype=np.float64) if ook0 is not None else None
+
+        results = []
+        for batch_start in range(0, len(precursor_mz), batch_size):
+            batch = slice(batch_start, batch_start + batch_size)
+            query_indexes, rows = self.query(precursor_mz[batch], charge[batch],
+                                             ook0[batch] if ook0 is not None else None, ppm, ook0_tolerance)
+            unique_rows, row_indexes = np.unique(rows, return_inverse=True)
+            scores = score_pairs(query_peaks, self.get_peaks(unique_rows), query_indexes + batch_start, row_indexes,
+                                 tolerance=fragment_tolerance, ppm=fragment_ppm, processes=processes)
+            scores.library_indexes = rows
+            results.append(scores)
+
+        if not results:
+            empty = np.empty(0)
+            return SimilarityScores(empty.astype(np.int64), empty.astype(np.int64), empty, empty,
+                                    empty.astype(np.int64))
+        return SimilarityScores(*(np.concatenate([getattr(scores, name) for scores in results])
+                                  for name in SimilarityScores.__slots__))
+
+    def __len__(self):
+        return len(self.precursor_mz)
+
+
+def add_search_spectra(writer: SpectralLibraryWriter, ms2_path: str, filter_path: str, min_x_corr: float = 0,
+                       dta_filter_version: str = None) -> int:
+    """
+    Adds the identified spectra of one search to a library, ms2 spectra are joined to DTASelect-filter peptide lines
+    on their low scan.
+    :param:     writer:             library writer
+    :param:     ms2_path:           path to the searched ms2 file
+    :param:     filter_path:        path to the DTASelect-filter file of the search
+    :param:     min_x_corr:         peptides below this XCorr are not added
+    :param:     dta_filter_version: DTASelect-filter version, read from the header when None
+    :return:    int:    number of spectra added
+    """
+    ms2_file_name = os.path.basename(ms2_path).split(".ms2")[0]
+    peptide_scan_index = read_peptide_scan_index(filter_path, ms2_file_name, version=dta_filter_version)
+
+    n_added = 0
+    for ms2_spectra in read_file_incrementally(ms2_path, materialize=ARRAYS):
+        peptide_hit = peptide_scan_index.get(ms2_spectra.s_line.low_scan)
+        if peptide_hit is None or peptide_hit.x_corr < min_x_corr:
+            continue
+        writer.add(precursor_mz=ms2_spectra.get_precursor_mz(),
+                   charge=peptide_hit.charge,
+                   mz_array=ms2_spectra.get_mz_spectra(),
+                   intensity_array=ms2_spectra.get_intensity_spectra(),
+                   sequence=peptide_hit.sequence,
+                   ook0=ms2_spectra.get_ook0())
+        n_added += 1
+    return n_added
+
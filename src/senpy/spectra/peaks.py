@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from typing import Any, Iterable, Tuple
+
+import numpy as np
+
+
+def get_spectrum_arrays(ms2_spectra: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (mz, intensity) float arrays for any of the senpy Ms2Spectra types
+    """
+    if hasattr(ms2_spectra, 'mz_spectra'):  # senpy.hdf5.parser.Ms2Spectra
+        mz_spectra, intensity_spectra = ms2_spectra.mz_spectra, ms2_spectra.int_spectra
+    else:  # senpy.ms2.lines.Ms2Spectra / senpy.ms2.fast_lines.Ms2SpectraFast
+        mz_spectra, intensity_spectra = ms2_spectra.get_mz_spectra(), ms2_spectra.get_intensity_spectra()
+    return np.asarray(mz_spectra, dtype=np.float64), np.asarray(intensity_spectra, dtype=np.float64)
+
+
+@dataclass
+class SpectraPeaks:
+    """
+    Peaks of many spectra stored flat, the peaks of spectrum i are [offsets[i]:offsets[i + 1]]. This is the layout of
+    the dfolder_to_hdf5.py 'spectra' dataset, where offsets are the cumulated precursor n_peaks.
+
+    peaks = SpectraPeaks.from_hdf5('file.hdf5')
+    mz, intensity = peaks[i]
+    """
+    offsets: np.ndarray  # int64, n_spectra + 1
+    mz: np.ndarray  # float64
+    intensity: np.ndarray
+
+    def get_n_peaks(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def get_spectrum_indexes(self) -> np.ndarray:
+        """
+        Returns the spectrum index of every peak
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.get_n_peaks())
+
+    def is_sorted(self) -> bool:
+        """
+        True when the m/z of every spectrum is ascending
+        """
+        ascending = np.diff(self.mz) >= 0
+        # differences across a spectrum boundary do not count
+        boundaries = self.offsets[1:-1] - 1
+        ascending[boundaries[(boundaries >= 0) & (boundaries < len(ascending))]] = True
+        return bool(ascending.all())
+
+    def sort_by_mz(self) -> 'SpectraPeaks':
+        """
+        Returns the peaks with the m/z of every spectrum ascending, self if already sorted
+        """
+        if self.is_sorted():
+            return self
+        order = np.lexsort((self.mz, self.get_spectrum_indexes()))
+        return SpectraPeaks(self.offsets, self.mz[order], self.intensity[order])
+
+    def take(self, keep: np.ndarray) -> 'SpectraPeaks':
+        """
+        Returns the peaks where the keep mask is True, every spectrum is kept even when it ends up empty
+        """
+        kept_before = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept_before[1:])
+        offsets = kept_before[self.offsets]
+        return SpectraPeaks(offsets, self.mz[keep], self.intensity[keep])
+
+    def __getitem__(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.mz[start:end], self.intensity[start:end]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @staticmethod
+    def from_n_peaks(n_peaks: np.ndarray, mz: np.ndarray, intensity: np.ndarray) -> 'SpectraPeaks':
+        offsets = np.zeros(len(n_peaks) + 1, dtype=np.int64)
+        np.cumsum(n_peaks, out=offsets[1:])
+        return SpectraPeaks(offsets, np.asarray(mz, dtype=np.float64), np.asarray(intensity))
+
+    @staticmethod
+    def from_arrays(mz_arrays: Iterable[np.ndarray], intensity_arrays: Iterable[np.ndarray]) -> 'SpectraPeaks':
+        """
+        Concatenates per spectrum (mz, intensity) arrays
+        """
+        mz_arrays, intensity_arrays = list(mz_arrays), list(intensity_arrays)
+        n_peaks = np.array([len(mz_array) for mz_array in mz_arrays], dtype=np.int64)
+        if not mz_arrays:
+            return SpectraPeaks.from_n_peaks(n_peaks, np.empty(0), np.empty(0))
+        return SpectraPeaks.from_n_peaks(n_peaks, np.concatenate(mz_arrays), np.concatenate(intensity_arrays))
+
+    @staticmethod
+    def from_ms2_spectras(ms2_spectras: Iterable[Any]) -> 'SpectraPeaks':
+        """
+        Builds the peaks from any of the senpy Ms2Spectra types
+        """
+        arrays = [get_spectrum_arrays(ms2_spectra) for ms2_spectra in ms2_spectras]
+        return SpectraPeaks.from_arrays([mz for mz, _ in arrays], [intensity for _, intensity in arrays])
+
+    @staticmethod
+    def from_hdf5(hdf5_file: str) -> 'SpectraPeaks':
+        """
+        Reads the peaks of a dfolder_to_hdf5.py file with two dataset reads, spectra are in precursor order
+        """
+        import h5py  # only this reader needs h5py, which is not a requirement of senpy.spectra
+
+        with h5py.File(hdf5_file, 'r') as f:
+            spectra = f['spectra'][()]
+            n_peaks = f['precursor']['n_peaks'].ravel()
+        return SpectraPeaks.from_n_peaks(n_peaks, spectra['mz_array'].ravel(), spectra['intensity_array'].ravel())
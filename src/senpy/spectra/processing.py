@@ -0,0 +1,242 @@
+from dataclasses import dataclass
+
+import numpy as np
+import scipy.sparse as sparse
+
+from .peaks import SpectraPeaks
+from ..constants import C13_MASS_DIFFERENCE
+from ..ragged import expand_ranges
+
+# normalize methods
+MAX = 'max'  # most intense peak of every spectrum is 1
+SUM = 'sum'  # intensities of every spectrum sum to 1
+L2 = 'l2'  # every spectrum is a unit vector, dot products are cosine similarities
+NORMALIZE_METHODS = (MAX, SUM, L2)
+
+# bin_peaks aggregates, how peaks falling into the same bin are combined
+AGGREGATES = {'sum': np.add, 'max': np.maximum}
+
+# Comet's default fragment_bin_tol for high resolution MS2
+DEFAULT_BIN_WIDTH = 1.0005079
+
+# size limit of the padded matrix top_n sorts
+_MAX_PADDED_CELLS = 1 << 24
+
+
+def reduce_spectra(ufunc: np.ufunc, values: np.ndarray, offsets: np.ndarray, initial: float = 0) -> np.ndarray:
+    """
+    Reduces values per spectrum with one ufunc.reduceat call, empty spectra get initial
+    :param:     ufunc:      ex: np.add, np.maximum
+    :param:     values:     one value per peak
+    :param:     offsets:    spectrum offsets (n_spectra + 1)
+    :param:     initial:    result of an empty spectrum
+    :return:    np.ndarray: one value per spectrum
+    """
+    result = np.full(len(offsets) - 1, initial, dtype=values.dtype)
+    # empty spectra have zero length so each non-empty start still ends where the next one begins
+    non_empty = offsets[:-1] < offsets[1:]
+    if non_empty.any():
+        result[non_empty] = ufunc.reduceat(values, offsets[:-1][non_empty])
+    return result
+
+
+def top_n(peaks: SpectraPeaks, n: int) -> SpectraPeaks:
+    """
+    Keeps the n most intense peaks of every spectrum, the kept peaks stay in their original order. Of equally intense
+    peaks the first one is ranked higher.
+    """
+    n_peaks = peaks.get_n_peaks()
+    keep = np.repeat(n_peaks <= n, n_peaks)
+    long_spectra = np.flatnonzero(n_peaks > n)
+    if len(long_spectra) == 0:
+        return peaks
+
+    # the n-th highest intensity of every spectrum to cut is found by partitioning the rows of a padded
+    # (spectra, peaks) matrix, which is cheaper than one sort over every peak. Batches bound the matrix
+    # size.
+    thresholds = np.empty(len(long_spectra), dtype=np.float64)
+    batch_size = max(1, _MAX_PADDED_CELLS // int(n_peaks[long_spectra].max()))
+    for batch_start in range(0, len(long_spectra), batch_size):
+        spectra = long_spectra[batch_start:batch_start + batch_size]
+        starts, lengths = peaks.offsets[spectra], n_peaks[spectra]
+        positions = expand_ranges(starts, lengths)
+        rows = np.repeat(np.arange(len(spectra)), lengths)
+
+        padded = np.full((len(spectra), lengths.max()), np.inf)
+        padded[rows, positions - starts[rows]] = -peaks.intensity[positions]
+        thresholds[batch_start:batch_start + batch_size] = -np.partition(padded, n - 1, axis=1)[:, n - 1]
+
+    positions = expand_ranges(peaks.offsets[long_spectra], n_peaks[long_spectra])
+    peak_thresholds = np.repeat(thresholds, n_peaks[long_spectra])
+    intensity = peaks.intensity[positions]
+    above = intensity > peak_thresholds
+    keep[positions] = above | (intensity == peak_thresholds)
+
+    # ties at the threshold can keep more than n peaks, the first ones are kept
+    if np.count_nonzero(keep) > len(keep) - len(positions) + n * len(long_spectra):
+        at = ~above & keep[positions]
+        long_offsets = np.zeros(len(long_spectra) + 1, dtype=np.int64)
+        np.cumsum(n_peaks[long_spectra], out=long_offsets[1:])
+        n_at = n - reduce_spectra(np.add, above.astype(np.int64), long_offsets)
+        at_cumsum = np.cumsum(at)
+        at_ranks = at_cumsum - np.repeat(np.append(0, at_cumsum[long_offsets[1:-1] - 1]), n_peaks[long_spectra])
+        keep[positions] = above | (at & (at_ranks <= np.repeat(n_at, n_peaks[long_spectra])))
+
+    return peaks.take(keep)
+
+
+def normalize(peaks: SpectraPeaks, method: str = MAX, sqrt: bool = False) -> SpectraPeaks:
+    """
+    Scales the intensities of every spectrum, see NORMALIZE_METHODS. Spectra whose norm is 0 are left as is.
+    :param:     peaks:      spectra peaks
+    :param:     method:     one of NORMALIZE_METHODS
+    :param:     sqrt:       square root the intensities first, dampens the most intense peaks
+    :return:    SpectraPeaks:   float64 intensities
+    """
+    if method not in NORMALIZE_METHODS:
+        raise ValueError(f"unknown normalize method: {method}, expected one of {NORMALIZE_METHODS}")
+
+    intensity = np.array(peaks.intensity, dtype=np.float64)
+    if sqrt:
+        np.sqrt(intensity, out=intensity)
+
+    if method == MAX:
+        norms = reduce_spectra(np.maximum, intensity, peaks.offsets)
+    elif method == SUM:
+        norms = reduce_spectra(np.add, intensity, peaks.offsets)
+    else:
+        norms = np.sqrt(reduce_spectra(np.add, intensity * intensity, peaks.offsets))
+
+    norms[norms == 0] = 1
+    intensity /= np.repeat(norms, peaks.get_n_peaks())
+    return SpectraPeaks(peaks.offsets, peaks.mz, intensity)
+
+
+def window_mz(peaks: SpectraPeaks, min_mz: float = None, max_mz: float = None) -> SpectraPeaks:
+    """
+    Keeps the peaks with min_mz <= mz <= max_mz, a missing bound is not applied
+    """
+    keep = np.ones(len(peaks.mz), dtype=bool)
+    if min_mz is not None:
+        keep &= peaks.mz >= min_mz
+    if max_mz is not None:
+        keep &= peaks.mz <= max_mz
+    return peaks.take(keep)
+
+
+def deisotope(peaks: SpectraPeaks, charges=(1,), ppm: float = 20) -> SpectraPeaks:
+    """
+    Removes isotope peaks. A peak is an isotope when the same spectrum has a more intense peak one C13 spacing
+    (divided by charge) below it, within ppm. Isotope chains are removed down to their most intense peak, which is
+    the monoisotopic peak for fragments. Spectra are returned sorted by m/z.
+    :param:     peaks:      spectra peaks
+    :param:     charges:    fragment charges to check isotope spacings for
+    :param:     ppm:        tolerance on the expected isotope m/z
+    :return:    SpectraPeaks
+    """
+    peaks = peaks.sort_by_mz()
+    if len(peaks.mz) == 0:
+        return peaks
+
+    # shift every spectrum into its own m/z range so one searchsorted covers all spectra, the gap between spectra is
+    # wider than any isotope spacing plus tolerance so windows never cross into the previous spectrum
+    spectrum_indexes = peaks.get_spectrum_indexes()
+    min_mz = peaks.mz.min()
+    spectrum_shift = spectrum_indexes * (peaks.mz.max() - min_mz + 100)
+    keys = peaks.mz - min_mz + spectrum_shift
+
+    is_isotope = np.zeros(len(peaks.mz), dtype=bool)
+    for charge in charges:
+        target_mz = peaks.mz - C13_MASS_DIFFERENCE / charge
+        tolerance = target_mz * ppm / 1_000_000
+        target_keys = target_mz - min_mz + spectrum_shift
+        start_indexes = np.searchsorted(keys, target_keys - tolerance, side='left')
+        end_indexes = np.searchsorted(keys, target_keys + tolerance, side='right')
+        counts = end_indexes - start_indexes
+
+        # (peak, candidate monoisotopic peak) pairs
+        peak_indexes = np.repeat(np.arange(len(peaks.mz)), counts)
+        positions = expand_ranges(start_indexes, counts)
+
+        more_intense = peaks.intensity[positions] > peaks.intensity[peak_indexes]
+        is_isotope[peak_indexes[more_intense]] = True
+
+    return peaks.take(~is_isotope)
+
+
+@dataclass
+class BinnedSpectra:
+    """
+    Spectra binned on a fixed m/z grid, stored sparse: the non-empty bins of spectrum i are
+    bin_indexes[offsets[i]:offsets[i + 1]] (ascending) with their intensities. Bin b covers
+    [min_mz + b * bin_width, min_mz + (b + 1) * bin_width).
+    """
+    offsets: np.ndarray  # int64, n_spectra + 1
+    bin_indexes: np.ndarray  # int64
+    intensity: np.ndarray  # float64
+    n_bins: int
+    bin_width: float
+    min_mz: float
+
+    def get_bin_mz(self) -> np.ndarray:
+        """
+        Returns the center m/z of every bin
+        """
+        return self.min_mz + (np.arange(self.n_bins) + 0.5) * self.bin_width
+
+    def to_sparse(self) -> sparse.csr_matrix:
+        """
+        Returns a (n_spectra, n_bins) csr matrix, this shares the layout so nothing is copied
+        """
+        return sparse.csr_matrix((self.intensity, self.bin_indexes, self.offsets), shape=(len(self), self.n_bins))
+
+    def to_dense(self, dtype=np.float32) -> np.ndarray:
+        """
+        Returns a (n_spectra, n_bins) matrix, mind the size for many spectra or narrow bins
+        """
+        dense = np.zeros((len(self), self.n_bins), dtype=dtype)
+        dense[np.repeat(np.arange(len(self)), np.diff(self.offsets)), self.bin_indexes] = self.intensity
+        return dense
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def bin_peaks(peaks: SpectraPeaks, bin_width: float = DEFAULT_BIN_WIDTH, min_mz: float = 0, max_mz: float = 2000,
+              aggregate: str = 'sum') -> BinnedSpectra:
+    """
+    Bins every spectrum on the same fixed width m/z grid, peaks outside [min_mz, max_mz) are dropped.
+    :param:     peaks:      spectra peaks
+    :param:     bin_width:  bin width in m/z
+    :param:     min_mz:     start of the first bin
+    :param:     max_mz:     end of the grid, the last bin is cut off here
+    :param:     aggregate:  one of AGGREGATES, combines the peaks of a bin
+    :return:    BinnedSpectra
+    """
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"unknown aggregate: {aggregate}, expected one of {tuple(AGGREGATES)}")
+
+    n_bins = int(np.ceil((max_mz - min_mz) / bin_width))
+    bins = np.floor((peaks.mz - min_mz) / bin_width).astype(np.int64)
+    keep = (peaks.mz >= min_mz) & (peaks.mz < max_mz) & (bins < n_bins)
+
+    keys = peaks.get_spectrum_indexes()[keep] * n_bins + bins[keep]
+    intensity = np.asarray(peaks.intensity[keep], dtype=np.float64)
+    if len(keys) > 1 and (keys[1:] < keys[:-1]).any():
+        order = np.argsort(keys, kind='stable')
+        keys, intensity = keys[order], intensity[order]
+
+    is_first = np.ones(len(keys), dtype=bool)
+    is_first[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(is_first)
+    unique_keys = keys[starts]
+    bin_intensity = AGGREGATES[aggregate].reduceat(intensity, starts) if len(starts) else intensity
+
+    offsets = np.zeros(len(peaks) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(unique_keys // n_bins, minlength=len(peaks)), out=offsets[1:])
+    return BinnedSpectra(offsets=offsets,
+                         bin_indexes=unique_keys % n_bins,
+                         intensity=bin_intensity,
+                         n_bins=n_bins,
+                         bin_width=bin_width,
+                         min_mz=min_mz)
@@ -0,0 +1,239 @@
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Tuple
+
+import numpy as np
+import scipy.sparse as sparse
+
+from .peaks import SpectraPeaks
+from .processing import DEFAULT_BIN_WIDTH, L2, bin_peaks, normalize, reduce_spectra
+from ..ragged import expand_ranges
+
+NO_MATCH = -1
+
+# set in each worker process by _init_worker, so the spectra are sent once per worker instead of once per batch
+_WORKER_ARGS = {}
+
+
+@dataclass
+class SimilarityScores:
+    """
+    Dataclass to store the scores of spectrum pairs. Element i scores query spectrum query_indexes[i] against library
+    spectrum library_indexes[i]. cosine is over matched peak intensities, spectral_angle is the normalized spectral
+    contrast angle 1 - 2 * arccos(cosine) / pi and shared_peaks the number of matched peak pairs.
+    """
+    query_indexes: np.ndarray
+    library_indexes: np.ndarray
+    cosine: np.ndarray
+    spectral_angle: np.ndarray
+    shared_peaks: np.ndarray
+
+    __slots__ = 'query_indexes', 'library_indexes', 'cosine', 'spectral_angle', 'shared_peaks'
+
+    def get_best_library_indexes(self, n_queries: int) -> np.ndarray:
+        """
+        Returns one library index per query, the pair with the highest cosine, NO_MATCH if the query has no pair
+        """
+        best_library_indexes = np.full(n_queries, NO_MATCH, dtype=np.int64)
+        order = np.lexsort((-self.cosine, self.query_indexes))
+        query_indexes = self.query_indexes[order]
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = query_indexes[1:] != query_indexes[:-1]
+        best_library_indexes[query_indexes[is_first]] = self.library_indexes[order][is_first]
+        return best_library_indexes
+
+    def __len__(self):
+        return len(self.query_indexes)
+
+
+def get_spectral_angle(cosine: np.ndarray) -> np.ndarray:
+    """
+    Returns the normalized spectral contrast angle of cosine similarities, 1 for identical spectra and 0 for
+    orthogonal ones
+    """
+    return 1 - 2 * np.arccos(np.clip(cosine, 0, 1)) / np.pi
+
+
+def _get_l2_norms(peaks: SpectraPeaks) -> np.ndarray:
+    intensity = np.asarray(peaks.intensity, dtype=np.float64)
+    return np.sqrt(reduce_spectra(np.add, intensity * intensity, peaks.offsets))
+
+
+def _match_pair_peaks(query: SpectraPeaks, library: SpectraPeaks, query_indexes: np.ndarray,
+                      library_indexes: np.ndarray, tolerance: float,
+                      ppm: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Matches the peaks of every (query, library) spectrum pair one to one, greedily by intensity product. Query and
+    library peaks must be sorted by m/z.
+    :return:    (pair indexes, query peak positions, library peak positions) of the matched peaks
+    """
+    # expand every pair into its query peaks
+    n_query_peaks = query.get_n_peaks()[query_indexes]
+    pair_indexes = np.repeat(np.arange(len(query_indexes)), n_query_peaks)
+    query_positions = expand_ranges(query.offsets[query_indexes], n_query_peaks)
+    query_mz = query.mz[query_positions]
+
+    # library spectra are shifted into their own m/z range so one searchsorted covers all pairs
+    min_mz = min(query.mz.min(), library.mz.min())
+    max_mz = max(query.mz.max(), library.mz.max())
+    max_tolerance = max_mz * ppm / 1_000_000 if ppm is not None else tolerance
+    spectrum_shift = max_mz - min_mz + 2 * max_tolerance + 1
+    library_keys = library.mz - min_mz + library.get_spectrum_indexes() * spectrum_shift
+
+    query_tolerance = query_mz * ppm / 1_000_000 if ppm is not None else tolerance
+    target_keys = query_mz - min_mz + library_indexes[pair_indexes] * spectrum_shift
+    start_indexes = np.searchsorted(library_keys, target_keys - query_tolerance, side='left')
+    end_indexes = np.searchsorted(library_keys, target_keys + query_tolerance, side='right')
+    counts = end_indexes - start_indexes
+
+    # one candidate per library peak in the window of a query peak
+    candidate_query_peaks = np.repeat(np.arange(len(query_positions)), counts)
+    candidate_library_peaks = expand_ranges(start_indexes, counts)
+    scores = query.intensity[query_positions[candidate_query_peaks]].astype(np.float64) * \
+        library.intensity[candidate_library_peaks]
+
+    # query and library peaks are sorted by m/z, so the candidates of a pair come out with both their query peak and
+    # their library peak ascending: peaks matched by several candidates sit next to each other. Candidates without a
+    # competitor are matches as they are, only the others go through the greedy assignment.
+    library_keys = pair_indexes[candidate_query_peaks] * len(library.mz) + candidate_library_peaks
+    is_shared = np.repeat(counts > 1, counts)
+    is_shared[1:] |= library_keys[1:] == library_keys[:-1]
+    is_shared[:-1] |= library_keys[:-1] == library_keys[1:]
+    accepted_query_peaks, accepted_library_keys = [candidate_query_peaks[~is_shared]], [library_keys[~is_shared]]
+
+    # greedy one to one assignment: a candidate which is the best remaining one of both its query and its library peak
+    # is what a sequential greedy pass would take, so every round accepts all of them and drops the candidates sharing
+    # a peak with an accepted one
+    order = np.argsort(-scores[is_shared], kind='stable')
+    candidate_query_peaks = candidate_query_peaks[is_shared][order]
+    library_keys = library_keys[is_shared][order]
+    while len(candidate_query_peaks):
+        is_best = np.zeros(len(candidate_query_peaks), dtype=bool)
+        is_best[np.unique(candidate_query_peaks, return_index=True)[1]] = True
+        is_library_best = np.zeros(len(candidate_query_peaks), dtype=bool)
+        is_library_best[np.unique(library_keys, return_index=True)[1]] = True
+        is_best &= is_library_best
+
+        accepted_query_peaks.append(candidate_query_peaks[is_best])
+        accepted_library_keys.append(library_keys[is_best])
+        remaining = ~np.isin(candidate_query_peaks, candidate_query_peaks[is_best]) & \
+            ~np.isin(library_keys, library_keys[is_best])
+        candidate_query_peaks, library_keys = candidate_query_peaks[remaining], library_keys[remaining]
+
+    accepted_query_peaks = np.concatenate(accepted_query_peaks)
+    accepted_library_keys = np.concatenate(accepted_library_keys)
+    return (pair_indexes[accepted_query_peaks], query_positions[accepted_query_peaks],
+            accepted_library_keys % len(library.mz))
+
+
+def _score_pair_batch(query: SpectraPeaks, library: SpectraPeaks, query_indexes: np.ndarray,
+                      library_indexes: np.ndarray, tolerance: float, ppm: float) -> Tuple[np.ndarray, np.ndarray]:
+    if len(query.mz) == 0 or len(library.mz) == 0:
+        return np.zeros(len(query_indexes)), np.zeros(len(query_indexes), dtype=np.int64)
+
+    pair_indexes, query_positions, library_positions = _match_pair_peaks(query, library, query_indexes,
+                                                                         library_indexes, tolerance, ppm)
+    products = query.intensity[query_positions].astype(np.float64) * library.intensity[library_positions]
+    dot_products = np.bincount(pair_indexes, weights=products, minlength=len(query_indexes))
+    shared_peaks = np.bincount(pair_indexes, minlength=len(query_indexes))
+
+    norms = _get_l2_norms(query)[query_indexes] * _get_l2_norms(library)[library_indexes]
+    cosine = np.divide(dot_products, norms, out=np.zeros(len(query_indexes)), where=norms > 0)
+    return np.minimum(cosine, 1), shared_peaks
+
+
+def _init_worker(query: SpectraPeaks, library: SpectraPeaks, tolerance: float, ppm: float) -> None:
+    _WORKER_ARGS.update(query=query, library=library, tolerance=tolerance, ppm=ppm)
+
+
+def _score_pair_batch_worker(indexes: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    return _score_pair_batch(query_indexes=indexes[0], library_indexes=indexes[1], **_WORKER_ARGS)
+
+
+def score_pairs(query: SpectraPeaks, library: SpectraPeaks, query_indexes: np.ndarray, library_indexes: np.ndarray,
+                tolerance: float = 0.02, ppm: float = None, processes: int = None,
+                batch_size: int = 20_000) -> SimilarityScores:
+    """
+    Scores query spectrum query_indexes[i] against library spectrum library_indexes[i] for every i. Peaks within
+    tolerance are matched one to one, greedily by intensity product, the way a per pair peak matching loop would.
+    Intensities are used as given, normalize(sqrt=True) first to dampen dominant peaks. Pair batches are scored in a
+    process pool.
+    :param:     query:              query spectra
+    :param:     library:            library spectra, may be query itself
+    :param:     query_indexes:      query spectrum of each pair
+    :param:     library_indexes:    library spectrum of each pair
+    :param:     tolerance:          peak m/z tolerance in Da
+    :param:     ppm:                peak m/z tolerance in ppm of the query peak, replaces tolerance when given
+    :param:     processes:          number of worker processes, defaults to os.cpu_count(), 1 scores in this process
+    :param:     batch_size:         pairs per batch, bounds the candidate arrays
+    :return:    SimilarityScores
+    """
+    query_indexes = np.asarray(query_indexes, dtype=np.int64)
+    library_indexes = np.asarray(library_indexes, dtype=np.int64)
+    query, library = query.sort_by_mz(), library.sort_by_mz()
+    # pairs are scored ordered by library spectrum so the library lookups of a batch walk memory forward
+    order = np.argsort(library_indexes, kind='stable')
+    batches = [(query_indexes[order[start:start + batch_size]], library_indexes[order[start:start + batch_size]])
+               for start in range(0, len(query_indexes), batch_size)]
+
+    if processes == 1 or len(batches) <= 1:
+        results = [_score_pair_batch(query, library, batch_query_indexes, batch_library_indexes, tolerance, ppm)
+                   for batch_query_indexes, batch_library_indexes in batches]
+    else:
+        with Pool(processes=processes, initializer=_init_worker, initargs=(query, library, tolerance, ppm)) as pool:
+            results = pool.map(_score_pair_batch_worker, batches)
+
+    cosine, shared_peaks = np.zeros(len(query_indexes)), np.zeros(len(query_indexes), dtype=np.int64)
+    if results:
+        cosine[order] = np.concatenate([batch_cosine for batch_cosine, _ in results])
+        shared_peaks[order] = np.concatenate([batch_shared for _, batch_shared in results])
+    return SimilarityScores(query_indexes=query_indexes,
+                            library_indexes=library_indexes,
+                            cosine=cosine,
+                            spectral_angle=get_spectral_angle(cosine),
+                            shared_peaks=shared_peaks)
+
+
+def binned_cosine_matrix(query: SpectraPeaks, library: SpectraPeaks, bin_width: float = DEFAULT_BIN_WIDTH,
+                         min_mz: float = 0, max_mz: float = 2000) -> sparse.csr_matrix:
+    """
+    Returns the (n_query, n_library) cosine similarity of every pair of spectra binned on a fixed m/z grid, as one
+    sparse matrix product. Pairs sharing no bin are not stored. This is the cheap all against all prefilter,
+    score_pairs gives tolerance aware scores.
+    """
+    query_vectors = bin_peaks(normalize(query, method=L2), bin_width, min_mz, max_mz).to_sparse()
+    library_vectors = bin_peaks(normalize(library, method=L2), bin_width, min_mz, max_mz).to_sparse()
+    # peaks falling into the same bin are summed, so the binned vectors are normalized again
+    query_vectors = _normalize_rows(query_vectors)
+    library_vectors = _normalize_rows(library_vectors)
+    return (query_vectors @ library_vectors.T).tocsr()
+
+
+def _normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def find_similar_pairs(query: SpectraPeaks, library: SpectraPeaks, min_cosine: float = 0.7,
+                       tolerance: float = 0.02, ppm: float = None, bin_width: float = DEFAULT_BIN_WIDTH,
+                       min_mz: float = 0, max_mz: float = 2000, min_binned_cosine: float = None,
+                       exclude_self: bool = False, processes: int = None) -> SimilarityScores:
+    """
+    Returns every (query, library) pair whose tolerance aware cosine is at least min_cosine, ex: duplicate spectra or
+    library matches. Candidate pairs come from binned_cosine_matrix and are rescored with score_pairs.
+    :param:     min_binned_cosine:  binned cosine a pair needs to be rescored, defaults to min_cosine / 2 since
+                                    binning can split matching peaks over neighbouring bins
+    :param:     exclude_self:   skip pairs of a spectrum with itself, for comparing a set with itself
+    :return:    SimilarityScores:   pairs ordered by query then library index
+    """
+    candidates = binned_cosine_matrix(query, library, bin_width, min_mz, max_mz).tocoo()
+    keep = candidates.data >= (min_binned_cosine if min_binned_cosine is not None else min_cosine / 2)
+    if exclude_self:
+        keep &= candidates.row != candidates.col
+    order = np.lexsort((candidates.col[keep], candidates.row[keep]))
+    scores = score_pairs(query, library, candidates.row[keep][order], candidates.col[keep][order], tolerance=tolerance,
+                         ppm=ppm, processes=processes)
+
+    keep = scores.cosine >= min_cosine
+    return SimilarityScores(*(getattr(scores, name)[keep] for name in SimilarityScores.__slots__))
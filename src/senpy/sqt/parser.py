@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Iterable, Iterator, List, Union
 
 from .lines import SLine, parse_sqt_line, MLine, LLine
 from ..util import HLine
@@ -44,14 +44,56 @@ def read_file(sqt_input: Union[str, List], version='auto') -> ([str], [SLine]):
     return h_lines, s_lines
 
 
-def write_file(h_lines: [HLine], s_lines: [SLine], out_file_path: str, version='auto') -> None:
+def read_h_lines(file_path: str, version='auto') -> List[HLine]:
     """
-    Write Sqt file from hlines and slines
+    Return the H lines at the top of the sqt file, stops at the first S line
+    """
+    h_lines = []
+    with open(file_path) as file:
+        for line in file:
+            if line == "" or line == "\n":
+                continue
+            if line[0] != HLine.LETTER:
+                break
+            h_lines.append(HLine.deserialize(line, version=version))
+    return h_lines
+
+
+def read_file_incrementally(file_path: str, version='auto') -> Iterator[SLine]:
+    """
+    Yields SLines (with their M and L lines) one at a time from the sqt file, H lines are skipped
+    :param:     file_path:          str to the path for the sqt file
+    :return:    Iterator[SLine]:    SLines
+    """
+    s_line = None
+    with open(file_path) as file:
+        for line in file:
+
+            if line == "" or line == "\n":
+                continue
+
+            sqt_line = parse_sqt_line(line, version=version)
+            if isinstance(sqt_line, SLine):
+                if s_line is not None:
+                    yield s_line
+                s_line = sqt_line
+            elif isinstance(sqt_line, MLine):
+                s_line.m_lines.append(sqt_line)
+            elif isinstance(sqt_line, LLine):
+                s_line.m_lines[-1].l_lines.append(sqt_line)
+
+    if s_line is not None:
+        yield s_line
+
+
+def write_file(h_lines: [HLine], s_lines: Iterable[SLine], out_file_path: str, version='auto') -> None:
+    """
+    Write Sqt file from hlines and slines. s_lines may be a generator, each SLine is written as it is produced.
     :param:     h_lines:    [str],      list of header lines
-    :param:     s_lines:    [SLine],    list of SLines
+    :param:     s_lines:    [SLine],    list (or iterator) of SLines
     :param:     out_file_path   str,    string to the sqt output file path
     """
-    with open(out_file_path, "w") as file:
+    with open(out_file_path, "w", buffering=1_000_000) as file:
 
         for h_line in h_lines:
             file.write(h_line.serialize(version=version))
@@ -0,0 +1,62 @@
+from typing import Dict, Iterable, List, Union
+
+from .lines import MLine, SLine
+from ..patch import encode_field, patch_fields, read_fields, rewrite_lines
+
+FieldValue = Union[str, bytes, None]
+
+
+def set_m_line_columns(in_path: str, out_path: str, values: Dict[int, FieldValue]) -> None:
+    """
+    Sets columns of every M line to the same value, all other lines and columns are copied byte for byte.
+    :param:     in_path:    path to the sqt file
+    :param:     out_path:   path of the patched sqt file, may be in_path
+    :param:     values:     {column index: value}, ex: {MLineColumns_v2_1_0_ext.tims_score.value: '0'}, None is 'NA'
+    """
+    fields = {index: encode_field(val) for index, val in values.items()}
+    rewrite_lines(in_path, out_path, [MLine.LETTER], lambda line: patch_fields(line, fields))
+
+
+def patch_columns(in_path: str, out_path: str, letter: str, columns: Dict[int, Iterable[FieldValue]]) -> None:
+    """
+    Patches columns of the S or M lines of a sqt file with one value per line, in file order. All other lines and
+    columns are copied byte for byte.
+    :param:     in_path:    path to the sqt file
+    :param:     out_path:   path of the patched sqt file, may be in_path
+    :param:     letter:     SLine.LETTER or MLine.LETTER
+    :param:     columns:    {column index: values}, values are consumed one per line, None is 'NA'
+    """
+    iterators = {index: iter(values) for index, values in columns.items()}
+    missing = object()
+
+    def patch_line(line: bytes) -> bytes:
+        fields = {}
+        for index, iterator in iterators.items():
+            val = next(iterator, missing)
+            if val is missing:
+                raise ValueError(f"fewer values than {letter} lines for column {index}: {in_path}")
+            fields[index] = encode_field(val)
+        return patch_fields(line, fields)
+
+    def finish() -> List[bytes]:
+        for index, iterator in iterators.items():
+            if next(iterator, missing) is not missing:
+                raise ValueError(f"more values than {letter} lines for column {index}: {in_path}")
+        return []
+
+    rewrite_lines(in_path, out_path, [letter], patch_line, finish)
+
+
+def patch_m_line_columns(in_path: str, out_path: str, columns: Dict[int, Iterable[FieldValue]]) -> None:
+    patch_columns(in_path, out_path, MLine.LETTER, columns)
+
+
+def patch_s_line_columns(in_path: str, out_path: str, columns: Dict[int, Iterable[FieldValue]]) -> None:
+    patch_columns(in_path, out_path, SLine.LETTER, columns)
+
+
+def read_m_line_column(path: str, index: int) -> List[bytes]:
+    """
+    Returns the raw value of a column of every M line, None for M lines without the column
+    """
+    return list(read_fields(path, MLine.LETTER, index))
@@ -0,0 +1,50 @@
+import sys
+import time
+
+import numpy as np
+
+from APIO.abstract import PsmKDTree, PsmRedBlackTree, psm_in_bounds, get_mz_bounds, get_ook0_bounds, get_rt_bounds
+
+n_psms = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+n_queries = 100
+n_linear_queries = 3
+
+rng = np.random.default_rng(0)
+mz = rng.uniform(300, 1800, n_psms)
+ook0 = rng.uniform(0.6, 1.6, n_psms)
+rt = rng.uniform(0, 7200, n_psms)
+
+start = time.time()
+psms = [{"mz": mz_val, "ook0": ook0_val, "rt": rt_val, "score": 1.0} for mz_val, ook0_val, rt_val in
+        zip(mz.tolist(), ook0.tolist(), rt.tolist())]
+print(f"{n_psms} psm dicts: {time.time() - start:.2f}s")
+
+queries = []
+for i in rng.integers(0, n_psms, n_queries):
+    queries.append((get_mz_bounds(mz[i], 50), get_ook0_bounds(ook0[i], 0.05), get_rt_bounds(rt[i], 60)))
+
+start = time.time()
+linear_results = [[psm for psm in psms if psm_in_bounds(psm["mz"], psm["ook0"], psm["rt"], *bounds)]
+                  for bounds in queries[:n_linear_queries]]
+print(f"linear psm_in_bounds: {(time.time() - start) / n_linear_queries * 1000:.1f}ms/query")
+
+for tree_type in (PsmRedBlackTree, PsmKDTree):
+    start = time.time()
+    tree = tree_type.from_arrays(mz, ook0, rt, psms=psms)
+    build_time = time.time() - start
+
+    start = time.time()
+    results = [tree.search(*bounds) for bounds in queries]
+    search_time = (time.time() - start) / n_queries * 1000
+
+    for result, linear_result in zip(results, linear_results):
+        assert [id(psm) for psm in result] == [id(psm) for psm in linear_result]
+    print(f"{tree_type.__name__}: build {build_time:.2f}s, search {search_time:.3f}ms/query, "
+          f"{np.mean([len(result) for result in results]):.1f} psm's/query")
+
+    start = time.time()
+    for mz_val, ook0_val, rt_val in zip(mz[:10_000].tolist(), ook0[:10_000].tolist(), rt[:10_000].tolist()):
+        tree.add({"mz": mz_val, "ook0": ook0_val, "rt": rt_val, "score": 2.0})
+    print(f"{tree_type.__name__}: 10000 adds {time.time() - start:.2f}s, len {tree.len()}")
+    added_in_bounds = sum(psm_in_bounds(psm["mz"], psm["ook0"], psm["rt"], *queries[0]) for psm in tree.db[n_psms:])
+    assert len(tree.search(*queries[0])) == len(results[0]) + added_in_bounds
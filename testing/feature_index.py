@@ -0,0 +1,51 @@
+import sys
+import time
+
+import numpy as np
+
+from src.senpy.feature.index import NO_FEATURE, FeatureIndex
+
+n_features = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+n_precursors = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+n_loop_precursors = 50
+ppm, ook0_tolerance = 10, 0.05
+
+rng = np.random.default_rng(0)
+feature_mz = rng.uniform(300, 1500, n_features)
+feature_rt_start = rng.uniform(0, 120, n_features)
+feature_rt_end = feature_rt_start + rng.uniform(0.05, 1.0, n_features)
+feature_ook0 = rng.uniform(0.6, 1.6, n_features)
+feature_charge = rng.integers(1, 5, n_features)
+feature_ids = np.arange(n_features) * 3 + 7
+
+# half of the precursors are drawn from features, the rest are noise
+source = rng.integers(0, n_features, n_precursors)
+mz = np.where(np.arange(n_precursors) % 2 == 0, feature_mz[source] * (1 + rng.normal(0, 3e-6, n_precursors)),
+              rng.uniform(300, 1500, n_precursors))
+rt = feature_rt_start[source] + rng.uniform(0, 1, n_precursors) * (feature_rt_end[source] - feature_rt_start[source])
+ook0 = feature_ook0[source] + rng.normal(0, 0.01, n_precursors)
+charge = feature_charge[source]
+
+start = time.time()
+index = FeatureIndex(feature_mz, feature_rt_start, feature_rt_end, feature_ook0, feature_charge, feature_ids)
+print(f"FeatureIndex, {n_features} features: {time.time() - start:.2f}s")
+
+start = time.time()
+matches = index.query(mz, rt, ook0, charge, ppm=ppm, ook0_tolerance=ook0_tolerance)
+best_feature_ids = matches.get_best_feature_ids(n_precursors)
+print(f"query, {n_precursors} precursors: {time.time() - start:.2f}s, {len(matches)} matches, "
+      f"{np.count_nonzero(best_feature_ids != NO_FEATURE)} precursors matched")
+
+# nested loop reference on a subset
+start = time.time()
+offsets = matches.get_offsets(n_precursors)
+for i in range(n_loop_precursors):
+    expected = [feature_ids[j] for j in range(n_features)
+                if abs(feature_mz[j] - mz[i]) <= mz[i] * ppm / 1e6
+                and feature_rt_start[j] <= rt[i] <= feature_rt_end[j]
+                and abs(feature_ook0[j] - ook0[i]) <= ook0_tolerance
+                and feature_charge[j] == charge[i]]
+    assert sorted(expected) == sorted(matches.feature_ids[offsets[i]:offsets[i + 1]].tolist()), i
+elapsed = time.time() - start
+print(f"nested loop, {n_loop_precursors} precursors: {elapsed:.2f}s "
+      f"(~{elapsed / n_loop_precursors * n_precursors:.0f}s for all)")
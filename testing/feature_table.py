@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.senpy.feature.parser import parse_file
+from src.senpy.feature.table import read_feature_table
+
+n_features = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+BIOSAUR_HEADER = ['massCalib', 'rtApex', 'intensityApex', 'charge', 'nIsotopes', 'nScans', 'sulfur', 'cos_corr_1',
+                  'cos_corr_2', 'diff_for_output', 'corr_fill_zero', 'intensity_1', 'scan_id_1', 'mz_std_1',
+                  'intensity_2', 'scan_id_2', 'mz_std_2', 'mz', 'rtStart', 'rtEnd', 'id', 'ion_mobility', 'FAIMS',
+                  'targeted_mode']
+
+rng = np.random.default_rng(0)
+feature_path = os.path.join(tempfile.mkdtemp(), 'features.tsv')
+with open(feature_path, 'w') as file:
+    file.write('\t'.join(BIOSAUR_HEADER) + '\n')
+    for i in range(n_features):
+        n_1, n_2 = rng.integers(0, 12, 2)
+        row = [f"{rng.uniform(500, 4000):.5f}", f"{rng.uniform(0, 120):.4f}", f"{rng.uniform(1e3, 1e7):.1f}",
+               str(rng.integers(1, 5)), str(rng.integers(2, 6)), str(rng.integers(1, 30)), '0',
+               f"{rng.uniform():.4f}", f"{rng.uniform():.4f}", f"{rng.uniform():.4f}", f"{rng.uniform():.4f}",
+               str([round(float(v), 1) for v in rng.uniform(1, 1e5, n_1)]), str(rng.integers(0, 9999, n_1).tolist()),
+               f"{rng.uniform():.4f}",
+               str([round(float(v), 1) for v in rng.uniform(1, 1e5, n_2)]), str(rng.integers(0, 9999, n_2).tolist()),
+               f"{rng.uniform():.4f}", f"{rng.uniform(300, 1500):.5f}", f"{rng.uniform(0, 120):.4f}",
+               f"{rng.uniform(0, 120):.4f}", str(i), f"{rng.uniform(0.6, 1.6):.4f}", '0', '0']
+        file.write('\t'.join(row) + '\n')
+print(f"{n_features} biosaur features, {os.path.getsize(feature_path) / 1e6:.1f}MB")
+
+start = time.time()
+feature_lines = list(parse_file(feature_path))
+print(f"parse_file (FeatureLine per row): {time.time() - start:.2f}s")
+
+start = time.time()
+table = read_feature_table(feature_path)
+print(f"read_feature_table: {time.time() - start:.2f}s")
+
+assert len(table) == len(feature_lines) == n_features
+assert table.feature_format.name == 'biosaur'
+for name in ('neutral_mass', 'rt_apex', 'charge', 'mz', 'id', 'ion_mobility'):
+    assert np.array_equal(table[name], np.array([getattr(line, name) for line in feature_lines])), name
+for name in ('intensity_1', 'scan_id_1', 'intensity_2', 'scan_id_2'):
+    ragged = table[name]
+    assert len(ragged) == n_features
+    for i in range(0, n_features, 997):
+        assert np.array_equal(ragged[i], np.array(getattr(feature_lines[i], name), dtype=ragged.values.dtype)), name
+os.remove(feature_path)
@@ -0,0 +1,152 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from pyteomics import mass
+
+from src.senpy.dtaSelectFilter.parser import read_file as read_filter_file
+from src.senpy.fragment.annotate import ANNOTATION_COLUMNS, annotate_batch, annotate_files, \
+    build_scan_number_to_sequence_map, read_annotation_batches, write_annotation_table
+from src.senpy.fragment.engine import FragmentEngine
+from src.senpy.ms2.lines import ILine, Ms2Spectra
+from src.senpy.ms2.parser import read_file as read_ms2_file
+
+FILTER_PATH = os.path.join('sample_files', 'paser_dta_select.txt')
+FILTER_VERSION = 'v2.1.12_paser'
+ION_TYPES = ['b', 'y']
+CHARGES = [1, 2, 3]
+LOSSES = {'H20': 18.01051, 'NH3': 17.02647, 'CO': 27.99491, 'NA': 0}
+RESIDUE_MODIFICATIONS = {'C': 57.02146}
+MAX_PPM = 40
+
+
+def get_fragment_ions(peptide, ion_types, charges, losses, residue_modifications):
+    """
+    The per ion fragment_ion_extractor.py implementation for unmodified peptides, yields (ion code, mz)
+    """
+    for i in range(len(peptide)):
+        for ion_type in ion_types:
+            for loss_type in losses:
+                for charge in charges:
+                    ion_peptide = peptide[:i + 1] if ion_type in 'abc' else peptide[i:]
+                    frag_ion_mass = mass.fast_mass(ion_peptide, ion_type=ion_type, charge=charge)
+                    frag_ion_mass -= losses[loss_type] / charge
+                    frag_ion_mass += sum(ion_peptide.count(aa) * mass_shift
+                                         for aa, mass_shift in residue_modifications.items()) / charge
+                    yield f"{ion_type}{len(ion_peptide)}_{charge}_{loss_type}", frag_ion_mass
+
+
+def annotate_with_parsers(ms2_path, filter_path, file_name):
+    """
+    The get_fragment_ions_information loop before senpy.fragment.annotate, with the charge assert replaced by a skip.
+    Returns {scan: (sequence, charge, collision_energy, max_fragment_intensity, [(ion code, ppm, mz, intensity)])}
+    """
+    supported_residues = set('ARNDCQGEHILKMFPSTWYV')
+    _, dta_filter_results, _ = read_filter_file(filter_path, version=FILTER_VERSION)
+    dta_filter_dict = {}
+    for dta_filter_result in dta_filter_results:
+        for unique_line in dta_filter_result.peptide_lines:
+            if unique_line.file_name == file_name:
+                dta_filter_dict[unique_line.low_scan] = unique_line
+
+    annotations = {}
+    _, ms2_spectras = read_ms2_file(ms2_path)
+    for ms2_spectra in ms2_spectras:
+        unique_line = dta_filter_dict.get(ms2_spectra.s_line.low_scan)
+        if unique_line is None or ms2_spectra.z_line.charge != unique_line.charge:
+            continue
+
+        clean_sequence = unique_line.sequence[2:-2]
+        if not set(clean_sequence).issubset(supported_residues):
+            continue
+
+        fragment_ion_bins = {}
+        for fragment_ion in get_fragment_ions(clean_sequence, ION_TYPES, CHARGES, LOSSES, RESIDUE_MODIFICATIONS):
+            start_bin_key = int((fragment_ion[1] - fragment_ion[1] * MAX_PPM / 1_000_000) * 100)
+            end_bin_key = int((fragment_ion[1] + fragment_ion[1] * MAX_PPM / 1_000_000) * 100)
+            for bin_key in range(start_bin_key, end_bin_key + 1):
+                fragment_ion_bins.setdefault(bin_key, []).append(fragment_ion)
+
+        identified = []
+        for mz, intensity in zip(ms2_spectra.get_mz_spectra(), ms2_spectra.get_intensity_spectra()):
+            mz = float(mz)  # numpy 1 promoted float32 scalars to float64 here
+            for fragment_ion_code, fragment_ion_mass in fragment_ion_bins.get(int(mz * 100), []):
+                fragment_ion_ppm = (fragment_ion_mass - mz) / fragment_ion_mass * 1_000_000
+                if abs(fragment_ion_ppm) <= MAX_PPM:
+                    identified.append((fragment_ion_code, fragment_ion_ppm, mz, float(intensity)))
+
+        annotations[unique_line.low_scan] = (clean_sequence, unique_line.charge,
+                                             float(ms2_spectra.get_i_line_dict()[ILine.COLLISION_ENERGY_KEYWORD]),
+                                             float(max(ms2_spectra.get_intensity_spectra())), identified)
+    return annotations
+
+
+engine = FragmentEngine(ion_types=ION_TYPES, charges=CHARGES, losses=LOSSES,
+                        residue_modifications=RESIDUE_MODIFICATIONS)
+scan_number_to_sequence_map = build_scan_number_to_sequence_map(FILTER_PATH, 'test_run',
+                                                                dta_filter_version=FILTER_VERSION)
+
+# spectra of the identified scans: fragments shifted by up to 60 ppm plus noise, m/z on a 1/32 grid so the float32 peak
+# lines of the old parser hold the same values. Every 25th spectrum has a Z line charge the filter file does not list.
+rng = np.random.default_rng(0)
+work_dir = tempfile.mkdtemp()
+ms2_path = os.path.join(work_dir, 'test_run.ms2')
+charge_mismatch_scans = set()
+with open(ms2_path, 'w') as file:
+    file.write('H\tExtractor\tTimsTOF_extractor\n')
+    for i, (scan, (sequence, charge)) in enumerate(sorted(scan_number_to_sequence_map.items())):
+        if i % 25 == 0:
+            charge += 1
+            charge_mismatch_scans.add(scan)
+        fragment_mz = engine.fragment(sequence)['mz']
+        n_fragment_peaks = len(fragment_mz) // 4
+        mz_spectra = rng.choice(fragment_mz, n_fragment_peaks) * (1 + rng.uniform(-60e-6, 60e-6, n_fragment_peaks))
+        mz_spectra = np.unique(np.round(np.concatenate([mz_spectra, rng.uniform(100, 2000, 50)]) * 32) / 32)
+        file.write(Ms2Spectra.create(scan, scan, 500.0, charge, 998.0, mz_spectra,
+                                     np.round(rng.uniform(1, 1e4, len(mz_spectra)), 1),
+                                     {ILine.COLLISION_ENERGY_KEYWORD: f"{rng.uniform(20, 60):.2f}"}).serialize())
+
+start = time.time()
+expected = annotate_with_parsers(ms2_path, FILTER_PATH, 'test_run')
+print(f"parsers: {time.time() - start:.2f}s")
+assert len(expected) > 0 and charge_mismatch_scans.isdisjoint(expected)
+
+start = time.time()
+(annotated_path, table), = annotate_files([(ms2_path, FILTER_PATH)], engine, ppm=MAX_PPM, processes=2, batch_size=100,
+                                          dta_filter_version=FILTER_VERSION)
+print(f"annotate_files: {time.time() - start:.2f}s")
+assert annotated_path == ms2_path
+
+# one table row per identified fragment, rows of a scan ordered by peak
+expected_scans = {scan for scan, annotation in expected.items() if annotation[4]}
+assert set(table['scan_number'].tolist()) == expected_scans
+for scan in expected_scans:
+    sequence, charge, collision_energy, max_fragment_intensity, identified = expected[scan]
+    rows = np.flatnonzero(table['scan_number'] == scan)
+    assert np.all(np.diff(table['mz'][rows]) >= 0)
+    assert set(table['sequence'][rows]) == {sequence} and set(table['charge'][rows]) == {charge}
+    assert np.allclose(table['collision_energy'][rows], collision_energy)
+    assert np.all(table['max_fragment_intensity'][rows] == np.float32(max_fragment_intensity))
+
+    codes = [f"{ion_type}{number}_{fragment_charge}_{loss}" for ion_type, number, fragment_charge, loss in
+             zip(table['ion_type'][rows], table['number'][rows], table['fragment_charge'][rows], table['loss'][rows])]
+    actual = sorted(zip(codes, table['mz'][rows].tolist(), table['intensity'][rows].tolist(),
+                        table['ppm'][rows].tolist()))
+    identified = sorted((code, mz, intensity, ppm) for code, ppm, mz, intensity in identified)
+    assert [row[:3] for row in actual] == [row[:3] for row in identified], scan
+    assert np.allclose([row[3] for row in actual], [row[3] for row in identified], atol=1e-3), scan
+print(f"{len(table['scan_number'])} fragments in {len(expected_scans)} spectra match the parser implementation")
+
+# batches annotate the same rows as the pool
+batches = list(read_annotation_batches(ms2_path, scan_number_to_sequence_map, engine, ppm=MAX_PPM, batch_size=100))
+assert sum(len(batch) for batch in batches) == len(expected)
+batch_tables = [annotate_batch(batch) for batch in batches]
+for column in ANNOTATION_COLUMNS:
+    assert np.array_equal(np.concatenate([batch_table[column] for batch_table in batch_tables]), table[column])
+
+out_path = os.path.join(work_dir, 'test_run.ions.tsv')
+write_annotation_table(table, out_path)
+df = pd.read_csv(out_path, sep='\t')
+assert list(df.columns) == ANNOTATION_COLUMNS and len(df) == len(table['scan_number'])
@@ -0,0 +1,92 @@
+import random
+import time
+
+import numpy as np
+from pyteomics import mass
+
+from src.senpy.fragment.engine import FragmentEngine
+from src.senpy.fragment.peptide import get_ptm_index_dict, remove_ptm
+
+ION_TYPES = ['b', 'y']
+CHARGES = [1, 2, 3]
+LOSSES = {'H20': 18.01051, 'NH3': 17.02647, 'CO': 27.99491, 'NA': 0}
+RESIDUE_MODIFICATIONS = {'C': 57.02146}
+
+
+def get_fragment_ions(peptide, ion_types, charges, losses, residue_modifications):
+    """
+    The per ion fragment_ion_extractor.py implementation before FragmentEngine, yields (ion_type, number, charge,
+    loss_type, mz)
+    """
+    ptm_dict = get_ptm_index_dict(peptide)
+    clean_peptide = remove_ptm(peptide)
+
+    for i in range(len(clean_peptide)):
+        for ion_type in ion_types:
+            for loss_type in losses:
+                for charge in charges:
+                    if ion_type in 'abc':
+                        ion_peptide = clean_peptide[:i + 1]
+                        ptm_list = [ptm_mass for aa_index, ptm_mass in ptm_dict.items() if aa_index <= i]
+                    else:
+                        ion_peptide = clean_peptide[i:]
+                        ptm_list = [ptm_mass for aa_index, ptm_mass in ptm_dict.items() if aa_index >= i]
+
+                    frag_ion_mass = mass.fast_mass(ion_peptide, ion_type=ion_type, charge=charge)
+                    frag_ion_mass -= losses[loss_type] / charge
+                    frag_ion_mass += sum(ion_peptide.count(aa) * mass_shift
+                                         for aa, mass_shift in residue_modifications.items()) / charge
+                    frag_ion_mass += sum(ptm_list) / charge
+                    yield ion_type, len(ion_peptide), charge, loss_type, frag_ion_mass
+
+
+def get_ladder(ions):
+    return {(ion_type, int(number), int(charge), loss): mz
+            for ion_type, number, charge, loss, mz in ions}
+
+
+def assert_same_ladder(peptide, engine):
+    expected = get_ladder(get_fragment_ions(peptide, ION_TYPES, CHARGES, LOSSES, RESIDUE_MODIFICATIONS))
+    ions = engine.fragment(peptide)
+    actual = get_ladder(zip(ions['ion_type'], ions['number'], ions['charge'], ions['loss'], ions['mz']))
+    assert actual.keys() == expected.keys(), peptide
+
+    # the per ion implementation dropped n-terminal ptm's (keyed -1) from the full length y ion
+    n_term_mass = get_ptm_index_dict(peptide).get(-1, 0.0)
+    peptide_length = len(remove_ptm(peptide))
+    for ion_type, number, charge, loss in expected:
+        if ion_type == 'y' and number == peptide_length:
+            expected[ion_type, number, charge, loss] += n_term_mass / charge
+    max_error = max(abs(actual[key] - expected[key]) for key in expected)
+    assert max_error < 1e-9, f"{peptide}: {max_error}"
+    return actual
+
+
+engine = FragmentEngine(ion_types=ION_TYPES, charges=CHARGES, losses=LOSSES,
+                        residue_modifications=RESIDUE_MODIFICATIONS)
+
+# n-terminal ptm's belong to the first residue: every b ion carries the mass, no y ion does
+unmodified = assert_same_ladder("PEPCK", engine)
+modified = assert_same_ladder("(42.0106)PEPCK", engine)
+for (ion_type, number, charge, loss), mz in modified.items():
+    shift = (mz - unmodified[ion_type, number, charge, loss]) * charge
+    expected_shift = 42.0106 if ion_type == 'b' or number == 5 else 0.0
+    assert abs(shift - expected_shift) < 1e-9, (ion_type, number, charge, loss, shift)
+
+for peptide in ["(42.0106)M(15.994915)PEPCK", "PEPC(57.02146)TIDE", "PEPTIDEK(114.04293)", "(42.0106)A"]:
+    assert_same_ladder(peptide, engine)
+
+random.seed(0)
+peptides = []
+for _ in range(2_000):
+    residues = random.choices('ACDEFGHIKLMNPQRSTVWY', k=random.randint(7, 30))
+    if random.random() < 0.5:
+        index = random.randrange(len(residues))
+        residues[index] += f"({random.choice([15.994915, 79.96633, 114.04293])})"
+    peptide = ''.join(residues)
+    peptides.append(f"(42.0106){peptide}" if random.random() < 0.3 else peptide)
+
+start = time.time()
+for peptide in peptides:
+    assert_same_ladder(peptide, engine)
+print(f"{len(peptides)} peptides match the per ion implementation: {time.time() - start:.2f}s")
@@ -0,0 +1,73 @@
+import random
+import time
+
+import numpy as np
+
+from src.senpy.fragment.engine import FragmentEngine
+from src.senpy.fragment.matcher import match_fragment_ions
+
+
+def match_with_bins(fragment_mz, mz_spectra, intensity_spectra, max_ppm=40):
+    """
+    The fragment_ion_extractor.py matching before match_fragment_ions: fragments are put in 0.01 m/z bins covering
+    their ppm window, each peak looks up its bin. Returns {(fragment_index, peak_index): (ppm, mz, intensity)}
+    """
+    fragment_ion_bins = {}
+    for fragment_index, fragment_ion_mass in enumerate(fragment_mz):
+        start_bin_key = int((fragment_ion_mass - fragment_ion_mass * max_ppm / 1_000_000) * 100)
+        end_bin_key = int((fragment_ion_mass + fragment_ion_mass * max_ppm / 1_000_000) * 100)
+        for bin_key in range(start_bin_key, end_bin_key + 1):
+            fragment_ion_bins.setdefault(bin_key, []).append(fragment_index)
+
+    matches = {}
+    for peak_index, (mz, intensity) in enumerate(zip(mz_spectra, intensity_spectra)):
+        for fragment_index in fragment_ion_bins.get(int(mz * 100), []):
+            fragment_ion_ppm = (fragment_mz[fragment_index] - mz) / fragment_mz[fragment_index] * 1_000_000
+            if abs(fragment_ion_ppm) <= max_ppm:
+                matches[fragment_index, peak_index] = (fragment_ion_ppm, mz, intensity)
+    return matches
+
+
+engine = FragmentEngine(ion_types=['b', 'y'], charges=[1, 2, 3],
+                        losses={'H20': 18.01051, 'NH3': 17.02647, 'CO': 27.99491, 'NA': 0},
+                        residue_modifications={'C': 57.02146})
+
+random.seed(0)
+rng = np.random.default_rng(0)
+spectra = []
+for _ in range(500):
+    fragment_mz = engine.fragment(''.join(random.choices('ACDEFGHIKLMNPQRSTVWY', k=random.randint(7, 30))))['mz']
+
+    # half of the peaks are fragments shifted by up to 60 ppm, the rest is noise
+    n_peaks = int(rng.integers(20, 400))
+    matched_mz = rng.choice(fragment_mz, n_peaks // 2)
+    matched_mz = matched_mz * (1 + rng.uniform(-60e-6, 60e-6, len(matched_mz)))
+    mz_spectra = np.sort(np.concatenate([matched_mz, rng.uniform(100, 2000, n_peaks - len(matched_mz))]))
+    spectra.append((fragment_mz, mz_spectra, rng.uniform(1, 1e5, n_peaks)))
+
+# unsorted peaks are matched by their input index
+fragment_mz, mz_spectra, intensity_spectra = spectra[0]
+shuffle = rng.permutation(len(mz_spectra))
+spectra.append((fragment_mz, mz_spectra[shuffle], intensity_spectra[shuffle]))
+
+start = time.time()
+expected = [match_with_bins(*spectrum) for spectrum in spectra]
+print(f"bins: {time.time() - start:.2f}s")
+
+start = time.time()
+actual = [match_fragment_ions(*spectrum, ppm=40) for spectrum in spectra]
+print(f"match_fragment_ions: {time.time() - start:.2f}s")
+
+n_matches = 0
+for expected_matches, matches in zip(expected, actual):
+    assert np.all(np.diff(matches.peak_indexes) >= 0)
+    pairs = list(zip(matches.fragment_indexes.tolist(), matches.peak_indexes.tolist()))
+    assert len(set(pairs)) == len(pairs) and set(pairs) == expected_matches.keys()
+    for pair, ppm, mz, intensity in zip(pairs, matches.ppm_errors, matches.mz, matches.intensities):
+        assert abs(ppm - expected_matches[pair][0]) < 1e-9
+        assert mz == expected_matches[pair][1] and intensity == expected_matches[pair][2]
+    n_matches += len(matches)
+print(f"{n_matches} matches in {len(spectra)} spectra equal the binned matching")
+
+matches = match_fragment_ions(fragment_mz, np.empty(0), np.empty(0))
+assert len(matches) == 0 and len(matches.ppm_errors) == 0
@@ -0,0 +1,48 @@
+import random
+import time
+
+import numpy as np
+from pyteomics import mass
+
+from src.senpy.fragment.engine import FragmentEngine
+from src.senpy.fragment.fragmer import Fragmer, STANDARD_AMINO_ACIDS
+
+
+def get_pyteomics_fragments(peptide, ion_types=('b', 'y'), charge=1):
+    ions = []
+    for ion_type in ion_types:
+        for i in range(1, len(peptide) + 1):
+            if ion_type in 'abc':
+                ions.append(mass.fast_mass(peptide[:i], ion_type=ion_type, charge=charge))
+            else:
+                ions.append(mass.fast_mass(peptide[len(peptide) - i:], ion_type=ion_type, charge=charge))
+    return np.array(ions).reshape(len(ion_types), len(peptide))
+
+
+random.seed(0)
+peptides = ["".join(random.choices(STANDARD_AMINO_ACIDS, k=random.randint(7, 30))) for _ in range(10_000)]
+
+start = time.time()
+pyteomics_fragments = [get_pyteomics_fragments(peptide) for peptide in peptides]
+print(f"pyteomics: {time.time() - start:.3f}s")
+
+for k in (1, 2, 3, 4):
+    start = time.time()
+    fragmer = Fragmer(k=k)
+    build_time = time.time() - start
+
+    start = time.time()
+    ladders = fragmer.fragment_peptides(peptides)
+    mz = ladders.get_mz(charge=1)
+    print(f"fragmer k={k}: table {fragmer.kmer_table.nbytes / 1e6:.1f}MB built in {build_time:.3f}s, "
+          f"fragment_peptides: {time.time() - start:.3f}s")
+
+    max_error = max(np.abs(mz[:, ladders.offsets[i]:ladders.offsets[i + 1]] - pyteomics_fragments[i]).max()
+                    for i in range(len(peptides)))
+    print(f"max error vs pyteomics: {max_error:.2e}")
+
+fragmer = Fragmer(k=3, modified_residues=['M(15.994915)'], residue_modifications={'C': 57.02146})
+engine = FragmentEngine(charges=[1], residue_modifications={'C': 57.02146})
+peptide = "PEPM(15.994915)TIDCE"
+print(fragmer.fragment_peptides([peptide]).get_mz(charge=1))
+print(engine.fragment(peptide)['mz'].reshape(2, -1))
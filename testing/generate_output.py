@@ -0,0 +1,146 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from generate_output import generate_output
+from src.senpy.dtaSelectFilter.parser import read_file as parse_filter
+from src.senpy.ms2.fast_parser import read_file
+from src.senpy.ms2.lines import ILine, Ms2Spectra
+from src.senpy.ms2.scan_map import ScanPrecursorMap
+from src.senpy.out.line import OutLine
+from src.senpy.out.parser import write_file
+
+FILTER_PATH = os.path.join('sample_files', 'paser_dta_select.txt')
+FILTER_VERSION = 'v2.1.12_paser'
+KEYWORDS = dict(retention_time_keyword=ILine.RETENTION_TIME_KEYWORD, ook0_keyword=ILine.OOK0_KEYWORD,
+                ccs_keyword=ILine.CCS_KEYWORD, collision_energy_keyword=ILine.COLLISION_ENERGY_KEYWORD,
+                precursor_intensity_keyword=ILine.PRECURSOR_INTENSITY_KEYWORD,
+                ook0_spectra_keyword=ILine.OOK0_SPECTRA_KEYWORD, ccs_spectra_keyword=ILine.CCS_SPECTRA_KEYWORD,
+                intensity_spectra_keyword=ILine.INTENSITY_SPECTRA_KEYWORD,
+                mz_spectra_keyword=ILine.MZ_SPECTRA_KEYWORD)
+
+
+def generate_output_with_parsers(ms2_path, filter_path, out_path, sn2p_path=None, retention_time_keyword=None,
+                                 ook0_keyword=None, ccs_keyword=None, collision_energy_keyword=None,
+                                 precursor_intensity_keyword=None, ook0_spectra_keyword=None, ccs_spectra_keyword=None,
+                                 intensity_spectra_keyword=None, mz_spectra_keyword=None, dta_filter_version=None):
+    """
+    The generate_output.py implementation before the streaming pipeline: both files are parsed into lists and every
+    OutLine is kept until the end
+    """
+    ms2_file_name = os.path.basename(ms2_path).split(".ms2")[0]
+
+    precursor_id_to_scan_number_map = {}
+    if sn2p_path:
+        with open(sn2p_path) as file:
+            for line in file:
+                line_elems = line.rstrip().split('\t')
+                precursor_id_to_scan_number_map[int(line_elems[1])] = int(line_elems[0])
+
+    peptide_line_by_scan_number_map = {}
+    _, dta_filter_results, _ = parse_filter(filter_path, version=dta_filter_version)
+    for filter_result in dta_filter_results:
+        for peptide_line in filter_result.peptide_lines:
+            if peptide_line.file_name == ms2_file_name:
+                peptide_line_by_scan_number_map[peptide_line.low_scan] = peptide_line
+
+    out_lines = []
+    _, ms2_spectras = read_file(ms2_path)
+    for ms2_spectra in ms2_spectras:
+        ms2_scan_number = int(ms2_spectra.s_line.get_low_scan())
+        if sn2p_path:
+            if int(ms2_spectra.get_precursor_id()) not in precursor_id_to_scan_number_map:
+                continue
+            ms2_scan_number = precursor_id_to_scan_number_map[int(ms2_spectra.get_precursor_id())]
+
+        if ms2_scan_number in peptide_line_by_scan_number_map:
+            peptide_line = peptide_line_by_scan_number_map[ms2_scan_number]
+            out_lines.append(OutLine(
+                scan_number=peptide_line.low_scan, sequence=peptide_line.sequence, charge=peptide_line.charge,
+                mass=ms2_spectra.z_line.get_mass(), mz=ms2_spectra.s_line.get_mz(), x_corr=peptide_line.x_corr,
+                retention_time=ms2_spectra.get_retention_time(keyword=retention_time_keyword),
+                OOK0=ms2_spectra.get_ook0(keyword=ook0_keyword), CCS=ms2_spectra.get_ccs(keyword=ccs_keyword),
+                collision_energy=ms2_spectra.get_collision_energy(keyword=collision_energy_keyword),
+                precursor_intensity=ms2_spectra.get_precursor_intensity(keyword=precursor_intensity_keyword),
+                OOK0_spectra=ms2_spectra.get_ook0_spectra(keyword=ook0_spectra_keyword),
+                CCS_spectra=ms2_spectra.get_ccs_spectra(keyword=ccs_spectra_keyword),
+                intensity_spectra=ms2_spectra.get_mobility_intensity_spectra(keyword=intensity_spectra_keyword),
+                mz_spectra=ms2_spectra.get_mobility_mz_spectra(keyword=mz_spectra_keyword)))
+
+    write_file(out_lines, out_path)
+
+
+def get_array_value(values):
+    return str([float(f"{val:.4f}") for val in values])
+
+
+def write_ms2(ms2_path, scans, precursor_ids, rng):
+    with open(ms2_path, 'w') as file:
+        file.write('H\tExtractor\tTimsTOF_extractor\n')
+        for scan, precursor_id in zip(scans, precursor_ids):
+            n_peaks, n_mobility_points = int(rng.integers(0, 30)), int(rng.integers(1, 6))
+            info = {ILine.PRECURSOR_ID_KEYWORD: f"{precursor_id}",
+                    ILine.RETENTION_TIME_KEYWORD: f"{rng.uniform(0, 7200):.4f}",
+                    ILine.OOK0_KEYWORD: f"{rng.uniform(0.6, 1.6):.4f}",
+                    ILine.CCS_KEYWORD: f"{rng.uniform(300, 600):.4f}",
+                    ILine.COLLISION_ENERGY_KEYWORD: f"{rng.uniform(20, 60):.2f}",
+                    ILine.PRECURSOR_INTENSITY_KEYWORD: f"{rng.uniform(1e3, 1e6):.1f}",
+                    ILine.OOK0_SPECTRA_KEYWORD: get_array_value(rng.uniform(0.6, 1.6, n_mobility_points)),
+                    ILine.CCS_SPECTRA_KEYWORD: get_array_value(rng.uniform(300, 600, n_mobility_points)),
+                    ILine.INTENSITY_SPECTRA_KEYWORD: get_array_value(rng.uniform(1, 1e4, n_mobility_points)),
+                    ILine.MZ_SPECTRA_KEYWORD: get_array_value(rng.uniform(100, 1800, n_mobility_points))}
+            file.write(Ms2Spectra.create(scan, scan, rng.uniform(300, 1500), int(rng.integers(1, 5)),
+                                         rng.uniform(600, 4000), np.sort(rng.uniform(100, 1800, n_peaks)),
+                                         rng.uniform(1, 1e4, n_peaks), info).serialize())
+
+
+def assert_same_output(expected_path, actual_path, n_rows):
+    with open(expected_path) as expected_file, open(actual_path) as actual_file:
+        expected, actual = expected_file.read(), actual_file.read()
+    # header line plus one line per row
+    assert actual == expected and actual.count('\n') == n_rows + 1 and n_rows > 0
+
+
+rng = np.random.default_rng(0)
+work_dir = tempfile.mkdtemp()
+_, dta_filter_results, _ = parse_filter(FILTER_PATH, version=FILTER_VERSION)
+filter_scans = sorted({peptide_line.low_scan for result in dta_filter_results for peptide_line in result.peptide_lines})
+
+# every identified scan plus unidentified ones, in shuffled order
+ms2_scans = rng.permutation(np.concatenate([filter_scans, np.arange(1, 2000) * 3 + 1]))
+ms2_scans = ms2_scans[~np.isin(ms2_scans, filter_scans) | (rng.random(len(ms2_scans)) < 0.9)]
+ms2_path = os.path.join(work_dir, 'test_run.ms2')
+write_ms2(ms2_path, ms2_scans.tolist(), (np.arange(len(ms2_scans)) + 1).tolist(), rng)
+
+expected_path, actual_path = os.path.join(work_dir, 'expected.out'), os.path.join(work_dir, 'actual.out')
+start = time.time()
+generate_output_with_parsers(ms2_path, FILTER_PATH, expected_path, dta_filter_version=FILTER_VERSION, **KEYWORDS)
+print(f"parsers: {time.time() - start:.2f}s")
+
+start = time.time()
+n_rows = generate_output(ms2_path=ms2_path, filter_path=FILTER_PATH, out_path=actual_path,
+                         dta_filter_version=FILTER_VERSION, **KEYWORDS)
+print(f"generate_output: {time.time() - start:.2f}s")
+assert_same_output(expected_path, actual_path, n_rows)
+print(f"{n_rows} out rows match the parser implementation")
+
+# with an sn2p map the filter scans refer to a searched ms2 file, spectra are joined on precursor id
+sn2p_precursor_ids = rng.permutation(len(filter_scans)) + 10_000
+sn2p_path = os.path.join(work_dir, 'test_run.sn2p.txt')
+with open(sn2p_path, 'w') as file:
+    for scan, precursor_id in zip(filter_scans, sn2p_precursor_ids.tolist()):
+        file.write(f"{scan}\t{precursor_id}\n")
+precursor_ids = np.concatenate([sn2p_precursor_ids[:-20], np.arange(500) + 50_000])
+write_ms2(ms2_path, (np.arange(len(precursor_ids)) + 1).tolist(), rng.permutation(precursor_ids).tolist(), rng)
+
+binary_sn2p_path = os.path.join(work_dir, 'test_run.sn2p')
+ScanPrecursorMap.load(sn2p_path).save(binary_sn2p_path)
+for sn2p in (sn2p_path, binary_sn2p_path):
+    generate_output_with_parsers(ms2_path, FILTER_PATH, expected_path, sn2p_path=sn2p_path,
+                                 dta_filter_version=FILTER_VERSION, **KEYWORDS)
+    n_rows = generate_output(ms2_path=ms2_path, filter_path=FILTER_PATH, out_path=actual_path, sn2p_path=sn2p,
+                             dta_filter_version=FILTER_VERSION, **KEYWORDS)
+    assert_same_output(expected_path, actual_path, n_rows)
+    print(f"{n_rows} out rows match the parser implementation with {os.path.basename(sn2p)}")
@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from src.senpy.ip2_project.batch import MANIFEST_FILE_NAME, SearchJob, discover_search_jobs, run_batch
+from src.senpy.ip2_project.file_types import Ip2FileType
+
+FAILING_SEARCH = 'search_1002'
+
+
+def get_output(job: SearchJob) -> Path:
+    return job.search / 'task.out'
+
+
+def task(job: SearchJob) -> int:
+    if job.search.name == FAILING_SEARCH and not (job.search / 'fixed').exists():
+        raise ValueError('task failed')
+    sqt = job.get_file(Ip2FileType.SQT)
+    with open(get_output(job), 'w') as file:
+        file.write(sqt.read_text())
+    return os.path.getsize(sqt)
+
+
+def run(project, **kwargs):
+    return run_batch(project, task, [Ip2FileType.SQT], task_name='test', processes=2,
+                     get_outputs=lambda job: [get_output(job)], **kwargs)
+
+
+if __name__ == '__main__':
+    project = Path(tempfile.mkdtemp())
+    # four experiments with one search each, the last one has no sqt and is skipped
+    for i in range(4):
+        search = project / f"experiment_{i}" / 'search' / f"search_{1000 + i}"
+        search.mkdir(parents=True)
+        (search / 'DTASelect-filter.txt').write_text('filter')
+        if i < 3:
+            (search / f"sample_{i}.sqt").write_text(f"sqt {i}")
+
+    jobs = discover_search_jobs(project, [Ip2FileType.SQT])
+    assert sorted(job.search.name for job in jobs) == ['search_1000', 'search_1001', 'search_1002']
+    manifest_path = project / MANIFEST_FILE_NAME.format(task_name='test')
+
+    # the failing search is not recorded, the others are
+    results = run(project)
+    assert sorted(search.name for search in results) == ['search_1000', 'search_1001']
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+    assert len(manifest) == 2
+    assert all(entry['outputs'] == [str(Path(search) / 'task.out')] for search, entry in manifest.items())
+
+    # only the failed search reruns
+    (project / 'experiment_2' / 'search' / FAILING_SEARCH / 'fixed').write_text('')
+    assert [search.name for search in run(project)] == [FAILING_SEARCH]
+    assert run(project) == {}
+
+    # changed inputs and missing outputs rerun, force reruns everything
+    (project / 'experiment_0' / 'search' / 'search_1000' / 'sample_0.sqt').write_text('sqt 0, rewritten')
+    os.remove(project / 'experiment_1' / 'search' / 'search_1001' / 'task.out')
+    assert sorted(search.name for search in run(project)) == ['search_1000', 'search_1001']
+    assert run(project) == {}
+    assert len(run(project, force=True)) == 3
+
+    # search ids select searches
+    assert [search.name for search in run(project, force=True, search_ids=['1001'])] == ['search_1001']
+
+    shutil.rmtree(project)
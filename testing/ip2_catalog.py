@@ -0,0 +1,90 @@
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from src.senpy.ip2_project.catalog import ProjectCatalog
+from src.senpy.ip2_project.experiment import get_latest_search_from_experiment, get_oldest_search_from_experiment, \
+    get_search_by_id_from_experiment, get_searches_from_experiment
+from src.senpy.ip2_project.file_types import Ip2FileType
+from src.senpy.ip2_project.project import get_experiments_in_project, get_latest_search_per_experiment, \
+    get_oldest_per_experiment, get_searches_matching_ids
+from src.senpy.ip2_project.search import get_file_from_search
+
+
+def add_search(project: Path, experiment: str, search_id: int, file_names) -> Path:
+    search = project / experiment / 'search' / f"projects2022_05_18_19_{search_id}"
+    search.mkdir(parents=True)
+    for file_name in file_names:
+        (search / file_name).write_text(file_name)
+    time.sleep(0.01)  # distinct ctimes, searches and experiments are ordered by ctime
+    return search
+
+
+def assert_same(project: Path, catalog: ProjectCatalog):
+    experiments = get_experiments_in_project(project)
+    assert catalog.get_experiments() == experiments
+    for experiment in experiments:
+        assert catalog.get_searches(experiment) == get_searches_from_experiment(experiment)
+        for search_id in ['157895', '157896', '1']:
+            assert catalog.get_search_by_id(experiment, search_id) == \
+                   get_search_by_id_from_experiment(experiment, search_id)
+        for search in get_searches_from_experiment(experiment):
+            for file_type in Ip2FileType:
+                assert catalog.get_file(search, file_type) == get_file_from_search(search, file_type), \
+                    (search, file_type)
+    # the project functions raise on an experiment without searches, the catalog skips it
+    with_searches = [experiment for experiment in experiments if get_searches_from_experiment(experiment)]
+    assert catalog.get_latest_search_per_experiment() == \
+           [get_latest_search_from_experiment(experiment) for experiment in with_searches]
+    assert [catalog.get_oldest_search(experiment) for experiment in with_searches] == \
+           [get_oldest_search_from_experiment(experiment) for experiment in with_searches]
+    if len(with_searches) == len(experiments):
+        assert catalog.get_latest_search_per_experiment() == get_latest_search_per_experiment(project)
+        assert [catalog.get_oldest_search(experiment) for experiment in experiments] == \
+               get_oldest_per_experiment(project)
+    for search_ids in (['157895'], ['157896', '157895'], ['999999']):
+        assert catalog.get_searches_matching_ids(search_ids) == get_searches_matching_ids(project, search_ids)
+
+
+if __name__ == '__main__':
+    project = Path(tempfile.mkdtemp())
+    (project / 'default_params').mkdir()
+    (project / 'activeExpList.txt').write_text('')
+
+    search_id = 157890
+    for i in range(4):
+        experiment = f"experiment_{i}"
+        for j in range(3):
+            search_id += 1
+            file_names = ['sample.ms2', 'sample.sqt', 'DTASelect.txt', 'DTASelect-filter.txt'][:4 - j]
+            add_search(project, experiment, search_id, file_names)
+        (project / experiment / 'search' / 'luciphor_ptm_out_final.txt').write_text('')
+    assert_same(project, ProjectCatalog(project))
+    (project / 'experiment_empty' / 'search').mkdir(parents=True)
+    assert_same(project, ProjectCatalog(project))
+    assert ProjectCatalog(project).get_searches_with_id('157895') == get_searches_matching_ids(project, ['157895'])
+
+    # a snapshot picks up new searches and experiments and matches a fresh walk
+    snapshot_path = project / 'default_params' / 'catalog.json'
+    ProjectCatalog(project, snapshot_path=snapshot_path)
+    assert snapshot_path.exists()
+    add_search(project, 'experiment_1', 200000, ['new.ms2'])
+    add_search(project, 'experiment_new', 200001, ['new.sqt'])
+    assert_same(project, ProjectCatalog(project, snapshot_path=snapshot_path))
+
+    # a rescanned search (now the latest by ctime) is written back, later runs reuse it without rescanning
+    search = project / 'experiment_2' / 'search' / 'projects2022_05_18_19_157898'
+    (search / 'DTASelect-filter.txt').write_text('DTASelect-filter.txt')
+    assert_same(project, ProjectCatalog(project, snapshot_path=snapshot_path))
+    snapshot_experiment, = [experiment for experiment in json.loads(snapshot_path.read_text())['experiments']
+                            if experiment['name'] == 'experiment_2']
+    assert snapshot_experiment['searches'][-1]['name'] == search.name
+    assert 'DTASelect-filter.txt' in [file['name'] for file in snapshot_experiment['searches'][-1]['files']]
+    snapshot_mtime_ns = snapshot_path.stat().st_mtime_ns
+    time.sleep(0.01)
+    assert_same(project, ProjectCatalog(project, snapshot_path=snapshot_path))
+    assert snapshot_path.stat().st_mtime_ns == snapshot_mtime_ns
+
+    shutil.rmtree(project)
@@ -0,0 +1,95 @@
+import ast
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.senpy.ms2.lines import ILine, Ms2Spectra
+from src.senpy.ms2.mobility_store import MobilitySpectraWriter, get_mobility_store_path
+from src.senpy.ms2.parser import read_file
+
+n_spectra = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+n_mobility_points = 200
+n_passes = 3
+
+SPECTRA_KEYWORDS = [ILine.OOK0_SPECTRA_KEYWORD, ILine.CCS_SPECTRA_KEYWORD, ILine.MZ_SPECTRA_KEYWORD,
+                    ILine.INTENSITY_SPECTRA_KEYWORD]
+
+
+def old_get_spectra(ms2_spectra, keyword):
+    # previous accessor: i line dict rebuilt and literal_eval on every call
+    val = {i_line.keyword: i_line.val for i_line in ms2_spectra.i_lines}.get(keyword)
+    return [float(i) for i in ast.literal_eval(val)] if val else val
+
+
+def old_get_float(ms2_spectra, keyword):
+    val = {i_line.keyword: i_line.val for i_line in ms2_spectra.i_lines}.get(keyword)
+    return float(val) if val else val
+
+
+rng = np.random.default_rng(0)
+tmp_dir = tempfile.mkdtemp()
+ms2_path = os.path.join(tmp_dir, 'mobility.ms2')
+store_ms2_path = os.path.join(tmp_dir, 'mobility_store.ms2')
+with open(ms2_path, 'w') as file, open(store_ms2_path, 'w') as store_file, \
+        MobilitySpectraWriter(get_mobility_store_path(store_ms2_path)) as writer:
+    for scan in range(1, n_spectra + 1):
+        info_dict = {ILine.PRECURSOR_ID_KEYWORD: f"{scan}", ILine.RETENTION_TIME_KEYWORD: f"{scan * 0.1:.4f}",
+                     ILine.OOK0_KEYWORD: f"{rng.uniform(0.6, 1.6):.4f}"}
+        store_info_dict = dict(info_dict)
+        mobility_spectra = {keyword: np.round(rng.uniform(0, 2000, n_mobility_points), 4)
+                            for keyword in SPECTRA_KEYWORDS}
+        for keyword in SPECTRA_KEYWORDS:
+            info_dict[keyword] = str(mobility_spectra[keyword].tolist())
+        store_info_dict[ILine.MOBILITY_SPECTRA_INDEX_KEYWORD] = str(writer.add(mobility_spectra))
+
+        peaks, intensities = np.sort(rng.uniform(100, 1800, 50)), rng.uniform(1, 1e4, 50)
+        file.write(Ms2Spectra.create(scan, scan, 500.0, 2, 998.0, peaks, intensities, info_dict).serialize())
+        store_file.write(Ms2Spectra.create(scan, scan, 500.0, 2, 998.0, peaks, intensities,
+                                           store_info_dict).serialize())
+print(f"{n_spectra} spectra, {n_mobility_points} mobility points, I lines: {os.path.getsize(ms2_path) / 1e6:.1f}MB, "
+      f"store: {os.path.getsize(store_ms2_path) / 1e6:.1f}MB ms2 + "
+      f"{os.path.getsize(get_mobility_store_path(store_ms2_path)) / 1e6:.1f}MB side store")
+
+start = time.time()
+_, ms2_spectras = read_file(ms2_path)
+print(f"read_file: {time.time() - start:.2f}s")
+
+start = time.time()
+old_values = []
+for _ in range(n_passes):
+    old_values = [[old_get_float(ms2_spectra, ILine.RETENTION_TIME_KEYWORD)] +
+                  [old_get_spectra(ms2_spectra, keyword) for keyword in SPECTRA_KEYWORDS]
+                  for ms2_spectra in ms2_spectras]
+print(f"old accessors, {n_passes} passes: {time.time() - start:.2f}s")
+
+start = time.time()
+new_values = []
+for _ in range(n_passes):
+    new_values = [[ms2_spectra.get_retention_time(), ms2_spectra.get_ook0_spectra(), ms2_spectra.get_ccs_spectra(),
+                   ms2_spectra.get_mobility_mz_spectra(), ms2_spectra.get_mobility_intensity_spectra()]
+                  for ms2_spectra in ms2_spectras]
+print(f"cached accessors, {n_passes} passes: {time.time() - start:.2f}s")
+
+for old_row, new_row in zip(old_values, new_values):
+    assert old_row[0] == new_row[0]
+    for old_val, new_val in zip(old_row[1:], new_row[1:]):
+        assert np.array_equal(np.array(old_val), new_val)
+
+start = time.time()
+_, store_ms2_spectras = read_file(store_ms2_path)
+store_values = [[ms2_spectra.get_retention_time(), ms2_spectra.get_ook0_spectra(), ms2_spectra.get_ccs_spectra(),
+                 ms2_spectra.get_mobility_mz_spectra(), ms2_spectra.get_mobility_intensity_spectra()]
+                for ms2_spectra in store_ms2_spectras]
+print(f"side store read_file + accessors: {time.time() - start:.2f}s")
+
+for new_row, store_row in zip(new_values, store_values):
+    assert new_row[0] == store_row[0]
+    for new_val, store_val in zip(new_row[1:], store_row[1:]):
+        assert np.array_equal(new_val.astype(np.float32), store_val)
+
+del store_ms2_spectras, store_values
+for path in (ms2_path, store_ms2_path, get_mobility_store_path(store_ms2_path)):
+    os.remove(path)
@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.senpy.ms2.fast_lines import ILine as FastILine
+from src.senpy.ms2.fast_parser import read_file as read_file_fast
+from src.senpy.ms2.fast_parser import write_file as write_file_fast
+from src.senpy.ms2.lines import ILine, Ms2Spectra
+from src.senpy.ms2.merge import merge_index_peaks
+from src.senpy.ms2.parser import read_file
+from src.senpy.ms2.scan_map import MISSING, ScanPrecursorMap, get_scan_map_path, lookup_sorted
+
+n_spectra = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+keyword_map = {'OOK0': ILine.OOK0_KEYWORD, 'Retention_Time': ILine.RETENTION_TIME_KEYWORD}
+
+rng = np.random.default_rng(0)
+work_dir = tempfile.mkdtemp()
+ms2_path, index_path = os.path.join(work_dir, 'merge.ms2'), os.path.join(work_dir, 'merge.ms2.index')
+header = 'H\tExtractor\tTimsTOF_extractor\n'
+
+# precursor ids of the ms2 file are shuffled, some are repeated (the last spectrum wins) and some index spectra have
+# no peaks in the ms2 file. m/z are on a 1/32 grid so the float32 parse of the old merge writes them back unchanged.
+ms2_precursor_ids = rng.permutation(n_spectra) + 1
+ms2_precursor_ids[::50] = ms2_precursor_ids[1::50]
+with open(ms2_path, 'w') as file:
+    file.write(header)
+    for scan, precursor_id in enumerate(ms2_precursor_ids.tolist(), start=1):
+        n_peaks = int(rng.integers(1, 60))
+        file.write(Ms2Spectra.create(scan, scan, 500.0, 2, 998.0,
+                                     np.sort(rng.integers(100 * 32, 1800 * 32, n_peaks)) / 32,
+                                     np.round(rng.uniform(1, 1e4, n_peaks), 1),
+                                     {ILine.PRECURSOR_ID_KEYWORD: f"{precursor_id}"}).serialize())
+
+with open(index_path, 'w') as file:
+    file.write(header)
+    for scan, precursor_id in enumerate(range(1, n_spectra + 11), start=1):
+        file.write(Ms2Spectra.create(scan, scan, 500.0, 2, 998.0, np.empty(0), np.empty(0),
+                                     {ILine.PRECURSOR_ID_KEYWORD: f"{precursor_id}", 'OOK0': f"{scan * 1e-4:.4f}",
+                                      'Retention_Time': f"{scan * 0.1:.4f}", 'OOK0_Spectra': '[1.0]'}).serialize())
+
+
+def merge_with_parsers(ms2_path, index_path, out_path):
+    """
+    The merge_index_ms2.py merge before merge_index_peaks: both files are parsed, I line keywords are renamed on the
+    keyword column
+    """
+    _, ms2_spectras = read_file(ms2_path)
+    h_lines, ms2_index_spectras = read_file_fast(index_path)
+
+    ms2_precursor_ids = np.array([int(ms2_spectra.get_precursor_id()) for ms2_spectra in ms2_spectras], dtype=np.int64)
+    index_precursor_ids = np.array([int(ms2_index_spectra.get_precursor_id())
+                                    for ms2_index_spectra in ms2_index_spectras], dtype=np.int64)
+    sorted_precursor_ids, first_reversed = np.unique(ms2_precursor_ids[::-1], return_index=True)
+    last_positions = np.append(len(ms2_precursor_ids) - 1 - first_reversed, MISSING)
+    positions = last_positions[lookup_sorted(sorted_precursor_ids, index_precursor_ids)]
+
+    for ms2_index_spectra, position in zip(ms2_index_spectras, positions.tolist()):
+        if position != MISSING:
+            ms2_index_spectra.peak_lines = ms2_spectras[position].peak_lines
+        for i_line in ms2_index_spectra.i_lines:
+            keyword = i_line.get_keyword()
+            if keyword in keyword_map:
+                i_line.line = FastILine(f"I\t{keyword_map[keyword]}\t{i_line.get_value()}\n").line
+
+    write_file_fast(h_lines, ms2_index_spectras, out_path)
+    scan_numbers = [int(ms2_index_spectra.s_line.get_low_scan()) for ms2_index_spectra in ms2_index_spectras]
+    ScanPrecursorMap(scan_numbers, index_precursor_ids).save(get_scan_map_path(out_path))
+
+
+expected_path, merged_path = os.path.join(work_dir, 'expected.ms2'), os.path.join(work_dir, 'merged.ms2')
+start = time.time()
+merge_with_parsers(ms2_path, index_path, expected_path)
+print(f"parser merge: {time.time() - start:.2f}s")
+start = time.time()
+scan_map = merge_index_peaks(index_path, ms2_path, merged_path, keyword_map=keyword_map)
+print(f"merge_index_peaks: {time.time() - start:.2f}s")
+
+with open(expected_path, 'rb') as expected_file, open(merged_path, 'rb') as merged_file:
+    expected, merged = expected_file.read(), merged_file.read()
+# fast_parser.write_file drops the final newline, merge_index_peaks keeps it
+assert merged == expected + b'\n'
+with open(get_scan_map_path(expected_path), 'rb') as expected_file, \
+        open(get_scan_map_path(merged_path), 'rb') as merged_file:
+    assert merged_file.read() == expected_file.read()
+assert len(scan_map) == n_spectra + 10
+assert b'OOK0\t' not in merged and b'I\tOOK0_Spectra\t' in merged
+
+# the merged file may replace the peak bearing ms2 file in place
+merge_index_peaks(index_path, ms2_path, ms2_path, keyword_map=keyword_map)
+with open(ms2_path, 'rb') as file:
+    assert file.read() == merged
+assert not os.path.exists(ms2_path + '.tmp')
+
+for file_name in os.listdir(work_dir):
+    os.remove(os.path.join(work_dir, file_name))
+os.rmdir(work_dir)
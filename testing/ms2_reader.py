@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.senpy.ms2 import exceptions as ms2_exceptions, reader
+from src.senpy.ms2.lines import ILine, Ms2Spectra, decode_peak_lines
+
+n_spectra = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+n_peaks = 100
+
+rng = np.random.default_rng(0)
+ms2_path = os.path.join(tempfile.mkdtemp(), 'reader.ms2')
+with open(ms2_path, 'w') as file:
+    file.write('H\tExtractor\tTimsTOF_extractor\n')
+    for scan in range(1, n_spectra + 1):
+        info_dict = {ILine.PRECURSOR_ID_KEYWORD: f"{scan}", ILine.RETENTION_TIME_KEYWORD: f"{scan * 0.1:.4f}"}
+        file.write(Ms2Spectra.create(scan, scan, rng.uniform(300, 1500), 2, 998.0,
+                                     np.sort(rng.uniform(100, 1800, n_peaks)), rng.uniform(1, 1e4, n_peaks),
+                                     info_dict).serialize())
+print(f"{n_spectra} spectra, {n_peaks} peaks each, {os.path.getsize(ms2_path) / 1e6:.1f}MB")
+
+results = {}
+for materialize in reader.MATERIALIZE_LEVELS:
+    start = time.time()
+    h_lines, ms2_spectras = reader.read_file(ms2_path, materialize=materialize)
+    print(f"read_file materialize={materialize}: {time.time() - start:.2f}s")
+    results[materialize] = ms2_spectras
+
+start = time.time()
+n_incremental = sum(1 for _ in reader.read_file_incrementally(ms2_path, materialize=reader.HEADER))
+print(f"read_file_incrementally materialize=header: {time.time() - start:.2f}s")
+
+# every level sees the same spectra, including the final one
+assert n_incremental == n_spectra
+for materialize, ms2_spectras in results.items():
+    assert len(ms2_spectras) == n_spectra, materialize
+    assert ms2_spectras[-1].get_precursor_id() == str(n_spectra), materialize
+    assert ms2_spectras[-1].get_retention_time() == results[reader.OBJECTS][-1].get_retention_time(), materialize
+
+for raw, arrays, objects in zip(results[reader.RAW], results[reader.ARRAYS], results[reader.OBJECTS]):
+    assert np.array_equal(np.array([float(mz) for mz in raw.get_mz_spectra()]), arrays.get_mz_spectra())
+    assert np.array_equal(np.array(objects.get_mz_spectra()), arrays.get_mz_spectra().astype(np.float32))
+    assert np.array_equal(np.array(objects.get_intensity_spectra()), arrays.get_intensity_spectra())
+assert all(len(ms2_spectra.peak_lines) == 0 for ms2_spectra in results[reader.HEADER])
+
+# lazy spectra decode on first access and write their peak block back unchanged
+lazy_spectras = results[reader.LAZY]
+with open(ms2_path) as file:
+    assert ''.join(ms2_spectra.serialize() for ms2_spectra in lazy_spectras) == file.read().split('\n', 1)[1]
+assert not any(ms2_spectra.is_decoded() for ms2_spectra in lazy_spectras)
+start = time.time()
+for ms2_spectra in lazy_spectras:
+    ms2_spectra.get_mz_spectra()
+print(f"decode lazy peak blocks: {time.time() - start:.2f}s")
+for lazy, arrays in zip(lazy_spectras, results[reader.ARRAYS]):
+    assert np.array_equal(lazy.get_mz_spectra(), arrays.get_mz_spectra())
+    assert np.array_equal(lazy.get_intensity_spectra(), arrays.get_intensity_spectra())
+    lazy.set_peaks(arrays.get_mz_spectra()[:10], arrays.get_intensity_spectra()[:10])
+    arrays.mz_array, arrays.intensity_array = arrays.mz_array[:10], arrays.intensity_array[:10]
+    assert lazy.serialize() == arrays.serialize()
+os.remove(ms2_path)
+
+# lines whose extra and missing columns add up to an even token count are still rejected, not mis-paired
+malformed_path = os.path.join(tempfile.mkdtemp(), 'malformed.ms2')
+with open(malformed_path, 'w') as file:
+    file.write('H\tExtractor\tTimsTOF_extractor\n')
+    file.write('S\t000001\t000001\t500.00000\nZ\t2\t998.00000\n100.0 1.0 5.0\n200.0\n')
+(lazy_spectra,) = reader.read_file(malformed_path, materialize=reader.LAZY)[1]
+try:
+    lazy_spectra.get_mz_spectra()
+    raise AssertionError('lazy level accepted a malformed peak block')
+except ms2_exceptions.Ms2FileDeserializationPeakLineException:
+    pass
+os.remove(malformed_path)
+
+# the arrays level takes one peak per line like the objects level, blank or merged lines are rejected
+for peak_lines in [['100.0 1.0 5.0\n', '200.0\n'], ['100.0 1.0\n', '\n'], ['100.0 1.0', '200.0 2.0\n']]:
+    try:
+        decode_peak_lines(peak_lines)
+        raise AssertionError(f"arrays level accepted {peak_lines}")
+    except ms2_exceptions.Ms2FileDeserializationPeakLineException:
+        pass
+assert np.array_equal(decode_peak_lines(['100.0 1.0\n', '200.0 2.0'])[0], [100.0, 200.0])
@@ -0,0 +1,59 @@
+import sys
+import time
+
+import numpy as np
+
+from src.senpy.ms2_refactor import exceptions as ms2_exceptions
+from src.senpy.ms2_refactor.lines import ILine, PeakLine, SLine, ZLine
+from src.senpy.ms2_refactor.serializers import PeakLineSerializer, ILineSerializer, SLineSerializer, \
+    ZLineSerializer, decode_peaks, encode_peaks
+
+n_peaks = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+rng = np.random.default_rng(0)
+mz = np.round(np.sort(rng.uniform(100, 1800, n_peaks)), 5)
+intensity = np.round(rng.uniform(1, 1e4, n_peaks), 1).astype(np.float32)
+serializer = PeakLineSerializer()
+
+
+def timed(name, func):
+    start = time.time()
+    result = func()
+    print(f"{name}: {time.time() - start:.3f}s")
+    return result
+
+
+looped_block = timed('serialize per line', lambda: ''.join([serializer.serialize(PeakLine(m, i))
+                                                            for m, i in zip(mz.tolist(), intensity.tolist())]))
+block = timed('encode_peaks', lambda: encode_peaks(mz, intensity))
+assert block == looped_block
+
+lines = block.splitlines(keepends=True)
+peak_lines = timed('deserialize per line', lambda: [PeakLineSerializer.deserialize(line) for line in lines])
+decoded_mz, decoded_intensity = timed('decode_peaks block', lambda: decode_peaks(block))
+assert np.array_equal(decoded_mz, mz) and np.array_equal(decoded_intensity, intensity)
+assert np.array_equal(np.array([peak_line.intensity for peak_line in peak_lines]), intensity)
+assert np.array_equal(np.array([peak_line.mz for peak_line in peak_lines]), mz.astype(np.float32))
+lines_mz, lines_intensity = timed('decode_peaks lines', lambda: decode_peaks(lines))
+assert np.array_equal(lines_mz, mz) and np.array_equal(lines_intensity, intensity)
+assert np.array_equal(decode_peaks('\n' + ''.join(lines[:100]) + '\n')[0], mz[:100])
+
+# precision config is kept per column
+assert PeakLineSerializer(MZ_PRECISION=2, INTENSITY_PRECISION=0).encode_peaks(mz[:1], intensity[:1]) == \
+       f"{mz[0]:.2f} {intensity[0]:.0f}\n"
+assert encode_peaks(np.empty(0), np.empty(0)) == ''
+assert len(decode_peaks('')[0]) == 0
+
+for bad_block in ['100.0 1.0\n200.0\n', '100.0 1.0 5.0\n200.0\n', ['100.0 1.0\n', '\n']]:
+    try:
+        decode_peaks(bad_block)
+        raise AssertionError(bad_block)
+    except ms2_exceptions.Ms2FileDeserializationPeakLineException:
+        pass
+
+# the other serializers write the line they are given
+assert ZLineSerializer().serialize(ZLine(2, 1887.9438)) == 'Z\t2\t1887.94380\n'
+assert ZLineSerializer.deserialize('Z\t2\t1887.94380\n') == ZLine(np.uint8(2), np.float32(1887.9438))
+assert ILineSerializer.serialize(ILine('RetTime', '1.3691')) == 'I\tRetTime\t1.3691\n'
+assert SLineSerializer().serialize(SLine(9, 9, 944.4755)) == 'S\t000009\t000009\t944.47550\n'
+assert SLineSerializer.deserialize('S\t000009\t000009\t944.47550\n') == SLine(9, 9, 944.4755)
@@ -0,0 +1,85 @@
+import ast
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.senpy.out.codec import OutFileWriter, read_out_table
+from src.senpy.out.line import OutLine
+from src.senpy.out.parser import read_file
+
+n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+n_mobility_points = 100
+
+
+def old_serialize(out_line):
+    # previous OutLine.serialize list formatting, the precursor_intensity trailing space is dropped
+    def fmt_list(vals, precision):
+        return str([f"{val:.{precision}f}" for val in vals]).replace("'", "")
+    return '\t'.join([str(out_line.scan_number), out_line.sequence, f"{out_line.charge}",
+                      f"{out_line.mass:.{OutLine.MASS_PRECISION}f}", f"{out_line.mz:.{OutLine.MZ_PRECISION}f}",
+                      f"{out_line.x_corr:.{OutLine.X_CORR_PRECISION}f}",
+                      f"{out_line.retention_time:.{OutLine.RETENTION_TIME_PRECISION}f}",
+                      f"{out_line.OOK0:.{OutLine.OOK0_PRECISION}f}", f"{out_line.CCS:.{OutLine.CCS_PRECISION}f}",
+                      f"{out_line.collision_energy:.{OutLine.COLLISION_ENERGY_PRECISION}f}",
+                      f"{out_line.precursor_intensity:.{OutLine.INTENSITY_PRECISION}f}",
+                      fmt_list(out_line.OOK0_spectra, OutLine.OOK0_PRECISION),
+                      fmt_list(out_line.CCS_spectra, OutLine.CCS_PRECISION),
+                      fmt_list(out_line.intensity_spectra, OutLine.INTENSITY_PRECISION),
+                      fmt_list(out_line.mz_spectra, OutLine.MZ_PRECISION)]) + '\n'
+
+
+def old_deserialize_lists(line):
+    return [[float(val) for val in ast.literal_eval(elem)] for elem in line.rstrip().split('\t')[11:]]
+
+
+rng = np.random.default_rng(0)
+out_lines = []
+for scan in range(1, n_rows + 1):
+    n_points = int(rng.integers(0, n_mobility_points))
+    out_lines.append(OutLine(scan_number=scan, sequence='K.PEPTIDE.R', charge=int(rng.integers(1, 5)),
+                             mass=rng.uniform(500, 4000), mz=rng.uniform(300, 1500), x_corr=rng.uniform(0, 6),
+                             retention_time=rng.uniform(0, 7200), OOK0=rng.uniform(0.6, 1.6),
+                             CCS=rng.uniform(300, 700), collision_energy=rng.uniform(20, 60),
+                             precursor_intensity=rng.uniform(1e3, 1e6),
+                             OOK0_spectra=rng.uniform(0.6, 1.6, n_points), CCS_spectra=rng.uniform(300, 700, n_points),
+                             intensity_spectra=rng.uniform(1, 1e4, n_points),
+                             mz_spectra=rng.uniform(300, 1500, n_points)))
+
+out_path = os.path.join(tempfile.mkdtemp(), 'codec.out')
+start = time.time()
+old_rows = [old_serialize(out_line) for out_line in out_lines]
+print(f"old serialize, {n_rows} rows: {time.time() - start:.2f}s")
+
+start = time.time()
+with OutFileWriter(out_path) as writer:
+    for out_line in out_lines:
+        writer.write_line(out_line)
+print(f"OutFileWriter: {time.time() - start:.2f}s")
+
+with open(out_path) as file:
+    assert file.readline() == OutLine.get_header()
+    assert file.read() == ''.join(old_rows)
+
+start = time.time()
+old_lists = [old_deserialize_lists(row) for row in old_rows]
+print(f"old literal_eval list columns: {time.time() - start:.2f}s")
+
+start = time.time()
+read_lines = read_file(out_path)
+print(f"read_file (OutLine per row): {time.time() - start:.2f}s")
+
+start = time.time()
+table = read_out_table(out_path)
+print(f"read_out_table: {time.time() - start:.2f}s")
+
+assert len(table) == len(read_lines) == n_rows
+assert np.array_equal(table['scan_number'], [out_line.scan_number for out_line in read_lines])
+assert np.array_equal(table['x_corr'], [out_line.x_corr for out_line in read_lines])
+for i in range(0, n_rows, 101):
+    for j, name in enumerate(('OOK0_spectra', 'CCS_spectra', 'intensity_spectra', 'mz_spectra')):
+        assert np.array_equal(table[name][i], old_lists[i][j]), name
+        assert getattr(read_lines[i], name) == old_lists[i][j], name
+os.remove(out_path)
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from src.senpy.ms2.lines import ILine, Ms2Spectra
+from src.senpy.ms2.patch import patch_i_line_values
+from src.senpy.sqt.columns import MLineColumns_v2_1_0_ext
+from src.senpy.sqt.patch import patch_m_line_columns, patch_s_line_columns, read_m_line_column, set_m_line_columns
+
+sqt_path = os.path.join('sample_files', 'sample_timscore.sqt')
+work_dir = tempfile.mkdtemp()
+TIMS_SCORE = MLineColumns_v2_1_0_ext.tims_score.value
+TIMS_B_SCORE_M2 = MLineColumns_v2_1_0_ext.tims_b_score_m2.value
+
+
+def read_lines(path):
+    with open(path, 'rb') as file:
+        return file.readlines()
+
+
+def assert_only_columns_changed(in_path, out_path, letter, columns):
+    """
+    Every line not starting with letter is unchanged, lines starting with letter only differ in columns
+    """
+    in_lines, out_lines = read_lines(in_path), read_lines(out_path)
+    assert len(in_lines) == len(out_lines)
+    for in_line, out_line in zip(in_lines, out_lines):
+        if in_line[:1] != letter.encode():
+            assert in_line == out_line
+            continue
+        assert in_line[len(in_line.rstrip(b'\r\n')):] == out_line[len(out_line.rstrip(b'\r\n')):]
+        in_fields, out_fields = in_line.rstrip(b'\r\n').split(b'\t'), out_line.rstrip(b'\r\n').split(b'\t')
+        for index in range(max(len(in_fields), len(out_fields))):
+            if index not in columns:
+                assert in_fields[index] == out_fields[index], (index, in_line, out_line)
+
+
+def assert_fails_untouched(func, path):
+    with open(path, 'rb') as file:
+        before = file.read()
+    try:
+        func()
+        raise AssertionError(f"{func} did not raise")
+    except ValueError:
+        pass
+    with open(path, 'rb') as file:
+        assert file.read() == before
+    assert not os.path.exists(path + '.tmp')
+
+
+# set one column of every M line, a column past the end of the line is appended
+out_path = os.path.join(work_dir, 'set.sqt')
+set_m_line_columns(sqt_path, out_path, {TIMS_SCORE: '0', TIMS_B_SCORE_M2: None})
+assert_only_columns_changed(sqt_path, out_path, 'M', {TIMS_SCORE, TIMS_B_SCORE_M2})
+assert set(read_m_line_column(out_path, TIMS_SCORE)) == {b'0'}
+assert set(read_m_line_column(out_path, TIMS_B_SCORE_M2)) == {b'NA'}
+
+# one value per line, in file order
+n_m_lines = len(read_m_line_column(sqt_path, TIMS_SCORE))
+tims_scores = [f"{val:.4f}" for val in np.linspace(0, 1, n_m_lines)]
+out_path = os.path.join(work_dir, 'patched.sqt')
+patch_m_line_columns(sqt_path, out_path, {TIMS_SCORE: tims_scores})
+assert_only_columns_changed(sqt_path, out_path, 'M', {TIMS_SCORE})
+assert read_m_line_column(out_path, TIMS_SCORE) == [val.encode() for val in tims_scores]
+
+# value count mismatches raise and leave the file intact, also when patching in place
+in_place_path = os.path.join(work_dir, 'in_place.sqt')
+shutil.copy(sqt_path, in_place_path)
+assert_fails_untouched(lambda: patch_m_line_columns(in_place_path, in_place_path, {TIMS_SCORE: tims_scores[:-1]}),
+                       in_place_path)
+assert_fails_untouched(lambda: patch_m_line_columns(in_place_path, in_place_path,
+                                                    {TIMS_SCORE: tims_scores + ['1.0']}), in_place_path)
+assert_fails_untouched(lambda: patch_s_line_columns(in_place_path, in_place_path, {9: ['1']}), in_place_path)
+patch_m_line_columns(in_place_path, in_place_path, {TIMS_SCORE: tims_scores})
+assert read_lines(in_place_path) == read_lines(out_path)
+
+# ms2 I lines: existing values are replaced, missing keywords are added, None leaves the spectrum as is
+rng = np.random.default_rng(0)
+ms2_path = os.path.join(work_dir, 'patch.ms2')
+n_spectra = 200
+with open(ms2_path, 'w') as file:
+    file.write('H\tExtractor\tTimsTOF_extractor\n')
+    for scan in range(1, n_spectra + 1):
+        file.write(Ms2Spectra.create(scan, scan, rng.uniform(300, 1500), 2, 998.0,
+                                     np.sort(rng.uniform(100, 1800, 20)), rng.uniform(1, 1e4, 20),
+                                     {ILine.PRECURSOR_ID_KEYWORD: f"{scan}",
+                                      ILine.RETENTION_TIME_KEYWORD: f"{scan * 0.1:.4f}"}).serialize())
+
+retention_times = [f"{scan * 0.2:.4f}" for scan in range(1, n_spectra + 1)]
+ook0s = [None if scan % 3 == 0 else f"{scan * 1e-3:.4f}" for scan in range(1, n_spectra + 1)]
+out_path = os.path.join(work_dir, 'patched.ms2')
+patch_i_line_values(ms2_path, out_path, {ILine.RETENTION_TIME_KEYWORD: retention_times, ILine.OOK0_KEYWORD: ook0s})
+
+in_lines, out_lines = read_lines(ms2_path), read_lines(out_path)
+assert [line for line in in_lines if line[:1] != b'I'] == [line for line in out_lines if line[:1] != b'I']
+rt_prefix, ook0_prefix = f"I\t{ILine.RETENTION_TIME_KEYWORD}\t".encode(), f"I\t{ILine.OOK0_KEYWORD}\t".encode()
+assert [line[len(rt_prefix):].rstrip() for line in out_lines if line.startswith(rt_prefix)] == \
+       [val.encode() for val in retention_times]
+assert [line[len(ook0_prefix):].rstrip() for line in out_lines if line.startswith(ook0_prefix)] == \
+       [val.encode() for val in ook0s if val is not None]
+precursor_prefix = f"I\t{ILine.PRECURSOR_ID_KEYWORD}\t".encode()
+assert [line for line in in_lines if line.startswith(precursor_prefix)] == \
+       [line for line in out_lines if line.startswith(precursor_prefix)]
+
+shutil.copy(ms2_path, in_place_path)
+assert_fails_untouched(lambda: patch_i_line_values(in_place_path, in_place_path,
+                                                   {ILine.RETENTION_TIME_KEYWORD: retention_times[:-1]}),
+                       in_place_path)
+assert_fails_untouched(lambda: patch_i_line_values(in_place_path, in_place_path,
+                                                   {ILine.RETENTION_TIME_KEYWORD: retention_times + ['1.0']}),
+                       in_place_path)
+
+shutil.rmtree(work_dir)
@@ -0,0 +1,68 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from Bio.SeqUtils.ProtParam import ProteinAnalysis
+
+from sqt_to_percolator import PIN_COLUMNS, compute_bull_breese, get_pin_table
+from src.senpy.sqt import parser as sqt_parser
+
+SQT_PATH = os.path.join('sample_files', 'sample_timscore.sqt')
+
+BB_MAP = {aa: bb for aa, bb in zip('ARNDCEQGHILKMFPSTWYV', [610, 690, 890, 610, 360, 970, 510, 810, 690, -1450, -1650,
+                                                           460, -660, -1520, -170, 420, 290, -1200, -1430, -750])}
+
+
+def get_pin_rows(sqt):
+    """
+    The per m line convert_sqt_to_pin before the columnar pin table, returns one list of PIN_COLUMNS values per psm
+    """
+    _, s_lines = sqt_parser.read_file(sqt)
+
+    rows = []
+    for s_line in s_lines:
+        for i, m_line in enumerate(s_line.m_lines):
+            if i > 0 or m_line.xcorr == 0 or i == len(s_line.m_lines) - 1:
+                continue
+            proteins = [l_line.locus_name for l_line in m_line.l_lines]
+            if len(proteins) == 0:
+                continue
+
+            unmod_seq = "".join([c for c in m_line.get_clean_seq() if c.isalpha()])
+            analysis = ProteinAnalysis(unmod_seq)
+            charges = [int(s_line.charge == charge) for charge in range(1, 5)]
+            rows.append([len(rows), -1 if m_line.is_reverse() else 1, s_line.low_scan, s_line.experimental_mass,
+                         m_line.calculated_mass, len(unmod_seq), *charges, m_line.sp, analysis.aromaticity(),
+                         analysis.instability_index(), analysis.gravy(), *analysis.secondary_structure_fraction(),
+                         sum(BB_MAP[aa] for aa in unmod_seq) / len(unmod_seq),
+                         0 if m_line.tims_score is None else m_line.tims_score,
+                         0 if m_line.predicted_ook0 is None else m_line.predicted_ook0,
+                         m_line.xcorr, s_line.m_lines[i + 1].delta_cn, m_line.sequence, " ".join(proteins)])
+    return rows
+
+
+start = time.time()
+expected = pd.DataFrame(get_pin_rows(SQT_PATH), columns=PIN_COLUMNS)
+print(f"per m line: {time.time() - start:.2f}s")
+
+start = time.time()
+pin_table = get_pin_table(SQT_PATH)
+print(f"get_pin_table: {time.time() - start:.2f}s")
+
+assert list(pin_table.columns) == PIN_COLUMNS and len(pin_table) == len(expected) > 0
+for column in PIN_COLUMNS:
+    if not pd.api.types.is_numeric_dtype(expected[column]):
+        assert pin_table[column].tolist() == expected[column].tolist(), column
+    else:
+        assert np.allclose(pin_table[column].to_numpy(np.float64), expected[column].to_numpy(np.float64)), column
+print(f"{len(pin_table)} pin rows match the per m line implementation")
+
+# residues without a Bull-Breese value are rejected, as the BB_MAP lookup did
+assert np.allclose(compute_bull_breese(['PEPTIDE', 'K']), [sum(BB_MAP[aa] for aa in 'PEPTIDE') / 7, BB_MAP['K']])
+for sequence in ['PEPXK', 'PEPTIDEk', 'BZU']:
+    try:
+        compute_bull_breese(['PEPTIDE', sequence])
+        raise AssertionError(sequence)
+    except KeyError:
+        pass
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.senpy.ms2 import fast_parser as fast_ms2_parser
+from src.senpy.ms2.lines import ILine, Ms2Spectra
+from src.senpy.rt_score.engine import calculate_scores, convert_mod_sequence, generate_rt_score_sqt, \
+    get_retention_times, is_valid_sequence, read_psm_columns, score_psms
+from src.senpy.rt_score.predictors import CompositionPredictor
+from src.senpy.sqt import parser as sqt_parser
+
+SQT_PATH = os.path.join('sample_files', 'sample_timscore.sqt')
+
+
+def generate_rt_score_sqt_per_psm(sqt_file, ms2_file, out_file, predictor, retention_time_keyword):
+    """
+    The rtScore.py generate_rt_score_sqt before senpy.rt_score, with DeepLC swapped for a RetentionTimePredictor
+    """
+    _, ms2_spectras = fast_ms2_parser.read_file(ms2_file)
+    h_lines, s_lines = sqt_parser.read_file(sqt_file)
+
+    rt_by_sn_map = {int(ms2_spectra.s_line.get_low_scan()): float(ms2_spectra.get_retention_time(
+        keyword=retention_time_keyword)) for ms2_spectra in ms2_spectras}
+
+    data = {'ip2_seq': [], 'tr': [], 'reverse': [], 'xcorr': [], 'm_line_number': []}
+    for s_line in s_lines:
+        for i, m_line in enumerate(s_line.m_lines):
+            data['ip2_seq'].append(m_line.sequence)
+            data['tr'].append(rt_by_sn_map[s_line.low_scan])
+            data['xcorr'].append(m_line.xcorr)
+            data['reverse'].append(m_line.is_reverse())
+            data['m_line_number'].append(i)
+
+    df = pd.DataFrame(data)
+    df['clean_seq'] = [seq[2:-2] for seq in df.ip2_seq]
+    df['modifications'] = ["|".join(convert_mod_sequence(seq)[0]) for seq in df.clean_seq]
+    df['seq'] = [convert_mod_sequence(seq)[1] for seq in df.clean_seq]
+    df['is_valid'] = [is_valid_sequence(seq) for seq in df.seq]
+
+    x_corr_percentile = np.percentile(df[(~df.reverse) & (df.m_line_number == 0)].xcorr, 95)
+    align_df = df[(~df.reverse) & (df.xcorr >= x_corr_percentile) & df.is_valid & (df.m_line_number == 0)]
+    predictor.calibrate(align_df.seq.tolist(), align_df.modifications.tolist(), align_df.tr.to_numpy())
+
+    prediction_df = df[df.is_valid].copy()
+    prediction_df['pred_rt'] = predictor.predict(prediction_df.seq.tolist(), prediction_df.modifications.tolist())
+    prediction_df_targets = prediction_df[(prediction_df.xcorr >= x_corr_percentile) & (~prediction_df.reverse) &
+                                          (prediction_df.m_line_number == 0)]
+    rt_std = np.std(prediction_df_targets.tr - prediction_df_targets.pred_rt)
+    pred_rt_by_seq_dict = {seq: rt for seq, rt in zip(prediction_df.ip2_seq, prediction_df.pred_rt)}
+
+    for s_line in s_lines:
+        experimental_rt = rt_by_sn_map[s_line.low_scan]
+        s_line.experimental_ook0 = experimental_rt
+        for m_line in s_line.m_lines:
+            if m_line.sequence in pred_rt_by_seq_dict and m_line.xcorr != 0:
+                m_line.predicted_ook0 = pred_rt_by_seq_dict[m_line.sequence]
+                m_line.tims_score = float(calculate_scores([experimental_rt - m_line.predicted_ook0], rt_std)[0])
+            else:
+                m_line.predicted_ook0 = None
+                m_line.tims_score = None
+
+    sqt_parser.write_file(h_lines, s_lines, out_file, version="v2.1.0_ext")
+
+
+def get_scored_values(sqt_file):
+    _, s_lines = sqt_parser.read_file(sqt_file, version="v2.1.0_ext")
+    experimental = [s_line.experimental_ook0 for s_line in s_lines]
+    predicted = [m_line.predicted_ook0 for s_line in s_lines for m_line in s_line.m_lines]
+    scores = [m_line.tims_score for s_line in s_lines for m_line in s_line.m_lines]
+    return experimental, predicted, scores
+
+
+def assert_same_values(actual, expected, name):
+    assert len(actual) == len(expected), name
+    assert [val is None for val in actual] == [val is None for val in expected], name
+    assert np.allclose([val for val in actual if val is not None], [val for val in expected if val is not None],
+                       rtol=1e-4, atol=1e-4), name
+
+
+# retention times follow the composition of the top hit, so the composition model has something to fit
+work_dir = tempfile.mkdtemp()
+ms2_path = os.path.join(work_dir, 'sample_timscore.ms2')
+rng = np.random.default_rng(0)
+residue_rts = dict(zip(CompositionPredictor.AMINO_ACIDS, rng.uniform(-1, 3, len(CompositionPredictor.AMINO_ACIDS))))
+_, s_lines = sqt_parser.read_file(SQT_PATH)
+with open(ms2_path, 'w') as file:
+    file.write('H\tExtractor\tTimsTOF_extractor\n')
+    for s_line in s_lines:
+        top_sequence = convert_mod_sequence(s_line.m_lines[0].sequence[2:-2])[1] if s_line.m_lines else ''
+        rt = 10 + sum(residue_rts.get(aa, 0) for aa in top_sequence) + rng.normal(0, 2)
+        file.write(Ms2Spectra.create(s_line.low_scan, s_line.low_scan, 500.0, s_line.charge, 998.0,
+                                     np.array([200.5, 300.25]), np.array([10.0, 20.0]),
+                                     {ILine.RETENTION_TIME_KEYWORD: f"{rt:.4f}"}).serialize())
+
+expected_path, actual_path = os.path.join(work_dir, 'expected.sqt'), os.path.join(work_dir, 'actual.sqt')
+start = time.time()
+generate_rt_score_sqt_per_psm(SQT_PATH, ms2_path, expected_path, CompositionPredictor(),
+                              ILine.RETENTION_TIME_KEYWORD)
+print(f"per psm: {time.time() - start:.2f}s")
+
+start = time.time()
+generate_rt_score_sqt(SQT_PATH, ms2_path, actual_path, CompositionPredictor())
+print(f"generate_rt_score_sqt: {time.time() - start:.2f}s")
+
+for actual, expected, name in zip(get_scored_values(actual_path), get_scored_values(expected_path),
+                                  ['experimental rt', 'predicted rt', 'score']):
+    assert_same_values(actual, expected, name)
+print(f"{len(s_lines)} s lines match the per psm implementation")
+
+# missing scans have no retention time, their psm's are not scored
+s_line_scans, psms = read_psm_columns(SQT_PATH)
+retention_times = get_retention_times(ms2_path, np.append(s_line_scans[1:], -1))
+assert np.isnan(retention_times[-1]) and not np.isnan(retention_times[:-1]).any()
+predicted, scores = score_psms(psms, retention_times[psms['s_line_index']], CompositionPredictor())
+is_missing = psms['s_line_index'] == len(s_line_scans) - 1
+assert np.isnan(predicted[is_missing]).all() and np.isnan(scores[is_missing]).all()
+assert ((scores[~np.isnan(scores)] >= 0) & (scores[~np.isnan(scores)] <= 1)).all()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+import numpy as np
+
+from src.senpy.ms2.lines import ILine, Ms2Spectra
+from src.senpy.ms2.scan_map import MISSING, SCAN_MAP_MAGIC, ScanPrecursorMap, get_scan_map_path, lookup_sorted
+
+rng = np.random.default_rng(0)
+work_dir = tempfile.mkdtemp()
+n_scans = 10_000
+scans = rng.permutation(np.arange(1, 3 * n_scans, 3))[:n_scans]
+precursor_ids = rng.permutation(n_scans) + 100
+scan_map = ScanPrecursorMap(scans, precursor_ids)
+missing_scans = np.array([0, 2, 3 * n_scans + 1, -5])
+missing_precursor_ids = np.array([0, 99, n_scans + 100])
+
+# binary sidecar round trip
+binary_path = os.path.join(work_dir, 'binary.sn2p')
+scan_map.save(binary_path)
+with open(binary_path, 'rb') as file:
+    assert file.read(len(SCAN_MAP_MAGIC)) == SCAN_MAP_MAGIC
+assert not os.path.exists(binary_path + '.tmp')
+loaded = ScanPrecursorMap.load(binary_path)
+assert np.array_equal(loaded.scans, scan_map.scans) and np.array_equal(loaded.precursor_ids, scan_map.precursor_ids)
+assert np.all(loaded.scans[1:] > loaded.scans[:-1])
+
+# legacy 'scan\tprecursor_id' text file
+text_path = os.path.join(work_dir, 'text.sn2p')
+with open(text_path, 'w') as file:
+    file.writelines(f"{scan}\t{precursor_id}\n" for scan, precursor_id in zip(scans.tolist(), precursor_ids.tolist()))
+text_loaded = ScanPrecursorMap.load(text_path)
+assert np.array_equal(text_loaded.scans, scan_map.scans)
+assert np.array_equal(text_loaded.precursor_ids, scan_map.precursor_ids)
+with open(text_path, 'w') as file:
+    file.write(f"{scans[0]}\t{precursor_ids[0]}\n")
+assert len(ScanPrecursorMap.load(text_path)) == 1
+
+# lookups in both directions, unknown values are MISSING
+for lookup_map in (scan_map, loaded, text_loaded):
+    assert np.array_equal(lookup_map.get_precursor_ids(scans), precursor_ids)
+    assert np.array_equal(lookup_map.get_scans(precursor_ids), scans)
+    assert np.all(lookup_map.get_precursor_ids(missing_scans) == MISSING)
+    assert np.all(lookup_map.get_scans(missing_precursor_ids) == MISSING)
+    mixed = np.array([scans[0], 2, scans[1]])
+    assert np.array_equal(lookup_map.get_precursor_ids(mixed), [precursor_ids[0], MISSING, precursor_ids[1]])
+
+empty = ScanPrecursorMap(np.empty(0), np.empty(0))
+empty_path = os.path.join(work_dir, 'empty.sn2p')
+empty.save(empty_path)
+assert len(ScanPrecursorMap.load(empty_path)) == 0
+assert np.all(empty.get_precursor_ids(scans[:3]) == MISSING) and np.all(empty.get_scans(precursor_ids[:3]) == MISSING)
+
+# lookup_sorted
+sorted_keys = np.array([2, 4, 8])
+assert np.array_equal(lookup_sorted(sorted_keys, [8, 1, 4, 9, 2]), [2, MISSING, 1, MISSING, 0])
+assert np.array_equal(lookup_sorted(np.empty(0, dtype=np.int64), [1, 2]), [MISSING, MISSING])
+
+# built from an ms2 file, spectra without a precursor id are skipped, and cached by load_or_build
+ms2_path = os.path.join(work_dir, 'scan_map.ms2')
+with open(ms2_path, 'w') as file:
+    file.write('H\tExtractor\tTimsTOF_extractor\n')
+    for scan, precursor_id in zip(scans[:100].tolist(), precursor_ids[:100].tolist()):
+        info_dict = {ILine.PRECURSOR_ID_KEYWORD: f"{precursor_id}"} if scan != scans[5] else {}
+        file.write(Ms2Spectra.create(scan, scan, 500.0, 2, 998.0, np.empty(0), np.empty(0), info_dict).serialize())
+built = ScanPrecursorMap.load_or_build(ms2_path)
+assert len(built) == 99 and built.get_precursor_ids(scans[5:6])[0] == MISSING
+assert np.array_equal(built.get_precursor_ids(scans[:5]), precursor_ids[:5])
+assert os.path.exists(get_scan_map_path(ms2_path))
+assert np.array_equal(ScanPrecursorMap.load_or_build(ms2_path).scans, built.scans)
+
+for file_name in os.listdir(work_dir):
+    os.remove(os.path.join(work_dir, file_name))
+os.rmdir(work_dir)
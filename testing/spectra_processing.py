@@ -0,0 +1,127 @@
+import os
+import sys
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from src.senpy.constants import C13_MASS_DIFFERENCE
+from src.senpy.spectra import processing
+from src.senpy.spectra.peaks import SpectraPeaks
+
+n_spectra = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+
+rng = np.random.default_rng(0)
+n_peaks = rng.integers(0, 300, n_spectra)
+n_peaks[::97] = 0
+mz_arrays = [np.sort(rng.uniform(100, 1800, n)) for n in n_peaks]
+intensity_arrays = [rng.uniform(1, 1e4, n).astype(np.float32) for n in n_peaks]
+# add an isotope peak after some peaks
+for mz_array, intensity_array in zip(mz_arrays[::3], intensity_arrays[::3]):
+    mz_array[1::10] = mz_array[0::10][:len(mz_array[1::10])] + C13_MASS_DIFFERENCE
+    intensity_array[1::10] = intensity_array[0::10][:len(intensity_array[1::10])] / 2
+    order = np.argsort(mz_array)
+    mz_array[:], intensity_array[:] = mz_array[order], intensity_array[order]
+peaks = SpectraPeaks.from_arrays(mz_arrays, intensity_arrays)
+print(f"{n_spectra} spectra, {len(peaks.mz)} peaks")
+
+# dfolder_to_hdf5.py layout round trip
+hdf5_path = os.path.join(tempfile.mkdtemp(), 'spectra.hdf5')
+peak_dt = [("mz_array", np.float64), ("intensity_array", np.float32)]
+spectra = np.zeros(len(peaks.mz), dtype=peak_dt)
+spectra["mz_array"], spectra["intensity_array"] = peaks.mz, peaks.intensity
+precursors = np.zeros((n_spectra, 1), dtype=[("n_peaks", np.int32)])
+precursors["n_peaks"][:, 0] = n_peaks
+with h5py.File(hdf5_path, 'w') as f:
+    f.create_dataset('spectra', data=spectra, dtype=peak_dt)
+    f.create_dataset('precursor', data=precursors)
+hdf5_peaks = SpectraPeaks.from_hdf5(hdf5_path)
+assert np.array_equal(hdf5_peaks.offsets, peaks.offsets) and np.array_equal(hdf5_peaks.mz, peaks.mz)
+os.remove(hdf5_path)
+
+
+def timed(name, func):
+    start = time.time()
+    result = func()
+    print(f"{name}: {time.time() - start:.3f}s")
+    return result
+
+
+def loop_top_n(n):
+    results = []
+    for mz, intensity in zip(mz_arrays, intensity_arrays):
+        keep = np.sort(np.argsort(-intensity, kind='stable')[:n])
+        results.append((mz[keep], intensity[keep]))
+    return results
+
+
+def loop_normalize():
+    return [(mz, intensity / intensity.max() if len(intensity) else intensity.astype(np.float64))
+            for mz, intensity in zip(mz_arrays, intensity_arrays)]
+
+
+def loop_deisotope(ppm=20):
+    results = []
+    for mz, intensity in zip(mz_arrays, intensity_arrays):
+        keep = []
+        for j in range(len(mz)):
+            target = mz[j] - C13_MASS_DIFFERENCE
+            tolerance = target * ppm / 1_000_000
+            keep.append(not any(abs(mz[i] - target) <= tolerance and intensity[i] > intensity[j]
+                                for i in range(len(mz))))
+        keep = np.array(keep, dtype=bool)
+        results.append((mz[keep], intensity[keep]))
+    return results
+
+
+def loop_bin(bin_width, min_mz, max_mz):
+    n_bins = int(np.ceil((max_mz - min_mz) / bin_width))
+    dense = np.zeros((n_spectra, n_bins))
+    for i, (mz, intensity) in enumerate(zip(mz_arrays, intensity_arrays)):
+        for peak_mz, peak_intensity in zip(mz, intensity):
+            if min_mz <= peak_mz < max_mz:
+                dense[i, int((peak_mz - min_mz) // bin_width)] += peak_intensity
+    return dense
+
+
+def assert_same(batched, looped):
+    assert len(batched) == len(looped)
+    for i, (mz, intensity) in enumerate(looped):
+        batch_mz, batch_intensity = batched[i]
+        assert np.array_equal(batch_mz, mz), i
+        assert np.allclose(batch_intensity, intensity), i
+
+
+assert_same(timed('top_n batched', lambda: processing.top_n(peaks, 50)), timed('top_n loop', lambda: loop_top_n(50)))
+assert_same(timed('normalize batched', lambda: processing.normalize(peaks)),
+            timed('normalize loop', loop_normalize))
+windowed = timed('window_mz batched', lambda: processing.window_mz(peaks, 200, 1500))
+assert_same(windowed, [(mz[(mz >= 200) & (mz <= 1500)], intensity[(mz >= 200) & (mz <= 1500)])
+                       for mz, intensity in zip(mz_arrays, intensity_arrays)])
+deisotoped = timed('deisotope batched', lambda: processing.deisotope(peaks))
+assert len(deisotoped.mz) < len(peaks.mz)
+# the loop is quadratic per spectrum, compare on the first 500 spectra only
+mz_arrays, intensity_arrays = mz_arrays[:500], intensity_arrays[:500]
+assert_same([deisotoped[i] for i in range(500)], timed('deisotope loop (500 spectra)', loop_deisotope))
+binned = timed('bin_peaks batched', lambda: processing.bin_peaks(peaks, 1.0005079, 0, 2000))
+mz_arrays, intensity_arrays = [peaks[i][0] for i in range(n_spectra)], [peaks[i][1] for i in range(n_spectra)]
+looped_binned = timed('bin_peaks loop', lambda: loop_bin(1.0005079, 0, 2000))
+assert np.allclose(binned.to_dense(np.float64), looped_binned)
+assert np.allclose(binned.to_sparse().toarray(), looped_binned)
+
+# unsorted spectra give the same binning and deisotoping as sorted ones
+shuffled = SpectraPeaks(peaks.offsets, peaks.mz[::-1].copy(), peaks.intensity[::-1].copy())
+shuffled = SpectraPeaks.from_arrays([shuffled.mz[len(peaks.mz) - end:len(peaks.mz) - start]
+                                     for start, end in zip(peaks.offsets[:-1], peaks.offsets[1:])],
+                                    [shuffled.intensity[len(peaks.mz) - end:len(peaks.mz) - start]
+                                     for start, end in zip(peaks.offsets[:-1], peaks.offsets[1:])])
+assert not shuffled.is_sorted() and peaks.is_sorted()
+assert np.allclose(processing.bin_peaks(shuffled).to_dense(), binned.to_dense())
+assert np.array_equal(processing.deisotope(shuffled).mz, deisotoped.mz)
+
+# integer intensities tie often, the first of equally intense peaks is kept
+tied_intensity_arrays = [rng.integers(0, 5, len(mz_array)).astype(np.float32) for mz_array in mz_arrays]
+tied = SpectraPeaks.from_arrays(mz_arrays, tied_intensity_arrays)
+intensity_arrays = tied_intensity_arrays
+assert_same(processing.top_n(tied, 20), loop_top_n(20))
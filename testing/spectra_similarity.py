@@ -0,0 +1,88 @@
+import sys
+import time
+
+import numpy as np
+
+from src.senpy.spectra import similarity
+from src.senpy.spectra.peaks import SpectraPeaks
+
+n_spectra = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+n_pairs = 100_000
+tolerance = 0.02
+
+rng = np.random.default_rng(0)
+n_peaks = rng.integers(0, 150, n_spectra)
+mz_arrays = [np.sort(rng.uniform(100, 1800, n)) for n in n_peaks]
+intensity_arrays = [rng.uniform(1, 1e4, n).astype(np.float32) for n in n_peaks]
+# every other spectrum is a noisy copy of the previous one, with close peaks competing for the same match
+for i in range(1, n_spectra, 2):
+    mz_arrays[i] = np.sort(np.concatenate([mz_arrays[i - 1] + rng.normal(0, 0.005, n_peaks[i - 1]),
+                                           mz_arrays[i - 1][::5] + 0.01]))
+    intensity_arrays[i] = rng.uniform(1, 1e4, len(mz_arrays[i])).astype(np.float32)
+peaks = SpectraPeaks.from_arrays(mz_arrays, intensity_arrays)
+print(f"{n_spectra} spectra, {len(peaks.mz)} peaks, {n_pairs} pairs")
+
+query_indexes = rng.integers(0, n_spectra, n_pairs)
+library_indexes = np.where(rng.random(n_pairs) < 0.5, query_indexes ^ 1, rng.integers(0, n_spectra, n_pairs))
+library_indexes = np.minimum(library_indexes, n_spectra - 1)
+
+
+def loop_score(query_mz, query_intensity, library_mz, library_intensity):
+    candidates = []
+    for i, (mz_1, intensity_1) in enumerate(zip(query_mz, query_intensity)):
+        for j, (mz_2, intensity_2) in enumerate(zip(library_mz, library_intensity)):
+            if abs(mz_1 - mz_2) <= tolerance:
+                candidates.append((float(intensity_1) * float(intensity_2), i, j))
+    candidates.sort(key=lambda candidate: -candidate[0])
+    used_query, used_library, dot_product = set(), set(), 0.0
+    for score, i, j in candidates:
+        if i not in used_query and j not in used_library:
+            used_query.add(i)
+            used_library.add(j)
+            dot_product += score
+    norm = np.sqrt(np.sum(np.square(query_intensity, dtype=np.float64))) * \
+        np.sqrt(np.sum(np.square(library_intensity, dtype=np.float64)))
+    return (min(dot_product / norm, 1) if norm > 0 else 0.0), len(used_query)
+
+
+def timed(name, func):
+    start = time.time()
+    result = func()
+    print(f"{name}: {time.time() - start:.3f}s")
+    return result
+
+
+scores = timed('score_pairs processes=1', lambda: similarity.score_pairs(peaks, peaks, query_indexes, library_indexes,
+                                                                         tolerance=tolerance, processes=1))
+parallel_scores = timed('score_pairs all cores', lambda: similarity.score_pairs(peaks, peaks, query_indexes,
+                                                                                library_indexes, tolerance=tolerance))
+assert np.array_equal(scores.cosine, parallel_scores.cosine)
+assert np.array_equal(scores.shared_peaks, parallel_scores.shared_peaks)
+
+n_loop = 2_000
+start = time.time()
+for i in range(n_loop):
+    cosine, shared_peaks = loop_score(*peaks[query_indexes[i]], *peaks[library_indexes[i]])
+    assert np.isclose(cosine, scores.cosine[i]), (i, cosine, scores.cosine[i])
+    assert shared_peaks == scores.shared_peaks[i], i
+print(f"python loop ({n_loop} pairs): {time.time() - start:.3f}s")
+assert np.all((0 <= scores.spectral_angle) & (scores.spectral_angle <= 1))
+self_scores = similarity.score_pairs(peaks, peaks, np.arange(n_spectra), np.arange(n_spectra), processes=1)
+assert np.allclose(self_scores.cosine[peaks.get_n_peaks() > 0], 1)
+assert np.array_equal(self_scores.shared_peaks, peaks.get_n_peaks())
+
+# binned all against all matrix against a dense computation
+subset = SpectraPeaks.from_arrays(mz_arrays[:300], intensity_arrays[:300])
+matrix = timed('binned_cosine_matrix (300 x 300)', lambda: similarity.binned_cosine_matrix(subset, subset))
+dense = np.zeros((300, 1999))
+for i in range(300):
+    np.add.at(dense[i], (mz_arrays[i] // similarity.DEFAULT_BIN_WIDTH).astype(int), intensity_arrays[i])
+norms = np.linalg.norm(dense, axis=1)
+norms[norms == 0] = 1
+dense /= norms[:, None]
+assert np.allclose(matrix.toarray(), dense @ dense.T)
+
+similar = timed('find_similar_pairs (all spectra)', lambda: similarity.find_similar_pairs(peaks, peaks, 0.5,
+                                                                                          exclude_self=True))
+assert np.all(similar.cosine >= 0.5) and np.all(similar.query_indexes != similar.library_indexes)
+print(f"{len(similar)} similar pairs")
@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.senpy.spectra import similarity
+from src.senpy.spectra.library import SpectralLibrary, SpectralLibraryWriter
+from src.senpy.spectra.peaks import SpectraPeaks
+
+n_library = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+n_queries = 20_000
+n_peaks = 50
+ppm, ook0_tolerance = 10, 0.05
+
+rng = np.random.default_rng(0)
+library_path = os.path.join(tempfile.mkdtemp(), 'library.slib')
+precursor_mz = rng.uniform(300, 1500, n_library)
+charge = rng.integers(1, 5, n_library)
+ook0 = rng.uniform(0.6, 1.4, n_library)
+ook0[::10] = np.nan
+library_peaks = SpectraPeaks.from_n_peaks(np.full(n_library, n_peaks),
+                                          np.sort(rng.uniform(100, 1800, (n_library, n_peaks)), axis=1).ravel(),
+                                          rng.uniform(1, 1e4, n_library * n_peaks).astype(np.float32))
+sequences = [f"PEP{i}TIDE" for i in range(n_library)]
+
+start = time.time()
+with SpectralLibraryWriter(library_path) as writer:
+    for batch_start in range(0, n_library, 10_000):
+        batch = np.arange(batch_start, min(batch_start + 10_000, n_library))
+        writer.add_batch(SpectraPeaks.from_arrays([library_peaks[i][0] for i in batch],
+                                                  [library_peaks[i][1] for i in batch]),
+                         precursor_mz[batch], charge[batch], [sequences[i] for i in batch], ook0[batch])
+    writer.add(500.0, 2, np.array([200.0, 300.0]), np.array([1.0, 2.0]), sequence='SINGLE')
+print(f"write {n_library} spectra: {time.time() - start:.2f}s, {os.path.getsize(library_path) / 1e6:.1f}MB")
+
+start = time.time()
+library = SpectralLibrary(library_path)
+print(f"open: {time.time() - start:.4f}s")
+assert len(library) == n_library + 1
+assert np.all(np.diff(library.charge) >= 0)
+for partition in range(len(library.charges)):
+    partition_rows = slice(library.charge_starts[partition], library.charge_starts[partition + 1])
+    assert np.all(np.diff(library.precursor_mz[partition_rows]) >= 0)
+
+# rows map back to the spectra that were added
+original = np.lexsort((np.append(precursor_mz, 500.0), np.append(charge, 2)))
+rows = rng.integers(0, len(library), 1000)
+row_peaks = library.get_peaks(rows)
+for i, row in enumerate(rows.tolist()):
+    if original[row] == n_library:
+        assert library.get_sequence(row) == 'SINGLE'
+        continue
+    assert library.get_sequence(row) == sequences[original[row]]
+    assert np.array_equal(row_peaks[i][0], library_peaks[original[row]][0])
+    assert np.array_equal(row_peaks[i][1], library_peaks[original[row]][1])
+    assert library.precursor_mz[row] == precursor_mz[original[row]]
+
+# queries: noisy copies of library spectra, some with unknown charge or mobility
+sources = rng.integers(0, n_library, n_queries)
+query_mz = precursor_mz[sources] * (1 + rng.normal(0, 2e-6, n_queries))
+query_charge = charge[sources].copy()
+query_charge[::7] = 0
+query_ook0 = ook0[sources] + rng.normal(0, 0.01, n_queries)
+query_ook0[::5] = np.nan
+query_peaks = SpectraPeaks.from_arrays([library_peaks[i][0] + rng.normal(0, 0.002, n_peaks) for i in sources],
+                                       [library_peaks[i][1] for i in sources])
+
+start = time.time()
+query_indexes, rows = library.query(query_mz, query_charge, query_ook0, ppm=ppm, ook0_tolerance=ook0_tolerance)
+print(f"query {n_queries}: {time.time() - start:.3f}s, {len(rows)} candidates")
+
+# brute force candidates
+library_charge, library_ook0, library_mz = library.charge.astype(np.int64), library.ook0, library.precursor_mz
+expected = []
+for i in range(0, n_queries, 50):
+    keep = np.abs(library_mz - query_mz[i]) <= query_mz[i] * ppm / 1_000_000
+    keep &= (library_charge == query_charge[i]) | (query_charge[i] == 0)
+    keep &= (np.abs(library_ook0 - query_ook0[i]) <= ook0_tolerance) | np.isnan(library_ook0) | np.isnan(query_ook0[i])
+    expected.extend((i, row) for row in np.flatnonzero(keep))
+found = {(i, row) for i, row in zip(query_indexes.tolist(), rows.tolist()) if i % 50 == 0}
+assert found == set(expected)
+
+start = time.time()
+scores = library.search(query_peaks, query_mz, query_charge, query_ook0, ppm=ppm, ook0_tolerance=ook0_tolerance,
+                        processes=1)
+print(f"search {n_queries}: {time.time() - start:.3f}s")
+assert np.array_equal(scores.query_indexes, query_indexes) and np.array_equal(scores.library_indexes, rows)
+best_rows = scores.get_best_library_indexes(n_queries)
+row_of_source = np.empty(len(library), dtype=np.int64)
+row_of_source[original] = np.arange(len(library))
+matched = best_rows != similarity.NO_MATCH
+assert np.mean(best_rows[matched] == row_of_source[sources][matched]) > 0.99
+print(f"{matched.mean():.3f} of queries matched, {np.mean(best_rows == row_of_source[sources]):.3f} to their source")
+
+# same scores as scoring the candidate pairs directly
+direct = similarity.score_pairs(query_peaks, library.get_peaks(), query_indexes, rows, processes=1)
+assert np.allclose(direct.cosine, scores.cosine) and np.array_equal(direct.shared_peaks, scores.shared_peaks)
+del library
+os.remove(library_path)
@@ -0,0 +1,92 @@
+import sys
+import time
+from ctypes import POINTER, c_double, c_float, c_int64, cast
+
+import numpy as np
+
+from src.senpy.d_folder.timsdata import MSMS_SPECTRUM_FUNCTOR, PasefMsMsBatch, _PeakArena, _copy_from_pointer
+
+# the dll is simulated: every spectrum is held in ctypes arrays and fed to the same MSMS_SPECTRUM_FUNCTOR callbacks
+# TimsData.readPasefMsMs / readPasefMsMsBatch hand to tims_read_pasef_msms
+n_spectra = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+
+rng = np.random.default_rng(0)
+precursor_ids = rng.permutation(n_spectra) + 1
+n_peaks = rng.integers(0, 400, n_spectra)
+spectra = []
+for n in n_peaks.tolist():
+    mz_values = (c_double * n)(*np.sort(rng.uniform(100, 1800, n)).tolist())
+    area_values = (c_float * n)(*rng.uniform(1, 1e4, n).astype(np.float32).tolist())
+    spectra.append((n, cast(mz_values, POINTER(c_double)), cast(area_values, POINTER(c_float)), mz_values, area_values))
+print(f"{n_spectra} spectra, {n_peaks.sum()} peaks")
+
+
+def read(callback_for_dll):
+    for precursor_id, (n, mz_pointer, area_pointer, _, _) in zip(precursor_ids.tolist(), spectra):
+        callback_for_dll(c_int64(precursor_id), n, mz_pointer, area_pointer)
+
+
+def timed(name, func):
+    start = time.time()
+    result = func()
+    print(f"{name}: {time.time() - start:.2f}s")
+    return result
+
+
+def read_sliced():
+    result = {}
+
+    @MSMS_SPECTRUM_FUNCTOR
+    def callback_for_dll(precursor_id, num_peaks, mz_values, area_values):
+        result[precursor_id] = (mz_values[0:num_peaks], area_values[0:num_peaks])
+
+    read(callback_for_dll)
+    return result
+
+
+def read_copied():
+    result = {}
+
+    @MSMS_SPECTRUM_FUNCTOR
+    def callback_for_dll(precursor_id, num_peaks, mz_values, area_values):
+        result[precursor_id] = (_copy_from_pointer(mz_values, num_peaks, np.float64),
+                                _copy_from_pointer(area_values, num_peaks, np.float32))
+
+    read(callback_for_dll)
+    return result
+
+
+def read_batch(capacity):
+    arena = _PeakArena([np.float64, np.float32], capacity=capacity)
+
+    @MSMS_SPECTRUM_FUNCTOR
+    def callback_for_dll(precursor_id, num_peaks, mz_values, area_values):
+        arena.add(precursor_id, num_peaks, (mz_values, area_values))
+
+    read(callback_for_dll)
+    ids, offsets, (mz, intensity) = arena.finish()
+    return PasefMsMsBatch(ids, offsets, mz, intensity)
+
+
+sliced = timed('list slicing', read_sliced)
+copied = timed('numpy copy', read_copied)
+batch = timed('arena', lambda: read_batch(1 << 16))
+# a capacity of 1 regrows the arena on nearly every spectrum, moving every earlier spectrum each time
+small_batch = read_batch(1)
+
+assert len(batch) == len(small_batch) == n_spectra
+assert np.array_equal(batch.precursor_ids, precursor_ids)
+assert np.array_equal(batch.offsets[1:], np.cumsum(n_peaks))
+for precursor_id, (mz_list, area_list) in sliced.items():
+    assert np.array_equal(copied[precursor_id][0], mz_list)
+    assert np.array_equal(copied[precursor_id][1], np.array(area_list, dtype=np.float32))
+    for peaks in (batch, small_batch):
+        mz, intensity = peaks.get_peaks(precursor_id)
+        assert mz.dtype == np.float64 and intensity.dtype == np.float32
+        assert np.array_equal(mz, mz_list) and np.array_equal(intensity, np.array(area_list, dtype=np.float32))
+    assert precursor_id in batch
+
+# precursors the dll returned nothing for give empty peaks
+assert n_spectra + 1 not in batch
+assert len(batch.get_peaks(n_spectra + 1)[0]) == 0
+assert batch.to_dict().keys() == set(precursor_ids.tolist())